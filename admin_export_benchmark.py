@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Admin Export Benchmark
+Compares the streaming admin export encoders with the previous build-everything-in-memory CSV:
+identical output, peak memory at 100k users, NDJSON/JSON shapes, incremental gzip and resumable
+range downloads of background export files
+"""
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from fastapi import HTTPException
+
+sys.path.append('/app/backend')
+
+from modules.admin_exports import AdminExportEngine, encode_rows, export_pipelines, gzip_chunks, iterate_rows, parse_range
+
+USERS = int(os.getenv("EXPORT_USERS", "100000"))
+TIERS = ["free", "basic", "professional", "enterprise"]
+
+
+# ----- Previous helper: collects every row, then builds the whole CSV in a StringIO -----
+def legacy_csv(data):
+    output = io.StringIO()
+    all_fieldnames = set()
+    for record in data:
+        all_fieldnames.update(record.keys())
+    writer = csv.DictWriter(output, fieldnames=sorted(all_fieldnames), restval='')
+    writer.writeheader()
+    for row in data:
+        cleaned_row = {}
+        for key, value in row.items():
+            if isinstance(value, datetime):
+                cleaned_row[key] = value.isoformat()
+            elif isinstance(value, list):
+                cleaned_row[key] = ", ".join(str(item) for item in value)
+            else:
+                cleaned_row[key] = value
+        writer.writerow(cleaned_row)
+    return output.getvalue()
+
+
+def make_user(index):
+    rng = random.Random(index)
+    user = {
+        "user_id": f"user_{index:08d}",
+        "email": f"user{index}@example.com",
+        "first_name": "Test",
+        "last_name": f"User {index}",
+        "subscription_tier": rng.choice(TIERS),
+        "is_active": rng.random() > 0.1,
+        "created_at": datetime(2024, 1, 1) + timedelta(minutes=index),
+        "tags": rng.sample(["beta", "vip", "trial", "churn-risk"], rng.randint(0, 3))
+    }
+    # Schema variations across documents
+    if index % 7 == 0:
+        user["company_name"] = f"Company {index}, Inc."
+    if index % 11 == 0:
+        user["last_login"] = datetime(2025, 6, 1) + timedelta(hours=index % 1000)
+    return user
+
+
+async def generated_users(count):
+    for index in range(count):
+        yield make_user(index)
+
+
+async def collect(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+
+async def run_benchmark():
+    results = []
+    print("📤 Admin Export Benchmark")
+    print("=" * 70)
+
+    # Same CSV bytes as the previous export when headers are discovered up front
+    sample = [make_user(index) for index in range(20000)]
+    columns = sorted({key for row in sample for key in row})
+    streamed = (await collect(encode_rows(iterate_rows(sample), "csv", columns))).decode()
+    identical = streamed == legacy_csv(sample)
+    results.append(identical)
+    print(f"{'✅ PASS' if identical else '❌ FAIL'}: streamed CSV identical to the previous export for 20,000 users with varying fields")
+
+    # Peak memory: previous to_list + StringIO vs cursor-batch streaming
+    tracemalloc.start()
+    started = time.perf_counter()
+    legacy_size = len(legacy_csv([make_user(index) for index in range(USERS)]).encode())
+    legacy_seconds = time.perf_counter() - started
+    legacy_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    streamed_size, chunk_count = 0, 0
+    async for chunk in encode_rows(generated_users(USERS), "csv", columns):
+        streamed_size += len(chunk)
+        chunk_count += 1
+    streamed_seconds = time.perf_counter() - started
+    streamed_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    bounded = streamed_size == legacy_size and streamed_peak * 20 < legacy_peak
+    results.append(bounded)
+    print(f"{'✅ PASS' if bounded else '❌ FAIL'}: {USERS:,} users ({streamed_size / 1e6:.1f} MB CSV): peak memory "
+          f"{streamed_peak / 1e6:.2f} MB streamed vs {legacy_peak / 1e6:.1f} MB previous "
+          f"({streamed_seconds:.2f}s vs {legacy_seconds:.2f}s, {chunk_count} chunks)")
+
+    # NDJSON rows and the JSON shape the endpoint always returned
+    rows = sample[:500]
+    ndjson = (await collect(encode_rows(iterate_rows(rows), "ndjson"))).decode().splitlines()
+    document = json.loads(await collect(encode_rows(iterate_rows(rows), "json")))
+    expected = json.loads(json.dumps(rows, default=lambda value: value.isoformat()))
+    empty = json.loads(await collect(encode_rows(iterate_rows([]), "xlsx")))
+    shapes = ([json.loads(line) for line in ndjson] == expected and document == {"data": expected, "count": len(rows)}
+              and empty == {"data": [], "count": 0})
+    results.append(shapes)
+    print(f"{'✅ PASS' if shapes else '❌ FAIL'}: NDJSON one object per line; JSON keeps {{\"data\": [...], \"count\": n}}")
+
+    # Incremental gzip round-trips
+    compressed = await collect(gzip_chunks(encode_rows(iterate_rows(sample), "csv", columns)))
+    round_trip = gzip.decompress(compressed).decode() == streamed
+    results.append(round_trip)
+    print(f"{'✅ PASS' if round_trip else '❌ FAIL'}: gzip stream decompresses to the same CSV "
+          f"({len(streamed) / 1e6:.1f} MB -> {len(compressed) / 1e6:.2f} MB)")
+
+    # The discounts export joins usage counts in the cursor's pipeline
+    _, base, joins, added = export_pipelines("discounts", {})
+    stages = [next(iter(stage)) for stage in base + joins]
+    joined = stages.count("$lookup") == 1 and added == ["actual_usage_count"] and {"$project": {"_id": 0}} in base
+    results.append(joined)
+    print(f"{'✅ PASS' if joined else '❌ FAIL'}: discounts pipeline {' -> '.join(stages)} replaces a count_documents per discount")
+
+    # Users carry search index arrays since keyset search; the export projects them away
+    _, base, _, _ = export_pipelines("users", {})
+    hidden = {field for stage in base if "$project" in stage for field, keep in stage["$project"].items() if keep == 0}
+    indexed = [{**user, "search": {"prefixes": ["us", "use"], "trigrams": ["use", "ser"]}} for user in sample[:500]]
+    exported = [{key: value for key, value in user.items() if key not in hidden} for user in indexed]
+    discovered = sorted({key for row in exported for key in row})
+    header = (await collect(encode_rows(iterate_rows(exported), "csv", discovered))).decode().splitlines()[0].split(",")
+    unindexed = {"search", "password_hash"} <= hidden and "search" not in header
+    results.append(unindexed)
+    print(f"{'✅ PASS' if unindexed else '❌ FAIL'}: users export projects away {sorted(hidden)}; CSV columns have no search")
+
+    results.append(await check_range_downloads(compressed))
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+async def read_response(response):
+    body = b""
+    async for chunk in response.body_iterator:
+        body += chunk if isinstance(chunk, bytes) else chunk.encode()
+    return response.status_code, response.headers, body
+
+
+async def check_range_downloads(content):
+    """An interrupted download resumes with Range/If-Range and reassembles the file"""
+    engine = AdminExportEngine(None)
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "job_users_export.csv.gz"
+        path.write_bytes(content)
+        job = {"job_id": "job", "status": "completed", "file_path": str(path), "file_name": path.name, "format": "csv", "gzip": True}
+
+        status, headers, body = await read_response(engine.download_response(job))
+        cut = len(content) * 2 // 5
+        first_part = body[:cut]
+        status_resumed, resumed_headers, rest = await read_response(
+            engine.download_response(job, f"bytes={cut}-", headers["etag"])
+        )
+        _, _, tail = await read_response(engine.download_response(job, "bytes=-100"))
+        status_changed, _, _ = await read_response(engine.download_response(job, f"bytes={cut}-", '"another-file"'))
+        try:
+            engine.download_response(job, f"bytes={len(content)}-")
+            unsatisfiable = None
+        except HTTPException as e:
+            unsatisfiable = e.status_code
+
+    ok = (status == 200 and body == content and status_resumed == 206 and first_part + rest == content
+          and resumed_headers["content-range"] == f"bytes {cut}-{len(content) - 1}/{len(content)}"
+          and tail == content[-100:] and status_changed == 200 and unsatisfiable == 416
+          and parse_range("bytes=0-0,5-9", 10) is None and parse_range("bytes=5-100", 10) == (5, 9))
+    print(f"{'✅ PASS' if ok else '❌ FAIL'}: download resumed at byte {cut:,} with 206 + Content-Range; suffix ranges, "
+          f"stale If-Range -> full file, out-of-range -> 416")
+    return ok
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
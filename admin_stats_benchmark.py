@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Admin Stats Benchmark
+Seeds users, login logs and trial email logs into a scratch database and compares the $facet stats
+engine with the previous per-breakdown queries behind /admin/analytics/dashboard,
+/admin/analytics/users and /admin/trial-emails/stats: identical numbers, database round trips per
+dashboard load and load latency
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+# Scratch database before importing the modules
+os.environ["DB_NAME"] = f"admin_stats_benchmark_{uuid.uuid4().hex[:8]}"
+sys.path.append('/app/backend')
+
+from modules.admin_stats import MONGO_URL, AdminStatsEngine
+from modules.index_registry import index_registry, IndexMigrationRunner
+
+USERS = int(os.getenv("ADMIN_STATS_USERS", "200000"))
+LOGINS = USERS * 2
+TRIAL_EMAILS = USERS // 2
+TIERS = ["free", "launch", "growth", "scale", "white_label", "custom"]
+EMAIL_TYPES = ["welcome", "progress", "urgency", "final"]
+STATUSES = ["sent", "sent", "sent", "failed", "scheduled", "skipped"]
+LOADS = 10
+
+
+class RoundTrips(monitoring.CommandListener):
+    """Counts the commands sent to the server, index builds excluded"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name not in ("createIndexes", "endSessions"):
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+round_trips = RoundTrips()
+client = AsyncIOMotorClient(MONGO_URL, event_listeners=[round_trips])
+db = client[os.environ["DB_NAME"]]
+
+
+# ----- Previous endpoint bodies, one query per breakdown -----
+async def legacy_dashboard():
+    tier_stats = await db.users.aggregate([{"$group": {
+        "_id": "$subscription_tier", "count": {"$sum": 1},
+        "active_count": {"$sum": {"$cond": [{"$eq": ["$is_active", True]}, 1, 0]}}
+    }}]).to_list(length=10)
+    monthly_growth = []
+    for i in range(12):
+        start_date = datetime.utcnow().replace(day=1) - timedelta(days=30 * i)
+        end_date = start_date + timedelta(days=32)
+        monthly_users = await db.users.count_documents({"created_at": {"$gte": start_date, "$lt": end_date}})
+        monthly_growth.insert(0, {"month": start_date.strftime("%Y-%m"), "new_users": monthly_users})
+    cancelled_users = await db.users.count_documents({"is_active": False})
+    banner_stats = await db.banners.aggregate([{"$group": {
+        "_id": "$status", "count": {"$sum": 1}, "total_views": {"$sum": "$views"}, "total_clicks": {"$sum": "$clicks"}
+    }}]).to_list(length=10)
+    discount_stats = await db.discounts.aggregate([{"$group": {
+        "_id": "$discount_type", "count": {"$sum": 1}, "total_uses": {"$sum": "$total_uses"}, "total_impact": {"$sum": "$total_revenue_impact"}
+    }}]).to_list(length=10)
+    recent_activities = await db.admin_audit_log.find({}).sort("timestamp", -1).limit(20).to_list(length=20)
+    return {"tier_stats": tier_stats, "monthly_growth": monthly_growth, "cancelled_users": cancelled_users,
+            "banner_stats": banner_stats, "discount_stats": discount_stats, "recent_activities": recent_activities}
+
+
+async def legacy_user_activity(start_date, end_date):
+    daily_signups = await db.users.aggregate([
+        {"$match": {"created_at": {"$gte": start_date, "$lte": end_date}}},
+        {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                    "signups": {"$sum": 1}, "by_tier": {"$push": "$subscription_tier"}}},
+        {"$sort": {"_id": 1}}
+    ]).to_list(length=100)
+    churn_data = await db.users.aggregate([
+        {"$match": {"is_active": False, "deactivated_at": {"$gte": start_date, "$lte": end_date}}},
+        {"$group": {"_id": "$subscription_tier", "churned_count": {"$sum": 1}}}
+    ]).to_list(length=10)
+    login_frequency = await db.login_logs.aggregate([
+        {"$match": {"login_time": {"$gte": start_date, "$lte": end_date}, "success": True}},
+        {"$group": {"_id": "$user_id", "login_count": {"$sum": 1}, "last_login": {"$max": "$login_time"}}},
+        {"$group": {"_id": {"$switch": {"branches": [
+            {"case": {"$gte": ["$login_count", 20]}, "then": "very_active"},
+            {"case": {"$gte": ["$login_count", 10]}, "then": "active"},
+            {"case": {"$gte": ["$login_count", 5]}, "then": "moderate"},
+            {"case": {"$gte": ["$login_count", 1]}, "then": "low"}
+        ], "default": "inactive"}}, "user_count": {"$sum": 1}}}
+    ]).to_list(length=10)
+    return {"daily_signups": daily_signups, "churn_analysis": churn_data, "login_frequency": login_frequency}
+
+
+async def legacy_trial_emails():
+    logs = db.trial_email_logs
+    total_logs = await logs.count_documents({})
+    overall = {"total_emails": total_logs}
+    for status in ("sent", "failed", "scheduled", "skipped"):
+        overall[status] = await logs.count_documents({"status": status})
+    overall["success_rate_percent"] = round((overall["sent"] / total_logs * 100) if total_logs > 0 else 0, 2)
+    type_stats = {}
+    for email_type in EMAIL_TYPES:
+        type_total = await logs.count_documents({"email_type": email_type})
+        type_sent = await logs.count_documents({"email_type": email_type, "status": "sent"})
+        type_failed = await logs.count_documents({"email_type": email_type, "status": "failed"})
+        type_stats[email_type] = {"total": type_total, "sent": type_sent, "failed": type_failed,
+                                  "success_rate": round((type_sent / type_total * 100) if type_total > 0 else 0, 2)}
+    recent_activity = await logs.aggregate([
+        {"$match": {"created_at": {"$gte": datetime.utcnow() - timedelta(days=7)}}},
+        {"$group": {"_id": {"date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}, "type": "$email_type"},
+                    "count": {"$sum": 1}}},
+        {"$sort": {"_id.date": 1}}
+    ]).to_list(length=None)
+    trial_users = await logs.aggregate([
+        {"$group": {"_id": "$user_email", "total_emails": {"$sum": 1},
+                    "sent_emails": {"$sum": {"$cond": [{"$eq": ["$status", "sent"]}, 1, 0]}},
+                    "first_name": {"$first": "$first_name"}, "trial_start": {"$first": "$trial_start_date"},
+                    "trial_end": {"$first": "$trial_end_date"}}},
+        {"$sort": {"trial_start": -1}},
+        {"$limit": 20}
+    ]).to_list(length=None)
+    return {"overall_stats": overall, "stats_by_email_type": type_stats, "recent_activity": recent_activity, "trial_users_with_emails": trial_users}
+
+
+async def seed(rng, now):
+    async def insert(collection, documents):
+        for start in range(0, len(documents), 20000):
+            await collection.insert_many(documents[start:start + 20000], ordered=False)
+
+    users = []
+    for index in range(USERS):
+        active = rng.random() < 0.85
+        users.append({
+            "user_id": f"user_{index}",
+            "subscription_tier": rng.choice(TIERS),
+            "is_active": active,
+            "created_at": now - timedelta(days=rng.uniform(0, 420)),
+            **({} if active else {"deactivated_at": now - timedelta(days=rng.uniform(0, 60))})
+        })
+    await insert(db.users, users)
+    await insert(db.login_logs, [{"user_id": f"user_{int(rng.paretovariate(1.2)) % USERS}", "success": rng.random() < 0.95,
+                                  "login_time": now - timedelta(days=rng.uniform(0, 60))} for _ in range(LOGINS)])
+    await insert(db.trial_email_logs, [{
+        "user_email": f"trial{index // 4}@example.com", "first_name": f"Trial{index // 4}",
+        "email_type": EMAIL_TYPES[index % 4], "status": rng.choice(STATUSES),
+        "trial_start_date": now - timedelta(days=(index // 4) % 365, seconds=index // 4),
+        "trial_end_date": now - timedelta(days=(index // 4) % 365 - 7, seconds=index // 4),
+        "created_at": now - timedelta(days=rng.uniform(0, 30))
+    } for index in range(TRIAL_EMAILS)])
+    await db.banners.insert_many([{"status": rng.choice(["active", "paused"]), "views": rng.randrange(1000), "clicks": rng.randrange(100)} for _ in range(200)])
+    await db.discounts.insert_many([{"discount_type": rng.choice(["percentage", "fixed_amount"]), "total_uses": rng.randrange(500),
+                                     "total_revenue_impact": rng.uniform(0, 5000)} for _ in range(100)])
+    await db.admin_audit_log.insert_many([{"action": "update", "timestamp": now - timedelta(minutes=i)} for i in range(100)])
+
+
+def normalized(stats):
+    """Order-independent view of the group outputs"""
+    key = lambda row: str(row["_id"])
+    result = dict(stats)
+    for name in ("tier_stats", "banner_stats", "discount_stats", "churn_analysis", "login_frequency", "recent_activity"):
+        if name in result:
+            result[name] = sorted(result[name], key=key)
+    for name in ("banner_stats", "discount_stats"):
+        if name in result:
+            result[name] = [{**row, **{field: round(value, 6) for field, value in row.items() if isinstance(value, float)}} for row in result[name]]
+    if "daily_signups" in result:
+        result["daily_signups"] = [{**row, "by_tier": sorted(row["by_tier"])} for row in result["daily_signups"]]
+    if "recent_activities" in result:
+        result["recent_activities"] = [row["_id"] for row in result["recent_activities"]]
+    if "trial_users_with_emails" in result:
+        result["trial_users_with_emails"] = [(row["_id"], row["total_emails"], row["sent_emails"]) for row in result["trial_users_with_emails"]]
+    return result
+
+
+async def measure(load):
+    """Round trips and latency of one full load"""
+    before = round_trips.count
+    started = time.perf_counter()
+    result = await load()
+    return result, round_trips.count - before, (time.perf_counter() - started) * 1000
+
+
+async def run_benchmark():
+    results = []
+    rng = random.Random(47)
+    now = datetime.utcnow()
+    engine = AdminStatsEngine(db)
+    start_date, end_date = now - timedelta(days=30), now
+    print("📊 Admin Stats Benchmark")
+    print("=" * 70)
+
+    try:
+        await seed(rng, now)
+        await IndexMigrationRunner(db, index_registry).migrate()
+
+        pairs = [
+            ("/admin/analytics/dashboard", legacy_dashboard, engine.dashboard),
+            ("/admin/analytics/users", lambda: legacy_user_activity(start_date, end_date), lambda: engine.user_activity(start_date, end_date)),
+            ("/admin/trial-emails/stats", legacy_trial_emails, engine.trial_emails)
+        ]
+        legacy_trips = facet_trips = 0
+        for route, legacy_load, facet_load in pairs:
+            legacy, legacy_count, _ = await measure(legacy_load)
+            facet, facet_count, _ = await measure(facet_load)
+            legacy_trips += legacy_count
+            facet_trips += facet_count
+            same = normalized(legacy) == normalized(facet)
+            results.append(same)
+            print(f"{'✅ PASS' if same else '❌ FAIL'}: {route} identical to the previous queries "
+                  f"({legacy_count} round trips -> {facet_count})")
+
+        fewer = facet_trips <= 7 and legacy_trips >= 30
+        results.append(fewer)
+        print(f"{'✅ PASS' if fewer else '❌ FAIL'}: {legacy_trips} round trips per load of the three dashboards -> {facet_trips}")
+
+        legacy_ms, facet_ms = [], []
+        for _ in range(LOADS):
+            started = time.perf_counter()
+            for _, legacy_load, _ in pairs:
+                await legacy_load()
+            legacy_ms.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            await asyncio.gather(*(facet_load() for _, _, facet_load in pairs))
+            facet_ms.append((time.perf_counter() - started) * 1000)
+        legacy_mean, facet_mean = sum(legacy_ms) / LOADS, sum(facet_ms) / LOADS
+        faster = facet_mean < legacy_mean
+        results.append(faster)
+        print(f"{'✅ PASS' if faster else '❌ FAIL'}: uncached load of the three dashboards {facet_mean:.0f} ms vs {legacy_mean:.0f} ms "
+              f"({USERS:,} users, {LOGINS:,} logins, {TRIAL_EMAILS:,} trial emails)")
+
+    finally:
+        await client.drop_database(os.environ["DB_NAME"])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Analytics Rollups Benchmark
+Seeds customers for several tenants into a scratch database and compares the materialized
+/api/analytics rollups with the previous load-everything computation: equality, read latency
+at growing sizes, incremental upserts/deletes and the consistency checker
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+
+# Scratch database before importing the modules
+os.environ["DB_NAME"] = f"analytics_rollups_benchmark_{uuid.uuid4().hex[:8]}"
+sys.path.append('/app/backend')
+
+from modules.analytics_rollups import db, client, AnalyticsRollupEngine, ALL_TENANTS
+
+SIZES = [int(size) for size in os.getenv("ROLLUP_SIZES", "10000,100000,400000").split(",")]
+TENANTS = ["tenant_a", "tenant_b", "tenant_c"]
+PRODUCTS = [f"Product {i}" for i in range(12)]
+STAGES = ["new", "active", "at_risk", "churned"]
+
+
+# ----- Previous per-request computation, without the 1,000-document cap and with ties broken by name -----
+async def legacy_analytics(customer_filter):
+    total_customers = await db.customers.count_documents(customer_filter)
+    customers = await db.customers.find(customer_filter).to_list(length=None)
+    total_revenue = sum(c.get("total_spent", 0) for c in customers)
+    software_counts = {}
+    for customer in customers:
+        for software in customer.get("software_owned", []):
+            software_counts[software] = software_counts.get(software, 0) + 1
+    top_products = [
+        {"name": software, "customers": count, "revenue": count * 3500}
+        for software, count in sorted(software_counts.items(), key=lambda x: (-x[1], x[0]))[:5]
+    ]
+    segment_counts = {}
+    for customer in customers:
+        stage = customer.get("lifecycle_stage", "active")
+        segment_counts[stage] = segment_counts.get(stage, 0) + 1
+    return total_customers, total_revenue, top_products, segment_counts
+
+
+def random_customer(rng, index):
+    return {
+        "customer_id": f"bench_{index:08d}",
+        "owner_user_id": rng.choice(TENANTS),
+        "total_spent": round(rng.uniform(0, 20000), 2),
+        "lifecycle_stage": rng.choice(STAGES),
+        "software_owned": rng.sample(PRODUCTS, rng.randint(0, 4))
+    }
+
+
+async def seed(rng, start, end):
+    batch = []
+    for index in range(start, end):
+        batch.append(random_customer(rng, index))
+        if len(batch) == 10000:
+            await db.customers.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.customers.insert_many(batch, ordered=False)
+
+
+def same(rollup, legacy):
+    total_customers, total_revenue, top_products, segments = legacy
+    return (rollup["total_customers"] == total_customers and abs(rollup["total_revenue"] - total_revenue) < 0.01
+            and rollup["top_products"] == top_products and rollup["segment_distribution"] == segments)
+
+
+async def run_benchmark():
+    results = []
+    rng = random.Random(3)
+    engine = AnalyticsRollupEngine(db)
+    print("📊 Analytics Rollups Benchmark")
+    print("=" * 70)
+
+    try:
+        seeded = 0
+        for size in SIZES:
+            await seed(rng, seeded, size)
+            seeded = size
+            await engine.rebuild()
+
+            equal = True
+            for tenant, customer_filter in [(ALL_TENANTS, {}), ("tenant_b", {"owner_user_id": "tenant_b"})]:
+                started = time.perf_counter()
+                legacy = await legacy_analytics(customer_filter)
+                legacy_ms = (time.perf_counter() - started) * 1000
+                started = time.perf_counter()
+                rollup = await engine.read(tenant)
+                rollup_ms = (time.perf_counter() - started) * 1000
+                equal = equal and same(rollup, legacy)
+            fast = rollup_ms < 50
+            results.append(equal and fast)
+            print(f"{'✅ PASS' if equal and fast else '❌ FAIL'}: {size:>9,} customers: rollup read {rollup_ms:6.1f} ms vs legacy {legacy_ms:8.1f} ms, "
+                  f"identical totals/segments/top products {equal}")
+
+        # Incremental inserts, updates and deletes through apply_change
+        started = time.perf_counter()
+        for index in range(seeded, seeded + 2000):
+            customer = random_customer(rng, index)
+            await db.customers.insert_one(dict(customer))
+            await engine.apply_change(None, customer)
+        for _ in range(2000):
+            index = rng.randrange(seeded)
+            changes = {"lifecycle_stage": rng.choice(STAGES), "total_spent": round(rng.uniform(0, 20000), 2),
+                       "software_owned": rng.sample(PRODUCTS, rng.randint(0, 4))}
+            previous = await db.customers.find_one_and_update({"customer_id": f"bench_{index:08d}"}, {"$set": changes})
+            await engine.apply_change(previous, {**previous, **changes})
+        for _ in range(1000):
+            previous = await db.customers.find_one_and_delete({"customer_id": f"bench_{rng.randrange(seeded):08d}"})
+            if previous:
+                await engine.apply_change(previous, None)
+        write_ms = (time.perf_counter() - started) * 1000 / 5000
+        report = await engine.check_consistency()
+        incremental = report["consistent"] and same(await engine.read(ALL_TENANTS), await legacy_analytics({}))
+        results.append(incremental)
+        print(f"{'✅ PASS' if incremental else '❌ FAIL'}: 5,000 incremental writes ({write_ms:.2f} ms each incl. the customer write) "
+              f"keep every rollup equal to a full recompute")
+
+        # Freshness advances with each write
+        before = (await engine.read("tenant_a"))["rolled_up_at"]
+        customer = random_customer(rng, seeded + 5000)
+        customer["owner_user_id"] = "tenant_a"
+        await db.customers.insert_one(dict(customer))
+        await engine.apply_change(None, customer)
+        fresh = (await engine.read("tenant_a"))["rolled_up_at"] > before
+        results.append(fresh)
+        print(f"{'✅ PASS' if fresh else '❌ FAIL'}: rolled_up_at advances on a customer write")
+
+        # Drift from a write outside the API is detected and repaired
+        await db.customers.update_many({"owner_user_id": "tenant_c", "lifecycle_stage": "new"}, {"$set": {"lifecycle_stage": "churned"}})
+        drifted = await engine.check_consistency("tenant_c", repair=True)
+        repaired = await engine.check_consistency("tenant_c")
+        detected = not drifted["consistent"] and "repair" in drifted and repaired["consistent"]
+        results.append(detected)
+        print(f"{'✅ PASS' if detected else '❌ FAIL'}: direct update drift found ({drifted['mismatch_count']} rollups) and repaired by a tenant rebuild "
+              f"({drifted.get('repair', {}).get('seconds', 0):.2f}s)")
+
+    finally:
+        await client.drop_database(os.environ["DB_NAME"])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
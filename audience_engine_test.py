@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Audience Engine Scale Test
+Snapshots and streams audiences of growing size and checks that memory stays flat and nothing is truncated
+"""
+
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from motor.motor_asyncio import AsyncIOMotorClient
+sys.path.append('/app/backend')
+
+from modules.audience_engine import AudienceEngine
+
+# MongoDB setup (scratch database, dropped at the end)
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+TEST_DB_NAME = f"audience_engine_test_{uuid.uuid4().hex[:8]}"
+
+AUDIENCE_SIZES = [int(size) for size in os.getenv("AUDIENCE_SIZES", "10000,100000,1000000").split(",")]
+TIERS = ["launch", "growth", "scale"]
+
+
+async def seed_users(db, start: int, end: int):
+    chunk = []
+    for i in range(start, end):
+        chunk.append({
+            "user_id": f"user_{i:08d}",
+            "email": f"user{i}@example.com",
+            "first_name": f"User{i}",
+            "subscription_tier": TIERS[i % len(TIERS)],
+            "is_active": i % 10 != 0
+        })
+        if len(chunk) == 10000:
+            await db.users.insert_many(chunk, ordered=False)
+            chunk = []
+    if chunk:
+        await db.users.insert_many(chunk, ordered=False)
+
+
+async def measure(engine: AudienceEngine, campaign_id: str, segment):
+    tracemalloc.start()
+    started = time.perf_counter()
+    snapshot = await engine.snapshot(campaign_id, segment, source="users")
+    snapshot_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    streamed = 0
+    async for batch in engine.iter_snapshot(campaign_id, batch_size=1000):
+        streamed += len(batch)
+    stream_seconds = time.perf_counter() - started
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return snapshot["member_count"], streamed, snapshot_seconds, stream_seconds, peak / (1024 * 1024)
+
+
+async def test_audience_engine():
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[TEST_DB_NAME]
+    engine = AudienceEngine(db)
+    results = []
+    peaks = []
+
+    print("🎯 Audience Engine Scale Test")
+    print("=" * 60)
+
+    try:
+        seeded = 0
+        for size in AUDIENCE_SIZES:
+            await seed_users(db, seeded, size)
+            seeded = size
+            expected = await db.users.count_documents({"is_active": True, "subscription_tier": {"$in": ["growth", "scale"]}})
+
+            member_count, streamed, snapshot_seconds, stream_seconds, peak_mb = await measure(
+                engine, f"campaign_{size}", {"subscription_tiers": ["growth", "scale"]}
+            )
+            peaks.append(peak_mb)
+
+            success = member_count == expected and streamed == expected
+            results.append(success)
+            print(f"\n{'✅ PASS' if success else '❌ FAIL'}: {size:,} users -> {member_count:,} snapshotted, {streamed:,} streamed (expected {expected:,})")
+            print(f"   Snapshot: {snapshot_seconds:.2f}s, stream: {stream_seconds:.2f}s ({streamed / max(stream_seconds, 1e-9):,.0f} recipients/s)")
+            print(f"   Peak Python memory: {peak_mb:.1f} MB")
+
+        # Memory must not scale with audience size
+        flat = max(peaks) <= min(peaks) * 2 + 5
+        results.append(flat)
+        print(f"\n{'✅ PASS' if flat else '❌ FAIL'}: peak memory stays flat across sizes ({', '.join(f'{p:.1f}' for p in peaks)} MB)")
+
+        # Resume from a checkpoint skips already-processed members
+        campaign_id = f"campaign_{AUDIENCE_SIZES[0]}"
+        first_batch = None
+        async for batch in engine.iter_snapshot(campaign_id, batch_size=1000):
+            first_batch = batch
+            break
+        await engine.save_checkpoint(campaign_id, "test_consumer", first_batch[-1]["member_id"], len(first_batch))
+        checkpoint = await engine.get_checkpoint(campaign_id, "test_consumer")
+        remaining = 0
+        async for batch in engine.iter_snapshot(campaign_id, batch_size=1000, start_after=checkpoint["last_member_id"]):
+            remaining += len(batch)
+        total = (await db.campaign_audience_snapshots.find_one({"campaign_id": campaign_id}))["member_count"]
+        resumed = remaining == total - len(first_batch)
+        results.append(resumed)
+        print(f"{'✅ PASS' if resumed else '❌ FAIL'}: resume after checkpoint streams the remaining {remaining:,} members")
+
+    finally:
+        await client.drop_database(TEST_DB_NAME)
+        client.close()
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(test_audience_engine())
+    sys.exit(0 if success else 1)
@@ -15,6 +15,9 @@ import os
 from motor.motor_asyncio import AsyncIOMotorClient
 import bcrypt
 from enum import Enum
+from modules.dashboard_cache import dashboard_cache
+from modules.user_search import user_search, search_fields
+from modules.index_registry import index_registry
 
 # MongoDB setup
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
@@ -22,6 +25,12 @@ DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
 client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 
+declare_index = index_registry.module(__name__)
+declare_index("users", "user_id", unique=True)
+declare_index("users", "email", unique=True)
+declare_index("users", [("role", 1), ("is_active", 1)])
+declare_index("login_logs", [("user_id", 1), ("login_time", -1)])
+
 # JWT Configuration
 JWT_SECRET = os.getenv("JWT_SECRET", secrets.token_urlsafe(32))
 JWT_ALGORITHM = "HS256"
@@ -420,6 +429,7 @@ async def register_user(user_data: UserRegistration):
         "login_attempts": 0,
         "locked_until": None
     }
+    user_doc["search"] = search_fields(user_doc)
     
     # Insert user
     await db.users.insert_one(user_doc)
@@ -438,6 +448,7 @@ async def register_user(user_data: UserRegistration):
     # Create user profile
     user_profile = UserProfile(**{k: v for k, v in user_doc.items() if k != "password_hash"})
     
+    dashboard_cache.notify("users")
     return TokenResponse(
         access_token=access_token,
         refresh_token=refresh_token,
@@ -601,6 +612,8 @@ async def update_user_profile(
         {"user_id": current_user.user_id},
         {"$set": update_data}
     )
+    if update_data.keys() & {"first_name", "last_name", "company_name"}:
+        await user_search.sync_user(current_user.user_id)
     
     # Get updated user
     updated_user = await db.users.find_one({"user_id": current_user.user_id})
@@ -740,7 +753,7 @@ async def get_all_users(
 ):
     """Get all users (admin only)"""
     
-    users = await db.users.find({}, {"password_hash": 0}).skip(skip).limit(limit).to_list(length=limit)
+    users = await db.users.find({}, {"password_hash": 0, "search": 0}).skip(skip).limit(limit).to_list(length=limit)
     total_users = await db.users.count_documents({})
     
     return {
@@ -797,6 +810,7 @@ async def update_user_subscription(
             detail="User not found"
         )
     
+    dashboard_cache.notify("users")
     return {"message": f"User subscription updated to {new_tier}"}
 
 @router.delete("/admin/users/{user_id}")
@@ -824,6 +838,7 @@ async def deactivate_user(
             detail="User not found"
         )
     
+    dashboard_cache.notify("users")
     return {"message": "User account deactivated"}
 
 # Module access check endpoint
@@ -6,7 +6,13 @@ Handles scheduled trial emails and other automated tasks
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from modules.email_system import process_scheduled_trial_emails
+from modules.trial_email_processor import trial_email_processor
+from modules.analytics_insights.cohort_analysis import cohort_service
+from modules.analytics_rollups import analytics_rollups
+from modules.discount_analytics import discount_analytics
+from modules.banner_delivery import banner_interactions, FLUSH_INTERVAL_SECONDS
+from modules.user_search import user_search
+from modules.data_lifecycle import data_lifecycle, DATA_LIFECYCLE_ENABLED
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -25,10 +31,35 @@ class BackgroundTaskManager:
         self.running = True
         logger.info("Starting background task manager...")
         
-        # Start trial email processor (runs every 5 minutes)
+        # Start trial email processor (wakes when the next email is due)
         trial_email_task = asyncio.create_task(self.trial_email_processor())
         self.tasks.append(trial_email_task)
         
+        # Start cohort rollup refresher (catches up on missed days, then hourly)
+        cohort_rollup_task = asyncio.create_task(self.cohort_rollup_refresher())
+        self.tasks.append(cohort_rollup_task)
+        
+        # Start analytics rollup rebuilder (repairs drift from writes made outside the API)
+        analytics_rollup_task = asyncio.create_task(self.analytics_rollup_rebuilder())
+        self.tasks.append(analytics_rollup_task)
+        
+        # Start discount ROI rollup refresher (rolls up each day once it is complete)
+        discount_rollup_task = asyncio.create_task(self.discount_rollup_refresher())
+        self.tasks.append(discount_rollup_task)
+        
+        # Start banner interaction flusher (writes buffered view/click/dismiss counts)
+        banner_flush_task = asyncio.create_task(self.banner_interaction_flusher())
+        self.tasks.append(banner_flush_task)
+        
+        # Start user search backfill (indexes users written outside the sign-up paths)
+        user_search_task = asyncio.create_task(self.user_search_backfiller())
+        self.tasks.append(user_search_task)
+        
+        # Start data lifecycle (rolls up each complete day, archives and expires cold log events)
+        if DATA_LIFECYCLE_ENABLED:
+            data_lifecycle_task = asyncio.create_task(self.data_lifecycle_runner())
+            self.tasks.append(data_lifecycle_task)
+        
         logger.info(f"Started {len(self.tasks)} background tasks")
     
     async def stop(self):
@@ -46,17 +77,101 @@ class BackgroundTaskManager:
         logger.info("Background task manager stopped")
     
     async def trial_email_processor(self):
-        """Process scheduled trial emails every 5 minutes"""
+        """Send due trial emails, then sleep until the next one is due"""
         while self.running:
             try:
                 logger.info("Processing scheduled trial emails...")
-                await process_scheduled_trial_emails()
-                logger.info("Trial email processing completed")
+                totals = await trial_email_processor.process_due()
+                logger.info(f"Trial email processing completed: {totals}")
             except Exception as e:
                 logger.error(f"Error processing trial emails: {str(e)}")
+                await asyncio.sleep(60)
+            
+            # Sleep until the next scheduled send time (capped at 5 minutes)
+            await trial_email_processor.wait_for_next_due()
+    
+    async def cohort_rollup_refresher(self):
+        """Fold each day's logins and payments into the cohort rollups"""
+        while self.running:
+            try:
+                result = await cohort_service.engine.refresh()
+                logger.info(f"Cohort rollups refreshed: {result}")
+            except Exception as e:
+                logger.error(f"Error refreshing cohort rollups: {str(e)}")
+            
+            # Today's partial day is reprocessed every hour until it is complete
+            await asyncio.sleep(3600)
+    
+    async def analytics_rollup_rebuilder(self):
+        """Periodically recompute the /api/analytics rollups with $merge pipelines"""
+        while self.running:
+            try:
+                report = await analytics_rollups.check_consistency(repair=True)
+                logger.info(f"Analytics rollups checked: {report['mismatch_count']} mismatches"
+                            f"{', rebuilt' if 'repair' in report else ''}")
+            except Exception as e:
+                logger.error(f"Error rebuilding analytics rollups: {str(e)}")
+            
+            # Customer writes through the API keep the rollups current in between
+            await asyncio.sleep(6 * 3600)
+    
+    async def discount_rollup_refresher(self):
+        """Fold each complete day's discount usage into the daily ROI buckets"""
+        while self.running:
+            try:
+                result = await discount_analytics.refresh()
+                logger.info(f"Discount ROI rollups refreshed: {result}")
+            except Exception as e:
+                logger.error(f"Error refreshing discount ROI rollups: {str(e)}")
+            
+            # Today is always aggregated live, so an hourly check catches the day change
+            await asyncio.sleep(3600)
+    
+    async def user_search_backfiller(self):
+        """Derive the search fields of users that lack them or carry an older version"""
+        while self.running:
+            try:
+                updated = await user_search.backfill()
+                if updated:
+                    logger.info(f"User search fields derived for {updated} users")
+            except Exception as e:
+                logger.error(f"Error backfilling user search fields: {str(e)}")
             
-            # Wait 5 minutes before next run
-            await asyncio.sleep(300)  # 300 seconds = 5 minutes
+            await asyncio.sleep(300)
+    
+    async def data_lifecycle_runner(self):
+        """Apply the log retention policies: daily rollups, archival of cold days"""
+        while self.running:
+            try:
+                report = await data_lifecycle.run()
+                logger.info(f"Data lifecycle run: {report['documents_archived']} documents archived "
+                            f"in {report['duration_seconds']}s")
+            except Exception as e:
+                logger.error(f"Error running data lifecycle: {str(e)}")
+            
+            # Each run only works on days that became complete or cold since the last one
+            await asyncio.sleep(3600)
+    
+    async def banner_interaction_flusher(self):
+        """Write buffered banner interactions every few seconds and once more on shutdown"""
+        try:
+            migrated = await banner_interactions.migrate_legacy_counters()
+            if migrated:
+                logger.info(f"Moved legacy dismissal counts of {migrated} banners to dismissals")
+        except Exception as e:
+            logger.error(f"Error migrating banner dismissal counts: {str(e)}")
+        try:
+            while self.running:
+                await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+                try:
+                    await banner_interactions.flush()
+                except Exception as e:
+                    logger.error(f"Error flushing banner interactions: {str(e)}")
+        finally:
+            try:
+                await banner_interactions.flush()
+            except Exception as e:
+                logger.error(f"Error flushing banner interactions on shutdown: {str(e)}")
 
 # Global instance
 task_manager = BackgroundTaskManager()
@@ -0,0 +1,383 @@
+"""
+Customer Mind IQ - Admin Exports
+Streaming exports for /api/admin/export: rows come from an async cursor with a projection and
+are encoded as CSV, NDJSON or JSON (optionally gzipped) chunk by chunk, joins run in the same
+aggregation, and large exports can run as background jobs whose files support range downloads
+"""
+
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+import time
+import uuid
+import zlib
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from modules.index_registry import index_registry
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
+client = AsyncIOMotorClient(MONGO_URL)
+db = client[DB_NAME]
+
+EXPORT_DIR = Path(os.getenv("ADMIN_EXPORT_DIR", "/app/exports"))
+EXPORT_BATCH_SIZE = int(os.getenv("ADMIN_EXPORT_BATCH_SIZE", "1000"))
+EXPORT_RETENTION_HOURS = float(os.getenv("ADMIN_EXPORT_RETENTION_HOURS", "24"))
+CHUNK_BYTES = 64 * 1024
+PROGRESS_INTERVAL_SECONDS = 2.0
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "json": ("application/json", "json")
+}
+STREAMED_EXPORT_TYPES = ("users", "discounts")
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+declare_index = index_registry.module(__name__)
+declare_index("export_jobs", "job_id", unique=True)
+declare_index("export_jobs", "expires_at", expireAfterSeconds=0)
+declare_index("discount_usage", "discount_id")
+
+
+def export_format(format_type: str) -> str:
+    """Formats other than csv and ndjson fall back to JSON, as the endpoint always did"""
+    return format_type if format_type in EXPORT_FORMATS else "json"
+
+
+def export_filename(export_type: str, format_type: str, compress: bool, at: Optional[datetime] = None) -> str:
+    extension = EXPORT_FORMATS[export_format(format_type)][1]
+    stamp = (at or datetime.utcnow()).strftime('%Y%m%d_%H%M%S')
+    return f"{export_type}_export_{stamp}.{extension}{'.gz' if compress else ''}"
+
+
+def build_export_query(export_type: str, filters: Dict[str, Any]) -> Dict[str, Any]:
+    query: Dict[str, Any] = {}
+    date_range = filters.get("date_range")
+    if date_range:
+        if date_range.get("from"):
+            query.setdefault("created_at", {})["$gte"] = datetime.fromisoformat(date_range["from"])
+        if date_range.get("to"):
+            query.setdefault("created_at", {})["$lte"] = datetime.fromisoformat(date_range["to"])
+    if export_type == "users":
+        if filters.get("subscription_tier"):
+            query["subscription_tier"] = filters["subscription_tier"]
+        if filters.get("is_active") is not None:
+            query["is_active"] = filters["is_active"]
+    return query
+
+
+def export_pipelines(export_type: str, query: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]], List[str]]:
+    """(collection, base pipeline, join stages, columns the joins add) for a streamed export type.
+
+    The base pipeline filters and projects away ``_id`` and secrets; CSV
+    headers are discovered on it alone, so the joins run only once.
+    """
+    if export_type == "users":
+        # search holds the prefix/trigram arrays maintained by modules/user_search.py
+        return "users", [{"$match": query}, {"$project": {"_id": 0, "password_hash": 0, "search": 0}}], [], []
+    if export_type == "discounts":
+        # One $lookup per cursor batch instead of a count_documents round trip per discount
+        joins = [
+            {"$lookup": {
+                "from": "discount_usage",
+                "let": {"discount_id": "$discount_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$discount_id", "$$discount_id"]}}},
+                    {"$count": "count"}
+                ],
+                "as": "_usage"
+            }},
+            {"$addFields": {"actual_usage_count": {"$ifNull": [{"$arrayElemAt": ["$_usage.count", 0]}, 0]}}},
+            {"$project": {"_usage": 0}}
+        ]
+        return "discounts", [{"$match": query}, {"$project": {"_id": 0}}], joins, ["actual_usage_count"]
+    raise ValueError(f"Unsupported streamed export type: {export_type}")
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return ", ".join(str(item) for item in value)
+    return value
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+async def iterate_rows(rows: Iterable[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    for row in rows:
+        yield row
+
+
+async def encode_rows(
+    rows: AsyncIterator[Dict[str, Any]],
+    format_type: str,
+    columns: Optional[List[str]] = None,
+    progress: Optional[Dict[str, int]] = None
+) -> AsyncIterator[bytes]:
+    """Encode rows into chunks of about CHUNK_BYTES.
+
+    CSV needs ``columns`` up front; cells are written like the previous
+    in-memory export (ISO datetimes, lists joined with ", ", blanks for
+    missing fields). JSON keeps the previous ``{"data": [...], "count": n}``
+    shape. ``progress["rows"]`` is incremented as rows are encoded.
+    """
+    format_type = export_format(format_type)
+    buffer = io.StringIO()
+    writer = None
+    if format_type == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=columns or [], restval='', extrasaction='ignore')
+        writer.writeheader()
+    elif format_type == "json":
+        buffer.write('{"data": [')
+
+    count = 0
+    async for row in rows:
+        if writer:
+            writer.writerow({key: _csv_value(value) for key, value in row.items()})
+        elif format_type == "ndjson":
+            buffer.write(json.dumps(row, default=_json_default))
+            buffer.write("\n")
+        else:
+            buffer.write(", " if count else "")
+            buffer.write(json.dumps(row, default=_json_default))
+        count += 1
+        if progress is not None:
+            progress["rows"] = progress.get("rows", 0) + 1
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    if format_type == "json":
+        buffer.write(f'], "count": {count}}}')
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """Gzip a chunk stream incrementally (a single gzip member, readable by gunzip and browsers)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single ``bytes=`` range, or None to send the whole file.
+
+    Raises ValueError when the range cannot be satisfied (416). Multi-range
+    and malformed headers are ignored, which RFC 9110 allows.
+    """
+    if not header:
+        return None
+    match = _RANGE_PATTERN.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def read_file_range(path: Path, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as handle:
+        handle.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = handle.read(min(CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class AdminExportEngine:
+    """Streams admin exports and runs them as background jobs.
+
+    ``stream`` never holds more than a cursor batch and one encoded chunk in
+    memory. ``create_job`` records an ``export_jobs`` document and
+    ``run_job`` writes the same stream to a file under ``EXPORT_DIR``,
+    updating progress as it goes; ``download_response`` serves the file with
+    ``Range``/``If-Range`` support so interrupted downloads can resume.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def columns(self, collection: str, pipeline: List[Dict[str, Any]], added: Iterable[str] = ()) -> List[str]:
+        """Sorted union of field names across the exported documents, computed by the server"""
+        keys_pipeline = pipeline + [
+            {"$project": {"keys": {"$map": {"input": {"$objectToArray": "$$ROOT"}, "in": "$$this.k"}}}},
+            {"$unwind": "$keys"},
+            {"$group": {"_id": None, "keys": {"$addToSet": "$keys"}}}
+        ]
+        result = await self.db[collection].aggregate(keys_pipeline, allowDiskUse=True).to_list(length=1)
+        if not result:
+            return []
+        return sorted(set(result[0]["keys"]) | set(added))
+
+    async def rows(self, collection: str, pipeline: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        cursor = self.db[collection].aggregate(pipeline, allowDiskUse=True, batchSize=EXPORT_BATCH_SIZE)
+        async for row in cursor:
+            yield row
+
+    async def stream(
+        self,
+        export_type: str,
+        filters: Dict[str, Any],
+        format_type: str,
+        compress: bool = False,
+        progress: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[bytes]:
+        """Encoded chunks of a users or discounts export; raises HTTPException(400) when a CSV is empty"""
+        collection, base, joins, added = export_pipelines(export_type, build_export_query(export_type, filters))
+        format_type = export_format(format_type)
+        columns = None
+        if format_type == "csv":
+            columns = await self.columns(collection, base, added)
+            if not columns:
+                raise HTTPException(status_code=400, detail="No data to export")
+        chunks = encode_rows(self.rows(collection, base + joins), format_type, columns, progress)
+        return gzip_chunks(chunks) if compress else chunks
+
+    def response(self, chunks: AsyncIterator[bytes], export_type: str, format_type: str, compress: bool = False) -> StreamingResponse:
+        media_type = "application/gzip" if compress else EXPORT_FORMATS[export_format(format_type)][0]
+        return StreamingResponse(
+            chunks,
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename={export_filename(export_type, format_type, compress)}"}
+        )
+
+    async def create_job(self, export_type: str, filters: Dict[str, Any], format_type: str, compress: bool, created_by: str) -> Dict[str, Any]:
+        # Validate the filters now rather than in the background
+        export_pipelines(export_type, build_export_query(export_type, filters))
+        now = datetime.utcnow()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "export_type": export_type,
+            "filters": filters,
+            "format": export_format(format_type),
+            "gzip": compress,
+            "file_name": export_filename(export_type, format_type, compress, now),
+            "status": "queued",
+            "rows_written": 0,
+            "bytes_written": 0,
+            "created_by": created_by,
+            "created_at": now,
+            "expires_at": now + timedelta(hours=EXPORT_RETENTION_HOURS)
+        }
+        await self.db.export_jobs.insert_one(dict(job))
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.export_jobs.find_one({"job_id": job_id}, {"_id": 0})
+
+    async def list_jobs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return await self.db.export_jobs.find({}, {"_id": 0}).sort("created_at", -1).to_list(length=limit)
+
+    async def run_job(self, job_id: str):
+        job = await self.get_job(job_id)
+        if not job or job["status"] != "queued":
+            return
+        await self.db.export_jobs.update_one({"job_id": job_id}, {"$set": {"status": "running", "started_at": datetime.utcnow()}})
+        path = EXPORT_DIR / f"{job_id}_{job['file_name']}"
+        partial = path.with_name(path.name + ".part")
+        progress = {"rows": 0}
+        written = 0
+        try:
+            EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+            await asyncio.to_thread(self._remove_expired_files)
+            chunks = await self.stream(job["export_type"], job["filters"], job["format"], job["gzip"], progress)
+            reported = time.monotonic()
+            with open(partial, "wb") as handle:
+                async for chunk in chunks:
+                    await asyncio.to_thread(handle.write, chunk)
+                    written += len(chunk)
+                    if time.monotonic() - reported >= PROGRESS_INTERVAL_SECONDS:
+                        reported = time.monotonic()
+                        await self.db.export_jobs.update_one(
+                            {"job_id": job_id}, {"$set": {"rows_written": progress["rows"], "bytes_written": written}}
+                        )
+            os.replace(partial, path)
+            await self.db.export_jobs.update_one({"job_id": job_id}, {"$set": {
+                "status": "completed",
+                "rows_written": progress["rows"],
+                "bytes_written": written,
+                "file_path": str(path),
+                "completed_at": datetime.utcnow()
+            }})
+        except Exception as e:
+            partial.unlink(missing_ok=True)
+            error = getattr(e, "detail", None) or str(e)
+            print(f"Export job {job_id} failed: {error}")
+            await self.db.export_jobs.update_one(
+                {"job_id": job_id},
+                {"$set": {"status": "failed", "error": error, "rows_written": progress["rows"], "completed_at": datetime.utcnow()}}
+            )
+
+    def download_response(self, job: Dict[str, Any], range_header: Optional[str] = None, if_range: Optional[str] = None) -> StreamingResponse:
+        if job["status"] != "completed":
+            raise HTTPException(status_code=409, detail=f"Export job is {job['status']}")
+        path = Path(job["file_path"])
+        if not path.exists():
+            raise HTTPException(status_code=410, detail="Export file has expired")
+
+        size = path.stat().st_size
+        etag = f'"{job["job_id"]}-{size}"'
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": etag,
+            "Content-Disposition": f"attachment; filename={job['file_name']}"
+        }
+        media_type = "application/gzip" if job.get("gzip") else EXPORT_FORMATS[job["format"]][0]
+        # A stale If-Range validator means the client's partial copy is of another file
+        if if_range and if_range.strip() != etag:
+            range_header = None
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+
+        if byte_range is None:
+            headers["Content-Length"] = str(size)
+            return StreamingResponse(read_file_range(path, 0, size - 1), media_type=media_type, headers=headers)
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(read_file_range(path, start, end), status_code=206, media_type=media_type, headers=headers)
+
+    def _remove_expired_files(self):
+        cutoff = time.time() - EXPORT_RETENTION_HOURS * 3600
+        for path in EXPORT_DIR.glob("*"):
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+
+
+# Shared instance used by the admin export endpoints
+admin_exports = AdminExportEngine(db)
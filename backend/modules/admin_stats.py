@@ -0,0 +1,213 @@
+"""
+Customer Mind IQ - Admin Stats
+Breakdowns for the admin analytics dashboard, user analytics and trial email stats: every count per
+tier, status, email type and time window is computed in one $facet pipeline per collection, and the
+collections of a dashboard are queried concurrently
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from modules.index_registry import index_registry
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
+client = AsyncIOMotorClient(MONGO_URL)
+db = client[DB_NAME]
+
+# Short TTL for the cached stats endpoints
+STATS_CACHE_TTL = float(os.getenv("ADMIN_STATS_CACHE_TTL", "30"))
+GROWTH_MONTHS = 12
+TRIAL_EMAIL_TYPES = ["welcome", "progress", "urgency", "final"]
+TRIAL_EMAIL_STATUSES = ["sent", "failed", "scheduled", "skipped"]
+RECENT_ACTIVITY_LIMIT = 20
+
+declare_index = index_registry.module(__name__)
+declare_index("users", [("is_active", 1), ("deactivated_at", 1)])
+declare_index("login_logs", [("login_time", 1), ("success", 1)])
+declare_index("trial_email_logs", "created_at")
+declare_index("admin_audit_log", [("timestamp", -1)])
+
+
+def growth_windows(now: datetime) -> List[Tuple[str, datetime, datetime]]:
+    """The monthly growth windows of the dashboard, oldest first.
+
+    Kept as before: 32-day windows starting 30 days apart from the first of
+    the current month.
+    """
+    windows = []
+    for i in range(GROWTH_MONTHS):
+        start = now.replace(day=1) - timedelta(days=30 * i)
+        windows.insert(0, (start.strftime("%Y-%m"), start, start + timedelta(days=32)))
+    return windows
+
+
+def in_window(field: str, start: datetime, end: datetime) -> Dict[str, Any]:
+    return {"$sum": {"$cond": [{"$and": [{"$gte": [field, start]}, {"$lt": [field, end]}]}, 1, 0]}}
+
+
+def first_facet(result: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return result[0] if result else {}
+
+
+class AdminStatsEngine:
+    """Computes the admin stats with one round trip per collection"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def dashboard(self) -> Dict[str, Any]:
+        """Users, banners, discounts and recent admin activity, queried concurrently"""
+        windows = growth_windows(datetime.utcnow())
+        totals = {f"m{index}": in_window("$created_at", start, end) for index, (_, start, end) in enumerate(windows)}
+        totals["cancelled_users"] = {"$sum": {"$cond": [{"$eq": ["$is_active", False]}, 1, 0]}}
+
+        users, banner_stats, discount_stats, recent_activities = await asyncio.gather(
+            self.db.users.aggregate([{"$facet": {
+                "by_tier": [{"$group": {
+                    "_id": "$subscription_tier",
+                    "count": {"$sum": 1},
+                    "active_count": {"$sum": {"$cond": [{"$eq": ["$is_active", True]}, 1, 0]}}
+                }}],
+                "totals": [{"$group": {"_id": None, **totals}}]
+            }}]).to_list(length=1),
+            self.db.banners.aggregate([{"$group": {
+                "_id": "$status",
+                "count": {"$sum": 1},
+                "total_views": {"$sum": "$views"},
+                "total_clicks": {"$sum": "$clicks"}
+            }}]).to_list(length=10),
+            self.db.discounts.aggregate([{"$group": {
+                "_id": "$discount_type",
+                "count": {"$sum": 1},
+                "total_uses": {"$sum": "$total_uses"},
+                "total_impact": {"$sum": "$total_revenue_impact"}
+            }}]).to_list(length=10),
+            self.db.admin_audit_log.find({}).sort("timestamp", -1).limit(RECENT_ACTIVITY_LIMIT).to_list(length=RECENT_ACTIVITY_LIMIT)
+        )
+
+        users = first_facet(users)
+        counts = (users.get("totals") or [{}])[0]
+        return {
+            "tier_stats": users.get("by_tier", [])[:10],
+            "monthly_growth": [{"month": month, "new_users": counts.get(f"m{index}", 0)} for index, (month, _, _) in enumerate(windows)],
+            "cancelled_users": counts.get("cancelled_users", 0),
+            "banner_stats": banner_stats,
+            "discount_stats": discount_stats,
+            "recent_activities": recent_activities
+        }
+
+    async def user_activity(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        """Daily signups and churn from one users pipeline, login frequency from login_logs"""
+        window = {"$gte": start_date, "$lte": end_date}
+        users, login_frequency = await asyncio.gather(
+            self.db.users.aggregate([
+                {"$match": {"$or": [{"created_at": window}, {"is_active": False, "deactivated_at": window}]}},
+                {"$facet": {
+                    "daily_signups": [
+                        {"$match": {"created_at": window}},
+                        {"$group": {
+                            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                            "signups": {"$sum": 1},
+                            "by_tier": {"$push": "$subscription_tier"}
+                        }},
+                        {"$sort": {"_id": 1}},
+                        {"$limit": 100}
+                    ],
+                    "churn_analysis": [
+                        {"$match": {"is_active": False, "deactivated_at": window}},
+                        {"$group": {"_id": "$subscription_tier", "churned_count": {"$sum": 1}}}
+                    ]
+                }}
+            ]).to_list(length=1),
+            self.db.login_logs.aggregate([
+                {"$match": {"login_time": window, "success": True}},
+                {"$group": {"_id": "$user_id", "login_count": {"$sum": 1}, "last_login": {"$max": "$login_time"}}},
+                {"$group": {
+                    "_id": {"$switch": {
+                        "branches": [
+                            {"case": {"$gte": ["$login_count", 20]}, "then": "very_active"},
+                            {"case": {"$gte": ["$login_count", 10]}, "then": "active"},
+                            {"case": {"$gte": ["$login_count", 5]}, "then": "moderate"},
+                            {"case": {"$gte": ["$login_count", 1]}, "then": "low"}
+                        ],
+                        "default": "inactive"
+                    }},
+                    "user_count": {"$sum": 1}
+                }}
+            ]).to_list(length=10)
+        )
+        users = first_facet(users)
+        return {
+            "daily_signups": users.get("daily_signups", []),
+            "churn_analysis": users.get("churn_analysis", [])[:10],
+            "login_frequency": login_frequency
+        }
+
+    async def trial_emails(self) -> Dict[str, Any]:
+        """Status, per-type, daily and per-user trial email breakdowns in one pipeline"""
+        seven_days_ago = datetime.utcnow() - timedelta(days=7)
+        result = await self.db.trial_email_logs.aggregate([{"$facet": {
+            "by_type_status": [{"$group": {"_id": {"type": "$email_type", "status": "$status"}, "count": {"$sum": 1}}}],
+            "recent_activity": [
+                {"$match": {"created_at": {"$gte": seven_days_ago}}},
+                {"$group": {
+                    "_id": {
+                        "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                        "type": "$email_type"
+                    },
+                    "count": {"$sum": 1}
+                }},
+                {"$sort": {"_id.date": 1}}
+            ],
+            "trial_users_with_emails": [
+                {"$group": {
+                    "_id": "$user_email",
+                    "total_emails": {"$sum": 1},
+                    "sent_emails": {"$sum": {"$cond": [{"$eq": ["$status", "sent"]}, 1, 0]}},
+                    "first_name": {"$first": "$first_name"},
+                    "trial_start": {"$first": "$trial_start_date"},
+                    "trial_end": {"$first": "$trial_end_date"}
+                }},
+                {"$sort": {"trial_start": -1}},
+                {"$limit": 20}
+            ]
+        }}], allowDiskUse=True).to_list(length=1)
+        result = first_facet(result)
+
+        by_status: Dict[Any, int] = {}
+        by_type: Dict[Any, Dict[Any, int]] = {}
+        for row in result.get("by_type_status", []):
+            email_type, status = row["_id"].get("type"), row["_id"].get("status")
+            by_status[status] = by_status.get(status, 0) + row["count"]
+            by_type.setdefault(email_type, {})[status] = row["count"]
+
+        total = sum(by_status.values())
+        overall = {"total_emails": total, **{status: by_status.get(status, 0) for status in TRIAL_EMAIL_STATUSES}}
+        overall["success_rate_percent"] = round((overall["sent"] / total * 100) if total > 0 else 0, 2)
+
+        type_stats = {}
+        for email_type in TRIAL_EMAIL_TYPES:
+            statuses = by_type.get(email_type, {})
+            type_total = sum(statuses.values())
+            type_stats[email_type] = {
+                "total": type_total,
+                "sent": statuses.get("sent", 0),
+                "failed": statuses.get("failed", 0),
+                "success_rate": round((statuses.get("sent", 0) / type_total * 100) if type_total > 0 else 0, 2)
+            }
+
+        return {
+            "overall_stats": overall,
+            "stats_by_email_type": type_stats,
+            "recent_activity": result.get("recent_activity", []),
+            "trial_users_with_emails": result.get("trial_users_with_emails", [])
+        }
+
+
+# Shared instance used by the admin analytics and trial email endpoints
+admin_stats = AdminStatsEngine(db)
@@ -3,22 +3,28 @@ Customer Mind IQ - Advanced Admin System
 Banner management, discount system, account impersonation, and analytics dashboard
 """
 
-from fastapi import APIRouter, HTTPException, Depends, status, BackgroundTasks, Query, Response
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Depends, status, BackgroundTasks, Query, Response, Header
 from pydantic import BaseModel, EmailStr, Field
 from typing import Dict, Optional, List, Union, Any
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from enum import Enum
 import asyncio
 import json
 import os
-import csv
-import io
 import uuid
 import re
 import pandas as pd
 from motor.motor_asyncio import AsyncIOMotorClient
 from auth.auth_system import get_current_user, require_role, UserRole, UserProfile, SubscriptionTier
+from modules.dashboard_cache import dashboard_cache
+from modules.banner_delivery import banner_delivery, banner_interactions, TRACKED_ACTIONS
+from modules.discount_bulk import bulk_discounts, BULK_SYNC_LIMIT
+from modules.discount_codes import discount_code_minter, discount_redemptions, DEFAULT_ALPHABET, DEFAULT_CODE_LENGTH, DEFAULT_CODE_PREFIX, MAX_MINT_COUNT, CODE_RESPONSE_LIMIT
+from modules.discount_analytics import discount_analytics
+from modules.user_search import user_search
+from modules.admin_stats import admin_stats, STATS_CACHE_TTL
+from modules.admin_exports import admin_exports, encode_rows, gzip_chunks, iterate_rows, STREAMED_EXPORT_TYPES
+from modules.index_registry import index_registry
 
 # MongoDB setup
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
@@ -26,6 +32,21 @@ DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
 client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 
+declare_index = index_registry.module(__name__)
+declare_index("banners", "banner_id", unique=True)
+declare_index("banners", [("status", 1), ("priority", -1)])
+declare_index("discounts", "discount_id", unique=True)
+declare_index("discount_usage", [("discount_id", 1), ("applied_at", -1)])
+declare_index("discount_usage", "user_id")
+declare_index("user_activities", [("user_id", 1), ("activity_type", 1), ("timestamp", -1)])
+declare_index("payments", "user_id")
+declare_index("impersonation_sessions", "session_id")
+declare_index("impersonation_sessions", "target_user_id")
+declare_index("impersonation_sessions", [("is_active", 1), ("admin_user_id", 1)], partialFilterExpression={"is_active": True})
+declare_index("admin_audit_log", [("timestamp", -1)])
+declare_index("api_keys", [("created_at", -1)])
+declare_index("user_cohorts", "cohort_id")
+
 router = APIRouter()
 
 # Enums
@@ -190,6 +211,7 @@ class BulkDiscountApplication(BaseModel):
     target_criteria: Dict[str, Any]  # Filtering criteria for users
     notify_users: bool = Field(default=True)
     reason: str
+    run_in_background: bool = False  # audiences above BULK_DISCOUNT_SYNC_LIMIT always run in the background
 
 class DiscountRule(BaseModel):
     rule_id: str
@@ -252,8 +274,10 @@ class AutomatedWorkflow(BaseModel):
 class ExportRequest(BaseModel):
     export_type: str  # users, discounts, banners, analytics
     filters: Dict[str, Any]
-    format: str = Field(default="csv")  # csv, json, xlsx
+    format: str = Field(default="csv")  # csv, ndjson, json
     date_range: Optional[Dict[str, datetime]] = None
+    gzip: bool = False
+    background: bool = False  # users and discounts: run as a job with a downloadable file
 
 # Banner Management Endpoints
 @router.post("/admin/banners", response_model=Banner)
@@ -298,6 +322,8 @@ async def create_banner(
     
     await db.banners.insert_one(banner_doc)
     
+    banner_delivery.invalidate()
+    dashboard_cache.notify("banners")
     return Banner(**banner_doc)
 
 @router.get("/admin/banners")
@@ -329,45 +355,8 @@ async def get_active_banners(
 ):
     """Get active banners for current user"""
     
-    now = datetime.utcnow()
-    
-    # Query for active banners
-    query = {
-        "$and": [
-            {"status": BannerStatus.ACTIVE},
-            {
-                "$or": [
-                    {"start_date": {"$lte": now}},
-                    {"start_date": None}
-                ]
-            },
-            {
-                "$or": [
-                    {"end_date": {"$gte": now}},
-                    {"end_date": None}
-                ]
-            }
-        ]
-    }
-    
-    banners = await db.banners.find(query).sort("priority", -1).to_list(length=50)
-    
-    # Filter by user and tier targeting
-    filtered_banners = []
-    for banner in banners:
-        # Remove ObjectId
-        if "_id" in banner:
-            del banner["_id"]
-            
-        # Check if banner targets this user specifically
-        if banner.get("target_users") and current_user.email not in banner["target_users"]:
-            continue
-        
-        # Check if banner targets this user's tier
-        if banner.get("target_tiers") and current_user.subscription_tier not in banner["target_tiers"]:
-            continue
-        
-        filtered_banners.append(banner)
+    # Served from the per-worker banner cache; targeting uses precomputed sets
+    filtered_banners = await banner_delivery.active_for(current_user.email, current_user.subscription_tier)
     
     return {
         "banners": filtered_banners,
@@ -397,6 +386,8 @@ async def update_banner(
         )
     
     updated_banner = await db.banners.find_one({"banner_id": banner_id})
+    banner_delivery.invalidate()
+    dashboard_cache.notify("banners")
     return Banner(**updated_banner)
 
 @router.delete("/admin/banners/{banner_id}")
@@ -414,8 +405,23 @@ async def delete_banner(
             detail="Banner not found"
         )
     
+    banner_delivery.invalidate()
+    dashboard_cache.notify("banners")
     return {"message": "Banner deleted successfully"}
 
+@router.get("/admin/banners/delivery-stats")
+async def get_banner_delivery_stats(
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Banner delivery cache and interaction buffer state of this worker"""
+    
+    pending_events, pending_counters = banner_interactions.pending()
+    return {
+        "delivery_cache": banner_delivery.snapshot(),
+        "interaction_buffer": {**banner_interactions.stats, "pending_events": pending_events, "pending_counters": pending_counters},
+        "timestamp": datetime.utcnow()
+    }
+
 # Announcements endpoints (alias for banners with announcement type)
 @router.get("/admin/announcements")
 async def get_announcements(
@@ -474,6 +480,7 @@ async def create_announcement(
         }
         
         result = await db.banners.insert_one(announcement_data)
+        banner_delivery.invalidate()
         
         return {
             "status": "success",
@@ -492,22 +499,9 @@ async def track_banner_interaction(
 ):
     """Track banner interactions for analytics"""
     
-    # Update banner statistics
-    update_field = f"{action}s"
-    if action in ["view", "click", "dismiss"]:
-        await db.banners.update_one(
-            {"banner_id": banner_id},
-            {"$inc": {update_field: 1}}
-        )
-        
-        # Log interaction for detailed analytics
-        await db.banner_interactions.insert_one({
-            "banner_id": banner_id,
-            "user_id": current_user.user_id,
-            "action": action,
-            "timestamp": datetime.utcnow(),
-            "user_tier": current_user.subscription_tier
-        })
+    # Counted in memory and flushed to the banner statistics in batches
+    if action in TRACKED_ACTIONS:
+        await banner_interactions.track(banner_id, action, current_user.user_id, current_user.subscription_tier)
     
     return {"message": f"Banner {action} tracked"}
 
@@ -544,6 +538,7 @@ async def create_discount(
     
     await db.discounts.insert_one(discount_doc)
     
+    dashboard_cache.notify("discounts")
     return Discount(**discount_doc)
 
 @router.get("/admin/discounts")
@@ -673,6 +668,7 @@ async def apply_discount_to_user(
         {"$inc": {"total_uses": 1}}
     )
     
+    dashboard_cache.notify("discounts")
     return {
         "message": f"Discount applied to user {target_user['email']}",
         "usage_record": usage_record
@@ -684,6 +680,7 @@ async def apply_discount_to_user(
 async def bulk_apply_discount(
     discount_id: str,
     bulk_request: BulkDiscountApplication,
+    background_tasks: BackgroundTasks,
     current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
 ):
     """Apply discount to multiple users based on criteria"""
@@ -693,92 +690,71 @@ async def bulk_apply_discount(
     if not discount:
         raise HTTPException(status_code=404, detail="Discount not found")
     
-    # Build user query from criteria
-    user_query = {}
-    criteria = bulk_request.target_criteria
-    
-    if criteria.get("subscription_tier"):
-        user_query["subscription_tier"] = criteria["subscription_tier"]
-    
-    if criteria.get("registration_date_from"):
-        user_query.setdefault("created_at", {})["$gte"] = datetime.fromisoformat(criteria["registration_date_from"])
-    
-    if criteria.get("registration_date_to"):
-        user_query.setdefault("created_at", {})["$lte"] = datetime.fromisoformat(criteria["registration_date_to"])
-        
-    if criteria.get("is_active") is not None:
-        user_query["is_active"] = criteria["is_active"]
+    job = await bulk_discounts.create_job(
+        discount, bulk_request.target_criteria, bulk_request.reason, bulk_request.notify_users, current_user.user_id
+    )
     
-    if criteria.get("email_contains"):
-        user_query["email"] = {"$regex": criteria["email_contains"], "$options": "i"}
+    if not job["total_eligible"]:
+        await bulk_discounts.run_job(job["job_id"])
+        return {"message": "No users match the specified criteria", "applied_count": 0, "job_id": job["job_id"]}
     
-    # Get matching users
-    users = await db.users.find(user_query).to_list(length=10000)
+    # Large audiences are applied by a tracked background job
+    if bulk_request.run_in_background or job["total_eligible"] > BULK_SYNC_LIMIT:
+        background_tasks.add_task(_run_bulk_discount_job, job["job_id"])
+        return {
+            "message": f"Applying discount to up to {job['total_eligible']} users in the background",
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "total_eligible": job["total_eligible"],
+            "status_url": f"/api/admin/discounts/bulk-jobs/{job['job_id']}"
+        }
     
-    if not users:
-        return {"message": "No users match the specified criteria", "applied_count": 0}
+    job = await _run_bulk_discount_job(job["job_id"])
+    if job["status"] != "completed":
+        raise HTTPException(status_code=500, detail=f"Bulk discount application failed: {job.get('error')}")
     
-    # Apply discount to each user
-    applied_count = 0
-    failed_applications = []
+    return {
+        "message": f"Discount applied to {job['applied_count']} users",
+        "applied_count": job["applied_count"],
+        "skipped_count": job["skipped_count"],
+        "total_eligible": job["total_eligible"],
+        "failed_applications": job["failed_applications"],
+        "job_id": job["job_id"]
+    }
+
+async def _run_bulk_discount_job(job_id: str):
+    job = await bulk_discounts.run_job(job_id)
+    dashboard_cache.notify("discounts")
+    return job
+
+@router.get("/admin/discounts/bulk-jobs/{job_id}")
+async def get_bulk_discount_job(
+    job_id: str,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Progress of a bulk discount application job"""
     
-    for user in users:
-        try:
-            # Check if user already has this discount
-            existing_usage = await db.discount_usage.find_one({
-                "user_id": user["user_id"],
-                "discount_id": discount_id
-            })
-            
-            if existing_usage:
-                continue  # Skip if already applied
-            
-            # Apply discount
-            usage_record = {
-                "usage_id": str(uuid.uuid4()),
-                "discount_id": discount_id,
-                "user_id": user["user_id"],
-                "applied_by": current_user.user_id,
-                "applied_at": datetime.utcnow(),
-                "discount_amount": discount["value"],
-                "discount_type": discount["discount_type"],
-                "application_reason": bulk_request.reason,
-                "is_bulk_applied": True
-            }
-            
-            await db.discount_usage.insert_one(usage_record)
-            applied_count += 1
-            
-            # Send notification if requested
-            if bulk_request.notify_users:
-                # Add to notification queue (simplified)
-                await db.notification_queue.insert_one({
-                    "user_id": user["user_id"],
-                    "type": "discount_applied",
-                    "message": f"You've received a {discount['name']} discount!",
-                    "discount_id": discount_id,
-                    "created_at": datetime.utcnow(),
-                    "status": "pending"
-                })
-            
-        except Exception as e:
-            failed_applications.append({
-                "user_id": user["user_id"],
-                "error": str(e)
-            })
+    job = await bulk_discounts.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Bulk discount job not found")
+    return job
+
+@router.post("/admin/discounts/bulk-jobs/{job_id}/resume")
+async def resume_bulk_discount_job(
+    job_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Resume a failed or interrupted bulk discount job; users already done are skipped"""
     
-    # Update discount usage statistics
-    await db.discounts.update_one(
-        {"discount_id": discount_id},
-        {"$inc": {"total_uses": applied_count}}
-    )
+    job = await bulk_discounts.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Bulk discount job not found")
+    if job["status"] == "completed":
+        raise HTTPException(status_code=400, detail="Bulk discount job already completed")
     
-    return {
-        "message": f"Discount applied to {applied_count} users",
-        "applied_count": applied_count,
-        "total_eligible": len(users),
-        "failed_applications": failed_applications
-    }
+    background_tasks.add_task(_run_bulk_discount_job, job_id)
+    return {"message": "Bulk discount job resumed", "job_id": job_id}
 
 # ===== DISCOUNT PERFORMANCE ANALYTICS =====
 
@@ -853,6 +829,30 @@ async def get_discount_analytics(
 
 # ===== USER COHORT ANALYSIS =====
 
+async def _cohort_user_totals(query: Dict[str, Any]) -> Dict[str, Any]:
+    """User count, revenue, active users and tier distribution of a cohort in one aggregation"""
+    result = await db.users.aggregate([
+        {"$match": query},
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": None,
+                "user_count": {"$sum": 1},
+                "total_revenue": {"$sum": "$total_paid"},
+                # Users without an is_active flag count as active
+                "active_users": {"$sum": {"$cond": [{"$ifNull": ["$is_active", True]}, 1, 0]}}
+            }}],
+            "tiers": [{"$group": {"_id": {"$ifNull": ["$subscription_tier", "unknown"]}, "count": {"$sum": 1}}}]
+        }}
+    ]).to_list(length=1)
+    facets = result[0] if result else {"totals": [], "tiers": []}
+    totals = facets["totals"][0] if facets["totals"] else {}
+    return {
+        "user_count": totals.get("user_count", 0),
+        "total_revenue": totals.get("total_revenue", 0),
+        "active_users": totals.get("active_users", 0),
+        "subscription_distribution": {row["_id"]: row["count"] for row in facets["tiers"]}
+    }
+
 @router.post("/admin/cohorts/create")
 async def create_user_cohort(
     name: str,
@@ -875,19 +875,17 @@ async def create_user_cohort(
         if period["to"]:
             query.setdefault("created_at", {})["$lte"] = datetime.fromisoformat(period["to"])
     
-    # Get users matching criteria
-    users = await db.users.find(query).to_list(length=50000)
-    user_count = len(users)
+    # Aggregate users matching criteria server-side
+    totals = await _cohort_user_totals(query)
+    user_count = totals["user_count"]
     
     # Calculate cohort metrics
-    total_revenue = sum(
-        user.get("total_paid", 0) for user in users
-    )
+    total_revenue = totals["total_revenue"]
     
     avg_revenue_per_user = total_revenue / user_count if user_count > 0 else 0
     
     # Retention analysis (simplified)
-    active_users = sum(1 for user in users if user.get("is_active", True))
+    active_users = totals["active_users"]
     retention_rate = (active_users / user_count) * 100 if user_count > 0 else 0
     
     cohort_doc = {
@@ -955,22 +953,19 @@ async def get_cohort_analytics(
         if period.get("to"):
             query.setdefault("created_at", {})["$lte"] = datetime.fromisoformat(period["to"])
     
-    users = await db.users.find(query).to_list(length=50000)
+    totals = await _cohort_user_totals(query)
     
     # Calculate current metrics
     current_metrics = {
-        "total_users": len(users),
-        "active_users": sum(1 for user in users if user.get("is_active", True)),
-        "subscription_distribution": {},
-        "revenue_metrics": {}
+        "total_users": totals["user_count"],
+        "active_users": totals["active_users"],
+        "subscription_distribution": totals["subscription_distribution"],
+        "revenue_metrics": {
+            "total_revenue": totals["total_revenue"],
+            "avg_revenue_per_user": round(totals["total_revenue"] / totals["user_count"], 2) if totals["user_count"] else 0
+        }
     }
     
-    # Subscription distribution
-    for user in users:
-        tier = user.get("subscription_tier", "unknown")
-        current_metrics["subscription_distribution"][tier] = \
-            current_metrics["subscription_distribution"].get(tier, 0) + 1
-    
     return {
         "cohort_info": cohort,
         "current_metrics": current_metrics,
@@ -986,6 +981,7 @@ async def get_cohort_analytics(
 async def get_discount_roi_tracking(
     date_from: Optional[str] = Query(None),
     date_to: Optional[str] = Query(None),
+    exact: bool = Query(False),
     current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
 ):
     """Get ROI tracking for all discounts"""
@@ -996,131 +992,58 @@ async def get_discount_roi_tracking(
     if not date_to:
         date_to = datetime.utcnow().isoformat()
     
-    date_filter = {
-        "applied_at": {
-            "$gte": datetime.fromisoformat(date_from.replace('Z', '+00:00')),
-            "$lte": datetime.fromisoformat(date_to.replace('Z', '+00:00'))
-        }
-    }
+    start = _naive_utc(datetime.fromisoformat(date_from.replace('Z', '+00:00')))
+    end = _naive_utc(datetime.fromisoformat(date_to.replace('Z', '+00:00')))
     
-    # Get all discount usage in period
-    usage_data = await db.discount_usage.find(date_filter).to_list(length=50000)
-    
-    # Group by discount
-    discount_roi = {}
-    for usage in usage_data:
-        discount_id = usage["discount_id"]
-        if discount_id not in discount_roi:
-            discount_roi[discount_id] = {
-                "discount_id": discount_id,
-                "total_uses": 0,
-                "revenue_impact": 0.0,
-                "users_acquired": set(),
-                "conversion_rate": 0.0
-            }
-        
-        discount_roi[discount_id]["total_uses"] += 1
-        discount_roi[discount_id]["users_acquired"].add(usage["user_id"])
-        
-        # Calculate revenue impact
-        if usage["discount_type"] == "percentage":
-            estimated_value = 149.0 * (usage["discount_amount"] / 100)
-        elif usage["discount_type"] == "fixed_amount":
-            estimated_value = usage["discount_amount"]
-        else:  # free_months
-            estimated_value = 149.0 * usage["discount_amount"]
-        
-        discount_roi[discount_id]["revenue_impact"] += estimated_value
-    
-    # Get discount details and calculate final metrics
-    roi_results = []
-    for discount_id, data in discount_roi.items():
-        discount = await db.discounts.find_one({"discount_id": discount_id})
-        if discount:
-            unique_users = len(data["users_acquired"])
-            
-            # Calculate estimated acquisition cost (simplified)
-            estimated_cost = data["revenue_impact"] * 0.3  # Assume 30% cost ratio
-            roi_percentage = ((data["revenue_impact"] - estimated_cost) / estimated_cost * 100) if estimated_cost > 0 else 0
-            
-            roi_results.append({
-                "discount_name": discount["name"],
-                "discount_id": discount_id,
-                "total_uses": data["total_uses"],
-                "unique_users": unique_users,
-                "revenue_impact": round(data["revenue_impact"], 2),
-                "estimated_cost": round(estimated_cost, 2),
-                "roi_percentage": round(roi_percentage, 2),
-                "cost_per_acquisition": round(estimated_cost / unique_users, 2) if unique_users > 0 else 0
-            })
-    
-    # Sort by ROI percentage
-    roi_results.sort(key=lambda x: x["roi_percentage"], reverse=True)
+    # Daily rollups plus live edge days; exact=true aggregates discount_usage directly
+    if exact:
+        result = await discount_analytics.roi_exact(start, end)
+    else:
+        result = await discount_analytics.roi(start, end)
     
     return {
-        "roi_tracking": roi_results,
+        **result,
         "period": f"{date_from} to {date_to}",
-        "total_discounts_analyzed": len(roi_results)
+        "total_discounts_analyzed": len(result["roi_tracking"])
     }
 
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
 # ===== EXPORT CAPABILITIES =====
 
 @router.post("/admin/export")
 async def export_admin_data(
     export_request: ExportRequest,
+    background_tasks: BackgroundTasks,
     current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
 ):
-    """Export admin data in various formats"""
+    """Export admin data as a streamed CSV, NDJSON or JSON download, or as a background job"""
     
     export_type = export_request.export_type
     filters = export_request.filters
     format_type = export_request.format
     
-    # Build query based on filters
-    query = {}
-    if filters.get("date_range"):
-        date_range = filters["date_range"]
-        if date_range.get("from"):
-            query.setdefault("created_at", {})["$gte"] = datetime.fromisoformat(date_range["from"])
-        if date_range.get("to"):
-            query.setdefault("created_at", {})["$lte"] = datetime.fromisoformat(date_range["to"])
-    
-    # Export users data
-    if export_type == "users":
-        if filters.get("subscription_tier"):
-            query["subscription_tier"] = filters["subscription_tier"]
-        if filters.get("is_active") is not None:
-            query["is_active"] = filters["is_active"]
-        
-        users = await db.users.find(query).to_list(length=100000)
-        
-        # Remove sensitive data
-        for user in users:
-            user.pop("password_hash", None)
-            user.pop("_id", None)
-        
-        if format_type == "csv":
-            return _export_to_csv(users, "users_export")
-        else:
-            return {"data": users, "count": len(users)}
-    
-    # Export discounts data
-    elif export_type == "discounts":
-        discounts = await db.discounts.find(query).to_list(length=10000)
-        
-        # Get usage statistics for each discount
-        for discount in discounts:
-            discount.pop("_id", None)
-            usage_count = await db.discount_usage.count_documents({"discount_id": discount["discount_id"]})
-            discount["actual_usage_count"] = usage_count
-        
-        if format_type == "csv":
-            return _export_to_csv(discounts, "discounts_export")
-        else:
-            return {"data": discounts, "count": len(discounts)}
+    # Users and discounts are streamed from a cursor; background jobs write the same stream to a file
+    if export_type in STREAMED_EXPORT_TYPES:
+        if export_request.background:
+            job = await admin_exports.create_job(export_type, filters, format_type, export_request.gzip, current_user.user_id)
+            background_tasks.add_task(admin_exports.run_job, job["job_id"])
+            job.pop("_id", None)
+            return {
+                "status": "success",
+                "job": job,
+                "status_url": f"/api/admin/export/jobs/{job['job_id']}",
+                "download_url": f"/api/admin/export/jobs/{job['job_id']}/download"
+            }
+        chunks = await admin_exports.stream(export_type, filters, format_type, export_request.gzip)
+        return admin_exports.response(chunks, export_type, format_type, export_request.gzip)
     
     # Export analytics data
     elif export_type == "analytics":
+        if export_request.background:
+            raise HTTPException(status_code=400, detail="Background exports support users and discounts")
+        
         # Get comprehensive analytics
         total_users = await db.users.count_documents({})
         total_discounts = await db.discounts.count_documents({})
@@ -1140,52 +1063,50 @@ async def export_admin_data(
             "export_timestamp": datetime.utcnow().isoformat()
         }]
         
-        if format_type == "csv":
-            return _export_to_csv(analytics_data, "analytics_export")
-        else:
-            return {"data": analytics_data, "count": len(analytics_data)}
+        columns = sorted(analytics_data[0])
+        chunks = encode_rows(iterate_rows(analytics_data), format_type, columns)
+        if export_request.gzip:
+            chunks = gzip_chunks(chunks)
+        return admin_exports.response(chunks, export_type, format_type, export_request.gzip)
     
     else:
         raise HTTPException(status_code=400, detail="Invalid export type")
 
-def _export_to_csv(data, filename):
-    """Helper function to export data as CSV"""
-    if not data:
-        raise HTTPException(status_code=400, detail="No data to export")
-    
-    # Create CSV content
-    output = io.StringIO()
-    
-    # Get all possible field names from all records to handle schema variations
-    all_fieldnames = set()
-    for record in data:
-        all_fieldnames.update(record.keys())
-    
-    fieldnames = sorted(list(all_fieldnames))  # Sort for consistent output
-    writer = csv.DictWriter(output, fieldnames=fieldnames, restval='')  # Use empty string for missing fields
-    
-    writer.writeheader()
-    for row in data:
-        # Convert datetime objects to strings
-        cleaned_row = {}
-        for key, value in row.items():
-            if isinstance(value, datetime):
-                cleaned_row[key] = value.isoformat()
-            elif isinstance(value, list):
-                cleaned_row[key] = ", ".join(str(item) for item in value)
-            else:
-                cleaned_row[key] = value
-        writer.writerow(cleaned_row)
-    
-    # Create response
-    csv_content = output.getvalue()
-    output.close()
-    
-    return StreamingResponse(
-        io.StringIO(csv_content),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"}
-    )
+@router.get("/admin/export/jobs")
+async def list_export_jobs(
+    limit: int = Query(50, le=200),
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Recent background export jobs"""
+    
+    jobs = await admin_exports.list_jobs(limit)
+    return {"jobs": jobs, "count": len(jobs)}
+
+@router.get("/admin/export/jobs/{job_id}")
+async def get_export_job(
+    job_id: str,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Status and progress of a background export job"""
+    
+    job = await admin_exports.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+@router.get("/admin/export/jobs/{job_id}/download")
+async def download_export_job(
+    job_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None, alias="If-Range"),
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Download a finished export; honours Range requests so interrupted downloads can resume"""
+    
+    job = await admin_exports.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return admin_exports.download_response(job, range_header, if_range)
 
 # ===== AUTOMATED DISCOUNT RULES =====
 
@@ -1468,6 +1389,7 @@ async def start_impersonation_session(
         "timestamp": start_time
     })
     
+    dashboard_cache.notify("admin_activity")
     return ImpersonationSession(**session_doc)
 
 @router.post("/admin/impersonate/{session_id}/end")
@@ -1505,6 +1427,7 @@ async def end_impersonation_session(
         "timestamp": datetime.utcnow()
     })
     
+    dashboard_cache.notify("admin_activity")
     return {"message": "Impersonation session ended successfully"}
 
 # ===== ENHANCED USER MANAGEMENT ENDPOINTS =====
@@ -1519,7 +1442,7 @@ async def get_all_users(
     """Get all users - simplified endpoint for admin portal"""
     try:
         # Get users from database
-        users_cursor = db.users.find({}).skip(offset).limit(limit)
+        users_cursor = db.users.find({}, {"search": 0}).skip(offset).limit(limit)
         users = await users_cursor.to_list(length=limit)
         
         # Convert ObjectId to string and format response
@@ -1551,6 +1474,8 @@ async def get_all_customers(
 
 @router.get("/admin/users/search")
 async def search_users(
+    q: Optional[str] = Query(None),
+    match: str = Query("prefix", regex="^(prefix|contains)$"),
     email: Optional[str] = Query(None),
     role: Optional[UserRole] = Query(None),
     subscription_tier: Optional[SubscriptionTier] = Query(None),
@@ -1559,17 +1484,15 @@ async def search_users(
     is_active: Optional[bool] = Query(None),
     has_subscription: Optional[bool] = Query(None),
     limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
     offset: int = Query(0, ge=0),
     current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
 ):
     """Advanced user search and filtering"""
     
-    # Build query
+    # Build filters; the search text itself is matched by the indexed search fields
     query = {}
     
-    if email:
-        query["email"] = {"$regex": email, "$options": "i"}
-    
     if role:
         query["role"] = role
     
@@ -1594,27 +1517,12 @@ async def search_users(
             date_query["$lte"] = datetime.fromisoformat(registration_to.replace('Z', '+00:00'))
         query["created_at"] = date_query
     
-    # Execute search with pagination
-    cursor = db.users.find(query).sort("created_at", -1).skip(offset).limit(limit)
-    users = await cursor.to_list(length=limit)
-    
-    # Get total count for pagination
-    total_count = await db.users.count_documents(query)
+    # The former email parameter was a substring match
+    if email and not q:
+        q, match = email, "contains"
     
-    # Remove sensitive data and ObjectIds
-    for user in users:
-        if "_id" in user:
-            del user["_id"]
-        if "password_hash" in user:
-            del user["password_hash"]
-    
-    return {
-        "users": users,
-        "total": total_count,
-        "limit": limit,
-        "offset": offset,
-        "has_more": total_count > (offset + limit)
-    }
+    # Keyset pagination: pass next_cursor back as cursor for the following page
+    return await user_search.search(query, query=q, match=match, limit=limit, cursor=cursor, offset=offset)
 
 @router.get("/admin/users/{user_id}/analytics")
 async def get_user_analytics(
@@ -1749,50 +1657,104 @@ async def get_user_analytics(
 @router.post("/admin/discounts/{discount_id}/codes/generate")
 async def generate_discount_codes(
     discount_id: str,
-    count: int = Query(1, ge=1, le=1000),
+    background_tasks: BackgroundTasks,
+    count: int = Query(1, ge=1, le=MAX_MINT_COUNT),
     max_uses_per_code: Optional[int] = Query(None),
     expires_in_days: Optional[int] = Query(None),
+    code_length: int = Query(DEFAULT_CODE_LENGTH, ge=4, le=32),
+    alphabet: str = Query(DEFAULT_ALPHABET, min_length=2, max_length=64),
+    prefix: str = Query(DEFAULT_CODE_PREFIX, max_length=16),
     current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
 ):
-    """Generate discount codes for a discount"""
+    """Generate discount codes for a discount; large batches are minted in the background"""
     
     # Verify discount exists
     discount = await db.discounts.find_one({"discount_id": discount_id})
     if not discount:
         raise HTTPException(status_code=404, detail="Discount not found")
     
-    codes = []
-    for _ in range(count):
-        code_id = str(uuid.uuid4())
-        code = f"CM{uuid.uuid4().hex[:8].upper()}"
-        
-        expires_at = None
-        if expires_in_days:
-            expires_at = datetime.utcnow() + timedelta(days=expires_in_days)
-        
-        code_doc = {
-            "code_id": code_id,
-            "discount_id": discount_id,
-            "code": code,
-            "is_active": True,
-            "usage_count": 0,
-            "max_uses": max_uses_per_code,
-            "created_at": datetime.utcnow(),
-            "expires_at": expires_at,
-            "created_by": current_user.user_id
+    expires_at = None
+    if expires_in_days:
+        expires_at = datetime.utcnow() + timedelta(days=expires_in_days)
+    
+    try:
+        batch = await discount_code_minter.create_batch(
+            discount_id, count, current_user.user_id, max_uses_per_code, expires_at, code_length, alphabet, prefix
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    batch_url = f"/api/admin/discounts/{discount_id}/codes/batches/{batch['batch_id']}"
+    if count > CODE_RESPONSE_LIMIT:
+        background_tasks.add_task(_mint_discount_codes, batch["batch_id"])
+        return {
+            "message": f"Generating {count} discount codes in the background",
+            "batch_id": batch["batch_id"],
+            "status_url": batch_url,
+            "download_url": f"{batch_url}/download"
         }
-        
-        await db.discount_codes.insert_one(code_doc)
-        
-        # Remove ObjectId for response
-        del code_doc["_id"]
-        codes.append(code_doc)
+    
+    batch = await _mint_discount_codes(batch["batch_id"])
+    if batch["status"] != "completed":
+        raise HTTPException(status_code=500, detail=f"Discount code generation failed: {batch.get('error')}")
+    codes = await db.discount_codes.find({"batch_id": batch["batch_id"]}, {"_id": 0}).to_list(length=CODE_RESPONSE_LIMIT)
     
     return {
         "message": f"Generated {count} discount codes",
-        "codes": codes
+        "codes": codes,
+        "batch_id": batch["batch_id"],
+        "download_url": f"{batch_url}/download"
     }
 
+async def _mint_discount_codes(batch_id: str):
+    batch = await discount_code_minter.mint(batch_id)
+    dashboard_cache.notify("discounts")
+    return batch
+
+@router.get("/admin/discounts/{discount_id}/codes/batches")
+async def list_discount_code_batches(
+    discount_id: str,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Code minting batches of a discount, newest first"""
+    
+    batches = await discount_code_minter.list_batches(discount_id)
+    return {"batches": batches, "total": len(batches)}
+
+@router.get("/admin/discounts/{discount_id}/codes/batches/{batch_id}")
+async def get_discount_code_batch(
+    discount_id: str,
+    batch_id: str,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Progress of a code minting batch"""
+    
+    batch = await discount_code_minter.get_batch(batch_id)
+    if not batch or batch["discount_id"] != discount_id:
+        raise HTTPException(status_code=404, detail="Code batch not found")
+    return batch
+
+@router.get("/admin/discounts/{discount_id}/codes/batches/{batch_id}/download")
+async def download_discount_code_batch(
+    discount_id: str,
+    batch_id: str,
+    format: str = Query("csv", regex="^(csv|ndjson|json)$"),
+    gzip: bool = False,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Stream every code of a finished batch as a file"""
+    
+    batch = await discount_code_minter.get_batch(batch_id)
+    if not batch or batch["discount_id"] != discount_id:
+        raise HTTPException(status_code=404, detail="Code batch not found")
+    if batch["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Code batch is {batch['status']}")
+    
+    chunks = encode_rows(discount_code_minter.batch_rows(batch_id), format, ["code", "expires_at", "max_uses"])
+    if gzip:
+        chunks = gzip_chunks(chunks)
+    return admin_exports.response(chunks, "discount_codes", format, gzip)
+
 @router.get("/admin/discounts/{discount_id}/codes")
 async def get_discount_codes(
     discount_id: str,
@@ -1819,59 +1781,11 @@ async def redeem_discount_code(
 ):
     """Redeem a discount code"""
     
-    # Find the code
-    code_doc = await db.discount_codes.find_one({"code": code})
-    if not code_doc:
-        raise HTTPException(status_code=404, detail="Invalid discount code")
-    
-    # Check if code is active and not expired
-    if not code_doc["is_active"]:
-        raise HTTPException(status_code=400, detail="Discount code is no longer active")
-    
-    if code_doc["expires_at"] and datetime.utcnow() > code_doc["expires_at"]:
-        raise HTTPException(status_code=400, detail="Discount code has expired")
-    
-    # Check usage limits
-    if code_doc["max_uses"] and code_doc["usage_count"] >= code_doc["max_uses"]:
-        raise HTTPException(status_code=400, detail="Discount code usage limit reached")
-    
-    # Check if user already used this code
-    existing_usage = await db.discount_usage.find_one({
-        "user_id": current_user.user_id,
-        "discount_code": code
-    })
-    if existing_usage:
-        raise HTTPException(status_code=400, detail="You have already used this discount code")
-    
-    # Get discount details
-    discount = await db.discounts.find_one({"discount_id": code_doc["discount_id"]})
-    if not discount:
-        raise HTTPException(status_code=404, detail="Associated discount not found")
-    
-    # Apply the discount
-    usage_record = {
-        "usage_id": str(uuid.uuid4()),
-        "discount_id": discount["discount_id"],
-        "discount_code": code,
-        "user_id": current_user.user_id,
-        "applied_at": datetime.utcnow(),
-        "discount_amount": discount["value"],
-        "discount_type": discount["discount_type"]
-    }
-    
-    await db.discount_usage.insert_one(usage_record)
-    
-    # Update usage statistics
-    await db.discount_codes.update_one(
-        {"code": code},
-        {"$inc": {"usage_count": 1}}
-    )
-    
-    await db.discounts.update_one(
-        {"discount_id": discount["discount_id"]},
-        {"$inc": {"total_uses": 1}}
-    )
+    # One conditional claim on the code; concurrent redemptions cannot exceed max_uses
+    redemption = await discount_redemptions.redeem(code, current_user.user_id)
+    discount = redemption["discount"]
     
+    dashboard_cache.notify("discounts")
     return {
         "message": "Discount code redeemed successfully",
         "discount": {
@@ -1879,7 +1793,7 @@ async def redeem_discount_code(
             "type": discount["discount_type"],
             "value": discount["value"]
         },
-        "usage_record": usage_record
+        "usage_record": redemption["usage_record"]
     }
 
 @router.get("/admin/impersonation/active")
@@ -1909,46 +1823,17 @@ async def get_active_impersonation_sessions(
 
 # Analytics Dashboard Endpoints
 @router.get("/admin/analytics/dashboard")
+@dashboard_cache.cached("/api/admin/analytics/dashboard", invalidated_by=["users", "banners", "discounts", "admin_activity"])
 async def get_admin_analytics_dashboard(
     current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
 ):
     """Get comprehensive admin analytics dashboard"""
     
-    # User statistics by tier
-    pipeline = [
-        {
-            "$group": {
-                "_id": "$subscription_tier",
-                "count": {"$sum": 1},
-                "active_count": {
-                    "$sum": {"$cond": [{"$eq": ["$is_active", True]}, 1, 0]}
-                }
-            }
-        }
-    ]
-    
-    tier_stats = await db.users.aggregate(pipeline).to_list(length=10)
-    
-    # Historical user growth (last 12 months)
-    monthly_growth = []
-    for i in range(12):
-        start_date = datetime.utcnow().replace(day=1) - timedelta(days=30 * i)
-        end_date = start_date + timedelta(days=32)  # Ensure we get the full month
-        
-        monthly_users = await db.users.count_documents({
-            "created_at": {
-                "$gte": start_date,
-                "$lt": end_date
-            }
-        })
-        
-        monthly_growth.insert(0, {
-            "month": start_date.strftime("%Y-%m"),
-            "new_users": monthly_users
-        })
-    
-    # Cancellation statistics
-    cancelled_users = await db.users.count_documents({"is_active": False})
+    # One $facet pipeline per collection, all collections concurrently
+    stats = await admin_stats.dashboard()
+    tier_stats = stats["tier_stats"]
+    banner_stats = stats["banner_stats"]
+    discount_stats = stats["discount_stats"]
     
     # Revenue analytics (mock data - integrate with Stripe in production)
     total_revenue = 0
@@ -1972,40 +1857,13 @@ async def get_admin_analytics_dashboard(
         revenue_by_tier[tier] = tier_revenue
         total_revenue += tier_revenue
     
-    # Banner analytics
-    banner_stats = await db.banners.aggregate([
-        {
-            "$group": {
-                "_id": "$status",
-                "count": {"$sum": 1},
-                "total_views": {"$sum": "$views"},
-                "total_clicks": {"$sum": "$clicks"}
-            }
-        }
-    ]).to_list(length=10)
-    
-    # Discount analytics
-    discount_stats = await db.discounts.aggregate([
-        {
-            "$group": {
-                "_id": "$discount_type",
-                "count": {"$sum": 1},
-                "total_uses": {"$sum": "$total_uses"},
-                "total_impact": {"$sum": "$total_revenue_impact"}
-            }
-        }
-    ]).to_list(length=10)
-    
-    # Recent admin activities
-    recent_activities = await db.admin_audit_log.find({}).sort("timestamp", -1).limit(20).to_list(length=20)
-    
     return {
         "user_statistics": {
             "by_tier": tier_stats,
             "total_users": sum(stat["count"] for stat in tier_stats),
             "active_users": sum(stat["active_count"] for stat in tier_stats),
-            "cancelled_users": cancelled_users,
-            "monthly_growth": monthly_growth
+            "cancelled_users": stats["cancelled_users"],
+            "monthly_growth": stats["monthly_growth"]
         },
         "revenue_analytics": {
             "total_monthly_revenue": total_revenue,
@@ -2022,11 +1880,12 @@ async def get_admin_analytics_dashboard(
             "total_discounts": sum(stat["count"] for stat in discount_stats),
             "total_uses": sum(stat["total_uses"] for stat in discount_stats)
         },
-        "recent_activities": recent_activities,
+        "recent_activities": stats["recent_activities"],
         "generated_at": datetime.utcnow()
     }
 
 @router.get("/admin/analytics/users")
+@dashboard_cache.cached("/api/admin/analytics/users", ttl=STATS_CACHE_TTL, invalidated_by=["users"], key_params=["start_date", "end_date"])
 async def get_user_analytics(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
@@ -2040,87 +1899,17 @@ async def get_user_analytics(
     if not start_date:
         start_date = end_date - timedelta(days=30)
     
-    # User acquisition over time
-    daily_signups = await db.users.aggregate([
-        {
-            "$match": {
-                "created_at": {"$gte": start_date, "$lte": end_date}
-            }
-        },
-        {
-            "$group": {
-                "_id": {
-                    "$dateToString": {
-                        "format": "%Y-%m-%d",
-                        "date": "$created_at"
-                    }
-                },
-                "signups": {"$sum": 1},
-                "by_tier": {
-                    "$push": "$subscription_tier"
-                }
-            }
-        },
-        {"$sort": {"_id": 1}}
-    ]).to_list(length=100)
-    
-    # Churn analysis
-    churn_data = await db.users.aggregate([
-        {
-            "$match": {
-                "is_active": False,
-                "deactivated_at": {"$gte": start_date, "$lte": end_date}
-            }
-        },
-        {
-            "$group": {
-                "_id": "$subscription_tier",
-                "churned_count": {"$sum": 1}
-            }
-        }
-    ]).to_list(length=10)
-    
-    # Login frequency analysis
-    login_frequency = await db.login_logs.aggregate([
-        {
-            "$match": {
-                "login_time": {"$gte": start_date, "$lte": end_date},
-                "success": True
-            }
-        },
-        {
-            "$group": {
-                "_id": "$user_id",
-                "login_count": {"$sum": 1},
-                "last_login": {"$max": "$login_time"}
-            }
-        },
-        {
-            "$group": {
-                "_id": {
-                    "$switch": {
-                        "branches": [
-                            {"case": {"$gte": ["$login_count", 20]}, "then": "very_active"},
-                            {"case": {"$gte": ["$login_count", 10]}, "then": "active"},
-                            {"case": {"$gte": ["$login_count", 5]}, "then": "moderate"},
-                            {"case": {"$gte": ["$login_count", 1]}, "then": "low"}
-                        ],
-                        "default": "inactive"
-                    }
-                },
-                "user_count": {"$sum": 1}
-            }
-        }
-    ]).to_list(length=10)
+    # Signups and churn in one users pipeline, login frequency concurrently
+    activity = await admin_stats.user_activity(start_date, end_date)
     
     return {
         "date_range": {
             "start_date": start_date,
             "end_date": end_date
         },
-        "daily_signups": daily_signups,
-        "churn_analysis": churn_data,
-        "login_frequency": login_frequency,
+        "daily_signups": activity["daily_signups"],
+        "churn_analysis": activity["churn_analysis"],
+        "login_frequency": activity["login_frequency"],
         "generated_at": datetime.utcnow()
     }
 
@@ -2173,94 +1962,18 @@ async def get_admin_trial_email_logs(
         raise HTTPException(status_code=500, detail=f"Failed to fetch trial email logs: {str(e)}")
 
 @router.get("/admin/trial-emails/stats")
+@dashboard_cache.cached("/api/admin/trial-emails/stats", ttl=STATS_CACHE_TTL)
 async def get_admin_trial_email_stats(
     current_user: UserProfile = Depends(require_role([UserRole.ADMIN]))
 ):
     """Get comprehensive trial email statistics for admin dashboard"""
     try:
-        # Overall stats
-        total_logs = await db.trial_email_logs.count_documents({})
-        sent_count = await db.trial_email_logs.count_documents({"status": "sent"})
-        failed_count = await db.trial_email_logs.count_documents({"status": "failed"})
-        scheduled_count = await db.trial_email_logs.count_documents({"status": "scheduled"})
-        skipped_count = await db.trial_email_logs.count_documents({"status": "skipped"})
-        
-        # Stats by email type
-        email_types = ["welcome", "progress", "urgency", "final"]
-        type_stats = {}
-        
-        for email_type in email_types:
-            type_total = await db.trial_email_logs.count_documents({"email_type": email_type})
-            type_sent = await db.trial_email_logs.count_documents({
-                "email_type": email_type,
-                "status": "sent"
-            })
-            type_failed = await db.trial_email_logs.count_documents({
-                "email_type": email_type,
-                "status": "failed"
-            })
-            
-            type_stats[email_type] = {
-                "total": type_total,
-                "sent": type_sent,
-                "failed": type_failed,
-                "success_rate": round((type_sent / type_total * 100) if type_total > 0 else 0, 2)
-            }
-        
-        # Recent activity (last 7 days)
-        seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        recent_activity = await db.trial_email_logs.aggregate([
-            {
-                "$match": {
-                    "created_at": {"$gte": seven_days_ago}
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
-                        "type": "$email_type"
-                    },
-                    "count": {"$sum": 1}
-                }
-            },
-            {"$sort": {"_id.date": 1}}
-        ]).to_list(length=None)
-        
-        # Trial users with email activity
-        trial_users_with_emails = await db.trial_email_logs.aggregate([
-            {
-                "$group": {
-                    "_id": "$user_email",
-                    "total_emails": {"$sum": 1},
-                    "sent_emails": {
-                        "$sum": {"$cond": [{"$eq": ["$status", "sent"]}, 1, 0]}
-                    },
-                    "first_name": {"$first": "$first_name"},
-                    "trial_start": {"$first": "$trial_start_date"},
-                    "trial_end": {"$first": "$trial_end_date"}
-                }
-            },
-            {"$sort": {"trial_start": -1}},
-            {"$limit": 20}
-        ]).to_list(length=None)
-        
-        # Calculate overall success rate
-        success_rate = round((sent_count / total_logs * 100) if total_logs > 0 else 0, 2)
+        # Every breakdown from one $facet pipeline
+        stats = await admin_stats.trial_emails()
         
         return {
             "status": "success",
-            "overall_stats": {
-                "total_emails": total_logs,
-                "sent": sent_count,
-                "failed": failed_count,
-                "scheduled": scheduled_count,
-                "skipped": skipped_count,
-                "success_rate_percent": success_rate
-            },
-            "stats_by_email_type": type_stats,
-            "recent_activity": recent_activity,
-            "trial_users_with_emails": trial_users_with_emails,
+            **stats,
             "generated_at": datetime.utcnow()
         }
         
@@ -11,6 +11,7 @@ import json
 
 # Import authentication
 from auth.auth_system import get_current_user, UserProfile, require_role, UserRole
+from modules.index_registry import index_registry
 
 # MongoDB setup
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
@@ -18,6 +19,11 @@ DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
 client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 
+declare_index = index_registry.module(__name__)
+declare_index("affiliate_chat_sessions", "id")
+declare_index("affiliate_chat_sessions", [("status", 1), ("updated_at", -1)])
+declare_index("affiliate_chat_messages", [("session_id", 1), ("timestamp", 1)])
+
 router = APIRouter(prefix="/api/affiliate-chat", tags=["Affiliate Chat"])
 
 # ========== MODELS ==========
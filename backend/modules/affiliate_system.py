@@ -18,6 +18,9 @@ import stripe
 
 # Import authentication from main auth system
 from auth.auth_system import get_current_user, UserProfile, require_role, UserRole
+from modules.dashboard_cache import dashboard_cache
+from modules.index_registry import index_registry
+from modules.data_lifecycle import data_lifecycle, ROLLUP_COLLECTION
 
 load_dotenv()
 
@@ -27,6 +30,23 @@ DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
 client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 
+declare_index = index_registry.module(__name__)
+declare_index("affiliates", "affiliate_id", unique=True)
+declare_index("affiliates", "email")
+declare_index("affiliates", [("status", 1), ("created_at", -1)])
+declare_index("click_tracking", [("affiliate_id", 1), ("clicked_at", -1)])
+declare_index("click_tracking", [("affiliate_id", 1), ("session_id", 1)])
+declare_index("click_tracking", [("affiliate_id", 1), ("conversion_date", -1)], partialFilterExpression={"converted": True})
+declare_index(ROLLUP_COLLECTION, [("dimensions.affiliate_id", 1), ("day", 1)], partialFilterExpression={"collection": "click_tracking"})
+declare_index("commissions", [("affiliate_id", 1), ("earned_date", -1)])
+declare_index("commissions", [("affiliate_id", 1), ("customer_id", 1), ("commission_type", 1)])
+declare_index("earnings_holdback", [("status", 1), ("release_date", 1)])
+declare_index("affiliate_monitoring", "affiliate_id")
+declare_index("affiliate_monitoring", "flagged_high_refund", partialFilterExpression={"flagged_high_refund": True})
+declare_index("customers", "customer_id")
+declare_index("customers", "referred_by_affiliate", sparse=True)
+declare_index("payments", "user_email")
+
 # Stripe configuration  
 stripe.api_key = os.getenv("STRIPE_API_KEY", "sk_test_emergent")
 
@@ -547,6 +567,7 @@ async def login_affiliate(login_data: AffiliateLogin):
 # ========== AFFILIATE MANAGEMENT ENDPOINTS ==========
 
 @router.get("/dashboard")
+@dashboard_cache.cached("/api/affiliate/dashboard", ttl=30, invalidated_by=["affiliate_activity"], tenant_param="affiliate_id")
 async def get_affiliate_dashboard(affiliate_id: str = Query(...)):
     """Get affiliate dashboard data"""
     try:
@@ -786,6 +807,7 @@ async def track_affiliate_event(event_data: Dict[str, Any]):
         if event_type == "conversion":
             await handle_conversion_event(event_data)
         
+        dashboard_cache.notify("affiliate_activity", tenant=affiliate_id)
         return {"success": True}
         
     except Exception as e:
@@ -1600,26 +1622,24 @@ async def get_affiliate_metrics(affiliate_id: str = Query(...)):
         else:
             customer_lifetime_value = 0
         
-        # Get traffic source data from click tracking
+        # Get traffic source data from click tracking; archived days come from the daily rollups
         traffic_sources = await db.click_tracking.aggregate([
             {"$match": {"affiliate_id": affiliate_id}},
             {"$group": {
                 "_id": {"$ifNull": ["$utm_source", "direct"]},
                 "clicks": {"$sum": 1},
                 "conversions": {"$sum": {"$cond": ["$converted", 1, 0]}}
-            }},
-            {"$sort": {"clicks": -1}},
-            {"$limit": 5}
-        ]).to_list(length=5)
-        
-        top_traffic_sources = [
-            {
-                "source": source["_id"],
-                "clicks": source["clicks"], 
-                "conversions": source["conversions"]
-            }
-            for source in traffic_sources
-        ]
+            }}
+        ]).to_list(length=None)
+        sources = {source["_id"]: {"source": source["_id"], "clicks": source["clicks"], "conversions": source["conversions"]}
+                   for source in traffic_sources}
+        for archived in await data_lifecycle.archived_summary("click_tracking", "utm_source", {"affiliate_id": affiliate_id}):
+            source = sources.setdefault(archived["_id"] or "direct",
+                                        {"source": archived["_id"] or "direct", "clicks": 0, "conversions": 0})
+            source["clicks"] += archived["count"]
+            source["conversions"] += archived.get("conversions", 0)
+        
+        top_traffic_sources = sorted(sources.values(), key=lambda source: source["clicks"], reverse=True)[:5]
         
         metrics = {
             "conversion_rate": conversion_rate,
@@ -12,6 +12,16 @@ import uuid
 import numpy as np
 import pandas as pd
 from enum import Enum
+import os
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from .cohort_engine import CohortEngine
+
+# MongoDB setup for event-based cohort rollups
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
+client = AsyncIOMotorClient(MONGO_URL)
+db = client[DB_NAME]
 
 # Initialize router
 cohort_analysis_router = APIRouter()
@@ -56,6 +66,8 @@ class CohortAnalysisResult(BaseModel):
     metrics: List[CohortMetric]
     retention_curves: Dict[str, List[float]]
     revenue_curves: Dict[str, List[float]]
+    cohort_sizes: Dict[str, int] = Field(default_factory=dict)
+    data_source: str = "simulated"  # simulated, events
 
 class PredictiveCohortInsight(BaseModel):
     cohort_id: str
@@ -73,6 +85,7 @@ class CohortAnalysisService:
         self.campaigns = ["Brand Campaign Q4", "Product Launch", "Retention Campaign", "Acquisition Push", "Referral Program"]
         self.regions = ["North America", "Europe", "Asia-Pacific", "Latin America", "Middle East"]
         self.product_versions = ["v1.0", "v1.1", "v1.2", "v2.0", "v2.1"]
+        self.engine = CohortEngine(db)
     
     async def generate_cohort_data(self, num_customers: int = 500, months_back: int = 12) -> List[CohortCustomer]:
         """Generate realistic cohort customer data"""
@@ -133,9 +146,67 @@ class CohortAnalysisService:
             cohorts=list(cohorts.keys()),
             metrics=all_metrics,
             retention_curves=retention_curves,
-            revenue_curves=revenue_curves
+            revenue_curves=revenue_curves,
+            cohort_sizes={cohort_id: len(cohort_customers) for cohort_id, cohort_customers in cohorts.items()}
+        )
+    
+    async def event_cohort_metrics(self, cohort_period: CohortPeriod, max_cohorts: int = 12, max_periods: int = 12) -> CohortAnalysisResult:
+        """Acquisition-date cohort metrics from the precomputed login/payment rollups"""
+        matrix = await self.engine.matrix(cohort_period.value, max_cohorts=max_cohorts, max_periods=max_periods)
+        
+        all_metrics = []
+        retention_curves = {}
+        revenue_curves = {}
+        retention_matrix = matrix.retention()
+        revenue_per_customer_matrix = matrix.revenue_per_active_user()
+        
+        for i, cohort_id in enumerate(matrix.cohorts):
+            if matrix.cohort_sizes[i] < 5:  # Skip small cohorts
+                continue
+            
+            initial_revenue_per_customer = revenue_per_customer_matrix[i][0] if revenue_per_customer_matrix[i] else 0.0
+            for period_num, active_customers in enumerate(matrix.active_users[i]):
+                if active_customers == 0:
+                    continue
+                retention_rate = retention_matrix[i][period_num]
+                total_revenue = matrix.revenue[i][period_num]
+                all_metrics.append(CohortMetric(
+                    cohort_id=cohort_id,
+                    period=period_num,
+                    retention_rate=retention_rate,
+                    revenue_per_customer=revenue_per_customer_matrix[i][period_num],
+                    customer_count=active_customers,
+                    total_revenue=total_revenue,
+                    churn_rate=1 - retention_rate if period_num > 0 else 0,
+                    # Revenue above what the same customers spent per head in their first period
+                    expansion_revenue=max(0.0, total_revenue - initial_revenue_per_customer * active_customers) if period_num > 0 else 0
+                ))
+            retention_curves[cohort_id] = retention_matrix[i]
+            revenue_curves[cohort_id] = revenue_per_customer_matrix[i]
+        
+        return CohortAnalysisResult(
+            cohort_type=CohortType.ACQUISITION_DATE,
+            cohort_period=cohort_period,
+            cohorts=matrix.cohorts,
+            metrics=all_metrics,
+            retention_curves=retention_curves,
+            revenue_curves=revenue_curves,
+            cohort_sizes=dict(zip(matrix.cohorts, matrix.cohort_sizes)),
+            data_source="events"
         )
     
+    async def acquisition_cohorts(self, cohort_period: CohortPeriod, num_customers: int, months_back: int) -> CohortAnalysisResult:
+        """Event-based cohorts when rollups exist, otherwise cohorts of simulated customers"""
+        try:
+            cohort_results = await self.event_cohort_metrics(cohort_period)
+            if cohort_results.retention_curves:
+                return cohort_results
+        except Exception as e:
+            print(f"Cohort rollups unavailable, using simulated cohorts: {e}")
+        
+        customers = await self.generate_cohort_data(num_customers, months_back)
+        return await self.calculate_cohort_metrics(customers, CohortType.ACQUISITION_DATE, cohort_period)
+    
     def _get_cohort_key(self, customer: CohortCustomer, cohort_type: CohortType) -> str:
         """Get cohort key based on cohort type"""
         if cohort_type == CohortType.ACQUISITION_DATE:
@@ -171,12 +242,15 @@ class CohortAnalysisService:
         # Get the earliest acquisition date for this cohort
         min_acquisition_date = min(c.acquisition_date for c in customers)
         
+        # The channel mix does not change between periods, so weigh it once
+        channel_multiplier = self._channel_retention_multiplier(customers)
+        
         for period_num in range(max_periods):
             period_start = min_acquisition_date + timedelta(days=period_num * period_length_days)
             period_end = period_start + timedelta(days=period_length_days)
             
             # Simulate customer behavior for this period
-            active_customers = self._simulate_customer_activity(customers, period_num, initial_count)
+            active_customers = self._simulate_customer_activity(channel_multiplier, period_num, initial_count)
             
             if active_customers > 0:
                 retention_rate = active_customers / initial_count
@@ -204,7 +278,7 @@ class CohortAnalysisService:
         
         return metrics, retention_curve, revenue_curve
     
-    def _simulate_customer_activity(self, customers: List[CohortCustomer], period_num: int, initial_count: int) -> int:
+    def _simulate_customer_activity(self, avg_multiplier: float, period_num: int, initial_count: int) -> int:
         """Simulate customer activity for a given period"""
         if period_num == 0:
             return initial_count
@@ -213,6 +287,14 @@ class CohortAnalysisService:
         base_retention = 0.85  # 85% retention in first period
         decay_rate = 0.95  # 5% additional decay each period
         
+        # Calculate retention for this period
+        period_retention = base_retention * (decay_rate ** period_num) * avg_multiplier
+        active_customers = int(initial_count * period_retention)
+        
+        return max(0, active_customers)
+    
+    def _channel_retention_multiplier(self, customers: List[CohortCustomer]) -> float:
+        """Average retention multiplier of a cohort's acquisition channel mix"""
         # Channel-based retention differences
         channel_retention_multipliers = {
             "organic_search": 1.1,
@@ -233,16 +315,10 @@ class CohortAnalysisService:
         
         # Calculate average retention multiplier
         total_customers = len(customers)
-        avg_multiplier = sum(
+        return sum(
             (count / total_customers) * channel_retention_multipliers.get(channel, 1.0)
             for channel, count in channel_weights.items()
         )
-        
-        # Calculate retention for this period
-        period_retention = base_retention * (decay_rate ** period_num) * avg_multiplier
-        active_customers = int(initial_count * period_retention)
-        
-        return max(0, active_customers)
     
     async def generate_predictive_insights(self, cohort_results: CohortAnalysisResult) -> List[PredictiveCohortInsight]:
         """Generate AI-powered predictive insights for cohorts"""
@@ -390,13 +466,8 @@ cohort_service = CohortAnalysisService()
 async def get_cohort_dashboard():
     """Get cohort analysis dashboard data"""
     try:
-        # Generate cohort data
-        customers = await cohort_service.generate_cohort_data(400, 12)
-        
-        # Analyze acquisition date cohorts (monthly)
-        cohort_results = await cohort_service.calculate_cohort_metrics(
-            customers, CohortType.ACQUISITION_DATE, CohortPeriod.MONTHLY
-        )
+        # Analyze acquisition date cohorts (monthly) from the precomputed rollups
+        cohort_results = await cohort_service.acquisition_cohorts(CohortPeriod.MONTHLY, 400, 12)
         
         # Generate predictive insights
         insights = await cohort_service.generate_predictive_insights(cohort_results)
@@ -405,7 +476,7 @@ async def get_cohort_dashboard():
         comparison = await cohort_service.compare_cohorts(cohort_results)
         
         # Calculate overall metrics
-        total_customers = len(customers)
+        total_customers = sum(cohort_results.cohort_sizes.values())
         total_cohorts = len(cohort_results.cohorts)
         
         # Calculate average metrics across all cohorts
@@ -423,11 +494,12 @@ async def get_cohort_dashboard():
                     "total_cohorts": total_cohorts,
                     "average_retention_rate_1m": avg_retention,
                     "average_revenue_per_customer": avg_revenue_per_customer,
-                    "cohort_analysis_period": "12 months"
+                    "cohort_analysis_period": "12 months",
+                    "data_source": cohort_results.data_source
                 },
                 "cohort_performance": {
                     cohort_id: {
-                        "customer_count": len([c for c in customers if cohort_service._get_cohort_key(c, CohortType.ACQUISITION_DATE) == cohort_id]),
+                        "customer_count": cohort_results.cohort_sizes.get(cohort_id, 0),
                         "retention_curve": cohort_results.retention_curves.get(cohort_id, [])[:6],
                         "revenue_curve": cohort_results.revenue_curves.get(cohort_id, [])[:6],
                         "predicted_ltv": next((i.predicted_ltv for i in insights if i.cohort_id == cohort_id), 0)
@@ -474,11 +546,15 @@ async def perform_custom_cohort_analysis(request: Dict):
         months_back = request.get('months_back', 12)
         customer_count = request.get('customer_count', 300)
         
-        # Generate cohort data
-        customers = await cohort_service.generate_cohort_data(customer_count, months_back)
-        
-        # Perform analysis
-        cohort_results = await cohort_service.calculate_cohort_metrics(customers, cohort_type, cohort_period)
+        # Acquisition cohorts come from real events when rolled up; other cohort types are simulated
+        customers = []
+        if cohort_type == CohortType.ACQUISITION_DATE:
+            cohort_results = await cohort_service.acquisition_cohorts(cohort_period, customer_count, months_back)
+        else:
+            cohort_results = None
+        if cohort_results is None or cohort_results.data_source != "events":
+            customers = await cohort_service.generate_cohort_data(customer_count, months_back)
+            cohort_results = await cohort_service.calculate_cohort_metrics(customers, cohort_type, cohort_period)
         
         # Generate insights
         insights = await cohort_service.generate_predictive_insights(cohort_results)
@@ -517,7 +593,8 @@ async def perform_custom_cohort_analysis(request: Dict):
                 "cohort_type": cohort_type.value,
                 "cohort_period": cohort_period.value,
                 "months_analyzed": months_back,
-                "customers_analyzed": len(customers)
+                "customers_analyzed": sum(cohort_results.cohort_sizes.values()),
+                "data_source": cohort_results.data_source
             },
             "cohort_results": {
                 "cohorts": cohort_results.cohorts,
@@ -528,7 +605,7 @@ async def perform_custom_cohort_analysis(request: Dict):
             "custom_metrics": custom_metrics,
             "predictive_insights": [insight.dict() for insight in insights],
             "key_findings": [
-                f"Analyzed {len(customers)} customers across {len(cohort_results.cohorts)} {cohort_type.value} cohorts",
+                f"Analyzed {sum(cohort_results.cohort_sizes.values())} customers across {len(cohort_results.cohorts)} {cohort_type.value} cohorts",
                 f"Average {cohort_period.value} retention varies from {min([min(curve) for curve in cohort_results.retention_curves.values()]):.1%} to {max([max(curve) for curve in cohort_results.retention_curves.values()]):.1%}",
                 f"Best performing cohort: {max(cohort_results.retention_curves.items(), key=lambda x: max(x[1]))[0]}"
             ],
@@ -542,13 +619,8 @@ async def perform_custom_cohort_analysis(request: Dict):
 async def get_retention_forecast():
     """Get retention forecasting for existing cohorts"""
     try:
-        # Generate data for forecasting
-        customers = await cohort_service.generate_cohort_data(350, 6)  # 6 months of data
-        
-        # Analyze current cohorts
-        cohort_results = await cohort_service.calculate_cohort_metrics(
-            customers, CohortType.ACQUISITION_DATE, CohortPeriod.MONTHLY
-        )
+        # Analyze current cohorts (6 months of simulated data when no rollups exist)
+        cohort_results = await cohort_service.acquisition_cohorts(CohortPeriod.MONTHLY, 350, 6)
         
         # Generate forecasts for each cohort
         forecasts = {}
@@ -621,4 +693,52 @@ async def get_retention_forecast():
         }
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Retention forecast error: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Retention forecast error: {e}")
+
+@cohort_analysis_router.get("/api/analytics/cohort-analysis/matrix")
+async def get_cohort_matrix(granularity: str = "monthly", max_cohorts: int = 12, max_periods: int = 12):
+    """Get the precomputed acquisition x activity period retention and revenue matrices"""
+    try:
+        matrix = await cohort_service.engine.matrix(granularity, max_cohorts=max_cohorts, max_periods=max_periods)
+        
+        return {
+            "status": "success",
+            "granularity": matrix.granularity,
+            "cohorts": matrix.cohorts,
+            "cohort_sizes": matrix.cohort_sizes,
+            "periods": list(range(matrix.periods)),
+            "active_users_matrix": matrix.active_users,
+            "retention_matrix": matrix.retention(),
+            "revenue_matrix": matrix.revenue,
+            "revenue_per_active_user_matrix": matrix.revenue_per_active_user(),
+            "freshness": {
+                "rolled_up_through": matrix.rolled_up_through,
+                "computed_at": matrix.computed_at
+            },
+            "timestamp": datetime.now()
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Cohort matrix error: {e}")
+
+@cohort_analysis_router.post("/api/analytics/cohort-analysis/rollups/refresh")
+async def refresh_cohort_rollups(request: Dict):
+    """Roll up login and payment events per day; 'since' forces a backfill from that date"""
+    try:
+        since = date.fromisoformat(request['since']) if request.get('since') else None
+        through = date.fromisoformat(request['through']) if request.get('through') else None
+        
+        result = await cohort_service.engine.refresh(through=through, since=since)
+        
+        return {
+            "status": "success",
+            "refresh": result,
+            "timestamp": datetime.now()
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Cohort rollup refresh error: {e}")
@@ -0,0 +1,328 @@
+"""
+Cohort Engine - Analytics & Insights Module
+Acquisition-period x activity-period retention and revenue matrices computed with MongoDB
+aggregation over real login and payment events, rolled up incrementally per day
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, date, time, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+
+from modules.index_registry import index_registry
+
+GRANULARITIES = ["weekly", "monthly", "quarterly"]
+STATE_ID = "cohort_rollups"
+
+declare_index = index_registry.module(__name__)
+# login_logs.login_time alone carries the retention TTL kept by modules/data_lifecycle.py
+declare_index("login_logs", [("login_time", 1), ("success", 1)])
+declare_index("payments", "payment_date")
+declare_index("users", "created_at")
+declare_index("cohort_rollups", [("granularity", 1), ("kind", 1)])
+declare_index("cohort_rollups", [("day", 1), ("computed_at", 1)])
+
+
+def period_key(granularity: str, day: date) -> str:
+    """Period label of ``day``; matches the keys produced by ``period_key_expression``"""
+    if granularity == "weekly":
+        iso_year, iso_week, _ = day.isocalendar()
+        return f"{iso_year}-W{iso_week:02d}"
+    if granularity == "monthly":
+        return f"{day.year}-{day.month:02d}"
+    if granularity == "quarterly":
+        return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+    raise ValueError(f"Unknown cohort granularity: {granularity}")
+
+
+def period_key_expression(granularity: str, date_expression: Any) -> Dict[str, Any]:
+    """Aggregation expression computing ``period_key`` server-side"""
+    if granularity == "weekly":
+        return {"$dateToString": {"format": "%G-W%V", "date": date_expression}}
+    if granularity == "monthly":
+        return {"$dateToString": {"format": "%Y-%m", "date": date_expression}}
+    if granularity == "quarterly":
+        return {"$concat": [
+            {"$dateToString": {"format": "%Y", "date": date_expression}},
+            "-Q",
+            {"$toString": {"$toInt": {"$ceil": {"$divide": [{"$month": date_expression}, 3]}}}}
+        ]}
+    raise ValueError(f"Unknown cohort granularity: {granularity}")
+
+
+def period_ordinal(granularity: str, key: str) -> int:
+    """Consecutive integer for a period key, so period offsets are plain differences"""
+    if granularity == "weekly":
+        year, week = key.split("-W")
+        return date.fromisocalendar(int(year), int(week), 1).toordinal() // 7
+    if granularity == "monthly":
+        year, month = key.split("-")
+        return int(year) * 12 + int(month) - 1
+    if granularity == "quarterly":
+        year, quarter = key.split("-Q")
+        return int(year) * 4 + int(quarter) - 1
+    raise ValueError(f"Unknown cohort granularity: {granularity}")
+
+
+@dataclass
+class CohortMatrix:
+    """Dense cohort x period-offset matrices read from the rollups"""
+    granularity: str
+    cohorts: List[str]
+    cohort_sizes: List[int]
+    active_users: List[List[int]]
+    revenue: List[List[float]]
+    rolled_up_through: Optional[str] = None
+    computed_at: Optional[datetime] = None
+    periods: int = field(init=False)
+
+    def __post_init__(self):
+        self.periods = max((len(row) for row in self.active_users), default=0)
+
+    def retention(self) -> List[List[float]]:
+        return [
+            [active / size if size else 0.0 for active in row]
+            for size, row in zip(self.cohort_sizes, self.active_users)
+        ]
+
+    def revenue_per_active_user(self) -> List[List[float]]:
+        return [
+            [revenue / active if active else 0.0 for revenue, active in zip(revenue_row, active_row)]
+            for revenue_row, active_row in zip(self.revenue, self.active_users)
+        ]
+
+
+class CohortEngine:
+    """Maintains ``cohort_rollups`` from ``login_logs`` and completed ``payments``.
+
+    A user is active in a period if they logged in or paid in it; revenue is
+    the completed payment amount. Each day is processed with aggregation
+    pipelines that touch only that day's events:
+
+    1. events are grouped per user (one ``$group`` over logins and payments,
+       joined with ``$unionWith``) and looked up in ``users`` for the
+       acquisition date;
+    2. the (user, activity period) memberships are ``$merge``d into
+       ``cohort_user_periods`` keeping the first day each was seen, which
+       makes distinct-user counts exact regardless of processing order;
+    3. per (granularity, cohort, activity period) cells with first-seen users
+       and revenue are ``$merge``d into ``cohort_rollups`` keyed by day.
+
+    Reprocessing a day replaces its rollup documents, so refreshes are
+    idempotent. Reading a matrix sums a few documents per cohort and day and
+    never scans users or events. Requires MongoDB 4.4+ (``$unionWith``).
+    """
+
+    def __init__(self, db, max_backfill_days: int = 730):
+        self.db = db
+        self.max_backfill_days = max_backfill_days
+
+    async def refresh_day(self, day: date) -> Dict[str, Any]:
+        """Recompute the rollup contribution of one calendar day (UTC)"""
+        day_label = day.isoformat()
+        computed_at = datetime.utcnow()
+        start = datetime.combine(day, time.min)
+        end = start + timedelta(days=1)
+
+        await self.db.login_logs.aggregate(
+            self._activity_stages(day, start, end) + self._membership_stages(day_label)
+        ).to_list(length=None)
+        await self.db.login_logs.aggregate(
+            self._activity_stages(day, start, end) + self._rollup_stages(day_label, computed_at)
+        ).to_list(length=None)
+
+        acquired = await self.db.users.count_documents({"created_at": {"$gte": start, "$lt": end}})
+        if acquired:
+            await self.db.cohort_rollups.bulk_write([
+                UpdateOne(
+                    {"_id": f"acquired|{granularity}|{period_key(granularity, day)}|{day_label}"},
+                    {"$set": {
+                        "kind": "acquired",
+                        "granularity": granularity,
+                        "cohort": period_key(granularity, day),
+                        "day": day_label,
+                        "acquired_users": acquired,
+                        "computed_at": computed_at
+                    }},
+                    upsert=True
+                )
+                for granularity in GRANULARITIES
+            ], ordered=False)
+
+        # Cells that had activity in an earlier run of this day but no longer do
+        await self.db.cohort_rollups.delete_many({"day": day_label, "computed_at": {"$lt": computed_at}})
+        return {"day": day_label, "acquired_users": acquired}
+
+    async def refresh(self, through: Optional[date] = None, since: Optional[date] = None) -> Dict[str, Any]:
+        """Roll up every day after the last completed one through ``through`` (default today).
+
+        Completed days are recorded in ``cohort_rollup_state``; today is
+        reprocessed on every run until it is over.
+        """
+        through = through or datetime.utcnow().date()
+        state = await self.db.cohort_rollup_state.find_one({"_id": STATE_ID}) or {}
+        if since is None:
+            if state.get("last_complete_day"):
+                since = date.fromisoformat(state["last_complete_day"]) + timedelta(days=1)
+            else:
+                since = await self._first_activity_day(through)
+        since = max(since, through - timedelta(days=self.max_backfill_days))
+
+        processed = 0
+        day = since
+        while day <= through:
+            await self.refresh_day(day)
+            processed += 1
+            day += timedelta(days=1)
+
+        last_complete = min(through, datetime.utcnow().date() - timedelta(days=1))
+        if last_complete.isoformat() > state.get("last_complete_day", ""):
+            await self.db.cohort_rollup_state.update_one(
+                {"_id": STATE_ID},
+                {"$set": {"last_complete_day": last_complete.isoformat(), "refreshed_at": datetime.utcnow()}},
+                upsert=True
+            )
+        else:
+            await self.db.cohort_rollup_state.update_one(
+                {"_id": STATE_ID}, {"$set": {"refreshed_at": datetime.utcnow()}}, upsert=True
+            )
+        return {"since": since.isoformat(), "through": through.isoformat(), "days_processed": processed}
+
+    async def matrix(self, granularity: str = "monthly", max_cohorts: Optional[int] = None, max_periods: Optional[int] = None) -> CohortMatrix:
+        """Acquisition cohort x period offset matrix, newest cohorts last"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown cohort granularity: {granularity}")
+        facets = await self.db.cohort_rollups.aggregate([
+            {"$match": {"granularity": granularity}},
+            {"$facet": {
+                "acquired": [
+                    {"$match": {"kind": "acquired"}},
+                    {"$group": {"_id": "$cohort", "users": {"$sum": "$acquired_users"}}}
+                ],
+                "activity": [
+                    {"$match": {"kind": "activity"}},
+                    {"$group": {
+                        "_id": {"cohort": "$cohort", "activity_period": "$activity_period"},
+                        "active_users": {"$sum": "$new_active_users"},
+                        "revenue": {"$sum": "$revenue"}
+                    }}
+                ],
+                "freshness": [{"$group": {"_id": None, "computed_at": {"$max": "$computed_at"}}}]
+            }}
+        ]).to_list(length=1)
+        facets = facets[0] if facets else {"acquired": [], "activity": [], "freshness": []}
+        state = await self.db.cohort_rollup_state.find_one({"_id": STATE_ID}) or {}
+
+        sizes = {row["_id"]: row["users"] for row in facets["acquired"]}
+        cells: Dict[Tuple[str, int], Tuple[int, float]] = {}
+        for row in facets["activity"]:
+            cohort = row["_id"]["cohort"]
+            offset = period_ordinal(granularity, row["_id"]["activity_period"]) - period_ordinal(granularity, cohort)
+            if offset < 0:
+                continue  # activity dated before the account was created
+            sizes.setdefault(cohort, 0)
+            cells[(cohort, offset)] = (row["active_users"], row["revenue"])
+
+        cohorts = sorted(sizes, key=lambda key: period_ordinal(granularity, key))
+        if max_cohorts:
+            cohorts = cohorts[-max_cohorts:]
+        latest = max((period_ordinal(granularity, cohort) for cohort in cohorts), default=0)
+        active_users, revenue = [], []
+        for cohort in cohorts:
+            # Offsets up to the newest period, so empty cells read as zero rather than missing
+            width = latest - period_ordinal(granularity, cohort) + 1
+            width = min(width, max_periods) if max_periods else width
+            active_users.append([cells.get((cohort, offset), (0, 0.0))[0] for offset in range(width)])
+            revenue.append([cells.get((cohort, offset), (0, 0.0))[1] for offset in range(width)])
+
+        return CohortMatrix(
+            granularity=granularity,
+            cohorts=cohorts,
+            cohort_sizes=[sizes[cohort] for cohort in cohorts],
+            active_users=active_users,
+            revenue=revenue,
+            rolled_up_through=state.get("last_complete_day"),
+            computed_at=facets["freshness"][0]["computed_at"] if facets["freshness"] else None
+        )
+
+    def _activity_stages(self, day: date, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """Active users of ``day`` with their revenue and cohort/activity period per granularity"""
+        return [
+            {"$match": {"login_time": {"$gte": start, "$lt": end}, "success": True}},
+            {"$project": {"_id": 0, "email": 1, "revenue": {"$literal": 0}}},
+            {"$unionWith": {"coll": "payments", "pipeline": [
+                {"$match": {"payment_date": {"$gte": start, "$lt": end}, "status": "completed"}},
+                # Payment amounts are stored in cents
+                {"$project": {"_id": 0, "email": "$user_email", "revenue": {"$divide": [{"$ifNull": ["$amount", 0]}, 100]}}}
+            ]}},
+            {"$group": {"_id": "$email", "revenue": {"$sum": "$revenue"}}},
+            {"$lookup": {"from": "users", "localField": "_id", "foreignField": "email", "as": "user"}},
+            {"$project": {"revenue": 1, "acquired_at": {"$arrayElemAt": ["$user.created_at", 0]}}},
+            {"$match": {"acquired_at": {"$type": "date"}}},
+            {"$project": {
+                "revenue": 1,
+                "periods": [
+                    {
+                        "granularity": granularity,
+                        "cohort": period_key_expression(granularity, "$acquired_at"),
+                        "activity_period": period_key(granularity, day)
+                    }
+                    for granularity in GRANULARITIES
+                ]
+            }},
+            {"$unwind": "$periods"},
+            {"$project": {
+                "revenue": 1,
+                "granularity": "$periods.granularity",
+                "cohort": "$periods.cohort",
+                "activity_period": "$periods.activity_period",
+                "membership_id": {"$concat": ["$periods.granularity", "|", "$periods.activity_period", "|", "$_id"]}
+            }}
+        ]
+
+    def _membership_stages(self, day_label: str) -> List[Dict[str, Any]]:
+        return [
+            {"$project": {
+                "_id": "$membership_id",
+                "granularity": 1,
+                "activity_period": 1,
+                "email": "$_id",
+                "first_seen_day": {"$literal": day_label}
+            }},
+            {"$merge": {"into": "cohort_user_periods", "on": "_id", "whenMatched": "keepExisting", "whenNotMatched": "insert"}}
+        ]
+
+    def _rollup_stages(self, day_label: str, computed_at: datetime) -> List[Dict[str, Any]]:
+        return [
+            {"$lookup": {"from": "cohort_user_periods", "localField": "membership_id", "foreignField": "_id", "as": "membership"}},
+            {"$group": {
+                "_id": {"granularity": "$granularity", "cohort": "$cohort", "activity_period": "$activity_period"},
+                "new_active_users": {"$sum": {"$cond": [
+                    {"$eq": [{"$arrayElemAt": ["$membership.first_seen_day", 0]}, day_label]}, 1, 0
+                ]}},
+                "active_user_days": {"$sum": 1},
+                "revenue": {"$sum": "$revenue"}
+            }},
+            {"$project": {
+                "_id": {"$concat": ["activity|", "$_id.granularity", "|", "$_id.cohort", "|", "$_id.activity_period", "|", day_label]},
+                "kind": "activity",
+                "granularity": "$_id.granularity",
+                "cohort": "$_id.cohort",
+                "activity_period": "$_id.activity_period",
+                "day": {"$literal": day_label},
+                "new_active_users": 1,
+                "active_user_days": 1,
+                "revenue": 1,
+                "computed_at": {"$literal": computed_at}
+            }},
+            {"$merge": {"into": "cohort_rollups", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ]
+
+    async def _first_activity_day(self, through: date) -> date:
+        first_user = await self.db.users.find_one(
+            {"created_at": {"$type": "date"}}, {"created_at": 1}, sort=[("created_at", ASCENDING)]
+        )
+        if not first_user:
+            return through
+        return first_user["created_at"].date()
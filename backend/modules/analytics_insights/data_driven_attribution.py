@@ -0,0 +1,316 @@
+"""
+Data-Driven Attribution - Analytics & Insights Module
+Learns channel credit from observed journeys: a first-order Markov chain with removal effects
+and a sampled Shapley-value mode, summarized chunk by chunk in a process pool
+"""
+
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, Iterable, AsyncIterable, Union
+import numpy as np
+
+from .attribution_engine import TouchpointFrame
+
+# 95% two-sided normal quantile used for the Shapley error bound
+CONFIDENCE_Z = 1.96
+
+
+def summarize_journey_chunk(channels: np.ndarray, lengths: np.ndarray, converted: np.ndarray, n_channels: int):
+    """Transition counts and channel-set conversions for one chunk of journeys.
+
+    ``channels`` holds channel codes of consecutive journeys, ``lengths`` the
+    touchpoints per journey. Module-level so it can run in a worker process.
+    """
+    start_state, conversion_state, null_state = n_channels, n_channels + 1, n_channels + 2
+    n_states = n_channels + 3
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    # Each journey contributes START -> c1 -> ... -> cn -> CONVERSION/NULL
+    from_states = np.insert(channels.astype(np.int64), starts, start_state)
+    to_states = np.insert(channels.astype(np.int64), ends, np.where(converted, conversion_state, null_state))
+    transitions = np.bincount(from_states * n_states + to_states, minlength=n_states * n_states).reshape(n_states, n_states)
+
+    # Channel set of every journey as a bitmask, aggregated into unique sets
+    masks = np.bitwise_or.reduceat(np.left_shift(np.int64(1), channels.astype(np.int64)), starts) if len(lengths) else np.zeros(0, np.int64)
+    unique_masks, inverse = np.unique(masks, return_inverse=True)
+    mask_journeys = np.bincount(inverse, minlength=len(unique_masks))
+    mask_conversions = np.bincount(inverse, weights=converted.astype(np.float64), minlength=len(unique_masks))
+    return transitions, unique_masks, mask_journeys, mask_conversions
+
+
+class JourneySummary:
+    """Everything the data-driven models need, independent of journey count"""
+
+    def __init__(self, channel_values: List[Any]):
+        self.channel_values = list(channel_values)
+        n_states = len(self.channel_values) + 3
+        self.transitions = np.zeros((n_states, n_states), dtype=np.int64)
+        self.mask_journeys: Dict[int, int] = {}
+        self.mask_conversions: Dict[int, float] = {}
+        self.journeys = 0
+        self.conversions = 0.0
+        self._removal_effects: Optional[Dict[Any, float]] = None
+
+    def add(self, transitions, unique_masks, mask_journeys, mask_conversions):
+        self.transitions += transitions
+        for mask, journeys, conversions in zip(unique_masks.tolist(), mask_journeys.tolist(), mask_conversions.tolist()):
+            self.mask_journeys[mask] = self.mask_journeys.get(mask, 0) + journeys
+            self.mask_conversions[mask] = self.mask_conversions.get(mask, 0.0) + conversions
+            self.journeys += journeys
+            self.conversions += conversions
+
+    @property
+    def n_channels(self) -> int:
+        return len(self.channel_values)
+
+    def transition_matrix(self) -> np.ndarray:
+        """Row-normalized transition probabilities (absorbing states have empty rows)"""
+        totals = self.transitions.sum(axis=1, keepdims=True)
+        matrix = np.zeros(self.transitions.shape, dtype=np.float64)
+        np.divide(self.transitions, totals, out=matrix, where=totals > 0)
+        return matrix
+
+    def conversion_probability(self, removed: Optional[int] = None) -> float:
+        """Probability of reaching CONVERSION from START, optionally with one channel removed.
+
+        Removing a channel sends every transition into it to NULL.
+        """
+        n = self.n_channels
+        matrix = self.transition_matrix()
+        transient = n + 1  # channels + START
+        q = matrix[:transient, :transient].copy()
+        r = matrix[:transient, n + 1].copy()
+        if removed is not None:
+            q[:, removed] = 0.0
+            r[removed] = 0.0
+        absorption = np.linalg.solve(np.eye(transient) - q, r)
+        return float(absorption[n])
+
+    def removal_effects(self) -> Dict[Any, float]:
+        """Relative drop in conversion probability when each channel is removed"""
+        if self._removal_effects is None:
+            base = self.conversion_probability()
+            self._removal_effects = {
+                channel: (1.0 - self.conversion_probability(code) / base) if base > 0 else 0.0
+                for code, channel in enumerate(self.channel_values)
+            }
+        return self._removal_effects
+
+    def markov_shares(self) -> Dict[Any, float]:
+        effects = self.removal_effects()
+        total = sum(effects.values())
+        return {channel: (effect / total if total > 0 else 0.0) for channel, effect in effects.items()}
+
+    def shapley(
+        self,
+        error_bound: float = 0.01,
+        max_permutations: int = 200000,
+        seed: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Sampled Shapley values over channel coalitions.
+
+        A coalition is worth the conversions of journeys whose channel set it
+        contains. Permutations are sampled in batches until the 95% confidence
+        half-width of every channel's value is within ``error_bound`` times
+        the total conversions, or ``max_permutations`` is reached.
+        """
+        n = self.n_channels
+        masks = np.array(list(self.mask_conversions), dtype=np.int64)
+        conversions = np.array(list(self.mask_conversions.values()), dtype=np.float64)
+        total = float(conversions.sum())
+        if n == 0 or total == 0:
+            return {"values": {}, "shares": {}, "std_errors": {}, "permutations": 0, "converged": True, "error_bound": error_bound}
+
+        rng = np.random.default_rng(seed)
+        # Keep the coalition/mask comparison matrix around 4M cells per batch
+        batch = max(16, min(4096, 4_000_000 // max(1, n * len(masks))))
+        sums = np.zeros(n)
+        squares = np.zeros(n)
+        sampled = 0
+        tolerance = error_bound * total
+        converged = False
+
+        def coalition_value(coalitions: np.ndarray) -> np.ndarray:
+            covered = (masks[None, :] & ~coalitions[:, None]) == 0
+            return covered @ conversions
+
+        while sampled < max_permutations:
+            size = min(batch, max_permutations - sampled)
+            permutations = rng.permuted(np.tile(np.arange(n), (size, 1)), axis=1)
+            bits = np.left_shift(np.int64(1), permutations)
+            with_channel = np.bitwise_or.accumulate(bits, axis=1)
+            without_channel = with_channel ^ bits
+            marginal = (coalition_value(with_channel.ravel()) - coalition_value(without_channel.ravel())).reshape(size, n)
+
+            # Scatter each permutation's marginals back to channel order
+            by_channel = np.empty_like(marginal)
+            np.put_along_axis(by_channel, permutations, marginal, axis=1)
+            sums += by_channel.sum(axis=0)
+            squares += (by_channel ** 2).sum(axis=0)
+            sampled += size
+
+            if sampled >= 2:
+                variance = np.maximum(squares / sampled - (sums / sampled) ** 2, 0.0) * sampled / (sampled - 1)
+                half_width = CONFIDENCE_Z * np.sqrt(variance / sampled)
+                if half_width.max() <= tolerance:
+                    converged = True
+                    break
+
+        values = sums / sampled
+        variance = np.maximum(squares / sampled - values ** 2, 0.0) * sampled / max(1, sampled - 1)
+        std_errors = np.sqrt(variance / sampled)
+        return {
+            "values": {channel: float(values[code]) for code, channel in enumerate(self.channel_values)},
+            "shares": {channel: float(values[code] / total) for code, channel in enumerate(self.channel_values)},
+            "std_errors": {channel: float(std_errors[code]) for code, channel in enumerate(self.channel_values)},
+            "permutations": sampled,
+            "converged": converged,
+            "error_bound": error_bound
+        }
+
+
+class DataDrivenAttributionEngine:
+    """Builds cached ``JourneySummary`` objects from frames or streamed journey chunks.
+
+    Frames are split into chunks of ``chunk_journeys`` journeys and each
+    chunk is summarized in a worker process; at most ``2 * max_workers``
+    chunks are in flight, so memory stays bounded regardless of how many
+    journeys are attributed. Summaries are cached per date range and data
+    fingerprint.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, chunk_journeys: int = 100000, cache_size: int = 32):
+        self.max_workers = max_workers or int(os.getenv("ATTRIBUTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.chunk_journeys = chunk_journeys
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple, JourneySummary]" = OrderedDict()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    async def summarize(
+        self,
+        frame: TouchpointFrame,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        use_cache: bool = True
+    ) -> JourneySummary:
+        """Summarize journeys whose final touchpoint falls in ``[start_date, end_date)``.
+
+        Pass ``use_cache=False`` for one-off frames that will never be summarized again.
+        """
+        journeys = self._journeys_in_range(frame, start_date, end_date)
+        key = (self._fingerprint(frame, journeys), start_date, end_date) if use_cache else None
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return self._cache[key]
+
+        if key is not None:
+            self.cache_misses += 1
+        converted = (frame.journey_revenue != 0)[journeys]
+        lengths = frame.lengths[journeys]
+        if len(journeys) == frame.journey_count:
+            channels = frame.channels
+        else:
+            selected = np.zeros(frame.journey_count, dtype=bool)
+            selected[journeys] = True
+            channels = frame.channels[selected[frame.journey_index]]
+        bounds = np.zeros(len(journeys) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=bounds[1:])
+
+        def chunks():
+            for first in range(0, len(journeys), self.chunk_journeys):
+                last = min(first + self.chunk_journeys, len(journeys))
+                yield channels[bounds[first]:bounds[last]], lengths[first:last], converted[first:last]
+
+        # Small frames are cheaper to summarize inline than to ship to a worker
+        use_pool = len(journeys) > self.chunk_journeys
+        summary = await self.summarize_chunks(chunks(), frame.channel_values, use_pool=use_pool)
+        if key is None:
+            return summary
+        self._cache[key] = summary
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return summary
+
+    async def summarize_chunks(
+        self,
+        chunks: Union[Iterable, AsyncIterable],
+        channel_values: List[Any],
+        use_pool: bool = True
+    ) -> JourneySummary:
+        """Summarize ``(channel_codes, lengths, converted)`` chunks, e.g. streamed from a cursor"""
+        summary = JourneySummary(channel_values)
+        n_channels = len(channel_values)
+        loop = asyncio.get_running_loop()
+        pending = set()
+
+        async def drain(limit: int):
+            nonlocal pending
+            while len(pending) > limit:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    summary.add(*task.result())
+
+        async for channels, lengths, converted in self._iterate(chunks):
+            if not use_pool or self.max_workers <= 1:
+                summary.add(*summarize_journey_chunk(channels, lengths, converted, n_channels))
+                continue
+            pending.add(loop.run_in_executor(self._get_executor(), summarize_journey_chunk, channels, lengths, converted, n_channels))
+            await drain(2 * self.max_workers - 1)
+        await drain(0)
+        return summary
+
+    def cache_stats(self) -> Dict[str, Any]:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "entries": len(self._cache),
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": self.cache_hits / lookups if lookups else 0.0
+        }
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def _iterate(self, chunks):
+        if hasattr(chunks, "__aiter__"):
+            async for chunk in chunks:
+                yield chunk
+        else:
+            for chunk in chunks:
+                yield chunk
+
+    def _journeys_in_range(self, frame: TouchpointFrame, start_date: Optional[datetime], end_date: Optional[datetime]) -> np.ndarray:
+        if frame.journey_count == 0:
+            return np.zeros(0, dtype=np.int64)
+        last_timestamps = frame.timestamps_us[frame.offsets[1:] - 1]
+        selected = np.ones(frame.journey_count, dtype=bool)
+        if start_date is not None:
+            selected &= last_timestamps >= np.datetime64(start_date, "us").astype(np.int64)
+        if end_date is not None:
+            selected &= last_timestamps < np.datetime64(end_date, "us").astype(np.int64)
+        return np.flatnonzero(selected)
+
+    def _fingerprint(self, frame: TouchpointFrame, journeys: np.ndarray) -> str:
+        """Cheap content hash so regenerated data never reuses a stale summary"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(np.asarray(journeys, dtype=np.int64).tobytes())
+        digest.update(frame.lengths.tobytes())
+        digest.update(frame.channels.tobytes())
+        digest.update((frame.journey_revenue != 0).tobytes())
+        digest.update(repr(frame.channel_values).encode())
+        return digest.hexdigest()
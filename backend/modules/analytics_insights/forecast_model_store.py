@@ -0,0 +1,402 @@
+"""
+Forecast Model Store - Analytics & Insights Module
+Persisted fitted parameters for the ROI forecasting models: fits are kept per campaign series,
+refit incrementally as new campaigns arrive, and served from cache on repeated requests
+"""
+
+import asyncio
+import os
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, Hashable
+import numpy as np
+
+# Models with fitted parameters, by ForecastModel value; the ensemble only combines them
+FITTED_MODELS = ["linear_regression", "arima", "prophet", "monte_carlo"]
+ARIMA_WINDOW = 6
+PROPHET_WINDOW = 5
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def series_columns(campaigns: List[Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(start dates, budgets, ROI) columns of historical campaigns, ROI as the forecasts define it"""
+    dates = np.array([c.start_date for c in campaigns], dtype="datetime64[us]")
+    budgets = np.array([c.budget for c in campaigns], dtype=np.float64)
+    rois = np.array([(c.revenue - c.actual_spend) / c.actual_spend if c.actual_spend > 0 else 0 for c in campaigns], dtype=np.float64)
+    return dates, budgets, rois
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer over uint64 arrays"""
+    z = values + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def extend_digest(digest: int, offset: int, dates: np.ndarray, budgets: np.ndarray, rois: np.ndarray) -> int:
+    """Order-sensitive series digest that can be extended batch by batch.
+
+    Rows are hashed independently and summed with their position as weight,
+    so extending by ``[a, b]`` then ``[c]`` gives the same digest as hashing
+    ``[a, b, c]`` at once.
+    """
+    if not len(dates):
+        return digest
+    with np.errstate(over="ignore"):
+        rows = _mix(dates.astype(np.int64).view(np.uint64))
+        rows = _mix(rows ^ budgets.view(np.uint64))
+        rows = _mix(rows ^ rois.view(np.uint64))
+        positions = np.arange(offset + 1, offset + len(rows) + 1, dtype=np.uint64)
+        total = np.sum(rows * _mix(positions), dtype=np.uint64)
+    return (digest + int(total)) & _MASK64
+
+
+def _moments(budgets: np.ndarray, rois: np.ndarray) -> Dict[str, float]:
+    mean_budget = float(np.mean(budgets))
+    mean_roi = float(np.mean(rois))
+    budget_deviation = budgets - mean_budget
+    roi_deviation = rois - mean_roi
+    return {
+        "n": len(rois),
+        "mean_budget": mean_budget,
+        "mean_roi": mean_roi,
+        "m2_budget": float(np.sum(budget_deviation * budget_deviation)),
+        "m2_roi": float(np.sum(roi_deviation * roi_deviation)),
+        "co_moment": float(np.sum(budget_deviation * roi_deviation))
+    }
+
+
+def _merge_moments(state: Dict[str, Any], budgets: np.ndarray, rois: np.ndarray) -> Dict[str, Any]:
+    """Chan et al. pairwise update of means, second moments and co-moment"""
+    batch = _moments(budgets, rois)
+    n_a, n_b = state["n"], batch["n"]
+    n = n_a + n_b
+    delta_budget = batch["mean_budget"] - state["mean_budget"]
+    delta_roi = batch["mean_roi"] - state["mean_roi"]
+    weight = n_a * n_b / n
+    return {
+        **state,
+        "n": n,
+        "mean_budget": state["mean_budget"] + delta_budget * n_b / n,
+        "mean_roi": state["mean_roi"] + delta_roi * n_b / n,
+        "m2_budget": state["m2_budget"] + batch["m2_budget"] + delta_budget * delta_budget * weight,
+        "m2_roi": state["m2_roi"] + batch["m2_roi"] + delta_roi * delta_roi * weight,
+        "co_moment": state["co_moment"] + batch["co_moment"] + delta_budget * delta_roi * weight
+    }
+
+
+def _merge_roi_moments(state: Dict[str, Any], rois: np.ndarray) -> Dict[str, Any]:
+    n_a, n_b = state["n"], len(rois)
+    n = n_a + n_b
+    mean_b = float(np.mean(rois))
+    deviation = rois - mean_b
+    delta = mean_b - state["mean_roi"]
+    return {
+        "n": n,
+        "mean_roi": state["mean_roi"] + delta * n_b / n,
+        "m2_roi": state["m2_roi"] + float(np.sum(deviation * deviation)) + delta * delta * n_a * n_b / n
+    }
+
+
+def _tail(dates: np.ndarray, rois: np.ndarray, window: int) -> Dict[str, list]:
+    """Last ``window`` ROIs in start-date order; ties keep arrival order like ``sorted``"""
+    order = np.argsort(dates, kind="stable")[-window:]
+    return {"tail_dates": dates[order].astype(datetime).tolist(), "tail_rois": rois[order].tolist()}
+
+
+def _extend_tail(state: Dict[str, Any], dates: np.ndarray, rois: np.ndarray, window: int) -> Dict[str, list]:
+    tail_dates, tail_rois = list(state["tail_dates"]), list(state["tail_rois"])
+    for date, roi in zip(dates.astype(datetime).tolist(), rois.tolist()):
+        # Later arrivals sort after equal dates; anything before the tail cannot enter it
+        position = bisect_right(tail_dates, date)
+        if position == 0 and len(tail_dates) >= window:
+            continue
+        tail_dates.insert(position, date)
+        tail_rois.insert(position, roi)
+        del tail_dates[:-window], tail_rois[:-window]
+    return {"tail_dates": tail_dates, "tail_rois": tail_rois}
+
+
+def fit_model(model: str, dates: np.ndarray, budgets: np.ndarray, rois: np.ndarray) -> Dict[str, Any]:
+    """Fit one model from scratch. Module-level so it can run in a worker process."""
+    if model == "linear_regression":
+        return {**_moments(budgets, rois), "first_roi": float(rois[0])}
+    if model == "arima":
+        return {"n": len(rois), **_tail(dates, rois, ARIMA_WINDOW)}
+    if model == "prophet":
+        return {"n": len(rois), "mean_roi": float(np.mean(rois)), **_tail(dates, rois, PROPHET_WINDOW)}
+    if model == "monte_carlo":
+        mean_roi = float(np.mean(rois))
+        deviation = rois - mean_roi
+        return {"n": len(rois), "mean_roi": mean_roi, "m2_roi": float(np.sum(deviation * deviation))}
+    raise ValueError(f"Unknown forecast model: {model}")
+
+
+def update_model(model: str, state: Dict[str, Any], dates: np.ndarray, budgets: np.ndarray, rois: np.ndarray) -> Dict[str, Any]:
+    """Fold newly arrived points into a fitted state without revisiting the history"""
+    if not len(rois):
+        return state
+    if model == "linear_regression":
+        return _merge_moments(state, budgets, rois)
+    if model == "monte_carlo":
+        return _merge_roi_moments(state, rois)
+    if model == "arima":
+        return {"n": state["n"] + len(rois), **_extend_tail(state, dates, rois, ARIMA_WINDOW)}
+    if model == "prophet":
+        n = state["n"] + len(rois)
+        mean_roi = state["mean_roi"] + (float(np.mean(rois)) - state["mean_roi"]) * len(rois) / n
+        return {"n": n, "mean_roi": mean_roi, **_extend_tail(state, dates, rois, PROPHET_WINDOW)}
+    raise ValueError(f"Unknown forecast model: {model}")
+
+
+class ModelCacheStats:
+    """Per model type fit and prediction cache counters"""
+
+    def __init__(self):
+        self.fit_hits = 0
+        self.incremental_refits = 0
+        self.full_fits = 0
+        self.fit_seconds = 0.0
+        self.last_fit_seconds = 0.0
+        self.prediction_hits = 0
+        self.prediction_misses = 0
+
+    def record_fit(self, seconds: float, incremental: bool):
+        self.fit_seconds += seconds
+        self.last_fit_seconds = seconds
+        if incremental:
+            self.incremental_refits += 1
+        else:
+            self.full_fits += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        fit_lookups = self.fit_hits + self.incremental_refits + self.full_fits
+        fits = self.incremental_refits + self.full_fits
+        predictions = self.prediction_hits + self.prediction_misses
+        return {
+            "fit_cache_hits": self.fit_hits,
+            "incremental_refits": self.incremental_refits,
+            "full_fits": self.full_fits,
+            "fit_cache_hit_rate": self.fit_hits / fit_lookups if fit_lookups else 0.0,
+            "total_fit_seconds": self.fit_seconds,
+            "mean_fit_seconds": self.fit_seconds / fits if fits else 0.0,
+            "last_fit_seconds": self.last_fit_seconds,
+            "prediction_cache_hits": self.prediction_hits,
+            "prediction_cache_misses": self.prediction_misses,
+            "prediction_cache_hit_rate": self.prediction_hits / predictions if predictions else 0.0
+        }
+
+
+class SeriesFit:
+    """Fitted states of one campaign series, all at the same number of points"""
+
+    def __init__(self, series: str, points: int = 0, digest: int = 0, fits: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.series = series
+        self.points = points
+        self.digest = digest
+        self.fits = fits or {}
+        self.lock = asyncio.Lock()
+
+    @property
+    def version(self) -> Tuple[int, int]:
+        return self.points, self.digest
+
+    def to_document(self) -> Dict[str, Any]:
+        return {
+            "_id": self.series,
+            "series": self.series,
+            "points": self.points,
+            "digest": format(self.digest, "016x"),
+            "fits": self.fits,
+            "updated_at": datetime.utcnow()
+        }
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "SeriesFit":
+        return cls(document["series"], document["points"], int(document["digest"], 16), document.get("fits", {}))
+
+
+class ForecastModelStore:
+    """Fitted forecast parameters per campaign series, persisted to ``forecast_models``.
+
+    A series is append-only: when it has grown since the last fit, only the
+    new points are folded into each fitted state; a shrunk or rewritten
+    series (detected through its digest) is refit from scratch. Full fits of
+    series with at least ``pool_min_points`` points run in a process pool.
+    Predictions are cached per series version, model and forecast parameters.
+    Persistence is best effort: without a reachable database the store keeps
+    working in memory and retries after ``retry_seconds``.
+    """
+
+    def __init__(
+        self,
+        db=None,
+        max_workers: Optional[int] = None,
+        pool_min_points: int = 50000,
+        prediction_cache_size: int = 4096,
+        persistence_timeout: float = 0.5,
+        retry_seconds: float = 60.0
+    ):
+        self.collection = db.forecast_models if db is not None else None
+        self.max_workers = max_workers or int(os.getenv("FORECAST_FIT_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.pool_min_points = pool_min_points
+        self.prediction_cache_size = prediction_cache_size
+        self.persistence_timeout = persistence_timeout
+        self.retry_seconds = retry_seconds
+        self.stats = {model: ModelCacheStats() for model in FITTED_MODELS + ["ensemble"]}
+        self._series: Dict[str, SeriesFit] = {}
+        self._predictions: "OrderedDict[Tuple, float]" = OrderedDict()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending_saves = set()
+        self._persistence_down_until = 0.0
+
+    async def fitted(self, series: str, model: str, campaigns: List[Any]) -> Tuple[Dict[str, Any], Tuple[int, int]]:
+        """Fitted state of ``model`` for ``campaigns`` (the full series) and the series version"""
+        entry = self._series.get(series)
+        if entry is None:
+            entry = self._series.setdefault(series, SeriesFit(series))
+        stats = self.stats[model]
+        if entry.points == len(campaigns) and model in entry.fits:
+            stats.fit_hits += 1
+            return entry.fits[model], entry.version
+
+        async with entry.lock:
+            if entry.points == 0 and not entry.fits:
+                await self._restore(entry, campaigns)
+            if entry.points == len(campaigns) and model in entry.fits:
+                stats.fit_hits += 1
+            elif 0 < entry.points < len(campaigns) and entry.fits:
+                await self._extend(entry, campaigns[entry.points:])
+            if entry.points != len(campaigns) or model not in entry.fits:
+                await self._refit(entry, model, campaigns)
+            return entry.fits[model], entry.version
+
+    async def observe(self, series: str, campaigns: List[Any]):
+        """Fold the points appended to ``campaigns`` since the last fit into every fitted model"""
+        entry = self._series.get(series)
+        if entry is None or not entry.fits:
+            return
+        async with entry.lock:
+            if entry.points < len(campaigns):
+                await self._extend(entry, campaigns[entry.points:])
+            elif entry.points > len(campaigns):
+                self._series[series] = SeriesFit(series)
+
+    def version(self, series: str, campaigns: List[Any]) -> Optional[Tuple[int, int]]:
+        """Version of the current fits of ``series``, or None if they are missing or stale"""
+        entry = self._series.get(series)
+        if entry is None or not entry.fits or entry.points != len(campaigns):
+            return None
+        return entry.version
+
+    def cached_prediction(self, model: str, key: Optional[Hashable], record: bool = True) -> Optional[float]:
+        """Cached prediction for ``key``; a None key (no current fit) always misses"""
+        prediction = self._predictions.get((model, key)) if key is not None else None
+        if prediction is not None:
+            self._predictions.move_to_end((model, key))
+        if record:
+            stats = self.stats[model]
+            if prediction is None:
+                stats.prediction_misses += 1
+            else:
+                stats.prediction_hits += 1
+        return prediction
+
+    def store_prediction(self, model: str, key: Hashable, prediction: float):
+        self._predictions[(model, key)] = prediction
+        if len(self._predictions) > self.prediction_cache_size:
+            self._predictions.popitem(last=False)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "series": {series: entry.points for series, entry in self._series.items() if entry.fits},
+            "cached_predictions": len(self._predictions),
+            "persistence": "memory" if self.collection is None else ("unavailable" if time.monotonic() < self._persistence_down_until else "mongodb"),
+            "models": {model: stats.snapshot() for model, stats in self.stats.items()}
+        }
+
+    async def flush(self):
+        """Wait for in-flight persistence writes"""
+        if self._pending_saves:
+            await asyncio.gather(*self._pending_saves, return_exceptions=True)
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _refit(self, entry: SeriesFit, model: str, campaigns: List[Any]):
+        dates, budgets, rois = series_columns(campaigns)
+        if entry.points != len(campaigns):
+            # History was rewritten; every other fitted state is stale as well
+            entry.fits = {}
+            entry.points, entry.digest = len(campaigns), extend_digest(0, 0, dates, budgets, rois)
+        started = time.perf_counter()
+        if len(campaigns) >= self.pool_min_points and self.max_workers > 1:
+            loop = asyncio.get_running_loop()
+            entry.fits[model] = await loop.run_in_executor(self._get_executor(), fit_model, model, dates, budgets, rois)
+        else:
+            entry.fits[model] = fit_model(model, dates, budgets, rois)
+        self.stats[model].record_fit(time.perf_counter() - started, incremental=False)
+        self._save(entry)
+
+    async def _extend(self, entry: SeriesFit, new_campaigns: List[Any]):
+        dates, budgets, rois = series_columns(new_campaigns)
+        for model, state in entry.fits.items():
+            started = time.perf_counter()
+            entry.fits[model] = update_model(model, state, dates, budgets, rois)
+            self.stats[model].record_fit(time.perf_counter() - started, incremental=True)
+        entry.digest = extend_digest(entry.digest, entry.points, dates, budgets, rois)
+        entry.points += len(new_campaigns)
+        self._save(entry)
+
+    async def _restore(self, entry: SeriesFit, campaigns: List[Any]):
+        """Adopt persisted fits if they were fitted on a prefix of ``campaigns``"""
+        if not self._persistence_available():
+            return
+        try:
+            document = await asyncio.wait_for(self.collection.find_one({"_id": entry.series}), self.persistence_timeout)
+        except Exception as e:
+            self._persistence_failed("load", e)
+            return
+        if not document or document["points"] > len(campaigns):
+            return
+        stored = SeriesFit.from_document(document)
+        dates, budgets, rois = series_columns(campaigns[:stored.points])
+        if extend_digest(0, 0, dates, budgets, rois) == stored.digest:
+            entry.points, entry.digest, entry.fits = stored.points, stored.digest, stored.fits
+
+    def _save(self, entry: SeriesFit):
+        if not self._persistence_available():
+            return
+        document = entry.to_document()
+
+        async def save():
+            try:
+                await asyncio.wait_for(
+                    self.collection.replace_one({"_id": entry.series}, document, upsert=True),
+                    self.persistence_timeout
+                )
+            except Exception as e:
+                self._persistence_failed("save", e)
+
+        task = asyncio.create_task(save())
+        self._pending_saves.add(task)
+        task.add_done_callback(self._pending_saves.discard)
+
+    def _persistence_available(self) -> bool:
+        return self.collection is not None and time.monotonic() >= self._persistence_down_until
+
+    def _persistence_failed(self, action: str, error: Exception):
+        self._persistence_down_until = time.monotonic() + self.retry_seconds
+        print(f"Forecast model store {action} failed, using in-memory fits for {self.retry_seconds:.0f}s: {error!r}")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
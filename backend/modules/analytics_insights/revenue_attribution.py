@@ -12,6 +12,9 @@ import uuid
 import numpy as np
 from enum import Enum
 
+from .attribution_engine import AttributionEngine, AttributionArrays, TouchpointFrame
+from .data_driven_attribution import DataDrivenAttributionEngine
+
 # Initialize router
 revenue_attribution_router = APIRouter()
 
@@ -74,6 +77,9 @@ class RevenueAttributionService:
             'middle': 0.20,
             'last': 0.40
         }
+        self.engine = AttributionEngine(decay_rate=self.decay_rate, position_weights=self.position_weights)
+        # Learns channel credit (Markov removal effects / Shapley values) from the journeys themselves
+        self.data_driven = DataDrivenAttributionEngine()
     
     async def generate_attribution_data(self, num_customers: int = 100) -> List[AttributionTouchpoint]:
         """Generate realistic attribution touchpoint data"""
@@ -129,106 +135,58 @@ class RevenueAttributionService:
     
     async def calculate_attribution(self, touchpoints: List[AttributionTouchpoint], model: AttributionModel) -> List[AttributionResult]:
         """Calculate attribution using specified model"""
-        # Group touchpoints by customer
-        customer_journeys = {}
-        for tp in touchpoints:
-            if tp.customer_id not in customer_journeys:
-                customer_journeys[tp.customer_id] = []
-            customer_journeys[tp.customer_id].append(tp)
-        
-        # Sort touchpoints by timestamp for each customer
-        for customer_id in customer_journeys:
-            customer_journeys[customer_id].sort(key=lambda x: x.timestamp)
-        
-        attribution_results = []
-        
-        for customer_id, journey in customer_journeys.items():
-            # Get total revenue for this customer
-            total_revenue = sum(tp.revenue for tp in journey)
-            if total_revenue == 0:
-                continue
-            
-            # Calculate attribution weights based on model
-            weights = self._calculate_attribution_weights(journey, model)
-            
-            # Create attribution results
-            for i, touchpoint in enumerate(journey):
-                attributed_revenue = total_revenue * weights[i]
-                roi = (attributed_revenue - touchpoint.cost) / touchpoint.cost if touchpoint.cost > 0 else 0
-                
-                result = AttributionResult(
-                    model_name=model,
-                    touchpoint_id=touchpoint.touchpoint_id,
-                    channel=touchpoint.channel,
-                    campaign_name=touchpoint.campaign_name,
-                    attributed_revenue=attributed_revenue,
-                    attribution_weight=weights[i],
-                    cost=touchpoint.cost,
-                    roi=roi
-                )
-                attribution_results.append(result)
-        
-        return attribution_results
+        results = await self.calculate_attribution_models(touchpoints, [model])
+        return results[model]
     
-    def _calculate_attribution_weights(self, journey: List[AttributionTouchpoint], model: AttributionModel) -> List[float]:
-        """Calculate attribution weights for a customer journey"""
-        n = len(journey)
-        weights = [0.0] * n
-        
-        if model == AttributionModel.FIRST_TOUCH:
-            weights[0] = 1.0
-            
-        elif model == AttributionModel.LAST_TOUCH:
-            weights[-1] = 1.0
-            
-        elif model == AttributionModel.LINEAR:
-            weight = 1.0 / n
-            weights = [weight] * n
-            
-        elif model == AttributionModel.TIME_DECAY:
-            # More recent touchpoints get higher weight
-            for i in range(n):
-                days_before_conversion = (journey[-1].timestamp - journey[i].timestamp).days
-                weights[i] = self.decay_rate ** days_before_conversion
-            
-            # Normalize weights to sum to 1
-            total_weight = sum(weights)
-            weights = [w / total_weight for w in weights]
-            
-        elif model == AttributionModel.POSITION_BASED:
-            if n == 1:
-                weights[0] = 1.0
-            elif n == 2:
-                weights[0] = self.position_weights['first']
-                weights[1] = self.position_weights['last']
-            else:
-                weights[0] = self.position_weights['first']
-                weights[-1] = self.position_weights['last']
-                middle_weight = self.position_weights['middle'] / (n - 2)
-                for i in range(1, n - 1):
-                    weights[i] = middle_weight
-                    
-        elif model == AttributionModel.DATA_DRIVEN:
-            # Simplified data-driven model using conversion rates
-            for i, touchpoint in enumerate(journey):
-                # Mock conversion probability based on channel
-                channel_conversion_rates = {
-                    TouchpointChannel.PAID_SEARCH: 0.15,
-                    TouchpointChannel.EMAIL: 0.25,
-                    TouchpointChannel.ORGANIC_SEARCH: 0.12,
-                    TouchpointChannel.SOCIAL_MEDIA: 0.08,
-                    TouchpointChannel.DIRECT: 0.30,
-                    TouchpointChannel.REFERRAL: 0.35,
-                    TouchpointChannel.DISPLAY: 0.05,
-                    TouchpointChannel.VIDEO: 0.10
-                }
-                weights[i] = channel_conversion_rates.get(touchpoint.channel, 0.10)
-            
-            # Normalize weights
-            total_weight = sum(weights)
-            weights = [w / total_weight for w in weights]
-        
-        return weights
+    async def calculate_attribution_models(
+        self,
+        touchpoints: List[AttributionTouchpoint],
+        models: List[AttributionModel]
+    ) -> Dict[AttributionModel, List[AttributionResult]]:
+        """Calculate several attribution models over one columnar load of the touchpoints"""
+        frame = TouchpointFrame.from_touchpoints(touchpoints)
+        model_arrays = await self.attribute_frame(frame, models)
+        return {model: self._to_results(frame, arrays) for model, arrays in model_arrays.items()}
+    
+    async def attribute_frame(
+        self,
+        frame: TouchpointFrame,
+        models: List[AttributionModel],
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Dict[AttributionModel, AttributionArrays]:
+        """Run attribution models over a loaded frame, learning data-driven credit when requested"""
+        channel_weights = None
+        if AttributionModel.DATA_DRIVEN in models:
+            summary = await self.data_driven.summarize(frame, start_date, end_date)
+            channel_weights = summary.removal_effects()
+        return self.engine.attribute(frame, models, channel_weights)
+    
+    def _to_results(self, frame: TouchpointFrame, arrays) -> List[AttributionResult]:
+        """Materialize attribution rows for journeys that produced revenue"""
+        rows = arrays.rows()
+        channel_values = frame.channel_values
+        return [
+            AttributionResult(
+                model_name=arrays.model,
+                touchpoint_id=touchpoint_id,
+                channel=channel_values[channel_code],
+                campaign_name=campaign_name,
+                attributed_revenue=attributed_revenue,
+                attribution_weight=weight,
+                cost=cost,
+                roi=roi
+            )
+            for touchpoint_id, channel_code, campaign_name, attributed_revenue, weight, cost, roi in zip(
+                frame.touchpoint_ids[rows].tolist(),
+                frame.channels[rows].tolist(),
+                frame.campaign_names[rows].tolist(),
+                arrays.attributed_revenue[rows].tolist(),
+                arrays.weights[rows].tolist(),
+                frame.costs[rows].tolist(),
+                arrays.roi[rows].tolist()
+            )
+        ]
     
     async def calculate_customer_ltv(self, touchpoints: List[AttributionTouchpoint]) -> List[CustomerLtvData]:
         """Calculate customer lifetime value with attribution context"""
@@ -327,10 +285,10 @@ async def get_attribution_dashboard():
             AttributionModel.DATA_DRIVEN
         ]
         
-        model_results = {}
-        for model in models_to_compare:
-            results = await attribution_service.calculate_attribution(touchpoints, model)
-            model_results[model.value] = results
+        model_results = {
+            model.value: results
+            for model, results in (await attribution_service.calculate_attribution_models(touchpoints, models_to_compare)).items()
+        }
         
         # Calculate LTV data
         ltv_data = await attribution_service.calculate_customer_ltv(touchpoints)
@@ -414,35 +372,34 @@ async def compare_attribution_models(request: Dict):
         # Generate touchpoint data
         touchpoints = await attribution_service.generate_attribution_data(100)
         
-        comparison_results = {}
-        
+        models = []
         for model_name in models_to_compare:
             try:
-                model = AttributionModel(model_name)
-                results = await attribution_service.calculate_attribution(touchpoints, model)
-                
-                # Aggregate metrics for this model
-                total_attributed = sum(r.attributed_revenue for r in results)
-                avg_roi = np.mean([r.roi for r in results])
-                
-                # Channel breakdown
-                channel_breakdown = {}
-                for result in results:
-                    channel = result.channel.value
-                    if channel not in channel_breakdown:
-                        channel_breakdown[channel] = 0
-                    channel_breakdown[channel] += result.attributed_revenue
-                
-                comparison_results[model_name] = {
-                    "total_attributed_revenue": total_attributed,
-                    "average_roi": avg_roi,
-                    "channel_breakdown": channel_breakdown,
-                    "top_performing_channel": max(channel_breakdown.items(), key=lambda x: x[1])[0] if channel_breakdown else "email"
-                }
-                
+                models.append(AttributionModel(model_name))
             except ValueError:
                 continue  # Skip invalid model names
         
+        # Load the touchpoints once and run every requested model over the same arrays
+        frame = TouchpointFrame.from_touchpoints(touchpoints)
+        comparison_results = {}
+        
+        for model, arrays in (await attribution_service.attribute_frame(frame, models)).items():
+            rows = arrays.rows()
+            
+            # Aggregate metrics for this model
+            total_attributed = float(arrays.attributed_revenue[rows].sum())
+            avg_roi = np.mean(arrays.roi[rows])
+            
+            # Channel breakdown
+            channel_breakdown = {channel.value: revenue for channel, revenue in arrays.channel_totals(frame).items()}
+            
+            comparison_results[model.value] = {
+                "total_attributed_revenue": total_attributed,
+                "average_roi": avg_roi,
+                "channel_breakdown": channel_breakdown,
+                "top_performing_channel": max(channel_breakdown.items(), key=lambda x: x[1])[0] if channel_breakdown else "email"
+            }
+        
         # Calculate differences between models
         model_differences = {}
         if len(comparison_results) >= 2:
@@ -486,6 +443,62 @@ async def compare_attribution_models(request: Dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Model comparison error: {e}")
 
+@revenue_attribution_router.post("/api/analytics/revenue-attribution/data-driven")
+async def get_data_driven_attribution(request: Dict):
+    """Learn channel credit from journeys with Markov removal effects and sampled Shapley values"""
+    try:
+        method = request.get('method', 'both')
+        if method not in ('markov', 'shapley', 'both'):
+            raise HTTPException(status_code=400, detail="method must be one of: markov, shapley, both")
+        start_date = datetime.fromisoformat(request['start_date']) if request.get('start_date') else None
+        end_date = datetime.fromisoformat(request['end_date']) if request.get('end_date') else None
+        
+        # Touchpoints are not persisted yet, so like the other endpoints of this module the journeys
+        # are simulated per request; a fresh sample never repeats, so its summary is not cached
+        touchpoints = await attribution_service.generate_attribution_data(int(request.get('num_customers', 500)))
+        frame = TouchpointFrame.from_touchpoints(touchpoints)
+        summary = await attribution_service.data_driven.summarize(frame, start_date, end_date, use_cache=False)
+        
+        response = {
+            "status": "success",
+            "journeys": summary.journeys,
+            "conversions": summary.conversions
+        }
+        
+        if method in ('markov', 'both'):
+            states = [channel.value for channel in summary.channel_values] + ["start", "conversion", "null"]
+            matrix = summary.transition_matrix()
+            response["markov"] = {
+                "conversion_probability": summary.conversion_probability(),
+                "removal_effects": {channel.value: effect for channel, effect in summary.removal_effects().items()},
+                "attribution_shares": {channel.value: share for channel, share in summary.markov_shares().items()},
+                "transition_matrix": {
+                    from_state: {to_state: float(matrix[i, j]) for j, to_state in enumerate(states) if matrix[i, j] > 0}
+                    for i, from_state in enumerate(states)
+                }
+            }
+        
+        if method in ('shapley', 'both'):
+            shapley = summary.shapley(
+                error_bound=float(request.get('error_bound', 0.01)),
+                max_permutations=int(request.get('max_permutations', 200000)),
+                seed=request.get('seed')
+            )
+            response["shapley"] = {
+                **shapley,
+                "values": {channel.value: value for channel, value in shapley["values"].items()},
+                "shares": {channel.value: value for channel, value in shapley["shares"].items()},
+                "std_errors": {channel.value: value for channel, value in shapley["std_errors"].items()}
+            }
+        
+        response["timestamp"] = datetime.now()
+        return response
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Data-driven attribution error: {e}")
+
 @revenue_attribution_router.get("/api/analytics/revenue-attribution/ltv-analysis")
 async def get_ltv_analysis():
     """Get detailed customer lifetime value analysis"""
@@ -13,6 +13,17 @@ import numpy as np
 import pandas as pd
 from enum import Enum
 import math
+import os
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from .monte_carlo_engine import MonteCarloEngine, SimulationScenario, SimulationResult, DEFAULT_PERCENTILES
+from .forecast_model_store import ForecastModelStore
+
+# MongoDB setup for persisted model fits
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
+client = AsyncIOMotorClient(MONGO_URL)
+db = client[DB_NAME]
 
 # Initialize router
 roi_forecasting_router = APIRouter()
@@ -106,6 +117,12 @@ class ROIForecastingService:
             ForecastModel.MONTE_CARLO: 0.25,
             ForecastModel.ENSEMBLE: 0.15
         }
+        seed = os.getenv("MONTE_CARLO_SEED")
+        self.monte_carlo = MonteCarloEngine(
+            paths=int(os.getenv("MONTE_CARLO_PATHS", "100000")),
+            seed=int(seed) if seed else None
+        )
+        self.model_store = ForecastModelStore(db)
     
     def _generate_historical_data(self) -> List[HistoricalCampaign]:
         """Generate realistic historical campaign data for training models"""
@@ -280,7 +297,12 @@ class ROIForecastingService:
             )
         ]
     
-    async def forecast_campaign_roi(self, parameters: ForecastParameters, model: ForecastModel = ForecastModel.ENSEMBLE) -> ROIForecast:
+    async def forecast_campaign_roi(
+        self,
+        parameters: ForecastParameters,
+        model: ForecastModel = ForecastModel.ENSEMBLE,
+        simulation: Optional[SimulationResult] = None
+    ) -> ROIForecast:
         """Generate ROI forecast for a campaign using specified model"""
         
         # Get historical data for this campaign type
@@ -288,10 +310,10 @@ class ROIForecastingService:
         
         if model == ForecastModel.ENSEMBLE:
             # Use ensemble of multiple models
-            roi_prediction = await self._ensemble_forecast(parameters, historical_campaigns)
+            roi_prediction = await self._ensemble_forecast(parameters, historical_campaigns, simulation)
         else:
             # Use single model
-            roi_prediction = await self._single_model_forecast(parameters, historical_campaigns, model)
+            roi_prediction = await self._single_model_forecast(parameters, historical_campaigns, model, simulation)
         
         # Calculate confidence intervals
         confidence_interval = self._calculate_confidence_interval(roi_prediction, historical_campaigns)
@@ -318,14 +340,24 @@ class ROIForecastingService:
             confidence_score=confidence_score
         )
     
-    async def _ensemble_forecast(self, parameters: ForecastParameters, historical_data: List[HistoricalCampaign]) -> float:
+    async def _ensemble_forecast(
+        self,
+        parameters: ForecastParameters,
+        historical_data: List[HistoricalCampaign],
+        simulation: Optional[SimulationResult] = None
+    ) -> float:
         """Generate ensemble forecast using multiple models"""
+        version = self.model_store.version(parameters.campaign_type.value, historical_data)
+        cached = self.model_store.cached_prediction(ForecastModel.ENSEMBLE.value, self._forecast_key(parameters, version) if version else None)
+        if cached is not None:
+            return cached
+        
         model_predictions = {}
         
         # Get predictions from each model
         for model in [ForecastModel.ARIMA, ForecastModel.PROPHET, ForecastModel.LINEAR_REGRESSION, ForecastModel.MONTE_CARLO]:
             try:
-                prediction = await self._single_model_forecast(parameters, historical_data, model)
+                prediction = await self._single_model_forecast(parameters, historical_data, model, simulation)
                 model_predictions[model] = prediction
             except:
                 # If model fails, use fallback
@@ -337,62 +369,74 @@ class ROIForecastingService:
             for model, prediction in model_predictions.items()
         ) / sum(self.model_weights[model] for model in model_predictions.keys())
         
+        version = self.model_store.version(parameters.campaign_type.value, historical_data)
+        if historical_data and version:
+            self.model_store.store_prediction(ForecastModel.ENSEMBLE.value, self._forecast_key(parameters, version), weighted_prediction)
         return weighted_prediction
     
-    async def _single_model_forecast(self, parameters: ForecastParameters, historical_data: List[HistoricalCampaign], model: ForecastModel) -> float:
+    async def _single_model_forecast(
+        self,
+        parameters: ForecastParameters,
+        historical_data: List[HistoricalCampaign],
+        model: ForecastModel,
+        simulation: Optional[SimulationResult] = None
+    ) -> float:
         """Generate forecast using single model"""
+        if model == ForecastModel.ENSEMBLE or not historical_data:
+            return self._fallback_prediction(parameters, historical_data)
+        
+        # Fitted parameters come from the model store; predictions are cached per series version
+        fit, version = await self.model_store.fitted(parameters.campaign_type.value, model.value, historical_data)
+        key = self._forecast_key(parameters, version)
+        cached = self.model_store.cached_prediction(model.value, key)
+        if cached is not None:
+            return cached
         
         if model == ForecastModel.LINEAR_REGRESSION:
-            return self._linear_regression_forecast(parameters, historical_data)
+            prediction = self._linear_regression_forecast(parameters, fit)
         elif model == ForecastModel.ARIMA:
-            return self._arima_forecast(parameters, historical_data)
+            prediction = self._arima_forecast(parameters, fit)
         elif model == ForecastModel.PROPHET:
-            return self._prophet_forecast(parameters, historical_data)
-        elif model == ForecastModel.MONTE_CARLO:
-            return self._monte_carlo_forecast(parameters, historical_data)
+            prediction = self._prophet_forecast(parameters, fit)
         else:
-            return self._fallback_prediction(parameters, historical_data)
+            prediction = self._monte_carlo_forecast(parameters, fit, simulation)
+        
+        self.model_store.store_prediction(model.value, key, prediction)
+        return prediction
+    
+    def _forecast_key(self, parameters: ForecastParameters, version: tuple) -> tuple:
+        return (parameters.campaign_type.value, version, tuple(sorted(parameters.dict().items())))
     
-    def _linear_regression_forecast(self, parameters: ForecastParameters, historical_data: List[HistoricalCampaign]) -> float:
+    def _linear_regression_forecast(self, parameters: ForecastParameters, fit: Dict[str, Any]) -> float:
         """Linear regression based forecast"""
-        if not historical_data:
-            return self._fallback_prediction(parameters, historical_data)
-        
-        # Simple linear relationship between budget and ROI
-        budgets = [c.budget for c in historical_data]
-        rois = [(c.revenue - c.actual_spend) / c.actual_spend if c.actual_spend > 0 else 0 for c in historical_data]
-        
-        # Calculate correlation and trend
-        if len(budgets) > 1:
-            correlation = np.corrcoef(budgets, rois)[0, 1] if not np.isnan(np.corrcoef(budgets, rois)).any() else 0
-            avg_roi = np.mean(rois)
+        # Simple linear relationship between budget and ROI, from the fitted moments
+        if fit["n"] > 1:
+            spread = fit["m2_budget"] * fit["m2_roi"]
+            correlation = fit["co_moment"] / math.sqrt(spread) if spread > 0 else 0
+            avg_roi = fit["mean_roi"]
             
             # Adjust for budget size effect
-            budget_factor = math.log(parameters.budget / np.mean(budgets)) * 0.1 if np.mean(budgets) > 0 else 0
+            budget_factor = math.log(parameters.budget / fit["mean_budget"]) * 0.1 if fit["mean_budget"] > 0 else 0
             
             predicted_roi = avg_roi + budget_factor + (correlation * 0.2)
         else:
-            predicted_roi = rois[0] if rois else 0.5
+            predicted_roi = fit["first_roi"]
         
         # Apply market conditions
         predicted_roi *= parameters.seasonal_factor
         
         return max(0, predicted_roi)
     
-    def _arima_forecast(self, parameters: ForecastParameters, historical_data: List[HistoricalCampaign]) -> float:
+    def _arima_forecast(self, parameters: ForecastParameters, fit: Dict[str, Any]) -> float:
         """ARIMA-inspired time series forecast"""
-        if not historical_data:
-            return self._fallback_prediction(parameters, historical_data)
+        # Most recent ROIs in start-date order
+        rois = fit["tail_rois"]
         
-        # Sort by date and get ROI time series
-        sorted_campaigns = sorted(historical_data, key=lambda x: x.start_date)
-        rois = [(c.revenue - c.actual_spend) / c.actual_spend if c.actual_spend > 0 else 0 for c in sorted_campaigns]
-        
-        if len(rois) < 3:
-            return np.mean(rois) if rois else 0.5
+        if fit["n"] < 3:
+            return float(np.mean(rois))
         
         # Simple trend and seasonality
-        recent_trend = np.mean(rois[-3:]) - np.mean(rois[-6:-3]) if len(rois) >= 6 else 0
+        recent_trend = np.mean(rois[-3:]) - np.mean(rois[-6:-3]) if fit["n"] >= 6 else 0
         seasonal_pattern = parameters.seasonal_factor - 1
         
         base_roi = np.mean(rois[-3:])  # Last 3 campaigns average
@@ -400,19 +444,14 @@ class ROIForecastingService:
         
         return max(0, predicted_roi)
     
-    def _prophet_forecast(self, parameters: ForecastParameters, historical_data: List[HistoricalCampaign]) -> float:
+    def _prophet_forecast(self, parameters: ForecastParameters, fit: Dict[str, Any]) -> float:
         """Prophet-inspired forecast with seasonality and trends"""
-        if not historical_data:
-            return self._fallback_prediction(parameters, historical_data)
-        
         # Calculate base performance
-        rois = [(c.revenue - c.actual_spend) / c.actual_spend if c.actual_spend > 0 else 0 for c in historical_data]
-        base_roi = np.mean(rois)
+        base_roi = fit["mean_roi"]
         
         # Trend component (simple linear trend)
-        if len(historical_data) > 1:
-            sorted_campaigns = sorted(historical_data, key=lambda x: x.start_date)
-            recent_performance = np.mean([(c.revenue - c.actual_spend) / c.actual_spend for c in sorted_campaigns[-5:]]) if len(sorted_campaigns) >= 5 else base_roi
+        if fit["n"] > 1:
+            recent_performance = np.mean(fit["tail_rois"]) if fit["n"] >= 5 else base_roi
             trend = (recent_performance - base_roi) * 0.5
         else:
             trend = 0
@@ -427,42 +466,90 @@ class ROIForecastingService:
         
         return max(0, predicted_roi)
     
-    def _monte_carlo_forecast(self, parameters: ForecastParameters, historical_data: List[HistoricalCampaign]) -> float:
+    def _monte_carlo_forecast(
+        self,
+        parameters: ForecastParameters,
+        fit: Dict[str, Any],
+        simulation: Optional[SimulationResult] = None
+    ) -> float:
         """Monte Carlo simulation forecast"""
-        if not historical_data:
-            return self._fallback_prediction(parameters, historical_data)
+        # Reuse a result simulated as part of a scenario/sensitivity grid
+        if simulation is None:
+            simulation = self.monte_carlo.simulate([self._simulation_scenario(parameters, fit)])[0]
         
-        # Run Monte Carlo simulation
-        simulations = 1000
-        results = []
+        # Return median of simulation results
+        return simulation.median
+    
+    def _simulation_scenario(self, parameters: ForecastParameters, fit: Dict[str, Any], label: Optional[str] = None) -> SimulationScenario:
+        """Fitted ROI distribution plus the campaign's market assumptions"""
+        return SimulationScenario(
+            mean_roi=fit["mean_roi"],
+            std_roi=math.sqrt(fit["m2_roi"] / fit["n"]) if fit["n"] > 1 else 0.2,
+            seasonal_factor=parameters.seasonal_factor,
+            competitive_pressure=parameters.competitive_pressure,
+            label=label
+        )
+    
+    async def forecast_grid(
+        self,
+        parameter_sets: List[ForecastParameters],
+        model: ForecastModel = ForecastModel.ENSEMBLE
+    ) -> List[ROIForecast]:
+        """Forecast several parameter variants, simulating all of them in one batched Monte Carlo run"""
+        simulations: List[Optional[SimulationResult]] = [None] * len(parameter_sets)
+        if model in (ForecastModel.ENSEMBLE, ForecastModel.MONTE_CARLO):
+            scenarios, indices = [], []
+            for i, parameters in enumerate(parameter_sets):
+                historical_campaigns = [c for c in self.historical_data if c.campaign_type == parameters.campaign_type]
+                if not historical_campaigns:
+                    continue
+                # Only simulate variants whose forecast is not already cached
+                fit, version = await self.model_store.fitted(parameters.campaign_type.value, ForecastModel.MONTE_CARLO.value, historical_campaigns)
+                key = self._forecast_key(parameters, version)
+                if any(self.model_store.cached_prediction(m.value, key, record=False) is not None for m in {model, ForecastModel.MONTE_CARLO}):
+                    continue
+                scenarios.append(self._simulation_scenario(parameters, fit))
+                indices.append(i)
+            if scenarios:
+                for i, result in zip(indices, self.monte_carlo.simulate(scenarios)):
+                    simulations[i] = result
         
-        # Get distribution parameters from historical data
-        rois = [(c.revenue - c.actual_spend) / c.actual_spend if c.actual_spend > 0 else 0 for c in historical_data]
-        mean_roi = np.mean(rois)
-        std_roi = np.std(rois) if len(rois) > 1 else 0.2
+        return [
+            await self.forecast_campaign_roi(parameters, model, simulation)
+            for parameters, simulation in zip(parameter_sets, simulations)
+        ]
+    
+    async def simulate_roi_distribution(
+        self,
+        parameters: ForecastParameters,
+        seasonal_factors: Optional[List[float]] = None,
+        competitive_pressures: Optional[List[str]] = None,
+        paths: Optional[int] = None,
+        correlation: Optional[List[List[float]]] = None,
+        seed: Optional[int] = None,
+        percentiles: tuple = DEFAULT_PERCENTILES
+    ) -> List[Dict[str, Any]]:
+        """Percentile summaries for every seasonal factor x competitive pressure combination"""
+        historical_campaigns = [c for c in self.historical_data if c.campaign_type == parameters.campaign_type]
+        if not historical_campaigns:
+            raise ValueError(f"No historical campaigns for {parameters.campaign_type.value}")
         
-        for _ in range(simulations):
-            # Sample ROI from normal distribution
-            simulated_roi = np.random.normal(mean_roi, std_roi)
-            
-            # Apply random market conditions
-            market_factor = random.choice([0.8, 0.9, 1.0, 1.1, 1.2])
-            
-            # Apply seasonal factor with some variance
-            seasonal_factor = parameters.seasonal_factor * random.uniform(0.9, 1.1)
-            
-            # Apply competitive pressure
-            competitive_factor = {
-                'low': random.uniform(1.0, 1.2),
-                'medium': random.uniform(0.9, 1.1),
-                'high': random.uniform(0.7, 0.9)
-            }.get(parameters.competitive_pressure, 1.0)
-            
-            final_roi = simulated_roi * market_factor * seasonal_factor * competitive_factor
-            results.append(max(0, final_roi))
+        fit, _ = await self.model_store.fitted(parameters.campaign_type.value, ForecastModel.MONTE_CARLO.value, historical_campaigns)
+        scenarios = []
+        for seasonal_factor in seasonal_factors or [parameters.seasonal_factor]:
+            for competitive_pressure in competitive_pressures or [parameters.competitive_pressure]:
+                variant = parameters.copy(update={'seasonal_factor': seasonal_factor, 'competitive_pressure': competitive_pressure})
+                scenarios.append(self._simulation_scenario(variant, fit, label=f"seasonal={seasonal_factor:g}, competition={competitive_pressure}"))
         
-        # Return median of simulation results
-        return np.median(results)
+        results = self.monte_carlo.simulate(scenarios, paths=paths, correlation=correlation, seed=seed)
+        return [
+            {
+                "seasonal_factor": result.scenario.seasonal_factor,
+                "competitive_pressure": result.scenario.competitive_pressure,
+                **result.summary(percentiles)
+            }
+            for result in results
+        ]
     
     def _fallback_prediction(self, parameters: ForecastParameters, historical_data: List[HistoricalCampaign]) -> float:
         """Fallback prediction based on campaign type benchmarks"""
@@ -585,117 +672,128 @@ class ROIForecastingService:
         
         return sum(confidence_factors)
     
-    async def scenario_analysis(self, parameters: ForecastParameters) -> List[ScenarioAnalysis]:
-        """Generate scenario analysis (best case, worst case, expected)"""
-        # Base forecast
-        base_forecast = await self.forecast_campaign_roi(parameters)
-        
-        scenarios = []
-        
-        # Best case scenario  
+    def _scenario_variants(self, parameters: ForecastParameters) -> Dict[str, ForecastParameters]:
+        """Best and worst case parameter sets"""
         best_case_params_dict = parameters.dict()
         best_case_params_dict['seasonal_factor'] = parameters.seasonal_factor * 1.3
         best_case_params_dict['competitive_pressure'] = "low"
-        best_case_params = ForecastParameters(**best_case_params_dict)
-        best_case_forecast = await self.forecast_campaign_roi(best_case_params)
-        
-        scenarios.append(ScenarioAnalysis(
-            scenario_name="Best Case",
-            probability=0.15,
-            predicted_roi=best_case_forecast.predicted_roi,
-            predicted_revenue=best_case_forecast.predicted_revenue,
-            key_assumptions=[
-                "Market conditions highly favorable",
-                "Low competitive pressure",
-                "Strong seasonal performance",
-                "All campaign elements perform above average"
-            ]
-        ))
-        
-        # Expected case
-        scenarios.append(ScenarioAnalysis(
-            scenario_name="Expected Case",
-            probability=0.70,
-            predicted_roi=base_forecast.predicted_roi,
-            predicted_revenue=base_forecast.predicted_revenue,
-            key_assumptions=[
-                "Normal market conditions",
-                "Average competitive pressure",
-                "Typical seasonal patterns",
-                "Campaign performs as predicted"
-            ]
-        ))
-        
-        # Worst case scenario
+        
         worst_case_params_dict = parameters.dict()
         worst_case_params_dict['seasonal_factor'] = parameters.seasonal_factor * 0.7
         worst_case_params_dict['competitive_pressure'] = "high"
-        worst_case_params = ForecastParameters(**worst_case_params_dict)
-        worst_case_forecast = await self.forecast_campaign_roi(worst_case_params)
-        
-        scenarios.append(ScenarioAnalysis(
-            scenario_name="Worst Case",
-            probability=0.15,
-            predicted_roi=worst_case_forecast.predicted_roi,
-            predicted_revenue=worst_case_forecast.predicted_revenue,
-            key_assumptions=[
-                "Economic downturn impacts spending",
-                "High competitive pressure",
-                "Poor seasonal performance",
-                "Campaign execution challenges"
-            ]
-        ))
-        
-        return scenarios
+        
+        return {
+            "best": ForecastParameters(**best_case_params_dict),
+            "worst": ForecastParameters(**worst_case_params_dict)
+        }
     
-    async def sensitivity_analysis(self, parameters: ForecastParameters) -> List[SensitivityAnalysis]:
-        """Perform sensitivity analysis on key parameters"""
-        base_forecast = await self.forecast_campaign_roi(parameters)
+    def _sensitivity_variants(self, parameters: ForecastParameters) -> Dict[str, ForecastParameters]:
+        """Each key parameter raised by 10%"""
+        raised_values = {
+            'budget': parameters.budget * 1.1,
+            'seasonal_factor': parameters.seasonal_factor * 1.1,
+            'duration_days': int(parameters.duration_days * 1.1)
+        }
+        variants = {}
+        for parameter, value in raised_values.items():
+            params_dict = parameters.dict()
+            params_dict[parameter] = value
+            variants[parameter] = ForecastParameters(**params_dict)
+        return variants
+    
+    def _build_scenarios(self, base_forecast: ROIForecast, best_case_forecast: ROIForecast, worst_case_forecast: ROIForecast) -> List[ScenarioAnalysis]:
+        return [
+            ScenarioAnalysis(
+                scenario_name="Best Case",
+                probability=0.15,
+                predicted_roi=best_case_forecast.predicted_roi,
+                predicted_revenue=best_case_forecast.predicted_revenue,
+                key_assumptions=[
+                    "Market conditions highly favorable",
+                    "Low competitive pressure",
+                    "Strong seasonal performance",
+                    "All campaign elements perform above average"
+                ]
+            ),
+            ScenarioAnalysis(
+                scenario_name="Expected Case",
+                probability=0.70,
+                predicted_roi=base_forecast.predicted_roi,
+                predicted_revenue=base_forecast.predicted_revenue,
+                key_assumptions=[
+                    "Normal market conditions",
+                    "Average competitive pressure",
+                    "Typical seasonal patterns",
+                    "Campaign performs as predicted"
+                ]
+            ),
+            ScenarioAnalysis(
+                scenario_name="Worst Case",
+                probability=0.15,
+                predicted_roi=worst_case_forecast.predicted_roi,
+                predicted_revenue=worst_case_forecast.predicted_revenue,
+                key_assumptions=[
+                    "Economic downturn impacts spending",
+                    "High competitive pressure",
+                    "Poor seasonal performance",
+                    "Campaign execution challenges"
+                ]
+            )
+        ]
+    
+    def _build_sensitivities(
+        self,
+        parameters: ForecastParameters,
+        base_forecast: ROIForecast,
+        variant_forecasts: Dict[str, ROIForecast]
+    ) -> List[SensitivityAnalysis]:
         sensitivities = []
-        
-        # Budget sensitivity
-        budget_params_dict = parameters.dict()
-        budget_params_dict['budget'] = parameters.budget * 1.1
-        budget_params_high = ForecastParameters(**budget_params_dict)
-        budget_forecast_high = await self.forecast_campaign_roi(budget_params_high)
-        budget_sensitivity = (budget_forecast_high.predicted_roi - base_forecast.predicted_roi) / (0.1 * base_forecast.predicted_roi) if base_forecast.predicted_roi != 0 else 0
-        
-        sensitivities.append(SensitivityAnalysis(
-            parameter="budget",
-            base_value=parameters.budget,
-            sensitivity_score=abs(budget_sensitivity),
-            roi_impact_per_percent_change=budget_sensitivity / 10
-        ))
-        
-        # Seasonal factor sensitivity
-        seasonal_params_dict = parameters.dict()
-        seasonal_params_dict['seasonal_factor'] = parameters.seasonal_factor * 1.1
-        seasonal_params_high = ForecastParameters(**seasonal_params_dict)
-        seasonal_forecast_high = await self.forecast_campaign_roi(seasonal_params_high)
-        seasonal_sensitivity = (seasonal_forecast_high.predicted_roi - base_forecast.predicted_roi) / (0.1 * base_forecast.predicted_roi) if base_forecast.predicted_roi != 0 else 0
-        
-        sensitivities.append(SensitivityAnalysis(
-            parameter="seasonal_factor",
-            base_value=parameters.seasonal_factor,
-            sensitivity_score=abs(seasonal_sensitivity),
-            roi_impact_per_percent_change=seasonal_sensitivity / 10
-        ))
-        
-        # Duration sensitivity
-        duration_params_dict = parameters.dict()
-        duration_params_dict['duration_days'] = int(parameters.duration_days * 1.1)
-        duration_params_high = ForecastParameters(**duration_params_dict)
-        duration_forecast_high = await self.forecast_campaign_roi(duration_params_high)
-        duration_sensitivity = (duration_forecast_high.predicted_roi - base_forecast.predicted_roi) / (0.1 * base_forecast.predicted_roi) if base_forecast.predicted_roi != 0 else 0
-        
-        sensitivities.append(SensitivityAnalysis(
-            parameter="duration_days",
-            base_value=parameters.duration_days,
-            sensitivity_score=abs(duration_sensitivity),
-            roi_impact_per_percent_change=duration_sensitivity / 10
-        ))
-        
+        for parameter, forecast_high in variant_forecasts.items():
+            sensitivity = (forecast_high.predicted_roi - base_forecast.predicted_roi) / (0.1 * base_forecast.predicted_roi) if base_forecast.predicted_roi != 0 else 0
+            sensitivities.append(SensitivityAnalysis(
+                parameter=parameter,
+                base_value=getattr(parameters, parameter),
+                sensitivity_score=abs(sensitivity),
+                roi_impact_per_percent_change=sensitivity / 10
+            ))
         return sensitivities
+    
+    async def scenario_analysis(self, parameters: ForecastParameters) -> List[ScenarioAnalysis]:
+        """Generate scenario analysis (best case, worst case, expected)"""
+        variants = self._scenario_variants(parameters)
+        base_forecast, best_case_forecast, worst_case_forecast = await self.forecast_grid(
+            [parameters, variants["best"], variants["worst"]]
+        )
+        return self._build_scenarios(base_forecast, best_case_forecast, worst_case_forecast)
+    
+    async def sensitivity_analysis(self, parameters: ForecastParameters) -> List[SensitivityAnalysis]:
+        """Perform sensitivity analysis on key parameters"""
+        variants = self._sensitivity_variants(parameters)
+        forecasts = await self.forecast_grid([parameters, *variants.values()])
+        return self._build_sensitivities(parameters, forecasts[0], dict(zip(variants, forecasts[1:])))
+    
+    async def add_historical_campaigns(self, campaigns: List[HistoricalCampaign]) -> Dict[str, int]:
+        """Append completed campaigns and fold them into the fitted models of their series"""
+        self.historical_data.extend(campaigns)
+        series_sizes = {}
+        for campaign_type in {c.campaign_type for c in campaigns}:
+            historical_campaigns = [c for c in self.historical_data if c.campaign_type == campaign_type]
+            await self.model_store.observe(campaign_type.value, historical_campaigns)
+            series_sizes[campaign_type.value] = len(historical_campaigns)
+        return series_sizes
+    
+    async def analyze_campaign(self, parameters: ForecastParameters, model: ForecastModel = ForecastModel.ENSEMBLE):
+        """Forecast, scenario and sensitivity analysis from one batched simulation grid"""
+        scenario_variants = self._scenario_variants(parameters)
+        sensitivity_variants = self._sensitivity_variants(parameters)
+        grid = [parameters, scenario_variants["best"], scenario_variants["worst"], *sensitivity_variants.values()]
+        ensemble_forecasts = await self.forecast_grid(grid)
+        
+        base_forecast = ensemble_forecasts[0]
+        forecast = base_forecast if model == ForecastModel.ENSEMBLE else (await self.forecast_grid([parameters], model))[0]
+        scenarios = self._build_scenarios(base_forecast, ensemble_forecasts[1], ensemble_forecasts[2])
+        sensitivities = self._build_sensitivities(parameters, base_forecast, dict(zip(sensitivity_variants, ensemble_forecasts[3:])))
+        return forecast, scenarios, sensitivities
 
 # Initialize service
 forecasting_service = ROIForecastingService()
@@ -731,8 +829,7 @@ async def get_roi_forecasting_dashboard():
         
         # Generate forecasts for sample campaigns
         forecasts = []
-        for params in sample_campaigns:
-            forecast = await forecasting_service.forecast_campaign_roi(params)
+        for params, forecast in zip(sample_campaigns, await forecasting_service.forecast_grid(sample_campaigns)):
             forecasts.append({
                 "campaign_type": params.campaign_type.value,
                 "budget": params.budget,
@@ -832,14 +929,8 @@ async def predict_campaign_roi(parameters: Dict):
         
         model = ForecastModel(parameters.get('model', 'ensemble'))
         
-        # Generate forecast
-        forecast = await forecasting_service.forecast_campaign_roi(forecast_params, model)
-        
-        # Generate scenario analysis
-        scenarios = await forecasting_service.scenario_analysis(forecast_params)
-        
-        # Generate sensitivity analysis
-        sensitivities = await forecasting_service.sensitivity_analysis(forecast_params)
+        # Generate forecast, scenario analysis and sensitivity analysis in one simulation grid
+        forecast, scenarios, sensitivities = await forecasting_service.analyze_campaign(forecast_params, model)
         
         return {
             "status": "success",
@@ -870,6 +961,84 @@ async def predict_campaign_roi(parameters: Dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"ROI prediction error: {e}")
 
+@roi_forecasting_router.post("/api/analytics/roi-forecasting/simulate")
+async def simulate_roi_distribution(request: Dict):
+    """Percentile summaries of simulated ROI over a seasonal x competitive pressure grid"""
+    try:
+        forecast_params = ForecastParameters(
+            campaign_type=CampaignType(request.get('campaign_type', 'email')),
+            budget=request.get('budget', 5000),
+            duration_days=request.get('duration_days', 30),
+            target_audience_size=request.get('target_audience_size', 10000),
+            seasonal_factor=request.get('seasonal_factor', 1.0),
+            competitive_pressure=request.get('competitive_pressure', 'medium')
+        )
+        paths = int(request.get('paths', forecasting_service.monte_carlo.paths))
+        if not 1000 <= paths <= 5_000_000:
+            raise HTTPException(status_code=400, detail="paths must be between 1,000 and 5,000,000")
+        
+        grid = await forecasting_service.simulate_roi_distribution(
+            forecast_params,
+            seasonal_factors=request.get('seasonal_factors'),
+            competitive_pressures=request.get('competitive_pressures'),
+            paths=paths,
+            correlation=request.get('correlation'),
+            seed=request.get('seed'),
+            percentiles=tuple(request.get('percentiles', DEFAULT_PERCENTILES))
+        )
+        
+        return {
+            "status": "success",
+            "campaign_parameters": forecast_params.dict(),
+            "paths_per_scenario": paths,
+            "grid": grid,
+            "timestamp": datetime.now()
+        }
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"ROI simulation error: {e}")
+
+@roi_forecasting_router.post("/api/analytics/roi-forecasting/historical-data")
+async def add_historical_campaigns(request: Dict):
+    """Add completed campaigns; fitted forecast models are updated incrementally"""
+    try:
+        campaigns = [HistoricalCampaign(**campaign) for campaign in request.get('campaigns', [])]
+        if not campaigns:
+            raise HTTPException(status_code=400, detail="campaigns must be a non-empty list")
+        
+        series_sizes = await forecasting_service.add_historical_campaigns(campaigns)
+        
+        return {
+            "status": "success",
+            "campaigns_added": len(campaigns),
+            "series_sizes": series_sizes,
+            "timestamp": datetime.now()
+        }
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Historical data error: {e}")
+
+@roi_forecasting_router.get("/api/analytics/roi-forecasting/model-cache/stats")
+async def get_model_cache_stats():
+    """Get fit and prediction cache hit rates and fit times per forecast model"""
+    try:
+        return {
+            "status": "success",
+            "model_cache": forecasting_service.model_store.cache_stats(),
+            "timestamp": datetime.now()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model cache stats error: {e}")
+
 @roi_forecasting_router.get("/api/analytics/roi-forecasting/historical-analysis")
 async def get_historical_analysis():
     """Get historical campaign performance analysis"""
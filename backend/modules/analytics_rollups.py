@@ -0,0 +1,257 @@
+"""
+Customer Mind IQ - Analytics Rollups
+Materialized per-tenant customer aggregates behind /api/analytics: incremental deltas on every
+customer write, periodic $merge rebuilds and a consistency check against a full recompute
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from modules.index_registry import index_registry
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
+client = AsyncIOMotorClient(MONGO_URL)
+db = client[DB_NAME]
+
+# Scope of the admin view, which covers customers of every owner (and unowned ones)
+ALL_TENANTS = "__all__"
+STATE_ID = "analytics_rollups"
+DEFAULT_SEGMENT = "active"
+TOP_PRODUCTS = 5
+PRODUCT_REVENUE_ESTIMATE = 3500  # per owning customer, as on the original dashboard
+
+declare_index = index_registry.module(__name__)
+declare_index("analytics_rollups", [("tenant", 1), ("kind", 1), ("customers", -1)])
+declare_index("analytics_rollups", "updated_at")
+declare_index("customers", "owner_user_id")
+
+
+def _scopes(owner_user_id: Any) -> List[str]:
+    return [owner_user_id, ALL_TENANTS] if isinstance(owner_user_id, str) else [ALL_TENANTS]
+
+
+def customer_contributions(customer: Optional[Dict[str, Any]]) -> Dict[Tuple[str, str, str], Tuple[int, float]]:
+    """(tenant, kind, key) -> (customers, revenue) that one customer document adds to the rollups"""
+    if not customer:
+        return {}
+    spent = customer.get("total_spent")
+    revenue = float(spent) if isinstance(spent, (int, float)) else 0.0
+    segment = customer.get("lifecycle_stage")
+    segment = segment if isinstance(segment, str) else DEFAULT_SEGMENT
+    contributions: Dict[Tuple[str, str, str], Tuple[int, float]] = {}
+    for tenant in _scopes(customer.get("owner_user_id")):
+        contributions[(tenant, "totals", "")] = (1, revenue)
+        contributions[(tenant, "segment", segment)] = (1, 0.0)
+        # Every listed product counts, duplicates included, like the original per-request loop
+        for product in customer.get("software_owned") or []:
+            if not isinstance(product, str):
+                continue
+            customers, _ = contributions.get((tenant, "product", product), (0, 0.0))
+            contributions[(tenant, "product", product)] = (customers + 1, 0.0)
+    return contributions
+
+
+def rollup_id(tenant: str, kind: str, key: str) -> str:
+    return f"{tenant}|{kind}|{key}"
+
+
+class AnalyticsRollupEngine:
+    """Maintains ``analytics_rollups``: one small document per tenant and
+    aggregate (totals, each lifecycle segment, each product).
+
+    Customer writes call ``apply_change`` with the document before and after
+    the write, which ``$inc``s the difference into the owner's and the
+    all-tenant documents. ``rebuild`` recomputes everything with ``$group``
+    pipelines that ``$merge`` into the collection and is run periodically to
+    repair drift from writes made outside the API. Reads touch only the
+    tenant's handful of rollup documents, whatever the number of customers.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._built = False
+        self._bootstrap_lock = asyncio.Lock()
+
+    async def apply_change(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> int:
+        """Fold the difference between two versions of a customer into the rollups.
+
+        ``before`` is None for inserts and ``after`` is None for deletes.
+        Returns the number of rollup documents touched.
+        """
+        old, new = customer_contributions(before), customer_contributions(after)
+        now = datetime.utcnow()
+        operations = []
+        for tenant, kind, key in sorted(set(old) | set(new)):
+            old_customers, old_revenue = old.get((tenant, kind, key), (0, 0.0))
+            new_customers, new_revenue = new.get((tenant, kind, key), (0, 0.0))
+            customers, revenue = new_customers - old_customers, new_revenue - old_revenue
+            # Totals always carry the write time, which is the rollup's freshness
+            if not customers and not revenue and kind != "totals":
+                continue
+            operations.append(UpdateOne(
+                {"_id": rollup_id(tenant, kind, key)},
+                {
+                    "$inc": {"customers": customers, "revenue": revenue},
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {"tenant": tenant, "kind": kind, "key": key}
+                },
+                upsert=True
+            ))
+        if operations:
+            await self.db.analytics_rollups.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    async def rebuild(self, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """Recompute the rollups of one tenant (or all of them) from ``customers``.
+
+        Documents not rewritten by this run (aggregates that no longer exist)
+        are removed afterwards; increments applied while the rebuild runs
+        carry a newer ``updated_at`` and are kept.
+        """
+        started = datetime.utcnow()
+        for pipeline in self._recompute_pipelines(tenant, started):
+            await self.db.customers.aggregate(pipeline + [
+                {"$merge": {"into": "analytics_rollups", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+            ]).to_list(length=None)
+
+        stale = {"updated_at": {"$lt": started}}
+        if tenant is not None:
+            stale["tenant"] = tenant
+        removed = await self.db.analytics_rollups.delete_many(stale)
+        update = {"last_rebuild_at": started, "last_rebuild_scope": tenant or "all"}
+        if tenant is None:
+            update["last_full_rebuild_at"] = started
+        await self.db.analytics_rollup_state.update_one({"_id": STATE_ID}, {"$set": update}, upsert=True)
+        return {
+            "tenant": tenant or "all",
+            "rebuilt_at": started,
+            "stale_documents_removed": removed.deleted_count,
+            "seconds": (datetime.utcnow() - started).total_seconds()
+        }
+
+    async def read(self, tenant: str) -> Dict[str, Any]:
+        """Totals, segment distribution and top products of a tenant"""
+        await self._ensure_built()
+        summary, top_products = await asyncio.gather(
+            self.db.analytics_rollups.find(
+                {"tenant": tenant, "kind": {"$in": ["totals", "segment"]}}
+            ).to_list(length=None),
+            self.db.analytics_rollups.find(
+                {"tenant": tenant, "kind": "product", "customers": {"$gt": 0}}
+            ).sort([("customers", DESCENDING), ("key", ASCENDING)]).limit(TOP_PRODUCTS).to_list(length=TOP_PRODUCTS)
+        )
+        totals = next((doc for doc in summary if doc["kind"] == "totals"), {})
+        return {
+            "total_customers": int(totals.get("customers", 0)),
+            "total_revenue": float(totals.get("revenue", 0.0)),
+            "top_products": [
+                {"name": doc["key"], "customers": doc["customers"], "revenue": doc["customers"] * PRODUCT_REVENUE_ESTIMATE}
+                for doc in top_products
+            ],
+            "segment_distribution": {
+                doc["key"]: doc["customers"] for doc in summary if doc["kind"] == "segment" and doc["customers"] > 0
+            },
+            "rolled_up_at": totals.get("updated_at")
+        }
+
+    async def check_consistency(self, tenant: Optional[str] = None, repair: bool = False) -> Dict[str, Any]:
+        """Compare the stored rollups with a full recompute from ``customers``"""
+        expected: Dict[str, Dict[str, Any]] = {}
+        for pipeline in self._recompute_pipelines(tenant, datetime.utcnow()):
+            async for doc in self.db.customers.aggregate(pipeline):
+                expected[doc["_id"]] = doc
+
+        stored_filter = {} if tenant is None else {"tenant": tenant}
+        stored = {doc["_id"]: doc async for doc in self.db.analytics_rollups.find(stored_filter)}
+
+        mismatches = []
+        for key in sorted(set(expected) | set(stored)):
+            want, have = expected.get(key, {}), stored.get(key, {})
+            want_customers, have_customers = want.get("customers", 0), have.get("customers", 0)
+            want_revenue, have_revenue = want.get("revenue", 0.0), have.get("revenue", 0.0)
+            if want_customers != have_customers or abs(want_revenue - have_revenue) > 0.005:
+                mismatches.append({
+                    "rollup": key,
+                    "expected": {"customers": want_customers, "revenue": round(want_revenue, 2)},
+                    "stored": {"customers": have_customers, "revenue": round(have_revenue, 2)}
+                })
+
+        report = {
+            "tenant": tenant or "all",
+            "checked_documents": len(set(expected) | set(stored)),
+            "consistent": not mismatches,
+            "mismatches": mismatches[:100],
+            "mismatch_count": len(mismatches),
+            "checked_at": datetime.utcnow()
+        }
+        if repair and mismatches:
+            report["repair"] = await self.rebuild(tenant)
+        return report
+
+    def _recompute_pipelines(self, tenant: Optional[str], computed_at: datetime) -> List[List[Dict[str, Any]]]:
+        """Totals, segment and product pipelines emitting rollup documents"""
+        if tenant is None:
+            match = {}
+            scopes = {"$cond": [
+                {"$eq": [{"$type": "$owner_user_id"}, "string"]}, ["$owner_user_id", ALL_TENANTS], [ALL_TENANTS]
+            ]}
+        elif tenant == ALL_TENANTS:
+            match, scopes = {}, [ALL_TENANTS]
+        else:
+            match, scopes = {"owner_user_id": tenant}, [tenant]
+
+        def emit(kind: str, key: Any, customers: Dict[str, Any], revenue: Any) -> List[Dict[str, Any]]:
+            return [
+                {"$group": {"_id": {"tenant": "$tenant", "key": key}, "customers": customers, "revenue": revenue}},
+                {"$project": {
+                    "_id": {"$concat": ["$_id.tenant", f"|{kind}|", "$_id.key"]},
+                    "tenant": "$_id.tenant",
+                    "kind": {"$literal": kind},
+                    "key": "$_id.key",
+                    "customers": 1,
+                    "revenue": 1,
+                    "updated_at": {"$literal": computed_at}
+                }}
+            ]
+
+        base = [
+            {"$match": match},
+            {"$project": {
+                "_id": 0,
+                "tenant": scopes,
+                "total_spent": 1,
+                "segment": {"$cond": [{"$eq": [{"$type": "$lifecycle_stage"}, "string"]}, "$lifecycle_stage", DEFAULT_SEGMENT]},
+                "software_owned": 1
+            }},
+            {"$unwind": "$tenant"}
+        ]
+        return [
+            base + emit("totals", "", {"$sum": 1}, {"$sum": "$total_spent"}),
+            base + emit("segment", "$segment", {"$sum": 1}, {"$sum": 0}),
+            base + [
+                {"$unwind": "$software_owned"},
+                {"$match": {"software_owned": {"$type": "string"}}}
+            ] + emit("product", "$software_owned", {"$sum": 1}, {"$sum": 0})
+        ]
+
+    async def _ensure_built(self):
+        """Build the rollups on first use after deployment"""
+        if self._built:
+            return
+        async with self._bootstrap_lock:
+            if self._built:
+                return
+            state = await self.db.analytics_rollup_state.find_one({"_id": STATE_ID}) or {}
+            if not state.get("last_full_rebuild_at"):
+                await self.rebuild()
+            self._built = True
+
+
+# Shared instance used by the customer endpoints and the background task manager
+analytics_rollups = AnalyticsRollupEngine(db)
@@ -0,0 +1,320 @@
+"""
+Customer Mind IQ - Audience Engine
+Compiles campaign segment definitions into MongoDB filters, streams recipients in batches
+and snapshots resolved audiences so sends are reproducible and resumable
+"""
+
+from typing import Dict, Any, List, Optional, AsyncIterator, Iterable
+from datetime import datetime, timedelta
+import json
+import re
+
+from pymongo import ASCENDING, UpdateOne
+
+from modules.index_registry import index_registry
+
+declare_index = index_registry.module(__name__)
+declare_index("campaign_audience_members", [("campaign_id", 1), ("member_id", 1)], unique=True)
+declare_index("campaign_audience_snapshots", "campaign_id", unique=True)
+
+
+# Where each audience source lives and how members are identified/projected
+AUDIENCE_SOURCES = {
+    "users": {
+        "collection": "users",
+        "id_field": "user_id",
+        "base_filter": {"is_active": True},
+        "fields": {
+            "email": "$email",
+            "name": "$first_name",
+            "subscription_tier": "$subscription_tier"
+        }
+    },
+    "customers": {
+        "collection": "customers",
+        "id_field": "customer_id",
+        "base_filter": {},
+        "fields": {
+            "email": "$email",
+            "name": "$name",
+            "phone_number": {"$ifNull": ["$phone_number", "$phone"]},
+            "push_tokens": {"$ifNull": ["$push_tokens", []]},
+            "opt_outs": {"$ifNull": ["$opt_outs", []]},
+            "timezone": {"$ifNull": ["$timezone", "UTC"]}
+        }
+    }
+}
+
+# Named segments that do not map onto a stored "segment" field
+SEGMENT_PRESETS = {
+    "all_users": {},
+    "all_customers": {},
+    "everyone": {},
+}
+
+RULE_OPERATORS = {
+    "eq": lambda value: value,
+    "ne": lambda value: {"$ne": value},
+    "in": lambda value: {"$in": list(value)},
+    "nin": lambda value: {"$nin": list(value)},
+    "gt": lambda value: {"$gt": value},
+    "gte": lambda value: {"$gte": value},
+    "lt": lambda value: {"$lt": value},
+    "lte": lambda value: {"$lte": value},
+    "exists": lambda value: {"$exists": bool(value)},
+    "contains": lambda value: {"$regex": re.escape(str(value)), "$options": "i"},
+    "starts_with": lambda value: {"$regex": f"^{re.escape(str(value))}"},
+    "within_days": lambda value: {"$gte": datetime.utcnow() - timedelta(days=float(value))},
+    "older_than_days": lambda value: {"$lt": datetime.utcnow() - timedelta(days=float(value))},
+}
+
+FIELD_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*$")
+
+
+class AudienceDefinitionError(ValueError):
+    """Raised when a segment definition cannot be compiled"""
+
+
+class AudienceEngine:
+    """Resolves segment definitions against ``users``/``customers`` without materializing them.
+
+    Audiences are snapshotted server-side with an aggregation ``$merge`` into
+    ``campaign_audience_members`` (one document per campaign member) so the
+    application never holds the full list. Consumers page through a snapshot
+    with keyset pagination on ``member_id`` and can checkpoint their position
+    to resume after a restart.
+    """
+
+    def __init__(self, db, default_batch_size: int = 1000):
+        self.db = db
+        self.default_batch_size = default_batch_size
+
+    def compile_segment(self, segment: Optional[Dict[str, Any]], source: str = "customers") -> Dict[str, Any]:
+        """Translate a segment definition into a MongoDB filter.
+
+        Supported keys: ``segment`` (preset name or stored segment value),
+        ``subscription_tiers``, ``lifecycle_stages``, ``emails`` and ``rules``
+        (``[{"field", "op", "value"}]`` combined with ``match`` = all/any).
+        """
+        if source not in AUDIENCE_SOURCES:
+            raise AudienceDefinitionError(f"Unknown audience source: {source}")
+
+        segment = segment or {}
+        clauses: List[Dict[str, Any]] = []
+        base_filter = AUDIENCE_SOURCES[source]["base_filter"]
+        if base_filter:
+            clauses.append(dict(base_filter))
+
+        segment_name = segment.get("segment")
+        if segment_name and segment_name not in SEGMENT_PRESETS:
+            clauses.append({"segment": segment_name})
+
+        if segment.get("subscription_tiers"):
+            clauses.append({"subscription_tier": {"$in": [str(tier) for tier in segment["subscription_tiers"]]}})
+
+        if segment.get("lifecycle_stages"):
+            clauses.append({"lifecycle_stage": {"$in": list(segment["lifecycle_stages"])}})
+
+        if segment.get("emails"):
+            clauses.append({"email": {"$in": list(segment["emails"])}})
+
+        rules = segment.get("rules") or []
+        if rules:
+            compiled_rules = [self._compile_rule(rule) for rule in rules]
+            if segment.get("match", "all") == "any":
+                clauses.append({"$or": compiled_rules})
+            else:
+                clauses.extend(compiled_rules)
+
+        if not clauses:
+            return {}
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$and": clauses}
+
+    async def count(self, segment: Optional[Dict[str, Any]], source: str = "customers") -> int:
+        config = AUDIENCE_SOURCES[source]
+        return await self.db[config["collection"]].count_documents(self.compile_segment(segment, source))
+
+    async def stream(
+        self,
+        segment: Optional[Dict[str, Any]],
+        source: str = "customers",
+        batch_size: Optional[int] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield matching members in batches straight from an async cursor"""
+        batch_size = batch_size or self.default_batch_size
+        config = AUDIENCE_SOURCES[source]
+        cursor = self.db[config["collection"]].aggregate(
+            [{"$match": self._with_member_id(self.compile_segment(segment, source), config)},
+             {"$project": self._member_projection(config)}],
+            batchSize=batch_size
+        )
+
+        batch = []
+        async for member in cursor:
+            batch.append(member)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def snapshot(
+        self,
+        campaign_id: str,
+        segment: Optional[Dict[str, Any]],
+        source: str = "customers",
+        refresh: bool = False
+    ) -> Dict[str, Any]:
+        """Resolve the audience into ``campaign_audience_members`` once per campaign.
+
+        Re-running returns the existing snapshot unless ``refresh`` is set, so
+        retries and scheduled follow-up steps target exactly the same people.
+        """
+        existing = await self.db.campaign_audience_snapshots.find_one({"campaign_id": campaign_id}, {"_id": 0})
+        if existing and existing.get("status") == "ready" and not refresh:
+            return existing
+
+        if refresh:
+            await self.db.campaign_audience_members.delete_many({"campaign_id": campaign_id})
+
+        config = AUDIENCE_SOURCES[source]
+        compiled = self.compile_segment(segment, source)
+        await self._mark_snapshot(campaign_id, source, segment, compiled, "building")
+
+        pipeline = [
+            {"$match": self._with_member_id(compiled, config)},
+            {"$project": {
+                **self._member_projection(config),
+                "_id": {"$concat": [campaign_id, ":", {"$toString": f"${config['id_field']}"}]},
+                "campaign_id": {"$literal": campaign_id},
+                "snapshotted_at": {"$literal": datetime.utcnow()}
+            }},
+            {"$merge": {
+                "into": "campaign_audience_members",
+                "on": "_id",
+                "whenMatched": "keepExisting",
+                "whenNotMatched": "insert"
+            }}
+        ]
+        await self.db[config["collection"]].aggregate(pipeline).to_list(length=None)
+
+        member_count = await self.db.campaign_audience_members.count_documents({"campaign_id": campaign_id})
+        return await self._mark_snapshot(campaign_id, source, segment, compiled, "ready", member_count)
+
+    async def snapshot_members(self, campaign_id: str, members: Iterable[Dict[str, Any]], source: str = "explicit") -> Dict[str, Any]:
+        """Snapshot an explicit member list (custom recipient lists, single sends)"""
+        await self._mark_snapshot(campaign_id, source, None, {}, "building")
+
+        operations = []
+        for member in members:
+            member_id = str(member.get("member_id") or member.get("email"))
+            document = {
+                **member,
+                "_id": f"{campaign_id}:{member_id}",
+                "member_id": member_id,
+                "campaign_id": campaign_id,
+                "snapshotted_at": datetime.utcnow()
+            }
+            operations.append(UpdateOne({"_id": document["_id"]}, {"$setOnInsert": document}, upsert=True))
+            if len(operations) >= self.default_batch_size:
+                await self.db.campaign_audience_members.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await self.db.campaign_audience_members.bulk_write(operations, ordered=False)
+
+        member_count = await self.db.campaign_audience_members.count_documents({"campaign_id": campaign_id})
+        return await self._mark_snapshot(campaign_id, source, None, {}, "ready", member_count)
+
+    async def iter_snapshot(
+        self,
+        campaign_id: str,
+        batch_size: Optional[int] = None,
+        start_after: Optional[str] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Page through a snapshot in ``member_id`` order using keyset pagination"""
+        batch_size = batch_size or self.default_batch_size
+        last_member_id = start_after
+        while True:
+            query: Dict[str, Any] = {"campaign_id": campaign_id}
+            if last_member_id is not None:
+                query["member_id"] = {"$gt": last_member_id}
+            batch = await self.db.campaign_audience_members.find(query, {"_id": 0}) \
+                .sort("member_id", ASCENDING).limit(batch_size).to_list(length=batch_size)
+            if not batch:
+                return
+            yield batch
+            if len(batch) < batch_size:
+                return
+            last_member_id = batch[-1]["member_id"]
+
+    async def save_checkpoint(self, campaign_id: str, consumer: str, last_member_id: str, processed: int = 0,
+                              details: Optional[Dict[str, Any]] = None):
+        """Record how far a consumer (e.g. an email send or journey step) has progressed"""
+        await self.db.campaign_audience_snapshots.update_one(
+            {"campaign_id": campaign_id},
+            {
+                "$set": {
+                    f"checkpoints.{consumer}.last_member_id": last_member_id,
+                    f"checkpoints.{consumer}.updated_at": datetime.utcnow(),
+                    **{f"checkpoints.{consumer}.{name}": value for name, value in (details or {}).items()}
+                },
+                "$inc": {f"checkpoints.{consumer}.processed": processed}
+            }
+        )
+
+    async def get_checkpoint(self, campaign_id: str, consumer: str) -> Optional[Dict[str, Any]]:
+        snapshot = await self.db.campaign_audience_snapshots.find_one(
+            {"campaign_id": campaign_id}, {f"checkpoints.{consumer}": 1}
+        )
+        if not snapshot:
+            return None
+        return snapshot.get("checkpoints", {}).get(consumer)
+
+    def _compile_rule(self, rule: Dict[str, Any]) -> Dict[str, Any]:
+        field = rule.get("field", "")
+        operator = rule.get("op", "eq")
+        if not FIELD_NAME_PATTERN.match(field):
+            raise AudienceDefinitionError(f"Invalid field name in audience rule: {field!r}")
+        if operator not in RULE_OPERATORS:
+            raise AudienceDefinitionError(f"Unsupported audience rule operator: {operator}")
+        return {field: RULE_OPERATORS[operator](rule.get("value"))}
+
+    def _with_member_id(self, compiled: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+        has_id = {config["id_field"]: {"$exists": True, "$ne": None}}
+        return {"$and": [compiled, has_id]} if compiled else has_id
+
+    def _member_projection(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "_id": 0,
+            "member_id": {"$toString": f"${config['id_field']}"},
+            **config["fields"]
+        }
+
+    async def _mark_snapshot(
+        self,
+        campaign_id: str,
+        source: str,
+        segment: Optional[Dict[str, Any]],
+        compiled: Dict[str, Any],
+        status: str,
+        member_count: Optional[int] = None
+    ) -> Dict[str, Any]:
+        update = {
+            "campaign_id": campaign_id,
+            "source": source,
+            "segment": segment or {},
+            # Stored as JSON: operator keys are not valid document field names
+            "compiled_filter": json.dumps(compiled, default=str),
+            "status": status,
+            "updated_at": datetime.utcnow()
+        }
+        if member_count is not None:
+            update["member_count"] = member_count
+        await self.db.campaign_audience_snapshots.update_one(
+            {"campaign_id": campaign_id},
+            {"$set": update, "$setOnInsert": {"created_at": datetime.utcnow(), "checkpoints": {}}},
+            upsert=True
+        )
+        return update
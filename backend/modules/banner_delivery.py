@@ -0,0 +1,218 @@
+"""
+Customer Mind IQ - Banner Delivery
+In-memory delivery of active banners for /api/banners/active: the active set is loaded once per
+worker, re-derived at the next start/end boundary and reloaded on banner writes, with targeting
+through precomputed tier and email sets. Banner interactions are counted in a buffer that is
+flushed to MongoDB in aggregated batches
+"""
+
+import asyncio
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
+client = AsyncIOMotorClient(MONGO_URL)
+db = client[DB_NAME]
+
+# Writes made through another worker are picked up after this many seconds
+BANNER_CACHE_MAX_AGE = float(os.getenv("BANNER_CACHE_MAX_AGE", "30"))
+MAX_ACTIVE_BANNERS = 50
+FLUSH_INTERVAL_SECONDS = float(os.getenv("BANNER_TRACKING_FLUSH_INTERVAL", "5"))
+MAX_BUFFERED_EVENTS = 10000
+# Action -> banner counter field
+TRACKED_ACTIONS = {"view": "views", "click": "clicks", "dismiss": "dismissals"}
+# Dismissals used to be counted into f"{action}s"; migrate_legacy_counters folds them into dismissals
+LEGACY_DISMISSAL_FIELD = "dismisss"
+_JUST_AFTER = timedelta(microseconds=1)
+DUPLICATE_KEY = 11000
+
+
+def _value(item: Any) -> Any:
+    return getattr(item, "value", item)
+
+
+class DeliverableBanner:
+    """A banner document with its targeting as hash sets and its active window"""
+
+    __slots__ = ("doc", "users", "tiers", "start", "end")
+
+    def __init__(self, doc: Dict[str, Any]):
+        self.doc = doc
+        self.users: FrozenSet[str] = frozenset(doc.get("target_users") or ())
+        self.tiers: FrozenSet[str] = frozenset(_value(tier) for tier in doc.get("target_tiers") or ())
+        self.start: Optional[datetime] = doc.get("start_date")
+        self.end: Optional[datetime] = doc.get("end_date")
+
+    def live_at(self, now: datetime) -> bool:
+        return (self.start is None or self.start <= now) and (self.end is None or self.end >= now)
+
+    def targets(self, email: str, tier: str) -> bool:
+        return (not self.users or email in self.users) and (not self.tiers or tier in self.tiers)
+
+
+class BannerDeliveryCache:
+    """Serves the active banners of a user without a database query.
+
+    ``reload`` reads every active-status banner that has not ended yet,
+    including the ones scheduled to start later, sorted by priority. The
+    live subset (start <= now <= end, at most 50, like the previous query)
+    is re-derived in memory whenever ``now`` crosses the next start or end
+    date among them. Banner writes call ``invalidate()`` so this worker
+    reloads on the next request; other workers reload within
+    ``BANNER_CACHE_MAX_AGE`` seconds.
+    """
+
+    def __init__(self, db, max_age: float = BANNER_CACHE_MAX_AGE):
+        self.db = db
+        self.max_age = max_age
+        self._candidates: List[DeliverableBanner] = []
+        self._live: List[DeliverableBanner] = []
+        self._next_boundary: Optional[datetime] = None
+        self._loaded_at: Optional[float] = None
+        self._stale = True
+        self._lock = asyncio.Lock()
+        self.stats = {"served": 0, "reloads": 0, "boundary_refreshes": 0, "invalidations": 0}
+
+    def invalidate(self):
+        self._stale = True
+        self.stats["invalidations"] += 1
+
+    async def active_for(self, email: str, tier: Any) -> List[Dict[str, Any]]:
+        """Live banners targeting this user, highest priority first"""
+        now = datetime.utcnow()
+        if self._stale or self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+            await self.reload()
+        if self._next_boundary is not None and now >= self._next_boundary:
+            self._derive_live(now)
+            self.stats["boundary_refreshes"] += 1
+        self.stats["served"] += 1
+        tier = _value(tier)
+        return [banner.doc for banner in self._live if banner.targets(email, tier)]
+
+    async def reload(self):
+        async with self._lock:
+            if not self._stale and self._loaded_at is not None and time.monotonic() - self._loaded_at <= self.max_age:
+                return
+            # Cleared before the read so a write during it triggers another reload
+            self._stale = False
+            now = datetime.utcnow()
+            documents = await self.db.banners.find(
+                {"status": "active", "$or": [{"end_date": {"$gte": now}}, {"end_date": None}]},
+                {"_id": 0}
+            ).sort("priority", -1).to_list(length=None)
+            self._candidates = [DeliverableBanner(document) for document in documents]
+            self._loaded_at = time.monotonic()
+            self.stats["reloads"] += 1
+            self._derive_live(now)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "cached_banners": len(self._candidates),
+            "live_banners": len(self._live),
+            "next_boundary": self._next_boundary,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            **self.stats
+        }
+
+    def _derive_live(self, now: datetime):
+        self._candidates = [banner for banner in self._candidates if banner.end is None or banner.end >= now]
+        self._live = [banner for banner in self._candidates if banner.live_at(now)][:MAX_ACTIVE_BANNERS]
+        # An end date is inclusive, so the banner leaves just after it
+        upcoming = [banner.start for banner in self._candidates if banner.start and banner.start > now]
+        upcoming += [banner.end + _JUST_AFTER for banner in self._candidates if banner.end]
+        self._next_boundary = min(upcoming) if upcoming else None
+
+
+class BannerInteractionBuffer:
+    """Aggregates banner views, clicks and dismissals in memory.
+
+    ``flush`` writes one ``$inc`` per banner for all buffered counts and the
+    interaction log with one ``insert_many``. It runs periodically from the
+    background task manager and inline once ``MAX_BUFFERED_EVENTS`` events
+    are waiting.
+    """
+
+    def __init__(self, db, max_events: int = MAX_BUFFERED_EVENTS):
+        self.db = db
+        self.max_events = max_events
+        self._counts: Counter = Counter()
+        self._events: List[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+        self.stats = {"tracked": 0, "flushes": 0, "flushed_events": 0}
+
+    async def track(self, banner_id: str, action: str, user_id: str, tier: Any):
+        self._counts[(banner_id, action)] += 1
+        self._events.append({
+            "banner_id": banner_id,
+            "user_id": user_id,
+            "action": action,
+            "timestamp": datetime.utcnow(),
+            "user_tier": _value(tier)
+        })
+        self.stats["tracked"] += 1
+        if len(self._events) >= self.max_events:
+            await self.flush()
+
+    async def migrate_legacy_counters(self) -> int:
+        """Move dismissals counted under the old misspelled field onto ``dismissals``; safe to rerun"""
+        result = await self.db.banners.update_many(
+            {LEGACY_DISMISSAL_FIELD: {"$exists": True}},
+            [
+                {"$set": {"dismissals": {"$add": [{"$ifNull": ["$dismissals", 0]}, {"$ifNull": [f"${LEGACY_DISMISSAL_FIELD}", 0]}]}}},
+                {"$unset": LEGACY_DISMISSAL_FIELD}
+            ]
+        )
+        return result.modified_count
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            counts, events = self._counts, self._events
+            if not events:
+                return 0
+            self._counts, self._events = Counter(), []
+            per_banner: Dict[str, Dict[str, int]] = {}
+            for (banner_id, action), count in counts.items():
+                per_banner.setdefault(banner_id, {})[TRACKED_ACTIONS[action]] = count
+            # Empty when only the log of an earlier flush is being retried
+            if per_banner:
+                try:
+                    await self.db.banners.bulk_write(
+                        [UpdateOne({"banner_id": banner_id}, {"$inc": increments}) for banner_id, increments in per_banner.items()],
+                        ordered=False
+                    )
+                except Exception:
+                    # Put everything back so the next flush retries it
+                    self._counts.update(counts)
+                    self._events = events + self._events
+                    raise
+            try:
+                await self.db.banner_interactions.insert_many(events, ordered=False)
+            except BulkWriteError as e:
+                # Events stored by a partly failed earlier attempt keep their _id and collide harmlessly
+                details = e.details or {}
+                if details.get("writeConcernErrors") or any(error.get("code") != DUPLICATE_KEY for error in details.get("writeErrors", [])):
+                    self._events = events + self._events
+                    raise
+            except Exception:
+                # The counters are written; only the log is retried
+                self._events = events + self._events
+                raise
+            self.stats["flushes"] += 1
+            self.stats["flushed_events"] += len(events)
+            return len(events)
+
+    def pending(self) -> Tuple[int, int]:
+        return len(self._events), len(self._counts)
+
+
+# Shared instances used by the banner endpoints and the background flusher
+banner_delivery = BannerDeliveryCache(db)
+banner_interactions = BannerInteractionBuffer(db)
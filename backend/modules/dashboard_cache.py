@@ -0,0 +1,250 @@
+"""
+Customer Mind IQ - Dashboard Cache
+In-process response cache for heavy dashboard endpoints: TTLs with stale-while-revalidate,
+single-flight de-duplication of concurrent misses, event-driven invalidation hooks and
+per-route hit rate and recompute time statistics
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "60"))
+DEFAULT_STALE_TTL = float(os.getenv("DASHBOARD_CACHE_STALE_TTL", "300"))
+MAX_ENTRIES = int(os.getenv("DASHBOARD_CACHE_MAX_ENTRIES", "2048"))
+
+CacheKey = Tuple[str, Optional[str], str]
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    fresh_until: float
+    stale_until: float
+
+
+@dataclass
+class RouteStats:
+    hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    recomputes: int = 0
+    recompute_errors: int = 0
+    invalidations: int = 0
+    recompute_seconds: float = 0.0
+    max_recompute_seconds: float = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        requests = self.hits + self.stale_hits + self.misses + self.coalesced
+        return {
+            "requests": requests,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced_misses": self.coalesced,
+            "hit_rate": (self.hits + self.stale_hits) / requests if requests else 0.0,
+            "recomputes": self.recomputes,
+            "recompute_errors": self.recompute_errors,
+            "invalidations": self.invalidations,
+            "mean_recompute_ms": self.recompute_seconds * 1000 / self.recomputes if self.recomputes else 0.0,
+            "max_recompute_ms": self.max_recompute_seconds * 1000
+        }
+
+
+@dataclass
+class RoutePolicy:
+    ttl: float
+    stale_ttl: float
+    events: Set[str] = field(default_factory=set)
+
+
+class DashboardCache:
+    """Caches dashboard responses per (route, tenant, params).
+
+    A fresh entry is returned as is. Within ``stale_ttl`` after expiry the
+    stale entry is returned immediately and one background recompute is
+    started. Otherwise the caller computes; concurrent callers for the same
+    key await that single computation instead of starting their own, and
+    share its result or its exception. Errors are never cached.
+
+    Writes that change what a dashboard shows call ``notify(event, tenant)``;
+    every route registered for the event drops the tenant's entries and the
+    cross-tenant (``tenant=None``) ones. A computation of the route that
+    started before an invalidation is returned to its callers but not stored.
+    """
+
+    def __init__(self, default_ttl: float = DEFAULT_TTL, default_stale_ttl: float = DEFAULT_STALE_TTL, max_entries: int = MAX_ENTRIES):
+        self.default_ttl = default_ttl
+        self.default_stale_ttl = default_stale_ttl
+        self.max_entries = max_entries
+        self.enabled = os.getenv("DASHBOARD_CACHE_ENABLED", "true").lower() != "false"
+        self._entries: "OrderedDict[CacheKey, CacheEntry]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Task] = {}
+        self._generations: Dict[str, int] = {}
+        self._policies: Dict[str, RoutePolicy] = {}
+        self._stats: Dict[str, RouteStats] = {}
+
+    def register(self, route: str, ttl: Optional[float] = None, stale_ttl: Optional[float] = None, invalidated_by: Iterable[str] = ()):
+        policy = self._policies.setdefault(route, RoutePolicy(ttl or self.default_ttl, self.default_stale_ttl if stale_ttl is None else stale_ttl))
+        if ttl is not None:
+            policy.ttl = ttl
+        if stale_ttl is not None:
+            policy.stale_ttl = stale_ttl
+        policy.events.update(invalidated_by)
+        self._stats.setdefault(route, RouteStats())
+        return policy
+
+    async def get_or_compute(
+        self,
+        route: str,
+        compute: Callable[[], Awaitable[Any]],
+        tenant: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        policy = self._policies.get(route) or self.register(route)
+        stats = self._stats[route]
+        if not self.enabled:
+            return await compute()
+
+        key = (route, tenant, self._params_key(params))
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and now < entry.fresh_until:
+            stats.hits += 1
+            self._entries.move_to_end(key)
+            return entry.value
+        if entry and now < entry.stale_until:
+            stats.stale_hits += 1
+            if key not in self._inflight:
+                self._start(key, compute, policy, stats)
+            return entry.value
+
+        if key in self._inflight:
+            stats.coalesced += 1
+        else:
+            stats.misses += 1
+            self._start(key, compute, policy, stats)
+        # Shielded so a cancelled request does not cancel the computation other callers share
+        return await asyncio.shield(self._inflight[key])
+
+    def notify(self, event: str, tenant: Optional[str] = None) -> int:
+        """Invalidate every route registered for ``event``; returns the number of entries dropped"""
+        dropped = 0
+        for route, policy in self._policies.items():
+            if event in policy.events:
+                dropped += self.invalidate(route, tenant)
+        return dropped
+
+    def invalidate(self, route: Optional[str] = None, tenant: Optional[str] = None) -> int:
+        """Drop cached entries of a route (all routes if None) for ``tenant`` and the cross-tenant view"""
+        routes = [route] if route else list(self._policies)
+        tenants = None if tenant is None else {tenant, None}
+        dropped = 0
+        for name in routes:
+            for key in [key for key in self._entries if key[0] == name and (tenants is None or key[1] in tenants)]:
+                del self._entries[key]
+                dropped += 1
+            # Computations of this route already running are returned but not stored
+            self._generations[name] = self._generations.get(name, 0) + 1
+            if name in self._stats:
+                self._stats[name].invalidations += 1
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        routes = {route: stats.summary() for route, stats in sorted(self._stats.items())}
+        for route, summary in routes.items():
+            policy = self._policies.get(route)
+            summary["ttl_seconds"] = policy.ttl if policy else self.default_ttl
+            summary["stale_ttl_seconds"] = policy.stale_ttl if policy else self.default_stale_ttl
+            summary["entries"] = sum(1 for key in self._entries if key[0] == route)
+            summary["invalidated_by"] = sorted(policy.events) if policy else []
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+            "routes": routes
+        }
+
+    def clear(self):
+        self._entries.clear()
+        for route in self._policies:
+            self._generations[route] = self._generations.get(route, 0) + 1
+
+    def cached(
+        self,
+        route: str,
+        ttl: Optional[float] = None,
+        stale_ttl: Optional[float] = None,
+        invalidated_by: Iterable[str] = (),
+        tenant_param: Optional[str] = None,
+        key_params: Iterable[str] = ()
+    ):
+        """Decorator for FastAPI endpoints; the key uses the named keyword arguments.
+
+        Dependencies such as authentication still run on every request, only
+        the endpoint body is cached.
+        """
+        self.register(route, ttl, stale_ttl, invalidated_by)
+        key_params = list(key_params)
+
+        def decorator(endpoint):
+            @functools.wraps(endpoint)
+            async def wrapper(*args, **kwargs):
+                tenant = kwargs.get(tenant_param) if tenant_param else None
+                params = {name: kwargs.get(name) for name in key_params}
+                return await self.get_or_compute(
+                    route, lambda: endpoint(*args, **kwargs),
+                    tenant=None if tenant is None else str(tenant), params=params
+                )
+            return wrapper
+        return decorator
+
+    def _start(self, key: CacheKey, compute: Callable[[], Awaitable[Any]], policy: RoutePolicy, stats: RouteStats):
+        generation = self._generations.get(key[0], 0)
+        task = asyncio.ensure_future(self._recompute(key, compute, policy, stats, generation))
+        self._inflight[key] = task
+        # Retrieve the exception of background refreshes nobody awaits
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    async def _recompute(self, key: CacheKey, compute: Callable[[], Awaitable[Any]], policy: RoutePolicy, stats: RouteStats, generation: int):
+        started = time.perf_counter()
+        try:
+            value = await compute()
+        except Exception as e:
+            stats.recompute_errors += 1
+            logger.warning(f"Dashboard cache recompute failed for {key[0]}: {e}")
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            elapsed = time.perf_counter() - started
+            stats.recomputes += 1
+            stats.recompute_seconds += elapsed
+            stats.max_recompute_seconds = max(stats.max_recompute_seconds, elapsed)
+
+        if self._generations.get(key[0], 0) == generation:
+            now = time.monotonic()
+            self._entries[key] = CacheEntry(value, now + policy.ttl, now + policy.ttl + policy.stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    @staticmethod
+    def _params_key(params: Optional[Dict[str, Any]]) -> str:
+        if not params:
+            return ""
+        return json.dumps(params, sort_keys=True, default=str)
+
+
+# Shared instance used by dashboard endpoints and write paths that invalidate them
+dashboard_cache = DashboardCache()
@@ -0,0 +1,78 @@
+"""
+Customer Mind IQ - Dashboard Composer
+Builds suite dashboards in-process: every module's dashboard function is awaited concurrently
+with its own timeout, and a failing or slow module yields an error marker instead of failing
+the whole dashboard
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+DEFAULT_MODULE_TIMEOUT = float(os.getenv("DASHBOARD_MODULE_TIMEOUT", "10"))
+
+
+@dataclass
+class DashboardSection:
+    """One module of a composed dashboard.
+
+    ``fetch`` is a zero-argument coroutine function, typically the module's
+    own dashboard endpoint function or a service method. ``fallback`` is
+    served (and marked as such) when the fetch fails or times out.
+    """
+    name: str
+    fetch: Callable[[], Awaitable[Any]]
+    timeout: Optional[float] = None
+    fallback: Any = None
+
+
+class DashboardComposer:
+    """Runs the sections of a suite dashboard concurrently in this process.
+
+    Replaces loopback HTTP calls to the app's own endpoints, which paid for
+    serialization, auth and a socket per module and could deadlock when all
+    workers were busy serving the outer request. Each section gets its own
+    timeout; the response always has every module, with
+    ``{"status": "error", ...}`` markers for the ones that failed, and a
+    ``sections`` summary with per-module status and latency.
+    """
+
+    def __init__(self, service: str, sections: List[DashboardSection], default_timeout: float = DEFAULT_MODULE_TIMEOUT):
+        self.service = service
+        self.sections = sections
+        self.default_timeout = default_timeout
+
+    async def compose(self) -> Dict[str, Any]:
+        outcomes = await asyncio.gather(*(self._run(section) for section in self.sections))
+        modules = {section.name: data for section, (data, _) in zip(self.sections, outcomes)}
+        sections = {section.name: meta for section, (_, meta) in zip(self.sections, outcomes)}
+        failed = [name for name, meta in sections.items() if meta["status"] != "ok"]
+        return {
+            "service": self.service,
+            "status": "success",
+            "partial": bool(failed),
+            "failed_modules": failed,
+            "modules": modules,
+            "sections": sections,
+            "timestamp": datetime.now()
+        }
+
+    async def _run(self, section: DashboardSection):
+        timeout = section.timeout or self.default_timeout
+        started = time.perf_counter()
+        try:
+            data = await asyncio.wait_for(section.fetch(), timeout=timeout)
+            return data, {"status": "ok", "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+        except asyncio.TimeoutError:
+            error, status = f"Timed out after {timeout:g}s", "timeout"
+        except Exception as e:
+            error, status = f"{type(e).__name__}: {getattr(e, 'detail', None) or e}", "error"
+
+        meta = {"status": status, "error": error, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+        if section.fallback is not None:
+            meta["fallback"] = True
+            return section.fallback, meta
+        return {"status": "error", "error": error}, meta
@@ -0,0 +1,468 @@
+"""
+Customer Mind IQ - Data Lifecycle
+Retention for the high-volume log and event collections: every complete day is rolled up into
+event_daily_rollups, days older than a collection's hot window are moved to a zstd-compressed
+archive collection or to JSONL.gz files, and TTL indexes expire raw events once they are rolled up
+"""
+
+import asyncio
+import gzip
+import logging
+import os
+import re
+import shutil
+import time as clock
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import json_util
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, CollectionInvalid
+
+from modules.index_registry import index_registry
+
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
+client = AsyncIOMotorClient(MONGO_URL)
+db = client[DB_NAME]
+
+DATA_LIFECYCLE_ENABLED = os.getenv("DATA_LIFECYCLE_ENABLED", "true").lower() != "false"
+ARCHIVE_DIR = Path(os.getenv("DATA_ARCHIVE_DIR", "/app/archive"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("DATA_ARCHIVE_BATCH_SIZE", "5000"))
+ARCHIVE_RETENTION_DAYS = int(os.getenv("DATA_ARCHIVE_RETENTION_DAYS", "730"))
+# The hot-collection TTL waits this long past the hot window, so the archiver gets there first
+TTL_GRACE_DAYS = int(os.getenv("DATA_LIFECYCLE_TTL_GRACE_DAYS", "14"))
+MAX_BACKFILL_DAYS = int(os.getenv("DATA_LIFECYCLE_BACKFILL_DAYS", "730"))
+ARCHIVE_COMPRESSOR = "zstd"
+ROLLUP_COLLECTION = "event_daily_rollups"
+DUPLICATE_KEY = 11000
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """How long one collection keeps raw events and where they go afterwards.
+
+    ``archive`` is "collection" (``<collection>_archive``), "file"
+    (JSONL.gz under ``ARCHIVE_DIR``) or None, in which case the TTL index
+    expires events once the hot window has passed and only the rollups
+    remain. Rollups count events per day and ``dimensions``, with
+    ``totals`` accumulators and the number of distinct ``distinct`` values.
+    """
+    collection: str
+    time_field: str
+    hot_days: int
+    archive: Optional[str] = "collection"
+    dimensions: Tuple[str, ...] = ()
+    distinct: Optional[str] = None
+    totals: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def archive_collection(self) -> str:
+        return f"{self.collection}_archive"
+
+    @property
+    def ttl_seconds(self) -> int:
+        return (self.hot_days + (TTL_GRACE_DAYS if self.archive else 0)) * 86400
+
+    def cutoff_day(self, today: date) -> date:
+        """The oldest day still kept hot; every earlier day is cold"""
+        return today - timedelta(days=self.hot_days)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "collection": self.collection,
+            "time_field": self.time_field,
+            "hot_days": self.hot_days,
+            "archive": self.archive,
+            "archive_target": (self.archive_collection if self.archive == "collection"
+                               else str(ARCHIVE_DIR / self.collection) if self.archive == "file" else None),
+            "ttl_days": self.ttl_seconds // 86400,
+            "rollup_dimensions": list(self.dimensions),
+            "rollup_distinct": self.distinct,
+            "rollup_totals": sorted(self.totals)
+        }
+
+
+# message deliveries are logged to channel_messages by the multi-channel orchestration
+RETENTION_POLICIES = [
+    RetentionPolicy("login_logs", "login_time", hot_days=90, dimensions=("success",), distinct="user_id"),
+    RetentionPolicy("click_tracking", "clicked_at", hot_days=365, dimensions=("affiliate_id", "utm_source"), distinct="session_id",
+                    totals={"conversions": {"$sum": {"$cond": ["$converted", 1, 0]}}}),
+    RetentionPolicy("email_logs", "sent_at", hot_days=365, archive="file", dimensions=("status", "method", "campaign_id")),
+    RetentionPolicy("channel_messages", "sent_time", hot_days=60, archive="file", dimensions=("channel", "status", "campaign_id"),
+                    distinct="customer_id", totals={"cost": {"$sum": "$cost"}}),
+    RetentionPolicy("variant_selections", "timestamp", hot_days=30, archive=None, dimensions=("test_id", "variant_id"))
+]
+# Chat transcripts, lead_activities (lead scores) and behavior_events (engagement history) are read
+# in full by their owners, so they stay out of the expiring policies
+
+
+# The TTL indexes of the hot collections are kept by sync_ttl: their expiry follows the archiver
+declare_index = index_registry.module(__name__)
+for _policy in RETENTION_POLICIES:
+    declare_index(_policy.collection, _policy.time_field, managed=True, expireAfterSeconds=_policy.ttl_seconds)
+    if _policy.archive == "collection":
+        declare_index(_policy.archive_collection, _policy.time_field, expireAfterSeconds=ARCHIVE_RETENTION_DAYS * 86400)
+declare_index(ROLLUP_COLLECTION, [("collection", 1), ("day", 1)])
+declare_index("data_lifecycle_runs", "started_at", expireAfterSeconds=90 * 86400)
+
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def rollup_pipeline(policy: RetentionPolicy, day: date, computed_at: datetime) -> List[Dict[str, Any]]:
+    """$group one day of raw events by the policy dimensions and $merge the summaries"""
+    start, end = day_bounds(day)
+    day_label = day.isoformat()
+    group: Dict[str, Any] = {"_id": {name: f"${name}" for name in policy.dimensions}, "count": {"$sum": 1}, **policy.totals}
+    summary: Dict[str, Any] = {
+        "_id": {"collection": policy.collection, "day": day_label, "dimensions": "$_id"},
+        "collection": {"$literal": policy.collection},
+        "day": {"$literal": day_label},
+        "dimensions": "$_id",
+        "count": 1,
+        **{name: 1 for name in policy.totals},
+        "computed_at": {"$literal": computed_at}
+    }
+    if policy.distinct:
+        group["distinct"] = {"$addToSet": f"${policy.distinct}"}
+        summary[f"distinct_{policy.distinct}"] = {"$size": "$distinct"}
+    return [
+        {"$match": {policy.time_field: {"$gte": start, "$lt": end}}},
+        {"$group": group},
+        {"$project": summary},
+        {"$merge": {"into": ROLLUP_COLLECTION, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+
+
+def archive_file_name(first_id: Any) -> str:
+    """Named after the first document of the batch, so a rerun after a crash overwrites instead of duplicating"""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(first_id)) + ".jsonl.gz"
+
+
+def write_archive_file(path: Path, documents: List[Dict[str, Any]]) -> int:
+    """Write documents as gzipped extended JSON lines, synced to disk before they are deleted"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".part")
+    lines = "".join(json_util.dumps(document, json_options=json_util.RELAXED_JSON_OPTIONS) + "\n" for document in documents)
+    with open(partial, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as handle:
+            handle.write(lines.encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(partial, path)
+    return path.stat().st_size
+
+
+def read_archive_file(path: Path) -> List[Dict[str, Any]]:
+    with gzip.open(path, "rt", encoding="utf-8") as handle:
+        return [json_util.loads(line) for line in handle if line.strip()]
+
+
+class DataLifecycleEngine:
+    """Applies the retention policies.
+
+    Each complete day is rolled up once it ends. When a day leaves the hot
+    window it is rolled up again (picking up late updates such as click
+    conversions), copied to its archive in batches and deleted from the hot
+    collection. Progress is kept per collection in ``data_lifecycle_state``,
+    so an interrupted run resumes with the day it was working on: documents
+    already copied are skipped as duplicates or their file is rewritten.
+
+    The TTL index on the time field expires what the archiver missed, such
+    as events that arrive for an already archived day. While days are still
+    waiting for their rollup or archive (a backlog on first rollout) its
+    expiry is raised to cover them and lowered to the policy once caught up.
+    """
+
+    def __init__(self, db, policies: List[RetentionPolicy] = RETENTION_POLICIES, archive_dir: Path = ARCHIVE_DIR,
+                 batch_size: int = ARCHIVE_BATCH_SIZE, max_backfill_days: int = MAX_BACKFILL_DAYS):
+        self.db = db
+        self.policies = {policy.collection: policy for policy in policies}
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.max_backfill_days = max_backfill_days
+        self._run_lock = asyncio.Lock()
+        self._archives_ready = set()
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    def policy(self, collection: str) -> RetentionPolicy:
+        if collection not in self.policies:
+            raise HTTPException(status_code=404, detail=f"No retention policy for {collection}")
+        return self.policies[collection]
+
+    async def ensure_archive_collections(self):
+        """Create the archive collections with block compression before anything else creates them"""
+        for policy in self.policies.values():
+            if policy.archive != "collection" or policy.collection in self._archives_ready:
+                continue
+            try:
+                await self.db.create_collection(
+                    policy.archive_collection,
+                    storageEngine={"wiredTiger": {"configString": f"block_compressor={ARCHIVE_COMPRESSOR}"}}
+                )
+            except CollectionInvalid:
+                pass
+            except Exception as e:
+                # zstd needs MongoDB 4.2+ on WiredTiger; fall back to the server's default compressor
+                logger.warning(f"Creating {policy.archive_collection} with {ARCHIVE_COMPRESSOR} failed: {str(e)}")
+                try:
+                    await self.db.create_collection(policy.archive_collection)
+                except CollectionInvalid:
+                    pass
+            self._archives_ready.add(policy.collection)
+
+    async def _state(self, policy: RetentionPolicy) -> Dict[str, Any]:
+        return await self.db.data_lifecycle_state.find_one({"_id": policy.collection}) or {}
+
+    async def _first_day(self, policy: RetentionPolicy) -> Optional[date]:
+        first = await self.db[policy.collection].find_one(
+            {policy.time_field: {"$type": "date"}}, {policy.time_field: 1}, sort=[(policy.time_field, 1)]
+        )
+        return first[policy.time_field].date() if first else None
+
+    async def _pending_day(self, policy: RetentionPolicy) -> Optional[date]:
+        """The oldest day whose raw events are still needed (not yet archived, or not yet rolled up)"""
+        state = await self._state(policy)
+        done = state.get("archived_through") if policy.archive else state.get("rolled_through")
+        if done:
+            return date.fromisoformat(done) + timedelta(days=1)
+        return await self._first_day(policy)
+
+    async def sync_ttl(self, policy: RetentionPolicy, today: date) -> int:
+        """Create or adjust the TTL index of a hot collection; returns its expiry in days"""
+        pending = await self._pending_day(policy)
+        days = policy.ttl_seconds // 86400
+        if pending:
+            days = max(days, (today - pending).days + TTL_GRACE_DAYS)
+        name = f"{policy.time_field}_1"
+        current = (await self.db[policy.collection].index_information()).get(name)
+        if current is None:
+            await self.db[policy.collection].create_index(policy.time_field, expireAfterSeconds=days * 86400)
+        elif current.get("expireAfterSeconds") != days * 86400:
+            # Also turns a plain index on the time field into a TTL index (MongoDB 5.1+)
+            await self.db.command("collMod", policy.collection, index={"name": name, "expireAfterSeconds": days * 86400})
+        return days
+
+    async def rollup_day(self, policy: RetentionPolicy, day: date) -> int:
+        """Recompute the daily summaries of one UTC day; returns the number of summary documents"""
+        day_label = day.isoformat()
+        await self.db[ROLLUP_COLLECTION].delete_many({"collection": policy.collection, "day": day_label})
+        await self.db[policy.collection].aggregate(
+            rollup_pipeline(policy, day, datetime.utcnow()), allowDiskUse=True
+        ).to_list(length=None)
+        return await self.db[ROLLUP_COLLECTION].count_documents({"collection": policy.collection, "day": day_label})
+
+    async def refresh_rollups(self, policy: RetentionPolicy, through: date) -> int:
+        """Roll up every complete day after the last rolled-up one; returns the number of days"""
+        state = await self._state(policy)
+        if state.get("rolled_through"):
+            since = date.fromisoformat(state["rolled_through"]) + timedelta(days=1)
+        else:
+            since = await self._first_day(policy) or through + timedelta(days=1)
+        day = max(since, through - timedelta(days=self.max_backfill_days))
+        processed = 0
+        while day <= through:
+            await self.rollup_day(policy, day)
+            await self.db.data_lifecycle_state.update_one(
+                {"_id": policy.collection},
+                {"$set": {"rolled_through": day.isoformat(), "updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+            processed += 1
+            day += timedelta(days=1)
+        return processed
+
+    async def _archive_batch(self, policy: RetentionPolicy, day: date, batch: List[Dict[str, Any]]) -> int:
+        if policy.archive == "collection":
+            written = 0
+            try:
+                await self.db[policy.archive_collection].insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Documents copied by an interrupted run are already in the archive
+                details = e.details or {}
+                if details.get("writeConcernErrors") or any(error.get("code") != DUPLICATE_KEY for error in details.get("writeErrors", [])):
+                    raise
+        else:
+            path = self.archive_dir / policy.collection / day.isoformat() / archive_file_name(batch[0]["_id"])
+            written = await asyncio.to_thread(write_archive_file, path, batch)
+        await self.db[policy.collection].delete_many({"_id": {"$in": [document["_id"] for document in batch]}})
+        return written
+
+    async def archive_day(self, policy: RetentionPolicy, day: date) -> Tuple[int, int]:
+        """Final rollup of a cold day, then move its raw events; returns (documents, file bytes)"""
+        await self.rollup_day(policy, day)
+        start, end = day_bounds(day)
+        cursor = self.db[policy.collection].find(
+            {policy.time_field: {"$gte": start, "$lt": end}}
+        ).sort(policy.time_field, 1).batch_size(self.batch_size)
+        moved, written, batch = 0, 0, []
+        async for document in cursor:
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                written += await self._archive_batch(policy, day, batch)
+                moved += len(batch)
+                batch = []
+        if batch:
+            written += await self._archive_batch(policy, day, batch)
+            moved += len(batch)
+        return moved, written
+
+    def _prune_files(self, policy: RetentionPolicy, today: date) -> int:
+        root = self.archive_dir / policy.collection
+        if not root.exists():
+            return 0
+        oldest = (today - timedelta(days=ARCHIVE_RETENTION_DAYS)).isoformat()
+        removed = 0
+        for directory in root.iterdir():
+            if directory.is_dir() and directory.name < oldest:
+                shutil.rmtree(directory)
+                removed += 1
+        return removed
+
+    async def run_policy(self, policy: RetentionPolicy, today: date) -> Dict[str, Any]:
+        # The time field index serves the rollup and archive queries; its TTL spares the backlog
+        await self.sync_ttl(policy, today)
+        result = {
+            "collection": policy.collection,
+            "days_rolled_up": await self.refresh_rollups(policy, today - timedelta(days=1)),
+            "days_archived": 0,
+            "documents_archived": 0,
+            "archive_bytes_written": 0
+        }
+        if not policy.archive:
+            result["ttl_days"] = await self.sync_ttl(policy, today)
+            return result
+
+        await self.ensure_archive_collections()
+        cutoff = policy.cutoff_day(today)
+        state = await self._state(policy)
+        if state.get("archived_through"):
+            day = date.fromisoformat(state["archived_through"]) + timedelta(days=1)
+        else:
+            day = await self._first_day(policy) or cutoff
+        while day < cutoff:
+            moved, written = await self.archive_day(policy, day)
+            await self.db.data_lifecycle_state.update_one(
+                {"_id": policy.collection},
+                {"$set": {"archived_through": day.isoformat(), "updated_at": datetime.utcnow()},
+                 "$inc": {"documents_archived": moved, "archive_bytes_written": written}},
+                upsert=True
+            )
+            result["days_archived"] += 1
+            result["documents_archived"] += moved
+            result["archive_bytes_written"] += written
+            day += timedelta(days=1)
+        if policy.archive == "file":
+            result["archive_days_pruned"] = await asyncio.to_thread(self._prune_files, policy, today)
+        result["ttl_days"] = await self.sync_ttl(policy, today)
+        return result
+
+    async def run(self, collection: Optional[str] = None) -> Dict[str, Any]:
+        """Apply one policy, or all of them; a failing collection does not stop the others"""
+        policies = [self.policy(collection)] if collection else list(self.policies.values())
+        async with self._run_lock:
+            started_at = datetime.utcnow()
+            started = clock.perf_counter()
+            collections = []
+            for policy in policies:
+                try:
+                    collections.append(await self.run_policy(policy, started_at.date()))
+                except Exception as e:
+                    logger.error(f"Data lifecycle failed for {policy.collection}: {str(e)}")
+                    collections.append({"collection": policy.collection, "error": str(e)})
+            report = {
+                "run_id": str(uuid.uuid4()),
+                "started_at": started_at,
+                "finished_at": datetime.utcnow(),
+                "duration_seconds": round(clock.perf_counter() - started, 2),
+                "documents_archived": sum(entry.get("documents_archived", 0) for entry in collections),
+                "collections": collections
+            }
+            await self.db.data_lifecycle_runs.insert_one(dict(report))
+            self.last_report = report
+            return report
+
+    async def _collection_stats(self, name: str) -> Dict[str, int]:
+        try:
+            stats = await self.db.command("collStats", name)
+        except Exception:
+            return {"documents": 0, "data_bytes": 0, "storage_bytes": 0, "index_bytes": 0}
+        return {
+            "documents": stats.get("count", 0),
+            "data_bytes": stats.get("size", 0),
+            "storage_bytes": stats.get("storageSize", 0),
+            "index_bytes": stats.get("totalIndexSize", 0)
+        }
+
+    async def working_set(self) -> Dict[str, Any]:
+        """Size of the hot collections and their indexes against the WiredTiger cache"""
+        try:
+            status = await self.db.command("serverStatus")
+            cache_bytes = status.get("wiredTiger", {}).get("cache", {}).get("maximum bytes configured")
+        except Exception:
+            cache_bytes = None
+        collections = []
+        for policy in self.policies.values():
+            entry = {"collection": policy.collection, **await self._collection_stats(policy.collection)}
+            if policy.archive == "collection":
+                entry["archive"] = await self._collection_stats(policy.archive_collection)
+            collections.append(entry)
+        hot_bytes = sum(entry["data_bytes"] + entry["index_bytes"] for entry in collections)
+        return {
+            "cache_bytes": cache_bytes,
+            "hot_bytes": hot_bytes,
+            "hot_fraction_of_cache": round(hot_bytes / cache_bytes, 3) if cache_bytes else None,
+            "collections": collections
+        }
+
+    async def status(self) -> Dict[str, Any]:
+        states = {state["_id"]: state for state in await self.db.data_lifecycle_state.find({}).to_list(length=None)}
+        last_run = self.last_report or await self.db.data_lifecycle_runs.find_one({}, {"_id": 0}, sort=[("started_at", -1)])
+        policies = []
+        for policy in self.policies.values():
+            state = states.get(policy.collection, {})
+            policies.append({
+                **policy.describe(),
+                "rolled_through": state.get("rolled_through"),
+                "archived_through": state.get("archived_through"),
+                "documents_archived": state.get("documents_archived", 0)
+            })
+        return {"policies": policies, "working_set": await self.working_set(), "last_run": last_run}
+
+    async def daily(self, collection: str, start: date, end: date) -> List[Dict[str, Any]]:
+        """Daily summaries of a collection between two days (inclusive)"""
+        self.policy(collection)
+        return await self.db[ROLLUP_COLLECTION].find(
+            {"collection": collection, "day": {"$gte": start.isoformat(), "$lte": end.isoformat()}}, {"_id": 0}
+        ).sort("day", 1).to_list(length=None)
+
+    async def archived_summary(self, collection: str, group_by: str,
+                               filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Rollup totals per ``group_by`` value over the days already archived out of a hot collection.
+
+        Readers that span more than the hot window add these to their query over the raw events.
+        """
+        policy = self.policy(collection)
+        through = (await self._state(policy)).get("archived_through")
+        if not policy.archive or not through:
+            return []
+        match = {"collection": collection, "day": {"$lte": through},
+                 **{f"dimensions.{name}": value for name, value in (filters or {}).items()}}
+        return await self.db[ROLLUP_COLLECTION].aggregate([
+            {"$match": match},
+            {"$group": {"_id": f"$dimensions.{group_by}", "count": {"$sum": "$count"},
+                        **{name: {"$sum": f"${name}"} for name in policy.totals}}}
+        ]).to_list(length=None)
+
+
+# Shared instance used by the background lifecycle task and the admin data lifecycle endpoints
+data_lifecycle = DataLifecycleEngine(db)
@@ -0,0 +1,346 @@
+"""
+Customer Mind IQ - Discount Analytics
+Discount ROI for /api/admin/discounts/roi-tracking from daily per-discount rollups: each bucket
+holds use and revenue totals plus a mergeable distinct-user sketch, so any date range is answered
+by summing buckets, with partial days and today filled in by a $group-on-user pipeline
+"""
+
+import asyncio
+import hashlib
+import math
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from bson import Binary
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, ReplaceOne
+
+from modules.index_registry import index_registry
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
+client = AsyncIOMotorClient(MONGO_URL)
+db = client[DB_NAME]
+
+STATE_ID = "discount_roi"
+ESTIMATED_PLAN_PRICE = 149.0  # used to value percentage and free-month discounts, as before
+ESTIMATED_COST_RATIO = 0.3
+MAX_BACKFILL_DAYS = int(os.getenv("DISCOUNT_ROLLUP_BACKFILL_DAYS", "730"))
+
+# Distinct users: exact 64-bit hash sets up to SPARSE_LIMIT users, HyperLogLog registers beyond
+SKETCH_PRECISION = 12
+SKETCH_REGISTERS = 1 << SKETCH_PRECISION
+SPARSE_LIMIT = 512
+_HASH_BITS = 64 - SKETCH_PRECISION
+_HASH_MASK = (1 << 64) - 1
+
+declare_index = index_registry.module(__name__)
+declare_index("discount_usage", [("applied_at", 1), ("discount_id", 1)])
+declare_index("discount_daily_rollups", [("day", 1), ("discount_id", 1)])
+
+# Estimated revenue impact of one usage record
+REVENUE_EXPRESSION = {"$switch": {
+    "branches": [
+        {"case": {"$eq": ["$discount_type", "percentage"]},
+         "then": {"$multiply": [ESTIMATED_PLAN_PRICE, {"$divide": ["$discount_amount", 100]}]}},
+        {"case": {"$eq": ["$discount_type", "fixed_amount"]}, "then": "$discount_amount"}
+    ],
+    "default": {"$multiply": [ESTIMATED_PLAN_PRICE, "$discount_amount"]}
+}}
+
+
+def user_hash(user_id: Any) -> int:
+    return int.from_bytes(hashlib.blake2b(str(user_id).encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class UserSketch:
+    """Mergeable distinct-user counter.
+
+    Holds the exact set of user hashes while it is small and switches to
+    HyperLogLog registers (about 1.6% standard error) above
+    ``SPARSE_LIMIT``. Merging two sketches gives the sketch of the union, so
+    daily buckets add up to any range without double-counting users.
+    """
+
+    __slots__ = ("hashes", "registers")
+
+    def __init__(self, hashes: Optional[Set[int]] = None, registers: Optional[np.ndarray] = None):
+        self.hashes = set() if hashes is None and registers is None else hashes
+        self.registers = registers
+
+    @property
+    def exact(self) -> bool:
+        return self.registers is None
+
+    def add(self, user_id: Any):
+        self.add_hash(user_hash(user_id))
+
+    def add_hash(self, value: int):
+        if self.registers is None:
+            self.hashes.add(value)
+            if len(self.hashes) > SPARSE_LIMIT:
+                self._densify()
+        else:
+            self._set_register(value)
+
+    def merge(self, other: "UserSketch") -> "UserSketch":
+        if self.registers is None and other.registers is None:
+            self.hashes |= other.hashes
+            if len(self.hashes) > SPARSE_LIMIT:
+                self._densify()
+            return self
+        if self.registers is None:
+            self._densify()
+        if other.registers is None:
+            for value in other.hashes:
+                self._set_register(value)
+        else:
+            np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        if self.registers is None:
+            return len(self.hashes)
+        estimate = 0.7213 / (1 + 1.079 / SKETCH_REGISTERS) * SKETCH_REGISTERS ** 2 / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * SKETCH_REGISTERS and zeros:
+            estimate = SKETCH_REGISTERS * math.log(SKETCH_REGISTERS / zeros)
+        return int(round(estimate))
+
+    def to_doc(self) -> Dict[str, Any]:
+        if self.registers is None:
+            # BSON integers are signed
+            return {"user_hashes": [value - (1 << 64) if value >= 1 << 63 else value for value in self.hashes], "registers": None}
+        return {"user_hashes": None, "registers": Binary(self.registers.tobytes())}
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "UserSketch":
+        if doc.get("registers") is not None:
+            return cls(registers=np.frombuffer(bytes(doc["registers"]), dtype=np.uint8).copy())
+        return cls(hashes={value & _HASH_MASK for value in doc.get("user_hashes") or []})
+
+    def _densify(self):
+        self.registers = np.zeros(SKETCH_REGISTERS, dtype=np.uint8)
+        for value in self.hashes:
+            self._set_register(value)
+        self.hashes = None
+
+    def _set_register(self, value: int):
+        index = value >> _HASH_BITS
+        rank = _HASH_BITS - (value & ((1 << _HASH_BITS) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+
+class DiscountTotals:
+    __slots__ = ("total_uses", "revenue_impact", "users")
+
+    def __init__(self):
+        self.total_uses = 0
+        self.revenue_impact = 0.0
+        self.users = UserSketch()
+
+    def merge(self, other: "DiscountTotals"):
+        self.total_uses += other.total_uses
+        self.revenue_impact += other.revenue_impact
+        self.users.merge(other.users)
+
+
+def split_range(start: datetime, end: datetime, last_complete_day: Optional[date]) -> Tuple[Optional[Tuple[date, date]], List[Tuple[datetime, datetime, bool]]]:
+    """Split ``[start, end]`` into whole rolled-up days and live segments.
+
+    Returns ``((first_day, last_day) or None, [(from, to, to_inclusive), ...])``:
+    days entirely inside the range and no later than ``last_complete_day``
+    come from the rollups, the partial days at either edge and the days not
+    rolled up yet are aggregated live.
+    """
+    first_day = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+    last_day = end.date() - timedelta(days=1)
+    if last_complete_day is not None:
+        last_day = min(last_day, last_complete_day)
+    if last_complete_day is None or first_day > last_day:
+        return None, [(start, end, True)]
+
+    live = []
+    bucket_start = datetime.combine(first_day, time.min)
+    bucket_end = datetime.combine(last_day + timedelta(days=1), time.min)
+    if start < bucket_start:
+        live.append((start, bucket_start, False))
+    if bucket_end <= end:
+        live.append((bucket_end, end, True))
+    return (first_day, last_day), live
+
+
+def roi_row(discount_id: str, name: str, total_uses: int, unique_users: int, revenue_impact: float, exact: bool = True) -> Dict[str, Any]:
+    # Estimated acquisition cost (simplified)
+    estimated_cost = revenue_impact * ESTIMATED_COST_RATIO
+    roi_percentage = ((revenue_impact - estimated_cost) / estimated_cost * 100) if estimated_cost > 0 else 0
+    return {
+        "discount_name": name,
+        "discount_id": discount_id,
+        "total_uses": total_uses,
+        "unique_users": unique_users,
+        "unique_users_exact": exact,
+        "revenue_impact": round(revenue_impact, 2),
+        "estimated_cost": round(estimated_cost, 2),
+        "roi_percentage": round(roi_percentage, 2),
+        "cost_per_acquisition": round(estimated_cost / unique_users, 2) if unique_users > 0 else 0
+    }
+
+
+def sort_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    rows.sort(key=lambda row: (row["roi_percentage"], row["revenue_impact"], row["total_uses"]), reverse=True)
+    return rows
+
+
+class DiscountAnalyticsEngine:
+    """Maintains ``discount_daily_rollups``: one document per discount and UTC
+    day with ``total_uses``, ``revenue_impact`` and a ``UserSketch``.
+
+    ``refresh`` rolls up every day after the last complete one, recording it
+    in ``discount_rollup_state``. It only runs from the background refresher,
+    never inside a request. ``roi`` sums the buckets of a range and aggregates
+    the partial edge days, days not rolled up yet and today live; before the
+    first backfill has finished it answers like ``roi_exact``. ``roi_exact``
+    answers from ``discount_usage`` alone with a single ``$group`` (on
+    discount and user, then discount) + ``$lookup`` pipeline.
+    """
+
+    def __init__(self, db, max_backfill_days: int = MAX_BACKFILL_DAYS):
+        self.db = db
+        self.max_backfill_days = max_backfill_days
+        self._refresh_lock = asyncio.Lock()
+
+    async def refresh_day(self, day: date) -> int:
+        """Recompute the buckets of one UTC day; returns the number of discounts used that day"""
+        start = datetime.combine(day, time.min)
+        totals = await self._aggregate_live([(start, start + timedelta(days=1), False)])
+        computed_at = datetime.utcnow()
+        operations = [
+            ReplaceOne({"_id": f"{discount_id}|{day.isoformat()}"}, {
+                "discount_id": discount_id,
+                "day": start,
+                "total_uses": bucket.total_uses,
+                "revenue_impact": bucket.revenue_impact,
+                "unique_users": bucket.users.count(),
+                **bucket.users.to_doc(),
+                "computed_at": computed_at
+            }, upsert=True)
+            for discount_id, bucket in totals.items()
+        ]
+        if operations:
+            await self.db.discount_daily_rollups.bulk_write(operations, ordered=False)
+        # Discounts with usage in an earlier run of this day but none now
+        await self.db.discount_daily_rollups.delete_many({"day": start, "computed_at": {"$lt": computed_at}})
+        return len(operations)
+
+    async def refresh(self, through: Optional[date] = None, since: Optional[date] = None) -> Dict[str, Any]:
+        """Roll up every complete day after the last rolled-up one (through yesterday by default)"""
+        async with self._refresh_lock:
+            yesterday = datetime.utcnow().date() - timedelta(days=1)
+            through = min(through or yesterday, yesterday)
+            state = await self.db.discount_rollup_state.find_one({"_id": STATE_ID}) or {}
+            if since is None:
+                if state.get("last_complete_day"):
+                    since = date.fromisoformat(state["last_complete_day"]) + timedelta(days=1)
+                else:
+                    since = await self._first_usage_day(through)
+            since = max(since, through - timedelta(days=self.max_backfill_days))
+
+            processed = 0
+            day = since
+            while day <= through:
+                await self.refresh_day(day)
+                processed += 1
+                day += timedelta(days=1)
+
+            last_complete = max(through.isoformat(), state.get("last_complete_day", ""))
+            await self.db.discount_rollup_state.update_one(
+                {"_id": STATE_ID},
+                {"$set": {"last_complete_day": last_complete, "refreshed_at": datetime.utcnow()}},
+                upsert=True
+            )
+            return {"days_processed": processed, "last_complete_day": last_complete}
+
+    async def roi(self, start: datetime, end: datetime) -> Dict[str, Any]:
+        """ROI per discount for ``start <= applied_at <= end`` from rollups plus live edges"""
+        state = await self.db.discount_rollup_state.find_one({"_id": STATE_ID})
+        if not state or not state.get("last_complete_day"):
+            # The background refresher is still building the first backfill
+            return {**await self.roi_exact(start, end), "rollups_pending": True}
+
+        # Days the refresher has not reached yet are aggregated live by split_range
+        last_complete = date.fromisoformat(state["last_complete_day"])
+        days, live_segments = split_range(start, end, last_complete)
+        totals = await self._aggregate_live(live_segments) if live_segments else {}
+        bucket_count = 0
+        if days:
+            cursor = self.db.discount_daily_rollups.find(
+                {"day": {"$gte": datetime.combine(days[0], time.min), "$lte": datetime.combine(days[1], time.min)}},
+                {"_id": 0, "computed_at": 0, "day": 0}
+            )
+            async for bucket in cursor:
+                bucket_count += 1
+                entry = totals.setdefault(bucket["discount_id"], DiscountTotals())
+                entry.total_uses += bucket["total_uses"]
+                entry.revenue_impact += bucket["revenue_impact"]
+                entry.users.merge(UserSketch.from_doc(bucket))
+
+        names = {}
+        if totals:
+            async for discount in self.db.discounts.find({"discount_id": {"$in": list(totals)}}, {"_id": 0, "discount_id": 1, "name": 1}):
+                names[discount["discount_id"]] = discount["name"]
+        rows = [
+            roi_row(discount_id, names[discount_id], entry.total_uses, entry.users.count(), entry.revenue_impact, entry.users.exact)
+            for discount_id, entry in totals.items() if discount_id in names
+        ]
+        return {
+            "roi_tracking": sort_rows(rows),
+            "source": "rollups",
+            "rollup_days": (days[1] - days[0]).days + 1 if days else 0,
+            "rollup_buckets": bucket_count,
+            "live_segments": [{"from": segment[0], "to": segment[1]} for segment in live_segments],
+            "rolled_through": state["last_complete_day"]
+        }
+
+    async def roi_exact(self, start: datetime, end: datetime) -> Dict[str, Any]:
+        """Exact ROI straight from discount_usage in one pipeline"""
+        pipeline = [
+            {"$match": {"applied_at": {"$gte": start, "$lte": end}}},
+            # Distinct users without $addToSet: one group per (discount, user), then count the groups
+            {"$group": {"_id": {"discount_id": "$discount_id", "user_id": "$user_id"}, "uses": {"$sum": 1}, "revenue": {"$sum": REVENUE_EXPRESSION}}},
+            {"$group": {"_id": "$_id.discount_id", "total_uses": {"$sum": "$uses"}, "unique_users": {"$sum": 1}, "revenue_impact": {"$sum": "$revenue"}}},
+            {"$lookup": {"from": "discounts", "localField": "_id", "foreignField": "discount_id", "as": "discount"}},
+            {"$unwind": "$discount"},
+            {"$project": {"total_uses": 1, "unique_users": 1, "revenue_impact": 1, "name": "$discount.name"}}
+        ]
+        rows = [
+            roi_row(row["_id"], row["name"], row["total_uses"], row["unique_users"], row["revenue_impact"])
+            async for row in self.db.discount_usage.aggregate(pipeline, allowDiskUse=True)
+        ]
+        return {"roi_tracking": sort_rows(rows), "source": "live"}
+
+    async def _aggregate_live(self, segments: Iterable[Tuple[datetime, datetime, bool]]) -> Dict[str, DiscountTotals]:
+        """Per-discount totals and user sketches for time segments, grouped by discount and user in Mongo"""
+        ranges = [{"applied_at": {"$gte": start, "$lte" if inclusive else "$lt": end}} for start, end, inclusive in segments]
+        pipeline = [
+            {"$match": ranges[0] if len(ranges) == 1 else {"$or": ranges}},
+            {"$group": {"_id": {"discount_id": "$discount_id", "user_id": "$user_id"}, "uses": {"$sum": 1}, "revenue": {"$sum": REVENUE_EXPRESSION}}}
+        ]
+        totals: Dict[str, DiscountTotals] = {}
+        async for row in self.db.discount_usage.aggregate(pipeline, allowDiskUse=True, batchSize=10000):
+            entry = totals.setdefault(row["_id"]["discount_id"], DiscountTotals())
+            entry.total_uses += row["uses"]
+            entry.revenue_impact += row["revenue"]
+            entry.users.add(row["_id"].get("user_id"))
+        return totals
+
+    async def _first_usage_day(self, through: date) -> date:
+        first = await self.db.discount_usage.find_one({"applied_at": {"$type": "date"}}, {"applied_at": 1}, sort=[("applied_at", ASCENDING)])
+        return first["applied_at"].date() if first else through
+
+
+# Shared instance used by the ROI endpoint and the background refresher
+discount_analytics = DiscountAnalyticsEngine(db)
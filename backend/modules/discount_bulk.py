@@ -0,0 +1,228 @@
+"""
+Customer Mind IQ - Bulk Discount Application
+Set-based discount application for /api/admin/discounts/{discount_id}/bulk-apply: eligible users
+come from one aggregation that anti-joins existing usage, usage records are written with unordered
+insert_many under a unique index, totals get a single $inc and large audiences run as tracked,
+resumable background jobs
+"""
+
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+
+from modules.index_registry import index_registry
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
+client = AsyncIOMotorClient(MONGO_URL)
+db = client[DB_NAME]
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_DISCOUNT_CHUNK_SIZE", "5000"))
+# Audiences above this size are always applied in the background
+BULK_SYNC_LIMIT = int(os.getenv("BULK_DISCOUNT_SYNC_LIMIT", "10000"))
+MAX_REPORTED_ERRORS = 100
+DUPLICATE_KEY = 11000
+
+declare_index = index_registry.module(__name__)
+declare_index("discount_usage", [("discount_id", 1), ("user_id", 1)], unique=True,
+              partialFilterExpression={"is_bulk_applied": True}, name="bulk_discount_user_unique")
+declare_index("discount_usage", [("user_id", 1), ("discount_id", 1)])
+declare_index("discount_usage", "bulk_job_id", sparse=True)
+declare_index("bulk_discount_jobs", "job_id", unique=True)
+declare_index("bulk_discount_jobs", [("discount_id", 1), ("created_at", -1)])
+
+
+def build_user_query(criteria: Dict[str, Any]) -> Dict[str, Any]:
+    user_query: Dict[str, Any] = {}
+    if criteria.get("subscription_tier"):
+        user_query["subscription_tier"] = criteria["subscription_tier"]
+    if criteria.get("registration_date_from"):
+        user_query.setdefault("created_at", {})["$gte"] = datetime.fromisoformat(criteria["registration_date_from"])
+    if criteria.get("registration_date_to"):
+        user_query.setdefault("created_at", {})["$lte"] = datetime.fromisoformat(criteria["registration_date_to"])
+    if criteria.get("is_active") is not None:
+        user_query["is_active"] = criteria["is_active"]
+    if criteria.get("email_contains"):
+        user_query["email"] = {"$regex": criteria["email_contains"], "$options": "i"}
+    return user_query
+
+
+def eligible_users_pipeline(discount_id: str, user_query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Users matching the criteria who have no usage record of the discount yet"""
+    return [
+        {"$match": user_query},
+        {"$project": {"_id": 0, "user_id": 1}},
+        {"$lookup": {
+            "from": "discount_usage",
+            "let": {"user_id": "$user_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$user_id", "$$user_id"]},
+                    {"$eq": ["$discount_id", discount_id]}
+                ]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 1}}
+            ],
+            "as": "existing_usage"
+        }},
+        {"$match": {"existing_usage": {"$size": 0}}},
+        {"$project": {"user_id": 1}}
+    ]
+
+
+def inserted_positions(error: BulkWriteError, batch_size: int) -> Tuple[List[int], List[Dict[str, Any]]]:
+    """Indexes of an unordered insert_many batch that were written, and the non-duplicate errors"""
+    failed = set()
+    errors = []
+    for write_error in error.details.get("writeErrors", []):
+        failed.add(write_error["index"])
+        if write_error.get("code") != DUPLICATE_KEY:
+            errors.append(write_error)
+    return [index for index in range(batch_size) if index not in failed], errors
+
+
+class BulkDiscountEngine:
+    """Applies a discount to every user matching a set of criteria.
+
+    The eligible set is streamed from a single aggregation on ``users`` that
+    anti-joins ``discount_usage``, so users who already have the discount are
+    filtered by the server. Usage records are inserted in unordered chunks;
+    a partial unique index on ``(discount_id, user_id)`` for bulk records
+    makes a re-run, a resumed job or two concurrent runs idempotent, with
+    duplicates counted as skipped. ``total_uses`` gets one ``$inc`` with the
+    number of records the job actually wrote.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def create_job(self, discount: Dict[str, Any], criteria: Dict[str, Any], reason: str, notify_users: bool, created_by: str) -> Dict[str, Any]:
+        user_query = build_user_query(criteria)
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "discount_id": discount["discount_id"],
+            "target_criteria": criteria,
+            "reason": reason,
+            "notify_users": notify_users,
+            "status": "queued",
+            "total_eligible": await self.db.users.count_documents(user_query),
+            "processed_count": 0,
+            "applied_count": 0,
+            "skipped_count": 0,
+            "failed_count": 0,
+            "failed_applications": [],
+            "created_by": created_by,
+            "created_at": datetime.utcnow()
+        }
+        await self.db.bulk_discount_jobs.insert_one(dict(job))
+        job.pop("_id", None)
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.bulk_discount_jobs.find_one({"job_id": job_id}, {"_id": 0})
+
+    async def list_jobs(self, discount_id: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        query = {"discount_id": discount_id} if discount_id else {}
+        return await self.db.bulk_discount_jobs.find(query, {"_id": 0}).sort("created_at", -1).to_list(length=limit)
+
+    async def run_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Apply (or resume applying) a job's discount; returns the finished job document.
+
+        Safe to call again on a failed or interrupted job: users done by the
+        earlier attempt no longer pass the anti-join, and the final ``$inc``
+        counts every record tagged with the job exactly once.
+        """
+        job = await self.get_job(job_id)
+        if not job or job["status"] == "completed":
+            return job
+        discount = await self.db.discounts.find_one({"discount_id": job["discount_id"]})
+        if not discount:
+            await self._finish(job_id, "failed", error="Discount not found")
+            return await self.get_job(job_id)
+
+        await self.db.bulk_discount_jobs.update_one(
+            {"job_id": job_id}, {"$set": {"status": "running", "started_at": datetime.utcnow()}, "$unset": {"error": ""}}
+        )
+        try:
+            pipeline = eligible_users_pipeline(job["discount_id"], build_user_query(job["target_criteria"]))
+            cursor = self.db.users.aggregate(pipeline, allowDiskUse=True, batchSize=BULK_CHUNK_SIZE)
+            batch: List[str] = []
+            async for user in cursor:
+                batch.append(user["user_id"])
+                if len(batch) >= BULK_CHUNK_SIZE:
+                    await self._apply_chunk(job, discount, batch)
+                    batch = []
+            if batch:
+                await self._apply_chunk(job, discount, batch)
+        except Exception as e:
+            print(f"Bulk discount job {job_id} failed: {e}")
+            await self._finish(job_id, "failed", error=str(e))
+            return await self.get_job(job_id)
+
+        applied = await self.db.discount_usage.count_documents({"bulk_job_id": job_id})
+        # Only the run that completes the job applies the totals
+        if await self._finish(job_id, "completed", applied_count=applied):
+            await self.db.discounts.update_one(
+                {"discount_id": job["discount_id"]},
+                {"$inc": {"total_uses": applied}, "$set": {"updated_at": datetime.utcnow()}}
+            )
+        return await self.get_job(job_id)
+
+    async def _apply_chunk(self, job: Dict[str, Any], discount: Dict[str, Any], user_ids: List[str]):
+        now = datetime.utcnow()
+        records = [{
+            "usage_id": str(uuid.uuid4()),
+            "discount_id": discount["discount_id"],
+            "user_id": user_id,
+            "applied_by": job["created_by"],
+            "applied_at": now,
+            "discount_amount": discount["value"],
+            "discount_type": discount["discount_type"],
+            "application_reason": job["reason"],
+            "is_bulk_applied": True,
+            "bulk_job_id": job["job_id"]
+        } for user_id in user_ids]
+
+        errors: List[Dict[str, Any]] = []
+        try:
+            await self.db.discount_usage.insert_many(records, ordered=False)
+            written = list(range(len(records)))
+        except BulkWriteError as e:
+            written, errors = inserted_positions(e, len(records))
+
+        applied_users = [user_ids[index] for index in written]
+        if job["notify_users"] and applied_users:
+            await self.db.notification_queue.insert_many([{
+                "user_id": user_id,
+                "type": "discount_applied",
+                "message": f"You've received a {discount['name']} discount!",
+                "discount_id": discount["discount_id"],
+                "created_at": now,
+                "status": "pending"
+            } for user_id in applied_users], ordered=False)
+
+        failed = [{"user_id": user_ids[error["index"]], "error": error.get("errmsg", "write error")} for error in errors]
+        update: Dict[str, Any] = {"$inc": {
+            "processed_count": len(user_ids),
+            "applied_count": len(applied_users),
+            "skipped_count": len(user_ids) - len(applied_users) - len(failed),
+            "failed_count": len(failed)
+        }}
+        if failed:
+            update["$push"] = {"failed_applications": {"$each": failed, "$slice": MAX_REPORTED_ERRORS}}
+        await self.db.bulk_discount_jobs.update_one({"job_id": job["job_id"]}, update)
+
+    async def _finish(self, job_id: str, status: str, **fields) -> bool:
+        fields.update({"status": status, "completed_at": datetime.utcnow()})
+        result = await self.db.bulk_discount_jobs.update_one(
+            {"job_id": job_id, "status": {"$ne": "completed"}}, {"$set": fields}
+        )
+        return result.modified_count == 1
+
+
+# Shared instance used by the bulk discount endpoints
+bulk_discounts = BulkDiscountEngine(db)
@@ -0,0 +1,351 @@
+"""
+Customer Mind IQ - Discount Codes
+Batched discount code minting: codes are generated in memory from a configurable alphabet and
+length, written with chunked unordered insert_many against a unique index where only colliding
+codes are regenerated, and each mint batch is tracked and downloadable as a stream. Redemption
+claims a use with one conditional update, so concurrent redemptions never exceed max_uses
+"""
+
+import os
+import secrets
+import string
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from modules.index_registry import index_registry
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
+client = AsyncIOMotorClient(MONGO_URL)
+db = client[DB_NAME]
+
+# Upper-case letters and digits without the look-alikes 0/O and 1/I
+DEFAULT_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+DEFAULT_CODE_LENGTH = int(os.getenv("DISCOUNT_CODE_LENGTH", "10"))
+DEFAULT_CODE_PREFIX = "CM"
+MINT_CHUNK_SIZE = int(os.getenv("DISCOUNT_CODE_CHUNK_SIZE", "10000"))
+MAX_MINT_COUNT = 2_000_000
+# Batches up to this size are minted inline and returned in the response
+CODE_RESPONSE_LIMIT = 1000
+MAX_COLLISION_ROUNDS = 20
+# Refuse batches that would fill more than this share of the code space
+MAX_SPACE_FILL = 0.5
+DUPLICATE_KEY = 11000
+EXHAUSTED_CACHE_TTL = float(os.getenv("DISCOUNT_EXHAUSTED_CACHE_TTL", "300"))
+EXHAUSTED_CACHE_SIZE = 10000
+
+_ALLOWED_SYMBOLS = set(string.ascii_letters + string.digits + "-_")
+
+declare_index = index_registry.module(__name__)
+declare_index("discount_codes", "code", unique=True)
+declare_index("discount_codes", "batch_id", sparse=True)
+declare_index("discount_codes", [("discount_id", 1), ("created_at", -1)])
+declare_index("discount_code_batches", "batch_id", unique=True)
+declare_index("discount_code_batches", [("discount_id", 1), ("created_at", -1)])
+declare_index("discount_usage", [("user_id", 1), ("discount_code", 1)], unique=True,
+              partialFilterExpression={"discount_code": {"$type": "string"}}, name="user_discount_code_unique")
+
+
+def validate_code_format(count: int, length: int, alphabet: str, prefix: str = ""):
+    """Raise ValueError when the format cannot hold ``count`` distinct codes comfortably"""
+    if len(set(alphabet)) != len(alphabet) or len(alphabet) < 2:
+        raise ValueError("Alphabet needs at least two distinct characters")
+    if not set(alphabet + prefix) <= _ALLOWED_SYMBOLS:
+        raise ValueError("Codes may only use letters, digits, '-' and '_'")
+    if not 4 <= length <= 32:
+        raise ValueError("Code length must be between 4 and 32")
+    if count > len(alphabet) ** length * MAX_SPACE_FILL:
+        raise ValueError(f"{count} codes do not fit {len(alphabet)}^{length} combinations without excessive collisions")
+
+
+def random_codes(count: int, length: int = DEFAULT_CODE_LENGTH, alphabet: str = DEFAULT_ALPHABET, prefix: str = "") -> List[str]:
+    """``count`` random codes (possibly repeating) from a CSPRNG, vectorized with numpy"""
+    if count <= 0:
+        return []
+    symbols = np.frombuffer(alphabet.encode("ascii"), dtype="S1")
+    size = len(symbols)
+    # Rejection sampling keeps every symbol equally likely
+    limit = 256 - 256 % size
+    needed = count * length
+    picks = np.empty(0, dtype=np.uint8)
+    while picks.size < needed:
+        raw = np.frombuffer(secrets.token_bytes(int((needed - picks.size) * 256 / limit) + 64), dtype=np.uint8)
+        picks = np.concatenate([picks, raw[raw < limit]])
+    codes = symbols[picks[:needed] % size].view(f"S{length}")
+    return [prefix + code.decode("ascii") for code in codes.tolist()]
+
+
+def unique_codes(count: int, length: int = DEFAULT_CODE_LENGTH, alphabet: str = DEFAULT_ALPHABET, prefix: str = "") -> List[str]:
+    """``count`` codes without repeats among themselves"""
+    codes = list(dict.fromkeys(random_codes(count, length, alphabet, prefix)))
+    while len(codes) < count:
+        seen = set(codes)
+        codes.extend(code for code in dict.fromkeys(random_codes(count - len(codes), length, alphabet, prefix)) if code not in seen)
+    return codes[:count]
+
+
+class DiscountCodeMinter:
+    """Mints batches of discount codes into ``discount_codes``.
+
+    Each batch is a ``discount_code_batches`` document with its format and
+    progress; every code carries the ``batch_id``. Codes are inserted in
+    unordered chunks against the unique ``code`` index and only the positions
+    rejected as duplicates are regenerated and retried, so a batch always
+    ends with exactly ``count`` new codes.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def create_batch(
+        self,
+        discount_id: str,
+        count: int,
+        created_by: str,
+        max_uses: Optional[int] = None,
+        expires_at: Optional[datetime] = None,
+        length: int = DEFAULT_CODE_LENGTH,
+        alphabet: str = DEFAULT_ALPHABET,
+        prefix: str = DEFAULT_CODE_PREFIX
+    ) -> Dict[str, Any]:
+        validate_code_format(count, length, alphabet, prefix)
+        batch = {
+            "batch_id": str(uuid.uuid4()),
+            "discount_id": discount_id,
+            "count": count,
+            "max_uses": max_uses,
+            "expires_at": expires_at,
+            "code_length": length,
+            "alphabet": alphabet,
+            "prefix": prefix,
+            "status": "queued",
+            "minted_count": 0,
+            "collisions_retried": 0,
+            "created_by": created_by,
+            "created_at": datetime.utcnow()
+        }
+        await self.db.discount_code_batches.insert_one(dict(batch))
+        return batch
+
+    async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.discount_code_batches.find_one({"batch_id": batch_id}, {"_id": 0})
+
+    async def list_batches(self, discount_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return await self.db.discount_code_batches.find(
+            {"discount_id": discount_id}, {"_id": 0}
+        ).sort("created_at", -1).to_list(length=limit)
+
+    async def mint(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Write the batch's codes; resuming a failed batch only mints the missing ones"""
+        batch = await self.get_batch(batch_id)
+        if not batch or batch["status"] == "completed":
+            return batch
+        await self.db.discount_code_batches.update_one(
+            {"batch_id": batch_id}, {"$set": {"status": "running", "started_at": datetime.utcnow()}, "$unset": {"error": ""}}
+        )
+        started = time.perf_counter()
+        try:
+            minted = await self.db.discount_codes.count_documents({"batch_id": batch_id})
+            while minted < batch["count"]:
+                size = min(MINT_CHUNK_SIZE, batch["count"] - minted)
+                written, retried = await self._insert_chunk(batch, size)
+                minted += written
+                await self.db.discount_code_batches.update_one(
+                    {"batch_id": batch_id}, {"$set": {"minted_count": minted}, "$inc": {"collisions_retried": retried}}
+                )
+        except Exception as e:
+            print(f"Discount code batch {batch_id} failed: {e}")
+            await self.db.discount_code_batches.update_one(
+                {"batch_id": batch_id}, {"$set": {"status": "failed", "error": str(e), "completed_at": datetime.utcnow()}}
+            )
+            return await self.get_batch(batch_id)
+
+        elapsed = time.perf_counter() - started
+        await self.db.discount_code_batches.update_one({"batch_id": batch_id}, {"$set": {
+            "status": "completed",
+            "minted_count": minted,
+            "seconds": round(elapsed, 3),
+            "codes_per_second": round(batch["count"] / elapsed, 1) if elapsed else None,
+            "completed_at": datetime.utcnow()
+        }})
+        return await self.get_batch(batch_id)
+
+    async def _insert_chunk(self, batch: Dict[str, Any], size: int):
+        """Insert ``size`` new codes, regenerating only the ones that collide; returns (written, retried)"""
+        now = datetime.utcnow()
+        codes = unique_codes(size, batch["code_length"], batch["alphabet"], batch["prefix"])
+        written, retried = 0, 0
+        for _ in range(MAX_COLLISION_ROUNDS):
+            documents = [{
+                "code_id": str(uuid.uuid4()),
+                "discount_id": batch["discount_id"],
+                "batch_id": batch["batch_id"],
+                "code": code,
+                "is_active": True,
+                "usage_count": 0,
+                "max_uses": batch["max_uses"],
+                "created_at": now,
+                "expires_at": batch["expires_at"],
+                "created_by": batch["created_by"]
+            } for code in codes]
+            try:
+                await self.db.discount_codes.insert_many(documents, ordered=False)
+                return written + len(documents), retried
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if any(error.get("code") != DUPLICATE_KEY for error in errors):
+                    raise
+                collided = {error["index"] for error in errors}
+                written += len(documents) - len(collided)
+                retried += len(collided)
+                taken = set(codes)
+                codes = [code for code in unique_codes(len(collided) * 2, batch["code_length"], batch["alphabet"], batch["prefix"])
+                         if code not in taken][:len(collided)]
+                if len(codes) < len(collided):
+                    codes.extend(unique_codes(len(collided) - len(codes), batch["code_length"], batch["alphabet"], batch["prefix"]))
+        raise RuntimeError(f"Codes still colliding after {MAX_COLLISION_ROUNDS} rounds; use a longer code or larger alphabet")
+
+    async def batch_rows(self, batch_id: str) -> AsyncIterator[Dict[str, Any]]:
+        cursor = self.db.discount_codes.find(
+            {"batch_id": batch_id}, {"_id": 0, "code": 1, "max_uses": 1, "expires_at": 1}, batch_size=MINT_CHUNK_SIZE
+        )
+        async for row in cursor:
+            yield row
+
+
+def redeemable_filter(code: str, now: datetime) -> Dict[str, Any]:
+    """Codes that are active, unexpired and below max_uses (None or 0 meaning unlimited)"""
+    return {
+        "code": code,
+        "is_active": True,
+        "$and": [
+            {"$or": [{"expires_at": None}, {"expires_at": {"$gt": now}}]},
+            {"$or": [{"max_uses": {"$in": [None, 0]}}, {"$expr": {"$lt": ["$usage_count", "$max_uses"]}}]}
+        ]
+    }
+
+
+class DiscountRedemptionEngine:
+    """Redeems discount codes without overshooting ``max_uses``.
+
+    A use is claimed by one ``find_one_and_update`` whose filter holds every
+    redeemability condition, so the usage counter can never pass the limit
+    however many requests race. A user who already redeemed the code is
+    turned away by an indexed lookup before claiming; the partial unique
+    index on ``(user_id, discount_code)`` backs that up when the same user
+    races themselves, and the extra claim is then released. A claim that
+    takes the last use marks the code exhausted in memory for
+    ``EXHAUSTED_CACHE_TTL`` seconds, so later attempts are rejected without a
+    database round trip while a popular code keeps being tried.
+    """
+
+    def __init__(self, db, exhausted_ttl: float = EXHAUSTED_CACHE_TTL):
+        self.db = db
+        self.exhausted_ttl = exhausted_ttl
+        self._exhausted: "OrderedDict[str, float]" = OrderedDict()
+        self.stats = {"redeemed": 0, "rejected": 0, "exhausted_cache_hits": 0, "released_claims": 0}
+
+    async def redeem(self, code: str, user_id: str) -> Dict[str, Any]:
+        """Redeem ``code`` for ``user_id``; returns the discount and usage record or raises HTTPException"""
+        if self._is_exhausted(code):
+            self.stats["exhausted_cache_hits"] += 1
+            self.stats["rejected"] += 1
+            raise HTTPException(status_code=400, detail="Discount code usage limit reached")
+
+        # A repeat redemption must not hold one of the code's uses, even briefly
+        if await self.db.discount_usage.find_one({"user_id": user_id, "discount_code": code}, {"_id": 1}):
+            self.stats["rejected"] += 1
+            raise HTTPException(status_code=400, detail="You have already used this discount code")
+
+        now = datetime.utcnow()
+        code_doc = await self.db.discount_codes.find_one_and_update(
+            redeemable_filter(code, now),
+            {"$inc": {"usage_count": 1}},
+            projection={"_id": 0, "discount_id": 1, "usage_count": 1, "max_uses": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not code_doc:
+            self.stats["rejected"] += 1
+            await self._raise_rejection(code, now)
+        if code_doc["max_uses"] and code_doc["usage_count"] >= code_doc["max_uses"]:
+            # This claim took the last use
+            self._remember_exhausted(code)
+
+        discount = await self.db.discounts.find_one(
+            {"discount_id": code_doc["discount_id"]}, {"_id": 0, "discount_id": 1, "name": 1, "discount_type": 1, "value": 1}
+        )
+        if not discount:
+            await self._release(code)
+            raise HTTPException(status_code=404, detail="Associated discount not found")
+
+        usage_record = {
+            "usage_id": str(uuid.uuid4()),
+            "discount_id": discount["discount_id"],
+            "discount_code": code,
+            "user_id": user_id,
+            "applied_at": now,
+            "discount_amount": discount["value"],
+            "discount_type": discount["discount_type"]
+        }
+        try:
+            await self.db.discount_usage.insert_one(dict(usage_record))
+        except DuplicateKeyError:
+            await self._release(code)
+            raise HTTPException(status_code=400, detail="You have already used this discount code")
+
+        await self.db.discounts.update_one({"discount_id": discount["discount_id"]}, {"$inc": {"total_uses": 1}})
+        self.stats["redeemed"] += 1
+        return {"discount": discount, "usage_record": usage_record}
+
+    def forget(self, code: Optional[str] = None):
+        """Drop a code (or every code) from the exhausted cache, e.g. after raising its max_uses"""
+        if code is None:
+            self._exhausted.clear()
+        else:
+            self._exhausted.pop(code, None)
+
+    async def _raise_rejection(self, code: str, now: datetime):
+        """Explain why the conditional claim matched nothing, with the previous messages"""
+        code_doc = await self.db.discount_codes.find_one({"code": code}, {"_id": 0})
+        if not code_doc:
+            raise HTTPException(status_code=404, detail="Invalid discount code")
+        if not code_doc["is_active"]:
+            raise HTTPException(status_code=400, detail="Discount code is no longer active")
+        if code_doc.get("expires_at") and now > code_doc["expires_at"]:
+            raise HTTPException(status_code=400, detail="Discount code has expired")
+        # Not cached: the limit may only be held by claims about to be released
+        raise HTTPException(status_code=400, detail="Discount code usage limit reached")
+
+    async def _release(self, code: str):
+        self.stats["released_claims"] += 1
+        self.forget(code)
+        await self.db.discount_codes.update_one({"code": code, "usage_count": {"$gt": 0}}, {"$inc": {"usage_count": -1}})
+
+    def _is_exhausted(self, code: str) -> bool:
+        expires = self._exhausted.get(code)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._exhausted[code]
+            return False
+        return True
+
+    def _remember_exhausted(self, code: str):
+        self._exhausted[code] = time.monotonic() + self.exhausted_ttl
+        self._exhausted.move_to_end(code)
+        while len(self._exhausted) > EXHAUSTED_CACHE_SIZE:
+            self._exhausted.popitem(last=False)
+
+
+# Shared instances used by the discount code endpoints
+discount_code_minter = DiscountCodeMinter(db)
+discount_redemptions = DiscountRedemptionEngine(db)
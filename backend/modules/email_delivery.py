@@ -0,0 +1,496 @@
+"""
+Customer Mind IQ - Email Campaign Delivery Pipeline
+Concurrent campaign delivery with provider batch APIs, bulk delivery logging,
+pause/resume checkpoints and live progress counters
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import smtplib
+import time
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Dict, Any, List, Optional, Tuple
+
+import aiohttp
+from pymongo.errors import BulkWriteError
+
+from modules.email_system import (
+    db,
+    audience_engine,
+    iter_campaign_recipients,
+    personalize_content,
+    EmailProvider,
+    EmailProviderConfig,
+    EmailRecipient,
+    EmailStatus,
+    RecipientType,
+    SimpleBulkEmail,
+)
+
+logger = logging.getLogger(__name__)
+
+# Provider endpoints (overridable so benchmarks can point at local stub servers)
+SENDGRID_API_URL = os.getenv("SENDGRID_API_URL", "https://api.sendgrid.com/v3/mail/send")
+MAILGUN_API_BASE = os.getenv("MAILGUN_API_BASE", "https://api.mailgun.net/v3")
+POSTMARK_API_BASE = os.getenv("POSTMARK_API_BASE", "https://api.postmarkapp.com")
+RESEND_API_URL = os.getenv("RESEND_API_URL", "https://api.resend.com/emails")
+
+# Largest batch each provider accepts in one API call
+PROVIDER_BATCH_LIMITS = {
+    EmailProvider.SENDGRID: 1000,   # personalizations per request
+    EmailProvider.MAILGUN: 1000,    # recipients per batch send
+    EmailProvider.POSTMARK: 500,    # messages per /email/batch
+}
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{ (\w+) \}\}")
+DUPLICATE_KEY = 11000
+
+# Live progress for campaigns being delivered by this worker
+campaign_progress: Dict[str, Dict[str, Any]] = {}
+
+
+class EmailDeliveryPipeline:
+    """Delivers a campaign's audience snapshot with a bounded pool of batch workers.
+
+    Each snapshot batch is rendered, sent through the provider's native batch
+    API when one exists (SendGrid personalizations, Mailgun batch sending,
+    Postmark /email/batch) or otherwise through a bounded per-recipient pool,
+    then logged with one ``insert_many``. Campaign counters are ``$inc``-ed per
+    batch and the audience checkpoint only advances past contiguous completed
+    batches, so a paused or crashed campaign resumes without re-sending.
+
+    A batch whose send or bookkeeping still fails after ``max_batch_retries``
+    jittered retries halts the run: later batches are not dispatched and the
+    campaign is left PAUSED with the checkpoint in front of the failed batch.
+    Batches that were already in flight are skipped on resume by their logs.
+    """
+
+    def __init__(
+        self,
+        provider_config: EmailProviderConfig,
+        batch_size: int = int(os.getenv("EMAIL_DELIVERY_BATCH_SIZE", "500")),
+        batch_workers: int = int(os.getenv("EMAIL_DELIVERY_WORKERS", "4")),
+        per_recipient_concurrency: int = int(os.getenv("EMAIL_DELIVERY_CONCURRENCY", "20")),
+        use_batch_api: bool = True,
+        max_batch_retries: int = int(os.getenv("EMAIL_DELIVERY_BATCH_RETRIES", "3")),
+        retry_backoff_seconds: float = 1.0
+    ):
+        self.provider_config = provider_config
+        self.batch_size = batch_size
+        self.batch_workers = batch_workers
+        self.per_recipient_concurrency = per_recipient_concurrency
+        self.use_batch_api = use_batch_api
+        self.max_batch_retries = max_batch_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.use_odoo = False
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._send_semaphore = asyncio.Semaphore(per_recipient_concurrency)
+
+    async def run(self, campaign_id: str, email_data: SimpleBulkEmail) -> Dict[str, Any]:
+        """Deliver the campaign from its last checkpoint; returns the final progress counters"""
+        progress = campaign_progress.setdefault(campaign_id, {
+            "campaign_id": campaign_id,
+            "sent": 0,
+            "failed": 0,
+            "batches_completed": 0,
+            "status": EmailStatus.SENDING.value,
+            "started_at": datetime.utcnow(),
+            "recipients_per_second": 0.0
+        })
+        progress["status"] = EmailStatus.SENDING.value
+        started = time.perf_counter()
+
+        self.use_odoo = await self._odoo_available()
+        checkpoint = await audience_engine.get_checkpoint(campaign_id, "email_send")
+        start_after = checkpoint.get("last_member_id") if checkpoint else None
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.batch_workers * 2)
+        completed: Dict[int, Tuple[str, int]] = {}
+        next_to_checkpoint = 0
+        checkpoint_lock = asyncio.Lock()
+        paused = asyncio.Event()
+        halted = asyncio.Event()
+        failed_batches: List[Tuple[int, str]] = []
+        # Batches in flight when an earlier run stopped may already be sent
+        recheck_batches = self.batch_workers if start_after else 0
+
+        async def advance_checkpoint(sequence: int, last_member_id: str, size: int):
+            nonlocal next_to_checkpoint
+            async with checkpoint_lock:
+                completed[sequence] = (last_member_id, size)
+                # Only move past batches that finished without gaps before them
+                while next_to_checkpoint in completed:
+                    member_id, batch_size = completed[next_to_checkpoint]
+                    await audience_engine.save_checkpoint(campaign_id, "email_send", member_id, batch_size)
+                    del completed[next_to_checkpoint]
+                    next_to_checkpoint += 1
+
+        async def deliver(sequence: int, batch: List[Tuple[str, EmailRecipient]]):
+            pending = batch
+            if sequence < recheck_batches:
+                pending = await self._retry(lambda: self._unsent(campaign_id, batch))
+            provider, results = await self._retry(lambda: self._send_batch(email_data, pending))
+            logs = self._batch_logs(campaign_id, email_data, provider, pending, results)
+            await self._retry(lambda: self._insert_logs(logs))
+
+            sent = sum(1 for result in results if result.get("success"))
+            failed = len(results) - sent
+            progress["sent"] += sent
+            progress["failed"] += failed
+            progress["batches_completed"] += 1
+            elapsed = time.perf_counter() - started
+            progress["recipients_per_second"] = round((progress["sent"] + progress["failed"]) / elapsed, 1) if elapsed else 0.0
+            await self._retry(lambda: db.email_campaigns.update_one(
+                {"campaign_id": campaign_id},
+                {
+                    "$inc": {"sent_count": sent, "failed_count": failed},
+                    "$set": {"progress": {k: v for k, v in progress.items() if k != "campaign_id"}}
+                }
+            ))
+            await self._retry(lambda: advance_checkpoint(sequence, batch[-1][0], len(batch)))
+
+        async def worker():
+            while True:
+                entry = await queue.get()
+                if entry is None:
+                    return
+                sequence, batch = entry
+                if halted.is_set():
+                    # Left for the resume, which starts at the failed batch
+                    continue
+                try:
+                    await deliver(sequence, batch)
+                except Exception as e:
+                    # The checkpoint stays behind this batch; stop dispatching the ones after it
+                    logger.error(f"Campaign {campaign_id} batch {sequence} failed after retries: {str(e)}")
+                    failed_batches.append((sequence, str(e)))
+                    halted.set()
+
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        workers = [asyncio.create_task(worker()) for _ in range(self.batch_workers)]
+        try:
+            sequence = 0
+            async for batch in iter_campaign_recipients(campaign_id, self.batch_size, start_after):
+                if not batch:
+                    continue
+                if halted.is_set():
+                    break
+                if await self._is_paused(campaign_id):
+                    paused.set()
+                    break
+                await queue.put((sequence, batch))
+                sequence += 1
+        finally:
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self._session.close()
+            self._session = None
+
+        if halted.is_set():
+            failed_sequence, error = min(failed_batches)
+            progress["status"] = EmailStatus.PAUSED.value
+            progress["halted_batch"] = failed_sequence
+            progress["error"] = error
+            await db.email_campaigns.update_one(
+                {"campaign_id": campaign_id},
+                {"$set": {
+                    "status": EmailStatus.PAUSED,
+                    "paused_at": datetime.utcnow(),
+                    "progress": {k: v for k, v in progress.items() if k != "campaign_id"}
+                }}
+            )
+        elif paused.is_set():
+            progress["status"] = EmailStatus.PAUSED.value
+        else:
+            campaign = await db.email_campaigns.find_one({"campaign_id": campaign_id}, {"sent_count": 1})
+            final_status = EmailStatus.SENT if (campaign or {}).get("sent_count", 0) > 0 else EmailStatus.FAILED
+            progress["status"] = final_status.value
+            progress["completed_at"] = datetime.utcnow()
+            progress.pop("halted_batch", None)
+            progress.pop("error", None)
+            await db.email_campaigns.update_one(
+                {"campaign_id": campaign_id},
+                {"$set": {"status": final_status, "progress": {k: v for k, v in progress.items() if k != "campaign_id"}}}
+            )
+        # Finished or paused campaigns are served from the persisted progress field
+        campaign_progress.pop(campaign_id, None)
+        return progress
+
+    async def __aenter__(self):
+        self.use_odoo = await self._odoo_available()
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+        self._session = None
+
+    async def send_message(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None) -> Dict[str, Any]:
+        """Send one already-rendered message (use inside ``async with pipeline``)"""
+        provider = EmailProvider.ODOO if self.use_odoo else self.provider_config.provider
+        message = SimpleBulkEmail(
+            subject=subject,
+            html_content=html_content,
+            text_content=text_content,
+            recipient_type=RecipientType.SINGLE_USER
+        )
+        result = await self._send_single(provider, message, EmailRecipient(email=to_email))
+        return {**result, "provider": provider.value}
+
+    async def _is_paused(self, campaign_id: str) -> bool:
+        campaign = await db.email_campaigns.find_one({"campaign_id": campaign_id}, {"status": 1})
+        return bool(campaign) and campaign.get("status") == EmailStatus.PAUSED
+
+    async def _odoo_available(self) -> bool:
+        """Check ODOO once per campaign instead of once per recipient"""
+        if self.provider_config.provider != EmailProvider.ODOO and os.getenv("EMAIL_PREFER_ODOO", "true").lower() != "true":
+            return False
+        try:
+            from modules.odoo_integration import odoo_integration
+            if not odoo_integration.connected:
+                await asyncio.to_thread(odoo_integration._connect)
+            return odoo_integration.connected
+        except Exception as e:
+            logger.warning(f"ODOO unavailable for campaign delivery: {str(e)}")
+            return False
+
+    async def _retry(self, operation):
+        """Run ``operation`` again with jittered exponential backoff until it succeeds or retries run out"""
+        attempt = 0
+        while True:
+            try:
+                return await operation()
+            except Exception as e:
+                if attempt >= self.max_batch_retries:
+                    raise
+                delay = random.uniform(0, self.retry_backoff_seconds * 2 ** attempt)
+                logger.warning(f"Email delivery step failed ({str(e)}), retrying in {delay:.2f}s")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def _unsent(self, campaign_id: str, batch: List[Tuple[str, EmailRecipient]]) -> List[Tuple[str, EmailRecipient]]:
+        """Drop recipients an interrupted run already sent this campaign to"""
+        emails = [recipient.email for _, recipient in batch]
+        sent = set(await db.email_logs.distinct("recipient_email", {
+            "campaign_id": campaign_id, "recipient_email": {"$in": emails}, "status": EmailStatus.SENT
+        }))
+        return [entry for entry in batch if entry[1].email not in sent]
+
+    async def _send_batch(self, email_data: SimpleBulkEmail, batch: List[Tuple[str, EmailRecipient]]) -> Tuple[EmailProvider, List[Dict[str, Any]]]:
+        recipients = [recipient for _, recipient in batch]
+        provider = EmailProvider.ODOO if self.use_odoo else self.provider_config.provider
+
+        try:
+            if not self.use_odoo and self.use_batch_api and provider in PROVIDER_BATCH_LIMITS:
+                results = await self._send_via_batch_api(provider, email_data, recipients)
+            else:
+                results = await asyncio.gather(*[
+                    self._send_single(provider, email_data, recipient) for recipient in recipients
+                ])
+        except Exception as e:
+            results = [{"success": False, "error": str(e)} for _ in recipients]
+        return provider, results
+
+    def _batch_logs(self, campaign_id: str, email_data: SimpleBulkEmail, provider: EmailProvider,
+                    batch: List[Tuple[str, EmailRecipient]], results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return [{
+            "campaign_id": campaign_id,
+            "recipient_email": recipient.email,
+            "subject": email_data.subject,
+            "status": EmailStatus.SENT if result.get("success") else EmailStatus.FAILED,
+            "provider": provider,
+            "provider_response": result.get("provider_response"),
+            "error": result.get("error"),
+            "sent_at": now
+        } for (_, recipient), result in zip(batch, results)]
+
+    async def _insert_logs(self, logs: List[Dict[str, Any]]):
+        if not logs:
+            return
+        try:
+            await db.email_logs.insert_many(logs, ordered=False)
+        except BulkWriteError as e:
+            # Logs written by a partly failed earlier attempt keep their _id and collide harmlessly
+            details = e.details or {}
+            if details.get("writeConcernErrors") or any(error.get("code") != DUPLICATE_KEY for error in details.get("writeErrors", [])):
+                raise
+
+    def _variables(self, email_data: SimpleBulkEmail, recipient: EmailRecipient) -> Dict[str, str]:
+        return {
+            "user_name": recipient.name or recipient.email.split("@")[0],
+            "user_email": recipient.email,
+            **email_data.variables,
+            **recipient.variables
+        }
+
+    async def _send_single(self, provider: EmailProvider, email_data: SimpleBulkEmail, recipient: EmailRecipient) -> Dict[str, Any]:
+        variables = self._variables(email_data, recipient)
+        html_content = personalize_content(email_data.html_content, variables)
+        text_content = personalize_content(email_data.text_content, variables) if email_data.text_content else None
+
+        async with self._send_semaphore:
+            try:
+                if provider == EmailProvider.ODOO:
+                    from modules.odoo_integration import odoo_integration
+                    success = await asyncio.to_thread(odoo_integration.send_email, recipient.email, email_data.subject, html_content)
+                    return {"success": success, "provider_response": "odoo_integration"}
+                if provider == EmailProvider.INTERNAL:
+                    return await self._send_smtp(recipient.email, email_data.subject, html_content, text_content)
+                if provider == EmailProvider.RESEND:
+                    payload = {
+                        "from": self._from_header(),
+                        "to": [recipient.email],
+                        "subject": email_data.subject,
+                        "html": html_content
+                    }
+                    if text_content:
+                        payload["text"] = text_content
+                    return await self._post_json(RESEND_API_URL, payload, {"Authorization": f"Bearer {self.provider_config.api_key}"}, "id")
+                if provider == EmailProvider.CUSTOM_API:
+                    payload = {
+                        "to": recipient.email,
+                        "from": self.provider_config.from_email,
+                        "from_name": self.provider_config.from_name,
+                        "subject": email_data.subject,
+                        "html_content": html_content,
+                        "text_content": text_content
+                    }
+                    headers = {"Authorization": f"Bearer {self.provider_config.api_key}"} if self.provider_config.api_key else {}
+                    return await self._post_json(self.provider_config.webhook_url, payload, headers, None)
+                # Batch-capable providers fall back to a batch of one
+                results = await self._send_via_batch_api(provider, email_data, [recipient])
+                return results[0]
+            except Exception as e:
+                return {"success": False, "error": f"{provider} exception: {str(e)}"}
+
+    async def _send_via_batch_api(self, provider: EmailProvider, email_data: SimpleBulkEmail, recipients: List[EmailRecipient]) -> List[Dict[str, Any]]:
+        limit = PROVIDER_BATCH_LIMITS[provider]
+        chunks = [recipients[i:i + limit] for i in range(0, len(recipients), limit)]
+        sender = {
+            EmailProvider.SENDGRID: self._sendgrid_batch,
+            EmailProvider.MAILGUN: self._mailgun_batch,
+            EmailProvider.POSTMARK: self._postmark_batch,
+        }[provider]
+        chunk_results = await asyncio.gather(*[sender(email_data, chunk) for chunk in chunks])
+        return [result for results in chunk_results for result in results]
+
+    async def _sendgrid_batch(self, email_data: SimpleBulkEmail, recipients: List[EmailRecipient]) -> List[Dict[str, Any]]:
+        """One request with a personalization (and substitutions) per recipient"""
+        def to_tags(content: str) -> str:
+            return PLACEHOLDER_PATTERN.sub(lambda match: f"-{match.group(1)}-", content)
+
+        payload = {
+            "personalizations": [{
+                "to": [{"email": recipient.email}],
+                "subject": email_data.subject,
+                "substitutions": {f"-{key}-": str(value) for key, value in self._variables(email_data, recipient).items()}
+            } for recipient in recipients],
+            "from": {"email": self.provider_config.from_email, "name": self.provider_config.from_name},
+            "content": [{"type": "text/html", "value": to_tags(email_data.html_content)}]
+        }
+        if email_data.text_content:
+            payload["content"].insert(0, {"type": "text/plain", "value": to_tags(email_data.text_content)})
+
+        async with self._session.post(SENDGRID_API_URL, json=payload, headers={"Authorization": f"Bearer {self.provider_config.api_key}"}) as response:
+            if response.status == 202:
+                message_id = response.headers.get("X-Message-Id")
+                return [{"success": True, "provider_response": message_id} for _ in recipients]
+            error = f"SendGrid error: {response.status} - {await response.text()}"
+        return [{"success": False, "error": error} for _ in recipients]
+
+    async def _mailgun_batch(self, email_data: SimpleBulkEmail, recipients: List[EmailRecipient]) -> List[Dict[str, Any]]:
+        """Mailgun batch sending with %recipient.<var>% substitution"""
+        def to_tags(content: str) -> str:
+            return PLACEHOLDER_PATTERN.sub(lambda match: f"%recipient.{match.group(1)}%", content)
+
+        data = aiohttp.FormData()
+        data.add_field("from", self._from_header())
+        for recipient in recipients:
+            data.add_field("to", recipient.email)
+        data.add_field("subject", email_data.subject)
+        data.add_field("html", to_tags(email_data.html_content))
+        if email_data.text_content:
+            data.add_field("text", to_tags(email_data.text_content))
+        data.add_field("recipient-variables", json.dumps({
+            recipient.email: {key: str(value) for key, value in self._variables(email_data, recipient).items()}
+            for recipient in recipients
+        }))
+
+        url = f"{MAILGUN_API_BASE}/{self.provider_config.domain}/messages"
+        async with self._session.post(url, data=data, auth=aiohttp.BasicAuth("api", self.provider_config.api_key or "")) as response:
+            if response.status == 200:
+                result = await response.json()
+                return [{"success": True, "provider_response": result.get("id")} for _ in recipients]
+            error = f"Mailgun error: {response.status} - {await response.text()}"
+        return [{"success": False, "error": error} for _ in recipients]
+
+    async def _postmark_batch(self, email_data: SimpleBulkEmail, recipients: List[EmailRecipient]) -> List[Dict[str, Any]]:
+        """Postmark /email/batch with fully rendered messages and per-message results"""
+        messages = []
+        for recipient in recipients:
+            variables = self._variables(email_data, recipient)
+            message = {
+                "From": self._from_header(),
+                "To": recipient.email,
+                "Subject": email_data.subject,
+                "HtmlBody": personalize_content(email_data.html_content, variables)
+            }
+            if email_data.text_content:
+                message["TextBody"] = personalize_content(email_data.text_content, variables)
+            messages.append(message)
+
+        headers = {"X-Postmark-Server-Token": self.provider_config.api_key or ""}
+        async with self._session.post(f"{POSTMARK_API_BASE}/email/batch", json=messages, headers=headers) as response:
+            if response.status == 200:
+                results = await response.json()
+                return [
+                    {"success": True, "provider_response": item.get("MessageID")} if item.get("ErrorCode", 0) == 0
+                    else {"success": False, "error": f"Postmark error: {item.get('ErrorCode')} - {item.get('Message')}"}
+                    for item in results
+                ]
+            error = f"Postmark error: {response.status} - {await response.text()}"
+        return [{"success": False, "error": error} for _ in recipients]
+
+    async def _post_json(self, url: str, payload: Dict[str, Any], headers: Dict[str, str], id_field: Optional[str]) -> Dict[str, Any]:
+        async with self._session.post(url, json=payload, headers=headers) as response:
+            if response.status in [200, 201, 202]:
+                if id_field:
+                    result = await response.json()
+                    return {"success": True, "provider_response": result.get(id_field)}
+                return {"success": True, "provider_response": await response.text()}
+            return {"success": False, "error": f"API error: {response.status} - {await response.text()}"}
+
+    async def _send_smtp(self, to_email: str, subject: str, html_content: str, text_content: Optional[str]) -> Dict[str, Any]:
+        """Send through SMTP_HOST when configured; otherwise keep the log-only fallback"""
+        smtp_host = os.getenv("SMTP_HOST")
+        if not smtp_host:
+            return {"success": True, "provider_response": "logged_for_smtp"}
+
+        message = MIMEMultipart("alternative")
+        message["Subject"] = subject
+        message["From"] = self._from_header()
+        message["To"] = to_email
+        if text_content:
+            message.attach(MIMEText(text_content, "plain"))
+        message.attach(MIMEText(html_content, "html"))
+
+        def send():
+            with smtplib.SMTP(smtp_host, int(os.getenv("SMTP_PORT", "25")), timeout=30) as server:
+                if os.getenv("SMTP_USERNAME"):
+                    server.starttls()
+                    server.login(os.getenv("SMTP_USERNAME"), os.getenv("SMTP_PASSWORD", ""))
+                server.sendmail(self.provider_config.from_email, [to_email], message.as_string())
+
+        await asyncio.to_thread(send)
+        return {"success": True, "provider_response": "smtp"}
+
+    def _from_header(self) -> str:
+        return f"{self.provider_config.from_name} <{self.provider_config.from_email}>"
@@ -21,6 +21,9 @@ from dotenv import load_dotenv
 
 # Import auth dependencies
 from auth.auth_system import get_current_user, require_role, UserRole, UserProfile, SubscriptionTier
+from modules.audience_engine import AudienceEngine
+from modules.index_registry import index_registry
+from modules.data_lifecycle import data_lifecycle, ROLLUP_COLLECTION
 
 # Load environment variables
 load_dotenv()
@@ -34,13 +37,26 @@ DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
 client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 
+declare_index = index_registry.module(__name__)
+declare_index("email_logs", [("status", 1), ("sent_at", -1)])
+declare_index("email_logs", "campaign_id")
+declare_index(ROLLUP_COLLECTION, [("dimensions.campaign_id", 1), ("day", 1)], partialFilterExpression={"collection": "email_logs"})
+declare_index("email_campaigns", "campaign_id")
+declare_index("email_campaigns", [("created_at", -1)])
+declare_index("trial_email_logs", [("email_type", 1), ("status", 1)])
+declare_index("trial_email_logs", "user_email")
+
 router = APIRouter(tags=["Email System"])
 
+# Campaign recipients are resolved into per-campaign audience snapshots
+audience_engine = AudienceEngine(db)
+
 # Enums
 class EmailStatus(str, Enum):
     DRAFT = "draft"
     QUEUED = "queued"
     SENDING = "sending"
+    PAUSED = "paused"
     SENT = "sent"
     FAILED = "failed"
     DELIVERED = "delivered"
@@ -130,6 +146,7 @@ class TrialEmailType(str, Enum):
 
 class TrialEmailStatus(str, Enum):
     SCHEDULED = "scheduled"
+    SENDING = "sending"   # Claimed by the trial email processor
     SENT = "sent"
     FAILED = "failed"
     SKIPPED = "skipped"  # User converted before email sent
@@ -190,56 +207,50 @@ async def get_email_provider_config() -> EmailProviderConfig:
         from_name="CustomerMind IQ"
     )
 
-async def get_recipients_by_type(recipient_type: RecipientType, **kwargs) -> List[EmailRecipient]:
-    """Get recipients based on type"""
-    recipients = []
+async def snapshot_recipients_by_type(campaign_id: str, recipient_type: RecipientType, **kwargs) -> int:
+    """Resolve recipients into the campaign's audience snapshot and return the recipient count"""
     
     if recipient_type == RecipientType.ALL_USERS:
         # Get all active users
-        users = await db.users.find({"is_active": True}).to_list(length=10000)
-        for user in users:
-            recipients.append(EmailRecipient(
-                email=user["email"],
-                name=user.get("first_name", ""),
-                user_id=user["user_id"]
-            ))
+        snapshot = await audience_engine.snapshot(campaign_id, {"segment": "all_users"}, source="users")
+        return snapshot.get("member_count", 0)
     
     elif recipient_type == RecipientType.SUBSCRIPTION_TIER:
         subscription_tiers = kwargs.get("subscription_tiers", [])
         if subscription_tiers:
-            users = await db.users.find({
-                "subscription_tier": {"$in": subscription_tiers},
-                "is_active": True
-            }).to_list(length=10000)
-            for user in users:
-                recipients.append(EmailRecipient(
-                    email=user["email"], 
-                    name=user.get("first_name", ""),
-                    user_id=user["user_id"]
-                ))
-    
-    elif recipient_type == RecipientType.CUSTOM_LIST:
-        custom_emails = kwargs.get("custom_emails", [])
-        for email in custom_emails:
-            # Try to find user info
-            user = await db.users.find_one({"email": email})
-            recipients.append(EmailRecipient(
-                email=email,
-                name=user.get("first_name", "") if user else "",
-                user_id=user.get("user_id") if user else None
-            ))
+            snapshot = await audience_engine.snapshot(
+                campaign_id,
+                {"subscription_tiers": [getattr(tier, "value", tier) for tier in subscription_tiers]},
+                source="users"
+            )
+            return snapshot.get("member_count", 0)
+        return 0
     
-    elif recipient_type == RecipientType.SINGLE_USER:
-        single_email = kwargs.get("single_email")
-        if single_email:
-            user = await db.users.find_one({"email": single_email})
-            recipients.append(EmailRecipient(
-                email=single_email,
-                name=user.get("first_name", "") if user else "",
-                user_id=user.get("user_id") if user else None
-            ))
+    elif recipient_type in [RecipientType.CUSTOM_LIST, RecipientType.SINGLE_USER]:
+        if recipient_type == RecipientType.CUSTOM_LIST:
+            emails = list(dict.fromkeys(kwargs.get("custom_emails") or []))
+        else:
+            emails = [kwargs["single_email"]] if kwargs.get("single_email") else []
+        if not emails:
+            return 0
+        
+        # One lookup for the whole list to pick up user info where available
+        users = {}
+        async for user in db.users.find({"email": {"$in": emails}}, {"email": 1, "first_name": 1, "user_id": 1}):
+            users[user["email"]] = user
+        
+        snapshot = await audience_engine.snapshot_members(campaign_id, [
+            {
+                "member_id": email,
+                "email": email,
+                "name": users.get(email, {}).get("first_name", ""),
+                "user_id": users.get(email, {}).get("user_id")
+            }
+            for email in emails
+        ])
+        return snapshot.get("member_count", 0)
     
-    return recipients
+    return 0
 
 def personalize_content(content: str, variables: Dict[str, str]) -> str:
     """Replace variables in content with actual values"""
@@ -496,15 +507,16 @@ async def send_simple_email(
         # Get email provider configuration
         provider_config = await get_email_provider_config()
         
-        # Get recipients based on type
-        recipients = await get_recipients_by_type(
+        # Snapshot recipients based on type (streamed server-side, never truncated)
+        recipient_count = await snapshot_recipients_by_type(
+            campaign_id,
             email_data.recipient_type,
             subscription_tiers=email_data.subscription_tiers,
             custom_emails=email_data.custom_emails,
             single_email=email_data.single_email
         )
         
-        if not recipients:
+        if not recipient_count:
             raise HTTPException(status_code=400, detail="No recipients found for the specified criteria")
         
         # Create campaign record
@@ -514,7 +526,7 @@ async def send_simple_email(
             "subject": email_data.subject,
             "html_content": email_data.html_content,
             "text_content": email_data.text_content,
-            "recipient_count": len(recipients),
+            "recipient_count": recipient_count,
             "sent_count": 0,
             "delivered_count": 0,
             "opened_count": 0,
@@ -524,7 +536,10 @@ async def send_simple_email(
             "provider": provider_config.provider,
             "created_at": datetime.utcnow(),
             "created_by": current_user.user_id,
-            "scheduled_at": email_data.schedule_at
+            "scheduled_at": email_data.schedule_at,
+            # Kept so a paused campaign can be resumed later
+            "recipient_type": email_data.recipient_type,
+            "variables": email_data.variables
         }
         
         await db.email_campaigns.insert_one(campaign)
@@ -534,9 +549,9 @@ async def send_simple_email(
             # Schedule for later
             return {
                 "status": "success",
-                "message": f"Email scheduled for {len(recipients)} recipients",
+                "message": f"Email scheduled for {recipient_count} recipients",
                 "campaign_id": campaign_id,
-                "recipient_count": len(recipients),
+                "recipient_count": recipient_count,
                 "scheduled_at": email_data.schedule_at
             }
         else:
@@ -544,16 +559,15 @@ async def send_simple_email(
             background_tasks.add_task(
                 process_email_campaign,
                 campaign_id,
-                recipients,
                 email_data,
                 provider_config
             )
             
             return {
                 "status": "success", 
-                "message": f"Email queued for {len(recipients)} recipients",
+                "message": f"Email queued for {recipient_count} recipients",
                 "campaign_id": campaign_id,
-                "recipient_count": len(recipients),
+                "recipient_count": recipient_count,
                 "provider": provider_config.provider
             }
     
@@ -564,12 +578,26 @@ async def send_simple_email(
         )
         raise HTTPException(status_code=500, detail=f"Failed to send email: {str(e)}")
 
-async def process_email_campaign(campaign_id: str, recipients: List[EmailRecipient], 
-                                email_data: SimpleBulkEmail, provider_config: EmailProviderConfig):
+async def iter_campaign_recipients(campaign_id: str, batch_size: int = 500, start_after: Optional[str] = None):
+    """Yield (member_id, EmailRecipient) batches from the campaign's audience snapshot"""
+    async for members in audience_engine.iter_snapshot(campaign_id, batch_size, start_after):
+        batch = []
+        for member in members:
+            if not member.get("email"):
+                continue
+            try:
+                batch.append((member["member_id"], EmailRecipient(
+                    email=member["email"],
+                    name=member.get("name") or "",
+                    user_id=member.get("user_id") or (member["member_id"] if member["member_id"] != member["email"] else None)
+                )))
+            except Exception as e:
+                logger.warning(f"Skipping invalid recipient {member.get('email')}: {str(e)}")
+        yield batch
+
+async def process_email_campaign(campaign_id: str, email_data: SimpleBulkEmail, provider_config: EmailProviderConfig):
     """Process email campaign sending (background task)"""
-    
-    sent_count = 0
-    failed_count = 0
+    from modules.email_delivery import EmailDeliveryPipeline
     
     # Update campaign status
     await db.email_campaigns.update_one(
@@ -577,76 +605,15 @@ async def process_email_campaign(campaign_id: str, recipients: List[EmailRecipie
         {"$set": {"status": EmailStatus.SENDING, "sent_at": datetime.utcnow()}}
     )
     
-    for recipient in recipients:
-        try:
-            # Personalize content
-            html_content = personalize_content(email_data.html_content, {
-                "user_name": recipient.name or recipient.email.split("@")[0],
-                "user_email": recipient.email,
-                **email_data.variables,
-                **recipient.variables
-            })
-            
-            text_content = None
-            if email_data.text_content:
-                text_content = personalize_content(email_data.text_content, {
-                    "user_name": recipient.name or recipient.email.split("@")[0],
-                    "user_email": recipient.email,
-                    **email_data.variables,
-                    **recipient.variables
-                })
-            
-            # Send email
-            result = await send_via_provider(
-                provider_config,
-                recipient.email,
-                email_data.subject,
-                html_content,
-                text_content
-            )
-            
-            # Log email result
-            email_log = {
-                "campaign_id": campaign_id,
-                "recipient_email": recipient.email,
-                "subject": email_data.subject,
-                "status": EmailStatus.SENT if result["success"] else EmailStatus.FAILED,
-                "provider": provider_config.provider,
-                "provider_response": result.get("provider_response"),
-                "error": result.get("error"),
-                "sent_at": datetime.utcnow()
-            }
-            
-            await db.email_logs.insert_one(email_log)
-            
-            if result["success"]:
-                sent_count += 1
-            else:
-                failed_count += 1
-                
-        except Exception as e:
-            failed_count += 1
-            # Log failed email
-            await db.email_logs.insert_one({
-                "campaign_id": campaign_id,
-                "recipient_email": recipient.email,
-                "status": EmailStatus.FAILED,
-                "error": str(e),
-                "sent_at": datetime.utcnow()
-            })
-    
-    # Update campaign final status
-    final_status = EmailStatus.SENT if sent_count > 0 else EmailStatus.FAILED
-    await db.email_campaigns.update_one(
-        {"campaign_id": campaign_id},
-        {
-            "$set": {
-                "status": final_status,
-                "sent_count": sent_count,
-                "failed_count": failed_count
-            }
-        }
-    )
+    try:
+        # Resumes after the last checkpointed batch if this campaign was interrupted
+        await EmailDeliveryPipeline(provider_config).run(campaign_id, email_data)
+    except Exception as e:
+        logger.error(f"Email campaign {campaign_id} delivery error: {str(e)}")
+        await db.email_campaigns.update_one(
+            {"campaign_id": campaign_id},
+            {"$set": {"status": EmailStatus.FAILED, "error": str(e)}}
+        )
 
 @router.get("/email/campaigns")
 async def get_email_campaigns(
@@ -682,8 +649,9 @@ async def get_campaign_details(
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
-    # Get email logs for this campaign
+    # Get email logs for this campaign; logs past the hot window only survive as daily rollups
     email_logs = await db.email_logs.find({"campaign_id": campaign_id}).sort("sent_at", -1).to_list(length=1000)
+    archived = await data_lifecycle.archived_summary("email_logs", "status", {"campaign_id": campaign_id})
     
     # Remove ObjectIds
     del campaign["_id"]
@@ -694,9 +662,82 @@ async def get_campaign_details(
     return {
         "campaign": campaign,
         "email_logs": email_logs,
-        "total_logs": len(email_logs)
+        "total_logs": len(email_logs),
+        "archived_status_counts": {row["_id"]: row["count"] for row in archived}
     }
 
+@router.get("/email/campaigns/{campaign_id}/progress")
+async def get_campaign_progress(
+    campaign_id: str,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Get live delivery progress for a campaign"""
+    from modules.email_delivery import campaign_progress
+    
+    campaign = await db.email_campaigns.find_one(
+        {"campaign_id": campaign_id},
+        {"_id": 0, "status": 1, "recipient_count": 1, "sent_count": 1, "failed_count": 1, "progress": 1}
+    )
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    # Prefer the in-process counters when this worker is delivering the campaign
+    progress = campaign_progress.get(campaign_id) or campaign.get("progress") or {}
+    processed = campaign.get("sent_count", 0) + campaign.get("failed_count", 0)
+    recipient_count = campaign.get("recipient_count", 0)
+    
+    return {
+        "campaign_id": campaign_id,
+        "status": campaign.get("status"),
+        "recipient_count": recipient_count,
+        "sent_count": campaign.get("sent_count", 0),
+        "failed_count": campaign.get("failed_count", 0),
+        "percent_complete": round(processed / recipient_count * 100, 1) if recipient_count else 0.0,
+        "recipients_per_second": progress.get("recipients_per_second", 0.0),
+        "batches_completed": progress.get("batches_completed", 0)
+    }
+
+@router.post("/email/campaigns/{campaign_id}/pause")
+async def pause_email_campaign(
+    campaign_id: str,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Pause a sending campaign after its in-flight batches complete"""
+    result = await db.email_campaigns.update_one(
+        {"campaign_id": campaign_id, "status": {"$in": [EmailStatus.QUEUED, EmailStatus.SENDING]}},
+        {"$set": {"status": EmailStatus.PAUSED, "paused_at": datetime.utcnow()}}
+    )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=400, detail="Campaign is not currently sending")
+    
+    return {"status": "success", "message": "Campaign will pause after in-flight batches", "campaign_id": campaign_id}
+
+@router.post("/email/campaigns/{campaign_id}/resume")
+async def resume_email_campaign(
+    campaign_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Resume a paused campaign from its last delivery checkpoint"""
+    campaign = await db.email_campaigns.find_one_and_update(
+        {"campaign_id": campaign_id, "status": EmailStatus.PAUSED},
+        {"$set": {"status": EmailStatus.SENDING, "resumed_at": datetime.utcnow()}}
+    )
+    if not campaign:
+        raise HTTPException(status_code=400, detail="Campaign is not paused")
+    
+    email_data = SimpleBulkEmail(
+        subject=campaign["subject"],
+        html_content=campaign["html_content"],
+        text_content=campaign.get("text_content"),
+        recipient_type=campaign.get("recipient_type", RecipientType.ALL_USERS),
+        variables=campaign.get("variables", {})
+    )
+    provider_config = await get_email_provider_config()
+    background_tasks.add_task(process_email_campaign, campaign_id, email_data, provider_config)
+    
+    return {"status": "success", "message": "Campaign resumed", "campaign_id": campaign_id}
+
 @router.post("/email/providers/configure")
 async def configure_email_provider(
     provider_config: EmailProviderConfig,
@@ -1144,6 +1185,7 @@ async def schedule_trial_email_sequence(user_email: str, user_id: str, first_nam
         }
         
         # Create email log entries for each email in the sequence
+        email_logs = []
         for email_type, send_time in email_schedule.items():
             template = TRIAL_EMAIL_TEMPLATES[email_type]
             
@@ -1175,12 +1217,18 @@ async def schedule_trial_email_sequence(user_email: str, user_id: str, first_nam
                 "updated_at": datetime.utcnow()
             }
             
-            # Store in database
-            await db.trial_email_logs.insert_one(email_log)
-            
-            # Send welcome email immediately
-            if email_type == TrialEmailType.WELCOME:
-                await send_trial_email_now(email_log["log_id"])
+            email_logs.append(email_log)
+        
+        # Store in database
+        await db.trial_email_logs.insert_many(email_logs)
+        
+        # Send welcome email immediately
+        welcome_log = next(log for log in email_logs if log["email_type"] == TrialEmailType.WELCOME.value)
+        await send_trial_email_now(welcome_log["log_id"])
+        
+        # Let the background processor re-plan its sleep around the new due times
+        from modules.trial_email_processor import trial_email_processor
+        trial_email_processor.notify_scheduled()
         
         logger.info(f"Trial email sequence scheduled successfully for {user_email}")
         return {"status": "success", "message": f"Trial email sequence scheduled for {user_email}"}
@@ -1191,9 +1239,11 @@ async def schedule_trial_email_sequence(user_email: str, user_id: str, first_nam
 
 async def send_trial_email_now(log_id: str):
     """Send a specific trial email immediately"""
+    from modules.trial_email_processor import trial_email_processor
+    
     try:
         # Get the email log
-        email_log = await db.trial_email_logs.find_one({"log_id": log_id})
+        email_log = await db.trial_email_logs.find_one({"log_id": log_id}, {"status": 1})
         if not email_log:
             raise HTTPException(status_code=404, detail="Email log not found")
         
@@ -1201,36 +1251,25 @@ async def send_trial_email_now(log_id: str):
         if email_log["status"] == TrialEmailStatus.SENT.value:
             return {"status": "already_sent", "message": "Email already sent"}
         
-        # Prepare email data
-        email_data = {
-            "subject": email_log["subject"],
-            "html_content": email_log["html_content"],
-            "text_content": "Please view this email in HTML format.",
-            "recipient_type": RecipientType.SINGLE_USER,
-            "single_email": email_log["user_email"],
-            "schedule_at": None,  # Send immediately
-            "variables": {}
-        }
-        
-        # Send the email using existing send system
-        result = await send_simple_email(SimpleBulkEmail(**email_data), background_tasks=None, current_user=None)
-        
-        # Update the log
-        update_data = {
-            "actual_send_time": datetime.utcnow(),
-            "status": TrialEmailStatus.SENT.value if result["status"] == "success" else TrialEmailStatus.FAILED.value,
-            "error_message": result.get("error") if result["status"] != "success" else None,
-            "updated_at": datetime.utcnow()
-        }
+        # Failed emails can be retried manually
+        if email_log["status"] == TrialEmailStatus.FAILED.value:
+            await db.trial_email_logs.update_one(
+                {"log_id": log_id, "status": TrialEmailStatus.FAILED.value},
+                {"$set": {"status": TrialEmailStatus.SCHEDULED.value}}
+            )
         
-        await db.trial_email_logs.update_one(
-            {"log_id": log_id},
-            {"$set": update_data}
-        )
+        # Send through the same claim/send/bulk-update path as scheduled emails
+        result = await trial_email_processor.send_now(log_id)
+        if result is None:
+            return {"status": "in_progress", "message": "Email is already being processed"}
+        if result["failed"]:
+            raise HTTPException(status_code=500, detail="Failed to send trial email")
         
         logger.info(f"Trial email sent successfully: {log_id}")
         return {"status": "success", "message": "Trial email sent successfully"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error sending trial email {log_id}: {str(e)}")
         # Update log with error
@@ -1247,39 +1286,12 @@ async def send_trial_email_now(log_id: str):
 # Background task to process scheduled trial emails
 async def process_scheduled_trial_emails():
     """Background task to send scheduled trial emails"""
+    from modules.trial_email_processor import trial_email_processor
+    
     try:
-        current_time = datetime.utcnow()
-        
-        # Find emails that are scheduled to be sent now or in the past
-        scheduled_emails = await db.trial_email_logs.find({
-            "status": TrialEmailStatus.SCHEDULED.value,
-            "scheduled_send_time": {"$lte": current_time}
-        }).to_list(length=None)
-        
-        for email_log in scheduled_emails:
-            # Check if user has already converted (skip remaining emails)
-            user = await db.users.find_one({"email": email_log["user_email"]})
-            if user and not user.get("is_trial", True):  # User is no longer on trial
-                # Mark remaining emails as skipped
-                await db.trial_email_logs.update_one(
-                    {"log_id": email_log["log_id"]},
-                    {"$set": {
-                        "status": TrialEmailStatus.SKIPPED.value,
-                        "error_message": "User converted before email was sent",
-                        "updated_at": datetime.utcnow()
-                    }}
-                )
-                logger.info(f"Skipped trial email for converted user: {email_log['user_email']}")
-                continue
-            
-            # Send the email
-            try:
-                await send_trial_email_now(email_log["log_id"])
-                logger.info(f"Processed scheduled trial email: {email_log['log_id']}")
-            except Exception as e:
-                logger.error(f"Failed to process trial email {email_log['log_id']}: {str(e)}")
-        
-        logger.info(f"Processed {len(scheduled_emails)} scheduled trial emails")
+        totals = await trial_email_processor.process_due()
+        logger.info(f"Processed scheduled trial emails: {totals}")
+        return totals
         
     except Exception as e:
         logger.error(f"Error processing scheduled trial emails: {str(e)}")
@@ -13,9 +13,12 @@ import random
 import statistics
 import math
 
+from modules.dashboard_cache import dashboard_cache
+
 executive_dashboard_router = APIRouter()
 
 @executive_dashboard_router.get("/dashboard")
+@dashboard_cache.cached("/api/executive/dashboard", ttl=300)
 async def get_executive_dashboard() -> Dict[str, Any]:
     """Get comprehensive executive dashboard with cross-module insights"""
     try:
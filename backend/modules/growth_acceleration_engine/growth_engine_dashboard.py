@@ -16,6 +16,7 @@ from dotenv import load_dotenv
 
 # Import auth dependencies for annual subscription requirement
 from auth.auth_system import require_annual_subscription, UserProfile
+from modules.dashboard_cache import dashboard_cache
 
 from .models import (
     GrowthDashboard,
@@ -484,6 +485,7 @@ growth_dashboard_router = APIRouter(prefix="/api/growth", tags=["Growth Accelera
 dashboard_service = GrowthEngineDashboard()
 
 @growth_dashboard_router.get("/dashboard")
+@dashboard_cache.cached("/api/growth/dashboard", ttl=120, invalidated_by=["growth_activity"])
 async def get_growth_dashboard(current_user: UserProfile = Depends(require_annual_subscription)):
     """Get comprehensive Growth Acceleration Engine dashboard"""
     try:
@@ -623,6 +625,7 @@ async def perform_full_growth_scan(request: Dict[str, Any]):
             except Exception as e:
                 print(f"ROI calculation error for opportunity {opportunity.id}: {e}")
         
+        dashboard_cache.notify("growth_activity")
         return {
             "status": "success",
             "scan_results": {
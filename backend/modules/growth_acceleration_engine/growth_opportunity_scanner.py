@@ -17,6 +17,7 @@ from dotenv import load_dotenv
 
 # Import auth dependencies for annual subscription requirement
 from auth.auth_system import require_annual_subscription, UserProfile
+from modules.dashboard_cache import dashboard_cache
 # Import advanced LLM manager for latest AI models
 from ..llm_manager import llm_manager, ModelType, LLMProvider
 
@@ -447,6 +448,7 @@ async def scan_opportunities(
             timeframe_months=request.timeframe_months
         )
         
+        dashboard_cache.notify("growth_activity")
         return {
             "status": "success",
             "opportunities_found": len(opportunities),
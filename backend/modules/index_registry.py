@@ -0,0 +1,351 @@
+"""
+Customer Mind IQ - Index Registry
+Declarative MongoDB indexes: modules declare the compound, unique, TTL and partial indexes of their
+collections at import time, a migration runner builds missing ones in the background at startup
+and reports drift against the live indexes, and a slow-query detector reads the database profiler
+to flag query shapes that scan a collection
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
+client = AsyncIOMotorClient(MONGO_URL)
+db = client[DB_NAME]
+
+INDEX_MIGRATIONS_ENABLED = os.getenv("INDEX_MIGRATIONS_ENABLED", "true").lower() != "false"
+SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_PROFILING = os.getenv("SLOW_QUERY_PROFILING", "false").lower() == "true"
+PROFILE_SCAN_LIMIT = 5000
+# Index options compared for drift; everything else (v, ns, background) is ignored
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+IndexKeys = Union[str, Sequence[Tuple[str, Any]]]
+
+
+def normalize_keys(keys: IndexKeys) -> Tuple[Tuple[str, Any], ...]:
+    if isinstance(keys, str):
+        return ((keys, ASCENDING),)
+    # Index information may report 1.0 for an index created as 1
+    return tuple((name, int(direction) if isinstance(direction, float) else direction) for name, direction in keys)
+
+
+def index_name(keys: Tuple[Tuple[str, Any], ...]) -> str:
+    """The default MongoDB name of an index (``field_1_other_-1``)"""
+    return "_".join(f"{name}_{direction}" for name, direction in keys)
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: Tuple[Tuple[str, Any], ...]
+    options: Tuple[Tuple[str, Any], ...] = ()
+    owner: str = ""
+    # The owner keeps the index itself (a TTL whose expiry it adjusts); drift ignores its expiry
+    managed: bool = False
+
+    @property
+    def name(self) -> str:
+        return dict(self.options).get("name") or index_name(self.keys)
+
+    def model(self) -> IndexModel:
+        return IndexModel(list(self.keys), **{"name": self.name, **dict(self.options)})
+
+    def compared(self) -> Dict[str, Any]:
+        options = dict(self.options)
+        return {option: options[option] for option in COMPARED_OPTIONS if options.get(option) not in (None, False)}
+
+    def matches(self, live: Dict[str, Any]) -> bool:
+        if self.managed:
+            expected = {k: v for k, v in self.compared().items() if k != "expireAfterSeconds"}
+            return ({k: v for k, v in live.items() if k != "expireAfterSeconds"} == expected
+                    and ("expireAfterSeconds" in live) == ("expireAfterSeconds" in self.compared()))
+        return live == self.compared()
+
+    def describe(self) -> Dict[str, Any]:
+        described = {"collection": self.collection, "name": self.name, "keys": [list(key) for key in self.keys],
+                     "owner": self.owner, **self.compared()}
+        if self.managed:
+            described["managed"] = True
+        return described
+
+
+def live_options(info: Dict[str, Any]) -> Dict[str, Any]:
+    return {option: info[option] for option in COMPARED_OPTIONS if info.get(option) not in (None, False)}
+
+
+def query_shape(entry: Dict[str, Any]) -> Tuple[str, ...]:
+    """Field names a profiled operation filters on, independent of the values"""
+    command = entry.get("command") or {}
+    criteria = command.get("filter") or command.get("query") or command.get("q")
+    if criteria is None and command.get("pipeline"):
+        first = command["pipeline"][0] if command["pipeline"] else {}
+        criteria = first.get("$match")
+    if criteria is None and command.get("updates"):
+        criteria = command["updates"][0].get("q")
+    if criteria is None and command.get("deletes"):
+        criteria = command["deletes"][0].get("q")
+    fields = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key in ("$and", "$or", "$nor"):
+                    for clause in value or []:
+                        walk(clause)
+                elif not key.startswith("$"):
+                    fields.add(key)
+    walk(criteria or {})
+    return tuple(sorted(fields))
+
+
+class IndexRegistry:
+    """Indexes declared by the modules, keyed by collection"""
+
+    def __init__(self):
+        self._specs: Dict[str, Dict[Tuple[Tuple[str, Any], ...], IndexSpec]] = {}
+
+    def declare(self, collection: str, keys: IndexKeys, owner: str = "", managed: bool = False, **options) -> IndexSpec:
+        """Declare an index with ``create_index`` options (unique, sparse, expireAfterSeconds, partialFilterExpression, name).
+
+        A ``managed`` index is built and adjusted by its owner; the migration
+        only reports it, and its expiry is not compared.
+        """
+        normalized = normalize_keys(keys)
+        spec = IndexSpec(collection, normalized, tuple(sorted(options.items())), owner, managed)
+        existing = self._specs.setdefault(collection, {}).get(normalized)
+        if existing and (existing.compared() != spec.compared() or existing.managed != spec.managed):
+            raise ValueError(f"Conflicting declarations of {collection}.{spec.name} by {existing.owner or '?'} and {owner or '?'}")
+        self._specs[collection][normalized] = existing or spec
+        return self._specs[collection][normalized]
+
+    def module(self, owner: str):
+        """A ``declare`` bound to one module, for its declarations block"""
+        def declare(collection: str, keys: IndexKeys, managed: bool = False, **options) -> IndexSpec:
+            return self.declare(collection, keys, owner=owner, managed=managed, **options)
+        return declare
+
+    def collections(self) -> List[str]:
+        return sorted(self._specs)
+
+    def specs(self, collection: Optional[str] = None) -> List[IndexSpec]:
+        collections = [collection] if collection else self.collections()
+        return [spec for name in collections for spec in self._specs.get(name, {}).values()]
+
+    def leading(self, collection: str, fields: Iterable[str]) -> List[IndexSpec]:
+        """Declared indexes of a collection whose first key is one of ``fields``"""
+        fields = set(fields)
+        return [spec for spec in self.specs(collection) if spec.keys[0][0] in fields]
+
+
+class IndexMigrationRunner:
+    """Compares the declared indexes with the live ones and builds what is missing.
+
+    A missing index is created; a TTL that only differs in its expiry is
+    changed in place with ``collMod``. Any other conflict (unique, sparse or
+    partial filter differs) and indexes that exist but are not declared are
+    reported, never dropped. Managed indexes are left to their owner. Each
+    run is stored in ``index_migrations``.
+    """
+
+    def __init__(self, db, registry: IndexRegistry):
+        self.db = db
+        self.registry = registry
+        self._task: Optional[asyncio.Task] = None
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    async def drift(self) -> Dict[str, Any]:
+        """Declared vs live indexes, without changing anything"""
+        existing_collections = set(await self.db.list_collection_names())
+        report = {"ok": [], "missing": [], "conflicting": [], "undeclared": []}
+        for collection in self.registry.collections():
+            live = await self.db[collection].index_information() if collection in existing_collections else {}
+            by_keys = {normalize_keys(info["key"]): (name, info) for name, info in live.items()}
+            declared = set()
+            for spec in self.registry.specs(collection):
+                declared.add(spec.keys)
+                current = by_keys.get(spec.keys)
+                if current is None:
+                    report["missing"].append(spec.describe())
+                elif not spec.matches(live_options(current[1])):
+                    report["conflicting"].append({**spec.describe(), "live_name": current[0], "live_options": live_options(current[1])})
+                else:
+                    report["ok"].append(spec.describe())
+            for keys, (name, info) in by_keys.items():
+                if name != "_id_" and keys not in declared:
+                    report["undeclared"].append({"collection": collection, "name": name, "keys": [list(key) for key in keys], **live_options(info)})
+        report["summary"] = {status: len(entries) for status, entries in report.items()}
+        return report
+
+    async def migrate(self) -> Dict[str, Any]:
+        started_at = datetime.utcnow()
+        drift = await self.drift()
+        created, updated, failed = [], [], []
+        specs = {(spec.collection, spec.name): spec for spec in self.registry.specs()}
+
+        for entry in drift["missing"]:
+            spec = specs[(entry["collection"], entry["name"])]
+            if spec.managed:
+                continue
+            try:
+                await self.db[spec.collection].create_indexes([spec.model()])
+                created.append(entry)
+            except Exception as e:
+                failed.append({**entry, "error": str(e)})
+
+        conflicts = []
+        for entry in drift["conflicting"]:
+            spec = specs[(entry["collection"], entry["name"])]
+            if spec.managed:
+                conflicts.append(entry)
+                continue
+            expected, live = spec.compared(), entry["live_options"]
+            ttl_only = ({k: v for k, v in expected.items() if k != "expireAfterSeconds"} == {k: v for k, v in live.items() if k != "expireAfterSeconds"}
+                        and "expireAfterSeconds" in expected and "expireAfterSeconds" in live)
+            if not ttl_only:
+                conflicts.append(entry)
+                continue
+            try:
+                await self.db.command("collMod", spec.collection, index={"name": entry["live_name"], "expireAfterSeconds": expected["expireAfterSeconds"]})
+                updated.append(entry)
+            except Exception as e:
+                failed.append({**entry, "error": str(e)})
+
+        report = {
+            "migration_id": str(uuid.uuid4()),
+            "started_at": started_at,
+            "finished_at": datetime.utcnow(),
+            "declared": len(specs),
+            "already_present": len(drift["ok"]),
+            "created": created,
+            "ttl_updated": updated,
+            "conflicting": conflicts,
+            "undeclared": drift["undeclared"],
+            "failed": failed
+        }
+        await self.db.index_migrations.insert_one(dict(report))
+        self.last_report = report
+        return report
+
+    def start(self) -> asyncio.Task:
+        """Run the migration in the background so startup does not wait for index builds"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def _run(self):
+        try:
+            report = await self.migrate()
+            logger.info(
+                f"Index migration: {len(report['created'])} created, {len(report['ttl_updated'])} TTL updated, "
+                f"{report['already_present']} present, {len(report['conflicting'])} conflicting, "
+                f"{len(report['undeclared'])} undeclared, {len(report['failed'])} failed"
+            )
+            for entry in report["conflicting"] + report["failed"]:
+                logger.warning(f"Index drift on {entry['collection']}.{entry['name']}: {entry.get('error') or entry.get('live_options')}")
+        except Exception as e:
+            logger.error(f"Index migration failed: {str(e)}")
+
+
+class SlowQueryDetector:
+    """Flags slow and unindexed queries from the MongoDB profiler.
+
+    ``enable`` turns on profiling level 1 for operations slower than
+    ``SLOW_QUERY_MS`` and, where the server supports a profile filter, for
+    every collection scan. ``report`` groups the profiled operations by
+    collection and filtered fields and points at the declared indexes that
+    should serve them.
+    """
+
+    def __init__(self, db, registry: IndexRegistry, slow_ms: int = SLOW_QUERY_MS):
+        self.db = db
+        self.registry = registry
+        self.slow_ms = slow_ms
+        self.profiling: Optional[str] = None
+
+    async def enable(self) -> Optional[str]:
+        try:
+            await self.db.command({"profile": 1, "slowms": self.slow_ms,
+                                   "filter": {"$or": [{"millis": {"$gte": self.slow_ms}}, {"planSummary": "COLLSCAN"}]}})
+            self.profiling = "slow_or_collscan"
+        except Exception:
+            # Servers before 4.4.2 have no profile filter; managed tiers may not allow profiling
+            try:
+                await self.db.command({"profile": 1, "slowms": self.slow_ms})
+                self.profiling = "slow"
+            except Exception as e:
+                logger.warning(f"Slow query profiling unavailable: {str(e)}")
+                self.profiling = None
+        return self.profiling
+
+    async def report(self, since: Optional[datetime] = None, limit: int = 50) -> Dict[str, Any]:
+        since = since or datetime.utcnow() - timedelta(hours=24)
+        entries = await self.db["system.profile"].find(
+            {"ts": {"$gte": since}, "ns": {"$not": {"$regex": r"\.system\."}}},
+            {"ns": 1, "op": 1, "millis": 1, "planSummary": 1, "docsExamined": 1, "keysExamined": 1, "nreturned": 1, "ts": 1, "command": 1}
+        ).sort("ts", -1).limit(PROFILE_SCAN_LIMIT).to_list(length=PROFILE_SCAN_LIMIT)
+
+        shapes: Dict[Tuple[str, str, Tuple[str, ...]], Dict[str, Any]] = {}
+        for entry in entries:
+            collection = entry.get("ns", "").split(".", 1)[-1]
+            fields = query_shape(entry)
+            key = (collection, entry.get("op", ""), fields)
+            shape = shapes.setdefault(key, {
+                "collection": collection, "op": entry.get("op"), "fields": list(fields), "count": 0,
+                "total_ms": 0, "max_ms": 0, "docs_examined": 0, "returned": 0, "collection_scan": False,
+                "plans": set(), "last_seen": entry.get("ts")
+            })
+            shape["count"] += 1
+            shape["total_ms"] += entry.get("millis", 0)
+            shape["max_ms"] = max(shape["max_ms"], entry.get("millis", 0))
+            shape["docs_examined"] += entry.get("docsExamined", 0)
+            shape["returned"] += entry.get("nreturned", 0)
+            plan = entry.get("planSummary") or ""
+            shape["plans"].add(plan)
+            shape["collection_scan"] = shape["collection_scan"] or "COLLSCAN" in plan
+
+        rows = []
+        for shape in shapes.values():
+            declared = self.registry.leading(shape["collection"], shape["fields"])
+            shape["plans"] = sorted(shape["plans"])
+            shape["mean_ms"] = round(shape.pop("total_ms") / shape["count"], 1)
+            shape["declared_indexes"] = [spec.name for spec in declared]
+            if shape["collection_scan"]:
+                shape["advice"] = ("declared index not built or not chosen; check /api/admin/indexes" if declared
+                                   else f"no declared index starts with {', '.join(shape['fields']) or 'these fields'}")
+            rows.append(shape)
+        rows.sort(key=lambda row: (not row["collection_scan"], -row["count"] * row["mean_ms"]))
+        return {
+            "profiling": self.profiling,
+            "slow_ms": self.slow_ms,
+            "since": since,
+            "profiled_operations": len(entries),
+            "collection_scans": sum(1 for row in rows if row["collection_scan"]),
+            "shapes": rows[:limit]
+        }
+
+    async def uses_index(self, collection: str, criteria: Dict[str, Any], sort: Optional[List[Tuple[str, Any]]] = None) -> bool:
+        """Whether the winning plan of a find avoids a collection scan"""
+        command = {"find": collection, "filter": criteria}
+        if sort:
+            command["sort"] = dict(sort)
+        explained = await self.db.command("explain", command, verbosity="queryPlanner")
+        return "COLLSCAN" not in str(explained["queryPlanner"]["winningPlan"])
+
+
+# Shared instances: modules declare into index_registry; server startup runs the migration and profiler
+index_registry = IndexRegistry()
+index_registry.declare("index_migrations", "started_at", owner=__name__, expireAfterSeconds=90 * 86400)
+index_migrations = IndexMigrationRunner(db, index_registry)
+slow_queries = SlowQueryDetector(db, index_registry)
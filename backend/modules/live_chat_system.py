@@ -12,6 +12,7 @@ import mimetypes
 from pathlib import Path
 from auth.auth_system import get_current_user, UserProfile, require_role, UserRole
 from dotenv import load_dotenv
+from modules.index_registry import index_registry
 
 # Load environment variables
 load_dotenv()
@@ -22,6 +23,14 @@ DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
 client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 
+declare_index = index_registry.module(__name__)
+declare_index("chat_sessions", "session_id")
+declare_index("chat_sessions", [("user_id", 1), ("status", 1)])
+declare_index("chat_sessions", [("user_id", 1), ("created_at", -1)])
+declare_index("chat_messages", [("session_id", 1), ("timestamp", 1)])
+declare_index("chat_messages", "file_info.stored_name", sparse=True)
+declare_index("admin_availability", "is_available")
+
 router = APIRouter(tags=["Live Chat"])
 
 # File Upload Directory
@@ -18,6 +18,12 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 import os
 import math
+from modules.index_registry import index_registry
+
+declare_index = index_registry.module(__name__)
+declare_index("ab_tests", "test_id")
+declare_index("ab_test_results", "test_id")
+declare_index("variant_selections", [("test_id", 1), ("timestamp", -1)])
 
 # Enums
 class TestStatus(str, Enum):
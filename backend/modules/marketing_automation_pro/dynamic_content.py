@@ -18,6 +18,14 @@ import re
 from jinja2 import Template, Environment, BaseLoader
 from textblob import TextBlob
 import random
+from modules.index_registry import index_registry
+
+declare_index = index_registry.module(__name__)
+declare_index("customer_behavior_profiles", "customer_id")
+declare_index("behavior_events", [("customer_id", 1), ("event_type", 1), ("timestamp", -1)])
+declare_index("personalization_rules", "rule_id")
+declare_index("personalization_rules", "is_active")
+declare_index("dynamic_content_templates", "template_id")
 
 # Enums
 class ContentType(str, Enum):
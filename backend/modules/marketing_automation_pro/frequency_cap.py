@@ -0,0 +1,239 @@
+"""
+Customer Mind IQ - Frequency Cap Counters
+Per-customer, per-channel send counters with an in-memory hot tier and compact daily MongoDB buckets
+"""
+
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+from datetime import datetime, timedelta, date
+from collections import OrderedDict
+import time
+
+from pymongo import UpdateOne
+
+from modules.index_registry import index_registry
+
+declare_index = index_registry.module(__name__)
+declare_index("frequency_cap_buckets", "day")
+declare_index("frequency_cap_buckets", "expires_at", expireAfterSeconds=0)
+
+
+class FrequencyCapManager:
+    """Sliding-window frequency cap counters keyed by customer and channel.
+
+    Each customer-day is stored as one ``frequency_cap_buckets`` document with
+    hourly counters per channel (``channels.<channel>.<HH>``). The default
+    window is the calendar day, matching the original count over
+    ``channel_messages``; a trailing ``window_hours`` window can be requested
+    instead and is answered from today's and yesterday's buckets.
+
+    Recently read buckets are held in a bounded LRU hot tier so the per-send
+    check during a campaign step is served from memory after one batched
+    prefetch for the audience.
+    """
+
+    def __init__(self, db, hot_ttl_seconds: int = 30, max_hot_entries: int = 200000, retention_days: int = 3):
+        self.db = db
+        self.collection = db.frequency_cap_buckets
+        self.hot_ttl_seconds = hot_ttl_seconds
+        self.max_hot_entries = max_hot_entries
+        self.retention_days = retention_days
+        self._hot: "OrderedDict[str, Tuple[float, Dict[str, Dict[str, int]]]]" = OrderedDict()
+
+    @staticmethod
+    def _bucket_id(customer_id: str, day: date) -> str:
+        return f"{customer_id}:{day.isoformat()}"
+
+    async def check_batch(
+        self,
+        customer_ids: Iterable[str],
+        channel: str,
+        cap: int,
+        window_hours: Optional[int] = None,
+        now: Optional[datetime] = None
+    ) -> Dict[str, bool]:
+        """Return ``{customer_id: allowed}`` for a whole audience with at most one query"""
+        now = now or datetime.now()
+        customer_ids = list(dict.fromkeys(customer_ids))
+        days = self._window_days(now, window_hours)
+        buckets = await self._load_buckets(customer_ids, days)
+
+        return {
+            customer_id: self._window_count(buckets, customer_id, channel, now, window_hours) < cap
+            for customer_id in customer_ids
+        }
+
+    async def check(self, customer_id: str, channel: str, cap: int, window_hours: Optional[int] = None) -> bool:
+        """Single-customer check; served from the hot tier after a batch prefetch"""
+        result = await self.check_batch([customer_id], channel, cap, window_hours)
+        return result[customer_id]
+
+    async def get_counts(self, customer_ids: Iterable[str], channel: str, window_hours: Optional[int] = None) -> Dict[str, int]:
+        """Current window send counts, used by dashboards and verification scripts"""
+        now = datetime.now()
+        customer_ids = list(dict.fromkeys(customer_ids))
+        buckets = await self._load_buckets(customer_ids, self._window_days(now, window_hours))
+        return {
+            customer_id: self._window_count(buckets, customer_id, channel, now, window_hours)
+            for customer_id in customer_ids
+        }
+
+    async def record(self, customer_id: str, channel: str, sent_at: Optional[datetime] = None):
+        """Count one delivery for a customer on a channel"""
+        await self.record_batch([(customer_id, channel, sent_at or datetime.now())])
+
+    async def record_batch(self, deliveries: List[Tuple[str, str, datetime]]):
+        """Count many deliveries with a single unordered bulk write"""
+        if not deliveries:
+            return
+
+        increments: Dict[str, Dict[str, Any]] = {}
+        for customer_id, channel, sent_at in deliveries:
+            day = sent_at.date()
+            bucket_id = self._bucket_id(customer_id, day)
+            entry = increments.setdefault(bucket_id, {"customer_id": customer_id, "day": day, "inc": {}})
+            field = f"channels.{channel}.{sent_at.hour:02d}"
+            entry["inc"][field] = entry["inc"].get(field, 0) + 1
+
+            # Apply locally so this worker sees its own sends immediately
+            cached = self._hot.get(bucket_id)
+            if cached:
+                hours = cached[1].setdefault(channel, {})
+                hour_key = f"{sent_at.hour:02d}"
+                hours[hour_key] = hours.get(hour_key, 0) + 1
+
+        operations = [
+            UpdateOne(
+                {"_id": bucket_id},
+                {
+                    "$inc": entry["inc"],
+                    "$setOnInsert": {
+                        "customer_id": entry["customer_id"],
+                        "day": entry["day"].isoformat(),
+                        "expires_at": datetime.combine(entry["day"], datetime.min.time()) + timedelta(days=self.retention_days)
+                    }
+                },
+                upsert=True
+            )
+            for bucket_id, entry in increments.items()
+        ]
+        await self.collection.bulk_write(operations, ordered=False)
+
+    async def backfill_from_deliveries(self, day: Optional[date] = None) -> int:
+        """Seed buckets for ``day`` from ``channel_messages`` without touching existing buckets.
+
+        Lets the counters take over mid-day from the count-based check without
+        resetting customers who were already messaged.
+        """
+        day = day or datetime.now().date()
+        start = datetime.combine(day, datetime.min.time())
+        end = start + timedelta(days=1)
+
+        pipeline = [
+            {"$match": {"sent_time": {"$gte": start, "$lt": end}}},
+            {"$group": {
+                "_id": {
+                    "customer_id": "$customer_id",
+                    "channel": "$channel",
+                    "hour": {"$hour": "$sent_time"}
+                },
+                "count": {"$sum": 1}
+            }},
+            {"$group": {
+                "_id": {"customer_id": "$_id.customer_id", "channel": "$_id.channel"},
+                "hours": {"$push": {
+                    "k": {"$cond": [{"$lt": ["$_id.hour", 10]}, {"$concat": ["0", {"$toString": "$_id.hour"}]}, {"$toString": "$_id.hour"}]},
+                    "v": "$count"
+                }}
+            }},
+            {"$group": {
+                "_id": "$_id.customer_id",
+                "channels": {"$push": {"k": "$_id.channel", "v": {"$arrayToObject": "$hours"}}}
+            }},
+            {"$project": {
+                "_id": {"$concat": ["$_id", ":", day.isoformat()]},
+                "customer_id": "$_id",
+                "day": day.isoformat(),
+                "channels": {"$arrayToObject": "$channels"},
+                "expires_at": end + timedelta(days=self.retention_days - 1)
+            }},
+            {"$merge": {
+                "into": "frequency_cap_buckets",
+                "on": "_id",
+                "whenMatched": "keepExisting",
+                "whenNotMatched": "insert"
+            }}
+        ]
+        await self.db.channel_messages.aggregate(pipeline).to_list(length=None)
+        return await self.collection.count_documents({"day": day.isoformat()})
+
+    def hot_tier_stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._hot), "max_entries": self.max_hot_entries, "ttl_seconds": self.hot_ttl_seconds}
+
+    def _window_days(self, now: datetime, window_hours: Optional[int]) -> List[date]:
+        if not window_hours:
+            return [now.date()]
+        start = now - timedelta(hours=window_hours)
+        days = []
+        day = start.date()
+        while day <= now.date():
+            days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    async def _load_buckets(self, customer_ids: List[str], days: List[date]) -> Dict[str, Dict[str, Dict[str, int]]]:
+        now_ts = time.monotonic()
+        buckets: Dict[str, Dict[str, Dict[str, int]]] = {}
+        missing = []
+
+        for customer_id in customer_ids:
+            for day in days:
+                bucket_id = self._bucket_id(customer_id, day)
+                cached = self._hot.get(bucket_id)
+                if cached and now_ts - cached[0] < self.hot_ttl_seconds:
+                    self._hot.move_to_end(bucket_id)
+                    buckets[bucket_id] = cached[1]
+                else:
+                    missing.append(bucket_id)
+
+        if missing:
+            # Chunk to keep the $in list well under the BSON document limit
+            for offset in range(0, len(missing), 5000):
+                chunk = missing[offset:offset + 5000]
+                found = {}
+                async for doc in self.collection.find({"_id": {"$in": chunk}}, {"channels": 1}):
+                    found[doc["_id"]] = doc.get("channels", {})
+                for bucket_id in chunk:
+                    channels = found.get(bucket_id, {})
+                    buckets[bucket_id] = channels
+                    self._remember(bucket_id, channels, now_ts)
+
+        return buckets
+
+    def _remember(self, bucket_id: str, channels: Dict[str, Dict[str, int]], loaded_at: float):
+        self._hot[bucket_id] = (loaded_at, channels)
+        self._hot.move_to_end(bucket_id)
+        while len(self._hot) > self.max_hot_entries:
+            self._hot.popitem(last=False)
+
+    def _window_count(
+        self,
+        buckets: Dict[str, Dict[str, Dict[str, int]]],
+        customer_id: str,
+        channel: str,
+        now: datetime,
+        window_hours: Optional[int]
+    ) -> int:
+        if not window_hours:
+            hours = buckets.get(self._bucket_id(customer_id, now.date()), {}).get(channel, {})
+            return sum(hours.values())
+
+        # Hour granularity: include the hour containing the window start
+        window_start = (now - timedelta(hours=window_hours)).replace(minute=0, second=0, microsecond=0)
+        total = 0
+        for day in self._window_days(now, window_hours):
+            hours = buckets.get(self._bucket_id(customer_id, day), {}).get(channel, {})
+            for hour_key, count in hours.items():
+                bucket_start = datetime.combine(day, datetime.min.time()) + timedelta(hours=int(hour_key))
+                if window_start <= bucket_start <= now:
+                    total += count
+        return total
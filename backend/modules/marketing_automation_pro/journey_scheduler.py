@@ -0,0 +1,356 @@
+"""
+Customer Mind IQ - Journey Step Scheduler
+Durable delayed-step scheduling for multi-channel campaign journeys backed by MongoDB
+"""
+
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+from datetime import datetime, timedelta
+from collections import deque
+from enum import Enum
+import asyncio
+import os
+import socket
+import uuid
+
+from pymongo import ASCENDING, ReturnDocument
+
+from modules.index_registry import index_registry
+
+declare_index = index_registry.module(__name__)
+declare_index("scheduled_steps", "step_id", unique=True)
+declare_index("scheduled_steps", [("status", 1), ("due_at", 1)])
+declare_index("scheduled_steps", [("status", 1), ("lease_expires_at", 1)])
+declare_index("scheduled_steps", [("campaign_id", 1), ("status", 1)])
+
+
+class ScheduledStepStatus(str, Enum):
+    PENDING = "pending"
+    CLAIMED = "claimed"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class SchedulerMetrics:
+    """Rolling lag and throughput statistics for the step scheduler.
+
+    Only aggregate counters and a fixed-size window of recent lag samples are
+    kept, so memory stays flat no matter how many steps are processed.
+    """
+
+    def __init__(self, window_size: int = 1000):
+        self.lag_samples = deque(maxlen=window_size)
+        self.executed = 0
+        self.failed = 0
+        self.retried = 0
+        self.lease_recoveries = 0
+        self.total_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+
+    def record_execution(self, due_at: datetime, started_at: datetime, success: bool):
+        lag = max((started_at - due_at).total_seconds(), 0.0)
+        self.lag_samples.append(lag)
+        self.total_lag_seconds += lag
+        self.max_lag_seconds = max(self.max_lag_seconds, lag)
+        if success:
+            self.executed += 1
+        else:
+            self.failed += 1
+
+    def _percentile(self, samples: List[float], percentile: float) -> float:
+        if not samples:
+            return 0.0
+        index = min(int(round(percentile * (len(samples) - 1))), len(samples) - 1)
+        return samples[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        samples = sorted(self.lag_samples)
+        processed = self.executed + self.failed
+        return {
+            "steps_executed": self.executed,
+            "steps_failed": self.failed,
+            "steps_retried": self.retried,
+            "expired_leases_recovered": self.lease_recoveries,
+            "lag_seconds": {
+                "mean": round(self.total_lag_seconds / processed, 3) if processed else 0.0,
+                "p50": round(self._percentile(samples, 0.50), 3),
+                "p95": round(self._percentile(samples, 0.95), 3),
+                "p99": round(self._percentile(samples, 0.99), 3),
+                "max": round(self.max_lag_seconds, 3)
+            }
+        }
+
+
+class JourneyStepScheduler:
+    """Persistent priority-queue scheduler for delayed campaign journey steps.
+
+    Steps live in the ``scheduled_steps`` collection ordered by ``due_at``.
+    Workers claim due steps one at a time with ``find_one_and_update`` and hold
+    a time-limited lease, so several workers can share the queue without
+    double-firing and steps held by a crashed worker become claimable again
+    once their lease expires.
+    """
+
+    def __init__(
+        self,
+        db,
+        handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        lease_seconds: int = 300,
+        batch_size: int = 50,
+        max_attempts: int = 3,
+        max_idle_seconds: int = 60
+    ):
+        self.db = db
+        self.collection = db.scheduled_steps
+        self.handler = handler
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.max_idle_seconds = max_idle_seconds
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.metrics = SchedulerMetrics()
+        self.running = False
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    async def schedule_step(
+        self,
+        campaign_id: str,
+        step: Dict[str, Any],
+        due_at: datetime,
+        payload: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Persist a journey step to be executed at ``due_at``"""
+        step_id = str(uuid.uuid4())
+        await self.collection.insert_one({
+            "step_id": step_id,
+            "campaign_id": campaign_id,
+            "step": step,
+            "payload": payload or {},
+            "due_at": due_at,
+            "status": ScheduledStepStatus.PENDING.value,
+            "attempts": 0,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "created_at": datetime.now()
+        })
+        # Let an idle worker re-evaluate its sleep if this step is due sooner
+        self._wakeup.set()
+        return step_id
+
+    async def cancel_campaign_steps(self, campaign_id: str) -> int:
+        """Drop every not-yet-executed step for a campaign"""
+        result = await self.collection.delete_many({
+            "campaign_id": campaign_id,
+            "status": ScheduledStepStatus.PENDING.value
+        })
+        return result.deleted_count
+
+    async def claim_next_step(self) -> Optional[Dict[str, Any]]:
+        """Atomically lease the earliest due step, recovering expired leases first"""
+        now = datetime.now()
+        lease_update = {
+            "$set": {
+                "status": ScheduledStepStatus.CLAIMED.value,
+                "lease_owner": self.worker_id,
+                "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                "claimed_at": now
+            },
+            "$inc": {"attempts": 1}
+        }
+
+        # Steps whose worker died mid-execution
+        recovered = await self.collection.find_one_and_update(
+            {
+                "status": ScheduledStepStatus.CLAIMED.value,
+                "lease_expires_at": {"$lte": now}
+            },
+            lease_update,
+            sort=[("lease_expires_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+        if recovered:
+            self.metrics.lease_recoveries += 1
+            return recovered
+
+        return await self.collection.find_one_and_update(
+            {
+                "status": ScheduledStepStatus.PENDING.value,
+                "due_at": {"$lte": now}
+            },
+            lease_update,
+            sort=[("due_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def renew_lease(self, scheduled: Dict[str, Any]) -> bool:
+        """Push back the lease on a step this worker is still executing.
+
+        Returns False when the lease has already passed to another worker, in which
+        case the caller must stop: the new owner resumes the step from its checkpoint.
+        """
+        result = await self.collection.update_one(
+            {
+                "step_id": scheduled["step_id"],
+                "status": ScheduledStepStatus.CLAIMED.value,
+                "lease_owner": self.worker_id
+            },
+            {"$set": {"lease_expires_at": datetime.now() + timedelta(seconds=self.lease_seconds)}}
+        )
+        return result.matched_count == 1
+
+    async def process_due_steps(self) -> int:
+        """Claim and execute up to ``batch_size`` due steps, returning how many ran"""
+        processed = 0
+        while processed < self.batch_size:
+            scheduled = await self.claim_next_step()
+            if not scheduled:
+                break
+            if scheduled.get("attempts", 1) > self.max_attempts:
+                # Repeatedly abandoned by crashing workers; stop recycling it
+                await self.collection.update_one(
+                    {"step_id": scheduled["step_id"], "lease_owner": self.worker_id},
+                    {"$set": {
+                        "status": ScheduledStepStatus.FAILED.value,
+                        "failed_at": datetime.now(),
+                        "last_error": "lease expired too many times",
+                        "lease_owner": None,
+                        "lease_expires_at": None
+                    }}
+                )
+                continue
+            await self._execute(scheduled)
+            processed += 1
+        return processed
+
+    async def seconds_until_next_due(self) -> float:
+        """Time to sleep before the earliest pending step or lease expiry becomes actionable"""
+        now = datetime.now()
+        candidates = []
+
+        next_pending = await self.collection.find_one(
+            {"status": ScheduledStepStatus.PENDING.value},
+            projection={"due_at": 1},
+            sort=[("due_at", ASCENDING)]
+        )
+        if next_pending:
+            candidates.append(next_pending["due_at"])
+
+        next_expiry = await self.collection.find_one(
+            {"status": ScheduledStepStatus.CLAIMED.value},
+            projection={"lease_expires_at": 1},
+            sort=[("lease_expires_at", ASCENDING)]
+        )
+        if next_expiry and next_expiry.get("lease_expires_at"):
+            candidates.append(next_expiry["lease_expires_at"])
+
+        if not candidates:
+            return float(self.max_idle_seconds)
+
+        wait = (min(candidates) - now).total_seconds()
+        return min(max(wait, 0.0), float(self.max_idle_seconds))
+
+    async def start(self):
+        """Start the worker loop in the background"""
+        if self.running:
+            return
+        self.running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker loop; claimed steps are recovered by lease expiry"""
+        self.running = False
+        self._wakeup.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def get_metrics(self) -> Dict[str, Any]:
+        """Scheduler lag/throughput metrics plus current queue depth"""
+        metrics = self.metrics.snapshot()
+        try:
+            now = datetime.now()
+            metrics["queue"] = {
+                "pending": await self.collection.count_documents({"status": ScheduledStepStatus.PENDING.value}),
+                "overdue": await self.collection.count_documents({
+                    "status": ScheduledStepStatus.PENDING.value,
+                    "due_at": {"$lte": now}
+                }),
+                "claimed": await self.collection.count_documents({"status": ScheduledStepStatus.CLAIMED.value})
+            }
+        except Exception as e:
+            metrics["queue"] = {"error": str(e)}
+        metrics["worker_id"] = self.worker_id
+        metrics["running"] = self.running
+        return metrics
+
+    async def _run(self):
+        while self.running:
+            try:
+                processed = await self.process_due_steps()
+                if processed >= self.batch_size:
+                    # Backlog remains; keep draining without sleeping
+                    continue
+                wait = await self.seconds_until_next_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Journey scheduler loop error: {e}")
+                wait = float(self.max_idle_seconds)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, scheduled: Dict[str, Any]):
+        started_at = datetime.now()
+        try:
+            result = await self.handler(scheduled)
+            success = not (isinstance(result, dict) and result.get("error"))
+            error = result.get("error") if isinstance(result, dict) else None
+        except Exception as e:
+            result = None
+            success = False
+            error = str(e)
+
+        if isinstance(result, dict) and result.get("lease_lost"):
+            # Another worker reclaimed the step and owns its outcome now
+            print(f"Scheduled step {scheduled['step_id']} lost its lease; left to the new owner")
+            return
+
+        self.metrics.record_execution(scheduled["due_at"], started_at, success)
+        owner_filter = {"step_id": scheduled["step_id"], "lease_owner": self.worker_id}
+
+        if success:
+            await self.collection.update_one(owner_filter, {"$set": {
+                "status": ScheduledStepStatus.COMPLETED.value,
+                "completed_at": datetime.now(),
+                "lag_seconds": max((started_at - scheduled["due_at"]).total_seconds(), 0.0),
+                "result": result,
+                "lease_owner": None,
+                "lease_expires_at": None
+            }})
+            return
+
+        print(f"Scheduled step {scheduled['step_id']} failed: {error}")
+        if scheduled.get("attempts", 1) < self.max_attempts:
+            # Exponential backoff before the step becomes due again
+            retry_delay = timedelta(minutes=2 ** scheduled.get("attempts", 1))
+            self.metrics.retried += 1
+            await self.collection.update_one(owner_filter, {"$set": {
+                "status": ScheduledStepStatus.PENDING.value,
+                "due_at": datetime.now() + retry_delay,
+                "last_error": error,
+                "lease_owner": None,
+                "lease_expires_at": None
+            }})
+        else:
+            await self.collection.update_one(owner_filter, {"$set": {
+                "status": ScheduledStepStatus.FAILED.value,
+                "failed_at": datetime.now(),
+                "last_error": error,
+                "lease_owner": None,
+                "lease_expires_at": None
+            }})
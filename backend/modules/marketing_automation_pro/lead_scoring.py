@@ -20,6 +20,11 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 import os
 import math
+from modules.index_registry import index_registry
+
+declare_index = index_registry.module(__name__)
+declare_index("lead_scores", [("lead_id", 1), ("updated_at", 1)])
+declare_index("lead_activities", [("lead_id", 1), ("timestamp", -1)])
 
 # Enums
 class ScoreCategory(str, Enum):
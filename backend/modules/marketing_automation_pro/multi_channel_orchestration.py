@@ -3,12 +3,13 @@ Customer Mind IQ - Multi-Channel Orchestration Microservice
 Advanced multi-channel marketing automation with SMS, Push Notifications, and Social Media Retargeting
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 from datetime import datetime, timedelta
 import asyncio
 import json
 import uuid
 import hashlib
+import random
 import phonenumbers
 from phonenumbers import NumberParseException
 from enum import Enum
@@ -19,15 +20,38 @@ import os
 import aiohttp
 import pytz
 
+from .journey_scheduler import JourneyStepScheduler
+from .frequency_cap import FrequencyCapManager
+from .send_pipeline import ChannelSendPipeline
+from modules.audience_engine import AudienceEngine
+
 # Mock integrations (replace with real APIs when keys are available)
-class MockTwilioClient:
+class MockProviderError(Exception):
+    """Simulated transient provider failure"""
+
+class MockProviderClient:
+    """Shared latency/failure simulation so send pipelines can be benchmarked offline"""
+    def __init__(self, latency_ms: float = 0.0, failure_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+    
+    async def _simulate_call(self):
+        if self.latency_ms:
+            # +/-25% jitter around the configured provider latency
+            await asyncio.sleep(self.latency_ms * random.uniform(0.75, 1.25) / 1000)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise MockProviderError("Simulated provider failure")
+
+class MockTwilioClient(MockProviderClient):
     """Mock Twilio client for SMS integration"""
-    def __init__(self, account_sid: str, auth_token: str):
+    def __init__(self, account_sid: str, auth_token: str, latency_ms: float = 0.0, failure_rate: float = 0.0):
+        super().__init__(latency_ms, failure_rate)
         self.account_sid = account_sid
         self.auth_token = auth_token
     
     async def send_sms(self, to: str, body: str, from_phone: str) -> Dict[str, Any]:
         """Mock SMS sending"""
+        await self._simulate_call()
         return {
             "sid": f"SM{uuid.uuid4().hex[:32]}",
             "status": "sent",
@@ -38,29 +62,33 @@ class MockTwilioClient:
             "price": "-0.0075"  # Mock price
         }
 
-class MockFirebaseClient:
+class MockFirebaseClient(MockProviderClient):
     """Mock Firebase client for push notifications"""
-    def __init__(self, project_id: str, credentials_path: str):
+    def __init__(self, project_id: str, credentials_path: str, latency_ms: float = 0.0, failure_rate: float = 0.0):
+        super().__init__(latency_ms, failure_rate)
         self.project_id = project_id
         self.credentials_path = credentials_path
     
     async def send_push_notification(self, tokens: List[str], title: str, body: str, data: Dict[str, str] = None) -> Dict[str, Any]:
         """Mock push notification sending"""
+        await self._simulate_call()
         return {
             "success_count": len(tokens),
             "failure_count": 0,
             "responses": [{"success": True, "message_id": f"msg_{uuid.uuid4().hex[:16]}"} for _ in tokens]
         }
 
-class MockMetaClient:
+class MockMetaClient(MockProviderClient):
     """Mock Meta/Facebook client for social media retargeting"""
-    def __init__(self, app_id: str, app_secret: str, access_token: str):
+    def __init__(self, app_id: str, app_secret: str, access_token: str, latency_ms: float = 0.0, failure_rate: float = 0.0):
+        super().__init__(latency_ms, failure_rate)
         self.app_id = app_id
         self.app_secret = app_secret
         self.access_token = access_token
     
     async def create_custom_audience(self, name: str, emails: List[str]) -> Dict[str, Any]:
         """Mock custom audience creation"""
+        await self._simulate_call()
         return {
             "id": f"audience_{uuid.uuid4().hex[:16]}",
             "name": name,
@@ -73,6 +101,7 @@ class MockMetaClient:
     
     async def send_conversions_api_event(self, events: List[Dict]) -> Dict[str, Any]:
         """Mock Conversions API event sending"""
+        await self._simulate_call()
         return {
             "events_received": len(events),
             "events_dropped": 0,
@@ -159,9 +188,25 @@ class MultiChannelOrchestrationService:
         self.db = self.client[os.environ.get('DB_NAME', 'customer_mind_iq')]
         
         # Initialize mock clients (replace with real ones when keys are available)
-        self.twilio_client = MockTwilioClient("mock_sid", "mock_token")
-        self.firebase_client = MockFirebaseClient("mock_project", "mock_credentials")
-        self.meta_client = MockMetaClient("mock_app_id", "mock_secret", "mock_token")
+        mock_latency_ms = float(os.getenv("MOCK_PROVIDER_LATENCY_MS", "0"))
+        mock_failure_rate = float(os.getenv("MOCK_PROVIDER_FAILURE_RATE", "0"))
+        self.twilio_client = MockTwilioClient("mock_sid", "mock_token", mock_latency_ms, mock_failure_rate)
+        self.firebase_client = MockFirebaseClient("mock_project", "mock_credentials", mock_latency_ms, mock_failure_rate)
+        self.meta_client = MockMetaClient("mock_app_id", "mock_secret", "mock_token", mock_latency_ms, mock_failure_rate)
+        
+        # Durable scheduler for delayed journey steps (started with the app)
+        self.step_scheduler = JourneyStepScheduler(self.db, handler=self.execute_scheduled_step)
+        
+        # Bucketed per-customer send counters used for frequency capping
+        self.frequency_caps = FrequencyCapManager(self.db)
+        self._campaign_frequency_caps: Dict[str, Dict[str, int]] = {}
+        
+        # Per-channel worker pools throttled by provider rate limits
+        self.send_pipeline = ChannelSendPipeline(self.db)
+        
+        # Segment compiler + per-campaign audience snapshots
+        self.audience_engine = AudienceEngine(self.db)
+        self.audience_batch_size = int(os.getenv("CAMPAIGN_AUDIENCE_BATCH_SIZE", "1000"))
         
         # Real initialization would look like:
         # from twilio.rest import Client as TwilioClient
@@ -276,8 +321,17 @@ class MultiChannelOrchestrationService:
             print(f"Multi-channel campaign creation error: {e}")
             return await self._fallback_campaign_creation(campaign_data)
 
-    async def send_sms_message(self, customer: CustomerProfile, message: str, campaign_id: str) -> Dict[str, Any]:
-        """Send SMS with phone number validation and compliance checking"""
+    async def send_sms_message(
+        self,
+        customer: CustomerProfile,
+        message: str,
+        campaign_id: str,
+        acquire: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """Send SMS with phone number validation and compliance checking.
+
+        ``acquire`` takes a provider rate-limit token right before the Twilio call.
+        """
         try:
             if not customer.phone_number or ChannelType.SMS in customer.opt_outs:
                 return {"error": "SMS not available or opted out", "status": "skipped"}
@@ -297,6 +351,8 @@ class MultiChannelOrchestrationService:
                 return {"error": "Frequency cap exceeded", "status": "throttled"}
             
             # Send SMS via Twilio (mock implementation)
+            if acquire:
+                await acquire()
             result = await self.twilio_client.send_sms(
                 to=formatted_number,
                 body=message,
@@ -321,10 +377,21 @@ class MultiChannelOrchestrationService:
             
         except Exception as e:
             print(f"SMS sending error: {e}")
-            return {"error": str(e), "status": "failed"}
+            return {"error": str(e), "status": "failed", "retryable": True}
+
+    async def send_push_notification(
+        self,
+        customer: CustomerProfile,
+        title: str,
+        body: str,
+        data: Dict[str, Any],
+        campaign_id: str,
+        acquire: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """Send push notification with device token management.
 
-    async def send_push_notification(self, customer: CustomerProfile, title: str, body: str, data: Dict[str, Any], campaign_id: str) -> Dict[str, Any]:
-        """Send push notification with device token management"""
+        ``acquire`` takes a provider rate-limit token right before the Firebase call.
+        """
         try:
             if not customer.push_tokens or ChannelType.PUSH in customer.opt_outs:
                 return {"error": "Push tokens not available or opted out", "status": "skipped"}
@@ -334,6 +401,8 @@ class MultiChannelOrchestrationService:
                 return {"error": "Frequency cap exceeded", "status": "throttled"}
             
             # Send push notification via Firebase (mock implementation)
+            if acquire:
+                await acquire()
             result = await self.firebase_client.send_push_notification(
                 tokens=customer.push_tokens,
                 title=title,
@@ -359,22 +428,32 @@ class MultiChannelOrchestrationService:
             
         except Exception as e:
             print(f"Push notification error: {e}")
-            return {"error": str(e), "status": "failed"}
+            return {"error": str(e), "status": "failed", "retryable": True}
 
     async def create_social_retargeting_audience(self, customers: List[CustomerProfile], campaign_name: str) -> Dict[str, Any]:
         """Create custom audiences for social media retargeting"""
         try:
             # Extract and hash customer emails for privacy compliance
-            hashed_emails = []
-            for customer in customers:
-                if customer.email and ChannelType.SOCIAL_RETARGETING not in customer.opt_outs:
-                    # Hash email with SHA-256 for Facebook Custom Audiences
-                    email_hash = hashlib.sha256(customer.email.lower().strip().encode()).hexdigest()
-                    hashed_emails.append(email_hash)
-            
+            hashed_emails = self._hash_retargeting_emails(customers)
             if not hashed_emails:
                 return {"error": "No valid emails for retargeting", "status": "failed"}
+            return await self._create_retargeting_audience(hashed_emails, campaign_name)
             
+        except Exception as e:
+            print(f"Social retargeting audience creation error: {e}")
+            return {"error": str(e), "status": "failed"}
+
+    def _hash_retargeting_emails(self, customers: List[CustomerProfile]) -> List[str]:
+        """SHA-256 email hashes of the customers who have not opted out of retargeting"""
+        hashed_emails = []
+        for customer in customers:
+            if customer.email and ChannelType.SOCIAL_RETARGETING not in customer.opt_outs:
+                # Hash email with SHA-256 for Facebook Custom Audiences
+                hashed_emails.append(hashlib.sha256(customer.email.lower().strip().encode()).hexdigest())
+        return hashed_emails
+
+    async def _create_retargeting_audience(self, hashed_emails: List[str], campaign_name: str) -> Dict[str, Any]:
+        try:
             # Create custom audience via Meta API (mock implementation)
             audience_result = await self.meta_client.create_custom_audience(
                 name=f"{campaign_name}_retargeting_{datetime.now().strftime('%Y%m%d')}",
@@ -408,12 +487,12 @@ class MultiChannelOrchestrationService:
             
             campaign = MultiChannelCampaign(**campaign)
             
-            # Get target audience
-            customers = await self._get_campaign_audience(campaign.target_audience)
+            # Resolve the target audience once; every step reads the same snapshot
+            audience = await self.audience_engine.snapshot(campaign_id, campaign.target_audience, source="customers")
             
             execution_results = {
                 "campaign_id": campaign_id,
-                "total_customers": len(customers),
+                "total_customers": audience.get("member_count", 0),
                 "channel_results": {},
                 "overall_metrics": {
                     "messages_sent": 0,
@@ -422,23 +501,27 @@ class MultiChannelOrchestrationService:
                 }
             }
             
+            execution_results["scheduled_steps"] = []
+            
             # Execute each step in the channel sequence
             for step in campaign.channel_sequence:
                 channel = step.get("channel")
                 delay_hours = step.get("delay_hours", 0)
-                conditions = step.get("conditions", {})
                 
-                # Apply delay if needed
+                # Delayed steps are persisted and fired by the journey scheduler
                 if delay_hours > 0:
                     execution_time = datetime.now() + timedelta(hours=delay_hours)
-                    # In production, this would be scheduled via Celery or similar
-                    print(f"Step {step.get('step')} scheduled for {execution_time}")
-                
-                # Filter customers based on conditions
-                eligible_customers = await self._filter_customers_by_conditions(customers, conditions, campaign_id)
+                    step_id = await self.step_scheduler.schedule_step(campaign_id, step, execution_time)
+                    execution_results["scheduled_steps"].append({
+                        "step_id": step_id,
+                        "step": step.get("step"),
+                        "channel": channel,
+                        "due_at": execution_time
+                    })
+                    continue
                 
-                # Execute channel-specific messaging
-                channel_results = await self._execute_channel_step(eligible_customers, step, campaign_id)
+                # Filter and message the audience batch by batch
+                channel_results = await self._execute_step_over_audience(campaign_id, step)
                 execution_results["channel_results"][channel] = channel_results
                 execution_results["overall_metrics"]["messages_sent"] += channel_results.get("sent_count", 0)
             
@@ -454,6 +537,145 @@ class MultiChannelOrchestrationService:
             print(f"Campaign orchestration error: {e}")
             return {"error": str(e)}
 
+    async def execute_scheduled_step(self, scheduled: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a delayed journey step claimed by the step scheduler"""
+        campaign_id = scheduled["campaign_id"]
+        step = scheduled.get("step", {})
+        
+        campaign = await self.db.multi_channel_campaigns.find_one({"campaign_id": campaign_id})
+        if not campaign:
+            return {"error": "Campaign not found"}
+        if campaign.get("status") in [CampaignStatus.PAUSED.value, CampaignStatus.CANCELLED.value]:
+            return {"status": "skipped", "reason": f"campaign {campaign.get('status')}"}
+        
+        campaign = MultiChannelCampaign(**campaign)
+        # No-op when the campaign was already snapshotted at execution time
+        await self.audience_engine.snapshot(campaign_id, campaign.target_audience, source="customers")
+        return await self._execute_step_over_audience(
+            campaign_id, step, heartbeat=lambda: self.step_scheduler.renew_lease(scheduled)
+        )
+
+    async def _execute_step_over_audience(
+        self,
+        campaign_id: str,
+        step: Dict[str, Any],
+        heartbeat: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> Dict[str, Any]:
+        """Stream the campaign audience snapshot through a channel step in bounded batches.
+
+        ``heartbeat`` runs after every checkpointed batch to keep the scheduler lease alive;
+        once it reports the lease lost the step stops so the new owner does not double-send.
+        """
+        if step.get("channel") == ChannelType.SOCIAL_RETARGETING.value:
+            return await self._execute_retargeting_step(campaign_id, step, heartbeat)
+        
+        consumer = f"step_{step.get('step')}_{step.get('channel')}"
+        checkpoint = await self.audience_engine.get_checkpoint(campaign_id, consumer)
+        start_after = checkpoint.get("last_member_id") if checkpoint else None
+        
+        totals = {
+            "channel": step.get("channel"),
+            "step": step.get("step"),
+            "targeted_customers": 0,
+            "sent_count": 0,
+            "delivered_count": 0,
+            "failed_count": 0,
+            "cost": 0.0,
+            "resumed": start_after is not None
+        }
+        
+        async for members in self.audience_engine.iter_snapshot(campaign_id, self.audience_batch_size, start_after):
+            customers = self._members_to_profiles(members)
+            eligible_customers = await self._filter_customers_by_conditions(customers, step.get("conditions", {}), campaign_id)
+            batch_results = await self._execute_channel_step(eligible_customers, step, campaign_id)
+            if batch_results.get("error"):
+                totals["error"] = batch_results["error"]
+                break
+            
+            for key in ["targeted_customers", "sent_count", "delivered_count", "failed_count", "cost"]:
+                totals[key] += batch_results.get(key, 0)
+            await self.audience_engine.save_checkpoint(campaign_id, consumer, members[-1]["member_id"], len(members))
+            if heartbeat and not await heartbeat():
+                totals["error"] = "step lease taken over by another worker"
+                totals["lease_lost"] = True
+                break
+        
+        return totals
+
+    async def _execute_retargeting_step(
+        self,
+        campaign_id: str,
+        step: Dict[str, Any],
+        heartbeat: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> Dict[str, Any]:
+        """Hash the whole audience batch by batch and upload it as one custom audience for the step.
+
+        Nothing reaches Meta before the upload, so the checkpoint is only written once the
+        audience exists; an interrupted step starts its hashing over instead of uploading twice.
+        """
+        consumer = f"step_{step.get('step')}_{step.get('channel')}"
+        totals = {
+            "channel": step.get("channel"),
+            "step": step.get("step"),
+            "targeted_customers": 0,
+            "sent_count": 0,
+            "delivered_count": 0,
+            "failed_count": 0,
+            "cost": 0.0,
+            "resumed": False
+        }
+        checkpoint = await self.audience_engine.get_checkpoint(campaign_id, consumer)
+        if checkpoint:
+            totals.update(resumed=True, audience_id=checkpoint.get("audience_id"))
+            return totals
+        
+        hashed_emails: List[str] = []
+        last_member_id, members_seen = None, 0
+        async for members in self.audience_engine.iter_snapshot(campaign_id, self.audience_batch_size, None):
+            customers = self._members_to_profiles(members)
+            eligible_customers = await self._filter_customers_by_conditions(customers, step.get("conditions", {}), campaign_id)
+            totals["targeted_customers"] += len(eligible_customers)
+            hashed_emails.extend(self._hash_retargeting_emails(eligible_customers))
+            last_member_id, members_seen = members[-1]["member_id"], members_seen + len(members)
+            if heartbeat and not await heartbeat():
+                totals["error"] = "step lease taken over by another worker"
+                totals["lease_lost"] = True
+                return totals
+        
+        if not hashed_emails:
+            totals["failed_count"] = totals["targeted_customers"]
+            return totals
+        
+        await self.send_pipeline.acquire(ChannelType.SOCIAL_RETARGETING.value)
+        audience = await self._create_retargeting_audience(hashed_emails, f"{campaign_id}_step_{step.get('step')}")
+        if audience.get("status") != "created":
+            totals["error"] = audience.get("error", "custom audience upload failed")
+            return totals
+        
+        totals["sent_count"] = totals["delivered_count"] = len(hashed_emails)
+        totals["failed_count"] = totals["targeted_customers"] - len(hashed_emails)
+        totals["audience_id"] = audience.get("audience_id")
+        await self.audience_engine.save_checkpoint(campaign_id, consumer, last_member_id, members_seen,
+                                                   details={"audience_id": totals["audience_id"]})
+        return totals
+
+    def _members_to_profiles(self, members: List[Dict[str, Any]]) -> List[CustomerProfile]:
+        """Convert snapshot members into customer profiles, skipping malformed records"""
+        customers = []
+        for member in members:
+            try:
+                customers.append(CustomerProfile(
+                    customer_id=member["member_id"],
+                    email=member.get("email") or None,
+                    phone_number=member.get("phone_number"),
+                    push_tokens=member.get("push_tokens") or [],
+                    opt_outs=member.get("opt_outs") or [],
+                    timezone=member.get("timezone") or "UTC"
+                ))
+            except Exception as e:
+                print(f"Skipping audience member {member.get('member_id')}: {e}")
+        return customers
+
     async def get_multi_channel_dashboard(self) -> Dict[str, Any]:
         """Comprehensive multi-channel orchestration dashboard"""
         try:
@@ -527,26 +749,35 @@ class MultiChannelOrchestrationService:
     async def _check_frequency_cap(self, customer_id: str, channel: ChannelType, campaign_id: str) -> bool:
         """Check if customer hasn't exceeded frequency cap for the channel"""
         try:
-            today = datetime.now().date()
-            messages_today = await self.db.channel_messages.count_documents({
-                "customer_id": customer_id,
-                "channel": channel.value,
-                "sent_time": {
-                    "$gte": datetime.combine(today, datetime.min.time()),
-                    "$lt": datetime.combine(today + timedelta(days=1), datetime.min.time())
-                }
-            })
-            
-            # Get campaign frequency cap (default to 5 if not specified)
-            campaign = await self.db.multi_channel_campaigns.find_one({"campaign_id": campaign_id})
-            frequency_cap = campaign.get('frequency_cap', {}).get(channel.value, 5) if campaign else 5
-            
-            return messages_today < frequency_cap
+            frequency_cap = await self._get_frequency_cap(campaign_id, channel.value)
+            return await self.frequency_caps.check(customer_id, channel.value, frequency_cap)
             
         except Exception:
             # Err on the side of caution
             return False
 
+    async def _prefetch_frequency_caps(self, customers: List[CustomerProfile], channel: str, campaign_id: str) -> Dict[str, bool]:
+        """Load frequency cap counters for a whole audience in one round trip"""
+        try:
+            frequency_cap = await self._get_frequency_cap(campaign_id, channel)
+            return await self.frequency_caps.check_batch(
+                [customer.customer_id for customer in customers], channel, frequency_cap
+            )
+        except Exception as e:
+            print(f"Frequency cap prefetch error: {e}")
+            return {}
+
+    async def _get_frequency_cap(self, campaign_id: str, channel: str) -> int:
+        """Campaign frequency cap for a channel (default 5), cached per campaign"""
+        if campaign_id not in self._campaign_frequency_caps:
+            campaign = await self.db.multi_channel_campaigns.find_one(
+                {"campaign_id": campaign_id}, {"frequency_cap": 1}
+            )
+            if len(self._campaign_frequency_caps) >= 1000:
+                self._campaign_frequency_caps.clear()
+            self._campaign_frequency_caps[campaign_id] = (campaign or {}).get('frequency_cap', {}) or {}
+        return self._campaign_frequency_caps[campaign_id].get(channel, 5)
+
     async def _log_message_delivery(self, customer_id: str, campaign_id: str, channel: ChannelType, content: str, result: Dict[str, Any]):
         """Log message delivery for tracking and analytics"""
         try:
@@ -564,32 +795,11 @@ class MultiChannelOrchestrationService:
             }
             
             await self.db.channel_messages.insert_one(message_log)
+            await self.frequency_caps.record(customer_id, channel.value, message_log["sent_time"])
             
         except Exception as e:
             print(f"Message logging error: {e}")
 
-    async def _get_campaign_audience(self, target_audience: Dict[str, Any]) -> List[CustomerProfile]:
-        """Get customers matching campaign targeting criteria"""
-        try:
-            # This would implement sophisticated audience targeting
-            # For now, return mock customers
-            mock_customers = []
-            for i in range(100):  # Mock 100 customers
-                customer = CustomerProfile(
-                    customer_id=f"customer_{i}",
-                    email=f"customer{i}@example.com",
-                    phone_number=f"+1555000{i:04d}",
-                    push_tokens=[f"token_{i}_{j}" for j in range(2)],
-                    timezone="America/New_York"
-                )
-                mock_customers.append(customer)
-            
-            return mock_customers
-            
-        except Exception as e:
-            print(f"Audience retrieval error: {e}")
-            return []
-
     async def _filter_customers_by_conditions(self, customers: List[CustomerProfile], conditions: Dict[str, Any], campaign_id: str) -> List[CustomerProfile]:
         """Filter customers based on orchestration conditions"""
         try:
@@ -633,39 +843,49 @@ class MultiChannelOrchestrationService:
                 "cost": 0.0
             }
             
-            for customer in customers:
-                try:
-                    if channel == "sms":
-                        result = await self.send_sms_message(
-                            customer,
-                            f"Personalized {message_type} message for {customer.customer_id}",
-                            campaign_id
-                        )
-                    elif channel == "push":
-                        result = await self.send_push_notification(
-                            customer,
-                            f"Important {message_type}",
-                            f"Personalized {message_type} message",
-                            {"campaign_id": campaign_id},
-                            campaign_id
-                        )
-                    elif channel == "social_retargeting":
-                        # Social retargeting is handled at audience level, not individual messages
-                        result = {"status": "audience_added"}
-                    else:
-                        result = {"status": "unsupported_channel"}
-                    
-                    if result.get("status") in ["sent", "audience_added"]:
-                        results["sent_count"] += 1
-                        results["delivered_count"] += 1
-                    else:
-                        results["failed_count"] += 1
-                    
-                    results["cost"] += result.get("cost", 0.0)
-                    
-                except Exception as e:
-                    print(f"Individual message sending error: {e}")
+            # Social retargeting uploads one audience per step in _execute_retargeting_step
+            if channel not in [ChannelType.SMS.value, ChannelType.PUSH.value]:
+                results["failed_count"] = len(customers)
+                results["skipped_reason"] = f"unsupported channel {channel}"
+                return results
+            
+            # Warm the frequency cap hot tier for the whole audience up front
+            await self._prefetch_frequency_caps(customers, channel, campaign_id)
+            
+            async def send_to_customer(customer: CustomerProfile, acquire) -> Dict[str, Any]:
+                if channel == ChannelType.SMS.value:
+                    return await self.send_sms_message(
+                        customer,
+                        f"Personalized {message_type} message for {customer.customer_id}",
+                        campaign_id,
+                        acquire=acquire
+                    )
+                return await self.send_push_notification(
+                    customer,
+                    f"Important {message_type}",
+                    f"Personalized {message_type} message",
+                    {"campaign_id": campaign_id},
+                    campaign_id,
+                    acquire=acquire
+                )
+            
+            send_results = await self.send_pipeline.run(
+                channel,
+                customers,
+                send_to_customer,
+                context={"campaign_id": campaign_id, "step": step.get("step")},
+                item_key=lambda customer: customer.customer_id,
+                acquire_in_send=True
+            )
+            
+            for result in send_results:
+                if result.get("status") == "sent":
+                    results["sent_count"] += 1
+                    results["delivered_count"] += 1
+                else:
                     results["failed_count"] += 1
+                
+                results["cost"] += result.get("cost", 0.0)
             
             return results
             
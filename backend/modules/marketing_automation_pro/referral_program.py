@@ -18,6 +18,12 @@ import os
 import math
 from scipy.stats import poisson
 import numpy as np
+from modules.index_registry import index_registry
+
+declare_index = index_registry.module(__name__)
+declare_index("referral_programs", "program_id")
+declare_index("referrals", "program_id")
+declare_index("referral_links", "program_id")
 
 # Enums
 class ReferralStatus(str, Enum):
@@ -0,0 +1,222 @@
+"""
+Customer Mind IQ - Channel Send Pipeline
+Concurrent per-channel delivery with provider token-bucket rate limits, jittered retries and a dead-letter queue
+"""
+
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Iterable
+from datetime import datetime
+from collections import deque
+import asyncio
+import os
+import random
+import time
+
+
+# Provider throughput defaults (messages/second, burst, concurrent workers).
+# Override per deployment with e.g. SEND_LIMIT_TWILIO="100,200,20".
+DEFAULT_PROVIDER_LIMITS = {
+    "twilio": {"rate_per_second": 30.0, "burst": 60, "workers": 10},
+    "firebase": {"rate_per_second": 500.0, "burst": 1000, "workers": 50},
+    "meta": {"rate_per_second": 50.0, "burst": 100, "workers": 5},
+    "email": {"rate_per_second": 100.0, "burst": 200, "workers": 20},
+}
+
+CHANNEL_PROVIDERS = {
+    "sms": "twilio",
+    "push": "firebase",
+    "social_retargeting": "meta",
+    "email": "email",
+}
+
+
+def load_provider_limits() -> Dict[str, Dict[str, float]]:
+    """Provider limits with optional SEND_LIMIT_<PROVIDER> environment overrides"""
+    limits = {provider: dict(config) for provider, config in DEFAULT_PROVIDER_LIMITS.items()}
+    for provider, config in limits.items():
+        override = os.getenv(f"SEND_LIMIT_{provider.upper()}")
+        if not override:
+            continue
+        try:
+            rate, burst, workers = [part.strip() for part in override.split(",")]
+            config.update({"rate_per_second": float(rate), "burst": int(burst), "workers": int(workers)})
+        except ValueError:
+            print(f"Ignoring malformed SEND_LIMIT_{provider.upper()}: {override}")
+    return limits
+
+
+class TokenBucket:
+    """Async token bucket shared by all workers sending through one provider"""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ChannelStats:
+    """Throughput and latency counters for one channel, bounded in memory"""
+
+    def __init__(self, window_size: int = 2000):
+        self.latencies_ms = deque(maxlen=window_size)
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.busy_seconds = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        samples = sorted(self.latencies_ms)
+
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            return round(samples[min(int(round(p * (len(samples) - 1))), len(samples) - 1)], 2)
+
+        processed = self.sent + self.failed
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+            "throughput_per_second": round(processed / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+            "latency_ms": {"p50": percentile(0.50), "p95": percentile(0.95), "p99": percentile(0.99)}
+        }
+
+
+class ChannelSendPipeline:
+    """Runs a worker pool per channel, throttled by the channel's provider token bucket.
+
+    ``send`` callables return the usual ``{"status": ...}`` result dicts. A send
+    is retried with exponential backoff and full jitter when it raises or
+    returns ``{"status": "failed", "retryable": True}``; once retries are
+    exhausted the item is written to the ``send_dead_letters`` collection.
+
+    With ``acquire_in_send`` the pipeline passes the provider's ``acquire``
+    coroutine to ``send`` instead of taking a token itself, so items that are
+    skipped, capped or invalid before the provider call cost no throughput.
+    """
+
+    def __init__(self, db=None, limits: Optional[Dict[str, Dict[str, float]]] = None, max_retries: int = 3, base_backoff_seconds: float = 0.5):
+        self.db = db
+        self.limits = limits or load_provider_limits()
+        self.max_retries = max_retries
+        self.base_backoff_seconds = base_backoff_seconds
+        self.buckets: Dict[str, TokenBucket] = {
+            provider: TokenBucket(config["rate_per_second"], int(config["burst"]))
+            for provider, config in self.limits.items()
+        }
+        self.stats: Dict[str, ChannelStats] = {}
+
+    async def run(
+        self,
+        channel: str,
+        items: Iterable[Any],
+        send: Callable[[Any], Awaitable[Dict[str, Any]]],
+        context: Optional[Dict[str, Any]] = None,
+        item_key: Callable[[Any], str] = str,
+        acquire_in_send: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Send every item through the channel's provider and return results in input order"""
+        provider = CHANNEL_PROVIDERS.get(channel, "email")
+        bucket = self.buckets[provider]
+        worker_count = int(self.limits[provider]["workers"])
+        stats = self.stats.setdefault(channel, ChannelStats())
+
+        items = list(items)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        dead_letters: List[Dict[str, Any]] = []
+        queue: asyncio.Queue = asyncio.Queue(maxsize=worker_count * 4)
+
+        async def worker():
+            while True:
+                entry = await queue.get()
+                if entry is None:
+                    queue.task_done()
+                    return
+                index, item = entry
+                results[index] = await self._send_with_retry(bucket, stats, item, send, dead_letters, channel, provider, item_key, context, acquire_in_send)
+                queue.task_done()
+
+        started = time.perf_counter()
+        workers = [asyncio.create_task(worker()) for _ in range(min(worker_count, max(len(items), 1)))]
+        for index, item in enumerate(items):
+            await queue.put((index, item))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        stats.busy_seconds += time.perf_counter() - started
+
+        if dead_letters:
+            await self._store_dead_letters(dead_letters)
+
+        return results
+
+    async def acquire(self, channel: str):
+        """Take one provider token for a call made outside ``run``, such as an audience upload"""
+        await self.buckets[CHANNEL_PROVIDERS.get(channel, "email")].acquire()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "channels": {channel: stats.snapshot() for channel, stats in self.stats.items()},
+            "provider_limits": self.limits
+        }
+
+    async def _send_with_retry(self, bucket, stats, item, send, dead_letters, channel, provider, item_key, context, acquire_in_send=False) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            if not acquire_in_send:
+                await bucket.acquire()
+            started = time.perf_counter()
+            try:
+                result = await send(item, bucket.acquire) if acquire_in_send else await send(item)
+            except Exception as e:
+                result = {"status": "failed", "error": str(e), "retryable": True}
+            stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+
+            retryable = result.get("status") == "failed" and result.get("retryable")
+            if not retryable:
+                if result.get("status") == "sent":
+                    stats.sent += 1
+                else:
+                    stats.failed += 1
+                return result
+
+            if attempt >= self.max_retries:
+                stats.failed += 1
+                stats.dead_lettered += 1
+                dead_letters.append({
+                    "channel": channel,
+                    "provider": provider,
+                    "item_key": item_key(item),
+                    "context": context or {},
+                    "error": result.get("error"),
+                    "attempts": attempt + 1,
+                    "created_at": datetime.now()
+                })
+                return {**result, "status": "dead_lettered"}
+
+            # Exponential backoff with full jitter
+            attempt += 1
+            stats.retried += 1
+            await asyncio.sleep(random.uniform(0, self.base_backoff_seconds * (2 ** attempt)))
+
+    async def _store_dead_letters(self, dead_letters: List[Dict[str, Any]]):
+        if self.db is None:
+            return
+        try:
+            await self.db.send_dead_letters.insert_many(dead_letters, ordered=False)
+        except Exception as e:
+            print(f"Dead-letter logging error: {e}")
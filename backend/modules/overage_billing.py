@@ -0,0 +1,273 @@
+"""
+Customer Mind IQ - Overage Billing
+Monthly overage charges for /admin/charge-overages: usage of a batch of users comes from one grouped
+aggregation per usage collection, overages against the plan limits are priced for the whole batch
+with numpy, and charges are upserted in bulk under per-user idempotency keys by a resumable run
+"""
+
+import asyncio
+import os
+import time as clock
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from modules.index_registry import index_registry
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
+client = AsyncIOMotorClient(MONGO_URL)
+db = client[DB_NAME]
+
+BILLING_BATCH_SIZE = int(os.getenv("OVERAGE_BILLING_BATCH_SIZE", "2000"))
+# A run that stops renewing its lease (crashed worker) can be resumed by another call after this
+RUN_LEASE_SECONDS = int(os.getenv("OVERAGE_BILLING_LEASE_SECONDS", "300"))
+CHARGE_PREVIEW_LIMIT = 100
+DUPLICATE_KEY = 11000
+
+# Same order as the usage details of /usage/{user_email}
+USAGE_RESOURCES = ("contacts", "websites", "keywords", "users", "api_calls_per_month", "email_sends_per_month", "data_storage_gb")
+
+declare_index = index_registry.module(__name__)
+declare_index("users", [("is_active", 1), ("email", 1)])
+declare_index("overage_charges", "idempotency_key", unique=True, partialFilterExpression={"idempotency_key": {"$exists": True}})
+declare_index("overage_charges", [("billing_run_id", 1), ("user_email", 1)])
+declare_index("overage_charges", [("user_email", 1), ("billing_period", -1)])
+
+
+def charge_key(billing_period: str, user_email: str) -> str:
+    """One overage charge per user and billing period"""
+    return f"overage:{billing_period}:{user_email}"
+
+
+def price_overages(usage: np.ndarray, limits: np.ndarray, prices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Overage units and their cost in dollars (rounded to cents) per user and resource.
+
+    ``usage`` and ``limits`` are users x resources, ``prices`` one per-unit
+    price per resource. Unlimited (infinite) limits never produce overages.
+    """
+    overage = np.where(np.isinf(limits), 0.0, np.maximum(usage - limits, 0.0))
+    return overage, np.round(overage * prices, 2)
+
+
+class OverageBillingEngine:
+    """Charges the monthly usage overages of all active users.
+
+    Users are read in email order in batches. For each batch the usage
+    counts come from one ``$group`` per collection over the batch's emails,
+    the overage matrix is priced in one vectorized pass and the resulting
+    charges are upserted with ``$setOnInsert`` keyed by ``charge_key``, so
+    writing a batch twice never creates a second charge. The run of a
+    billing period is a ``billing_runs`` document holding a lease and the
+    email cursor: a crashed run is resumed after its batch boundary, and a
+    completed period returns its report instead of charging again.
+    """
+
+    def __init__(self, db, usage_limits: Dict[str, Dict[str, float]], overage_pricing: Dict[str, float],
+                 batch_size: int = BILLING_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.plans = list(usage_limits)
+        self.limits = np.array([[float(usage_limits[plan].get(resource, 0)) for resource in USAGE_RESOURCES] for plan in self.plans])
+        # Priced by resource name, as get_detailed_usage does
+        self.prices = np.array([float(overage_pricing.get(resource, 0)) for resource in USAGE_RESOURCES])
+        self.worker_id = uuid.uuid4().hex[:12]
+
+    async def _claim(self, billing_period: str) -> Tuple[Dict[str, Any], bool]:
+        """Start or resume the run of a period; returns (run, resumed)"""
+        run_id = f"overage_{billing_period}"
+        now = datetime.utcnow()
+        try:
+            run = await self.db.billing_runs.find_one_and_update(
+                {"_id": run_id, "status": {"$ne": "completed"}, "lease_until": {"$lt": now}},
+                {
+                    "$set": {"status": "running", "worker_id": self.worker_id, "lease_until": now + timedelta(seconds=RUN_LEASE_SECONDS)},
+                    "$setOnInsert": {
+                        "billing_period": billing_period, "started_at": now, "cursor": None, "batches": 0,
+                        "users_scanned": 0, "charges_created": 0, "charges_existing": 0,
+                        "timings": {"usage_seconds": 0.0, "pricing_seconds": 0.0, "write_seconds": 0.0}
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            run = await self.db.billing_runs.find_one({"_id": run_id})
+            if run and run.get("status") == "completed":
+                return run, False
+            raise HTTPException(status_code=409, detail=f"Overage billing for {billing_period} is already running")
+        return run, run["cursor"] is not None
+
+    async def _usage(self, emails: List[str], collections: set, month_start: datetime) -> np.ndarray:
+        """Usage matrix (users x USAGE_RESOURCES) of a batch, one grouped aggregation per collection"""
+        async def grouped(collection: str, field: str, extra: Optional[Dict[str, Any]] = None,
+                          accumulators: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+            if collection not in collections:
+                return []
+            return await self.db[collection].aggregate([
+                {"$match": {field: {"$in": emails}, **(extra or {})}},
+                {"$group": {"_id": f"${field}", **(accumulators or {"n": {"$sum": 1}})}}
+            ]).to_list(length=None)
+
+        contacts, websites, keywords, team, api_calls, campaigns = await asyncio.gather(
+            grouped("customers", "owner_email"),
+            grouped("websites", "user_email"),
+            grouped("keywords", "user_email"),
+            grouped("team_members", "team_owner"),
+            grouped("api_logs", "user_email", {"timestamp": {"$gte": month_start}}),
+            grouped("email_campaigns", "user_email", accumulators={
+                "n": {"$sum": 1},
+                "sends": {"$sum": {"$cond": [{"$gte": ["$sent_at", month_start]}, "$recipient_count", 0]}}
+            })
+        )
+
+        row = {email: index for index, email in enumerate(emails)}
+        usage = np.zeros((len(emails), len(USAGE_RESOURCES)))
+        # Accounts without a team_members collection count as a single user
+        usage[:, USAGE_RESOURCES.index("users")] = 0 if "team_members" in collections else 1
+        for resource, rows, value in (("contacts", contacts, "n"), ("websites", websites, "n"), ("keywords", keywords, "n"),
+                                      ("users", team, "n"), ("api_calls_per_month", api_calls, "n"),
+                                      ("email_sends_per_month", campaigns, "sends")):
+            column = USAGE_RESOURCES.index(resource)
+            for entry in rows:
+                usage[row[entry["_id"]], column] = entry.get(value) or 0
+
+        # Estimated storage: 1 KB per contact, 10 KB per campaign
+        campaign_counts = np.zeros(len(emails))
+        for entry in campaigns:
+            campaign_counts[row[entry["_id"]]] = entry["n"]
+        storage = (usage[:, USAGE_RESOURCES.index("contacts")] * 0.001 + campaign_counts * 0.01) / 1024
+        usage[:, USAGE_RESOURCES.index("data_storage_gb")] = np.round(storage, 2)
+        return usage
+
+    def _charges(self, users: Sequence[Dict[str, Any]], usage: np.ndarray, run_id: str, billing_period: str) -> List[Dict[str, Any]]:
+        plan_index = {plan: index for index, plan in enumerate(self.plans)}
+        free = plan_index.get("free", 0)
+        plans = np.array([plan_index.get(user.get("plan_type", "free"), free) for user in users], dtype=np.intp)
+        overage, costs = price_overages(usage, self.limits[plans], self.prices)
+
+        created_at = datetime.utcnow()
+        charges = []
+        for index in np.flatnonzero((costs > 0).any(axis=1)):
+            items = [{
+                "resource": resource,
+                "overage_amount": float(overage[index, column]) if resource == "data_storage_gb" else int(overage[index, column]),
+                "cost": float(costs[index, column])
+            } for column, resource in enumerate(USAGE_RESOURCES) if costs[index, column] > 0]
+            user = users[index]
+            charges.append({
+                "charge_id": str(uuid.uuid4()),
+                "idempotency_key": charge_key(billing_period, user["email"]),
+                "billing_run_id": run_id,
+                "user_email": user["email"],
+                "plan_type": user.get("plan_type", "free"),
+                "billing_period": billing_period,
+                "overage_items": items,
+                "total_charge": sum(item["cost"] for item in items),
+                "status": "pending",
+                "created_at": created_at
+            })
+        return charges
+
+    async def _write(self, charges: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """Upsert charges by idempotency key; returns (created, already present)"""
+        if not charges:
+            return 0, 0
+        operations = [UpdateOne({"idempotency_key": charge["idempotency_key"]}, {"$setOnInsert": charge}, upsert=True)
+                      for charge in charges]
+        try:
+            result = await self.db.overage_charges.bulk_write(operations, ordered=False)
+            created = result.upserted_count
+        except BulkWriteError as e:
+            # Concurrent upserts of the same key lose the race on the unique index; the charge exists
+            details = e.details or {}
+            if details.get("writeConcernErrors") or any(error.get("code") != DUPLICATE_KEY for error in details.get("writeErrors", [])):
+                raise
+            created = details.get("nUpserted", 0)
+        return created, len(charges) - created
+
+    async def run(self, billing_period: Optional[str] = None) -> Dict[str, Any]:
+        """Charge the overages of a billing period (the current month by default)"""
+        billing_period = billing_period or datetime.utcnow().strftime("%Y-%m")
+        run, resumed = await self._claim(billing_period)
+        if run["status"] == "completed":
+            return self.report(run)
+
+        run_id = run["_id"]
+        month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        collections = set(await self.db.list_collection_names())
+        cursor = run.get("cursor")
+        started = clock.perf_counter()
+        scanned = 0
+
+        while True:
+            criteria: Dict[str, Any] = {"is_active": True, "plan_type": {"$ne": "scale"}}
+            if cursor is not None:
+                criteria["email"] = {"$gt": cursor}
+            users = await self.db.users.find(criteria, {"_id": 0, "email": 1, "plan_type": 1}).sort("email", 1).limit(
+                self.batch_size).to_list(length=self.batch_size)
+            if not users:
+                break
+
+            step = clock.perf_counter()
+            usage = await self._usage([user["email"] for user in users], collections, month_start)
+            usage_seconds = clock.perf_counter() - step
+            step = clock.perf_counter()
+            charges = self._charges(users, usage, run_id, billing_period)
+            pricing_seconds = clock.perf_counter() - step
+            step = clock.perf_counter()
+            created, existing = await self._write(charges)
+            write_seconds = clock.perf_counter() - step
+
+            cursor = users[-1]["email"]
+            scanned += len(users)
+            progress = await self.db.billing_runs.update_one({"_id": run_id, "worker_id": self.worker_id}, {
+                "$set": {"cursor": cursor, "lease_until": datetime.utcnow() + timedelta(seconds=RUN_LEASE_SECONDS)},
+                "$inc": {
+                    "batches": 1, "users_scanned": len(users), "charges_created": created, "charges_existing": existing,
+                    "timings.usage_seconds": usage_seconds, "timings.pricing_seconds": pricing_seconds,
+                    "timings.write_seconds": write_seconds
+                }
+            })
+            if not progress.matched_count:
+                # The lease expired and another call resumed the run; its charges are the same keys
+                raise HTTPException(status_code=409, detail=f"Overage billing for {billing_period} was taken over by another worker")
+
+        # Totals come from the charges themselves, so batches written before a crash count once
+        totals = await self.db.overage_charges.aggregate([
+            {"$match": {"billing_run_id": run_id}},
+            {"$group": {"_id": None, "users_charged": {"$sum": 1}, "total_charges": {"$sum": "$total_charge"}}}
+        ]).to_list(length=1)
+        totals = totals[0] if totals else {}
+        elapsed = clock.perf_counter() - started
+        run = await self.db.billing_runs.find_one_and_update({"_id": run_id}, {"$set": {
+            "status": "completed",
+            "finished_at": datetime.utcnow(),
+            "resumed": resumed,
+            "users_charged": totals.get("users_charged", 0),
+            "total_charges": round(totals.get("total_charges", 0.0), 2),
+            "last_pass_users": scanned,
+            "last_pass_seconds": round(elapsed, 3),
+            "users_per_second": round(scanned / elapsed, 1) if elapsed > 0 else None,
+            "lease_until": datetime.utcnow()
+        }}, return_document=ReturnDocument.AFTER)
+        return self.report(run)
+
+    def report(self, run: Dict[str, Any]) -> Dict[str, Any]:
+        report = {key: value for key, value in run.items() if key not in ("_id", "cursor", "worker_id", "lease_until")}
+        report["run_id"] = run["_id"]
+        report["timings"] = {name: round(seconds, 3) for name, seconds in (run.get("timings") or {}).items()}
+        return report
+
+    async def charges(self, run_id: str, limit: int = CHARGE_PREVIEW_LIMIT) -> List[Dict[str, Any]]:
+        return await self.db.overage_charges.find({"billing_run_id": run_id}, {"_id": 0}).sort("user_email", 1).to_list(length=limit)
+
+    async def runs(self, limit: int = 12) -> List[Dict[str, Any]]:
+        runs = await self.db.billing_runs.find({}).sort("started_at", -1).to_list(length=limit)
+        return [self.report(run) for run in runs]
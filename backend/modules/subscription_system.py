@@ -14,6 +14,10 @@ from dotenv import load_dotenv
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from email_system import schedule_trial_email_sequence
+from modules.dashboard_cache import dashboard_cache
+from modules.user_search import search_fields
+from modules.index_registry import index_registry
+from modules.overage_billing import OverageBillingEngine
 
 # Load environment variables
 load_dotenv()
@@ -24,6 +28,21 @@ DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
 client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 
+declare_index = index_registry.module(__name__)
+declare_index("referrals", "referrer_email")
+declare_index("referrals", "referee_email")
+declare_index("prepaid_balances", "user_email")
+declare_index("refund_requests", [("status", 1), ("created_at", -1)])
+declare_index("api_logs", [("user_email", 1), ("timestamp", -1)])
+declare_index("customers", "owner_email")
+declare_index("customers", "user_email")
+declare_index("campaigns", "user_email")
+declare_index("email_campaigns", "user_email")
+declare_index("automation_workflows", "user_email")
+declare_index("keywords", "user_email")
+declare_index("websites", "user_email")
+declare_index("team_members", "team_owner")
+
 router = APIRouter(tags=["Subscriptions"])
 
 # Models
@@ -123,6 +142,9 @@ OVERAGE_PRICING = {
     "data_storage_gb": 2.00     # $2.00 per extra GB per month
 }
 
+# Shared overage billing pipeline used by /admin/charge-overages
+overage_billing = OverageBillingEngine(db, USAGE_LIMITS, OVERAGE_PRICING)
+
 # Subscription Tiers and Features - Updated with New Pricing Structure
 SUBSCRIPTION_FEATURES = {
     "free": {
@@ -390,6 +412,7 @@ async def register_trial_user(trial_data: TrialRegistration):
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
+        new_user["search"] = search_fields(new_user)
         
         await db.users.insert_one(new_user)
         
@@ -407,6 +430,7 @@ async def register_trial_user(trial_data: TrialRegistration):
             # Log email scheduling error but don't fail the registration
             print(f"WARNING: Failed to schedule trial emails for {trial_data.email}: {str(e)}")
         
+        dashboard_cache.notify("users")
         return {
             "status": "success",
             "message": "Trial user registered successfully",
@@ -1163,65 +1187,28 @@ async def get_detailed_usage(user_email: str):
 async def charge_usage_overages():
     """Admin endpoint to process monthly overage charges for all users"""
     try:
-        # Get all active users
-        active_users = await db.users.find({"is_active": True}).to_list(length=None)
-        
-        overage_charges = []
-        total_charges = 0
-        
-        for user in active_users:
-            user_email = user["email"]
-            plan_type = user.get("plan_type", "free")
-            
-            # Skip scale plan users (they have high limits)
-            if plan_type == "scale":
-                continue
-            
-            # Get usage and calculate overages
-            usage_response = await get_detailed_usage(user_email)
-            usage_details = usage_response["usage_details"]
-            
-            user_overage_cost = 0
-            overage_items = []
-            
-            for resource, details in usage_details.items():
-                if details["status"] == "over_limit":
-                    overage_cost = float(details["overage_cost"].replace("$", ""))
-                    if overage_cost > 0:
-                        user_overage_cost += overage_cost
-                        overage_items.append({
-                            "resource": resource,
-                            "overage_amount": details["overage"],
-                            "cost": overage_cost
-                        })
-            
-            if user_overage_cost > 0:
-                # Create overage charge record
-                overage_record = {
-                    "charge_id": str(uuid.uuid4()),
-                    "user_email": user_email,
-                    "plan_type": plan_type,
-                    "billing_period": datetime.utcnow().strftime("%Y-%m"),
-                    "overage_items": overage_items,
-                    "total_charge": user_overage_cost,
-                    "status": "pending",
-                    "created_at": datetime.utcnow()
-                }
-                
-                await db.overage_charges.insert_one(overage_record)
-                overage_charges.append(overage_record)
-                total_charges += user_overage_cost
+        # Batched, idempotent and resumable: a second call in the same month returns the completed run
+        report = await overage_billing.run()
+        charges = await overage_billing.charges(report["run_id"])
         
         return {
             "status": "success",
-            "message": f"Processed overage charges for {len(overage_charges)} users",
-            "total_charges": f"${total_charges:.2f}",
-            "overage_charges": overage_charges
+            "message": f"Processed overage charges for {report['users_charged']} users",
+            "total_charges": f"${report['total_charges']:.2f}",
+            "overage_charges": charges,
+            "billing_run": report
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Overage charging failed: {str(e)}")
 
+@router.get("/admin/overage-runs")
+async def get_overage_billing_runs(limit: int = Query(12, ge=1, le=100)):
+    """Admin endpoint: reports of the latest overage billing runs with their throughput"""
+    return {"status": "success", "runs": await overage_billing.runs(limit)}
+
 # Helper functions for usage calculations
 async def get_monthly_api_calls(user_email: str) -> int:
     """Get API calls for current month"""
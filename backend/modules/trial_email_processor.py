@@ -0,0 +1,204 @@
+"""
+Customer Mind IQ - Trial Email Processor
+Set-based processing of scheduled trial lifecycle emails: batched claims joined to users,
+concurrent sends, bulk status write-back and due-time driven sleeping
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+from modules.email_system import db, get_email_provider_config, TrialEmailStatus
+from modules.index_registry import index_registry
+
+logger = logging.getLogger(__name__)
+
+declare_index = index_registry.module(__name__)
+declare_index("trial_email_logs", [("status", 1), ("scheduled_send_time", 1)])
+declare_index("trial_email_logs", "log_id", unique=True)
+declare_index("trial_email_logs", "claim_id", sparse=True)
+
+
+class TrialEmailProcessor:
+    """Claims due trial emails in batches and sends them concurrently.
+
+    A batch is claimed by stamping a ``claim_id`` on up to ``batch_size`` due
+    logs, then read back with a single ``$lookup`` to ``users`` so conversion
+    checks need no per-email query. Results are written back with one
+    ``bulk_write``. Claims left behind by a crashed worker are released after
+    ``claim_timeout``.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 1000,
+        concurrency: int = 50,
+        max_idle_seconds: int = 300,
+        claim_timeout: timedelta = timedelta(minutes=15)
+    ):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_idle_seconds = max_idle_seconds
+        self.claim_timeout = claim_timeout
+        self._wakeup = asyncio.Event()
+
+    def notify_scheduled(self):
+        """Wake the background loop when new emails are scheduled in this process"""
+        self._wakeup.set()
+
+    async def process_due(self, max_batches: Optional[int] = None) -> Dict[str, int]:
+        """Drain every currently due email batch by batch"""
+        await self._release_stale_claims()
+
+        totals = {"sent": 0, "failed": 0, "skipped": 0}
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            claimed = await self._claim_batch({"scheduled_send_time": {"$lte": datetime.utcnow()}})
+            if not claimed:
+                break
+            for key, value in (await self._process_batch(claimed)).items():
+                totals[key] += value
+            batches += 1
+            if len(claimed) < self.batch_size:
+                break
+        return totals
+
+    async def send_now(self, log_id: str) -> Optional[Dict[str, int]]:
+        """Send one log immediately regardless of its scheduled time; None if it is not pending"""
+        claimed = await self._claim_batch({"log_id": log_id})
+        if not claimed:
+            return None
+        return await self._process_batch(claimed)
+
+    async def seconds_until_next_due(self) -> float:
+        next_email = await db.trial_email_logs.find_one(
+            {"status": TrialEmailStatus.SCHEDULED.value},
+            projection={"scheduled_send_time": 1},
+            sort=[("scheduled_send_time", ASCENDING)]
+        )
+        if not next_email:
+            return float(self.max_idle_seconds)
+        wait = (next_email["scheduled_send_time"] - datetime.utcnow()).total_seconds()
+        return min(max(wait, 0.0), float(self.max_idle_seconds))
+
+    async def wait_for_next_due(self):
+        """Sleep until the next email is due, new emails are scheduled, or max_idle_seconds pass"""
+        wait = await self.seconds_until_next_due()
+        if wait <= 0:
+            return
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _release_stale_claims(self):
+        await db.trial_email_logs.update_many(
+            {
+                "status": TrialEmailStatus.SENDING.value,
+                "claimed_at": {"$lt": datetime.utcnow() - self.claim_timeout}
+            },
+            {"$set": {"status": TrialEmailStatus.SCHEDULED.value}, "$unset": {"claim_id": "", "claimed_at": ""}}
+        )
+
+    async def _claim_batch(self, due_filter: Dict[str, Any]) -> List[Dict[str, Any]]:
+        query = {"status": TrialEmailStatus.SCHEDULED.value, **due_filter}
+        candidates = await db.trial_email_logs.find(query, {"log_id": 1}) \
+            .sort("scheduled_send_time", ASCENDING).limit(self.batch_size).to_list(length=self.batch_size)
+        if not candidates:
+            return []
+
+        claim_id = str(uuid.uuid4())
+        # Re-check status so a concurrent worker's claim wins cleanly
+        await db.trial_email_logs.update_many(
+            {"log_id": {"$in": [c["log_id"] for c in candidates]}, "status": TrialEmailStatus.SCHEDULED.value},
+            {"$set": {"status": TrialEmailStatus.SENDING.value, "claim_id": claim_id, "claimed_at": datetime.utcnow()}}
+        )
+
+        return await db.trial_email_logs.aggregate([
+            {"$match": {"claim_id": claim_id}},
+            {"$lookup": {
+                "from": "users",
+                "localField": "user_email",
+                "foreignField": "email",
+                "as": "user"
+            }},
+            {"$project": {
+                "_id": 0,
+                "log_id": 1,
+                "user_email": 1,
+                "subject": 1,
+                "html_content": 1,
+                # Unknown users and users without the flag are treated as still on trial
+                "is_trial": {"$ifNull": [{"$arrayElemAt": ["$user.is_trial", 0]}, True]}
+            }}
+        ]).to_list(length=None)
+
+    async def _process_batch(self, claimed: List[Dict[str, Any]]) -> Dict[str, int]:
+        from modules.email_delivery import EmailDeliveryPipeline
+
+        now = datetime.utcnow()
+        operations = []
+        counts = {"sent": 0, "failed": 0, "skipped": 0}
+        to_send = []
+
+        for email_log in claimed:
+            if not email_log["is_trial"]:
+                # User converted before this email was due
+                counts["skipped"] += 1
+                operations.append(UpdateOne({"log_id": email_log["log_id"]}, {
+                    "$set": {
+                        "status": TrialEmailStatus.SKIPPED.value,
+                        "error_message": "User converted before email was sent",
+                        "updated_at": now
+                    },
+                    "$unset": {"claim_id": ""}
+                }))
+            else:
+                to_send.append(email_log)
+
+        if to_send:
+            provider_config = await get_email_provider_config()
+            semaphore = asyncio.Semaphore(self.concurrency)
+            async with EmailDeliveryPipeline(provider_config, per_recipient_concurrency=self.concurrency) as pipeline:
+                async def send(email_log):
+                    async with semaphore:
+                        try:
+                            return await pipeline.send_message(
+                                email_log["user_email"],
+                                email_log["subject"],
+                                email_log["html_content"],
+                                "Please view this email in HTML format."
+                            )
+                        except Exception as e:
+                            return {"success": False, "error": str(e)}
+
+                results = await asyncio.gather(*[send(email_log) for email_log in to_send])
+
+            sent_at = datetime.utcnow()
+            for email_log, result in zip(to_send, results):
+                success = bool(result.get("success"))
+                counts["sent" if success else "failed"] += 1
+                update = {
+                    "status": TrialEmailStatus.SENT.value if success else TrialEmailStatus.FAILED.value,
+                    "actual_send_time": sent_at,
+                    "error_message": None if success else result.get("error"),
+                    "updated_at": sent_at
+                }
+                if result.get("provider"):
+                    update["provider_used"] = result["provider"]
+                operations.append(UpdateOne({"log_id": email_log["log_id"]}, {"$set": update, "$unset": {"claim_id": ""}}))
+
+        if operations:
+            await db.trial_email_logs.bulk_write(operations, ordered=False)
+
+        logger.info(f"Trial email batch processed: {counts}")
+        return counts
+
+
+# Shared instance used by the background task manager and API endpoints
+trial_email_processor = TrialEmailProcessor()
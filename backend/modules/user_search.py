@@ -0,0 +1,204 @@
+"""
+Customer Mind IQ - User Search
+Indexed user search for /api/admin/users/search: each user carries a normalized search field with
+lowercase edge prefixes (search-as-you-type) and trigrams (substring matches), both indexed together
+with the created_at ordering so pages are read by keyset instead of skip, and totals are estimated
+"""
+
+import asyncio
+import base64
+import json
+import os
+import re
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DESCENDING, UpdateOne
+
+from modules.index_registry import index_registry
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
+client = AsyncIOMotorClient(MONGO_URL)
+db = client[DB_NAME]
+
+# Bump when search_fields changes so the backfill re-derives every user
+SEARCH_VERSION = 1
+PREFIX_MAX_LENGTH = 8
+GRAM_SIZE = 3
+BACKFILL_BATCH_SIZE = 1000
+# Counts stop at this many matches; larger totals are estimated from a sample
+EXACT_COUNT_LIMIT = 1000
+ESTIMATE_SAMPLE_SIZE = 2000
+MATCH_MODES = ("prefix", "contains")
+SOURCE_FIELDS = {"user_id": 1, "email": 1, "first_name": 1, "last_name": 1, "company_name": 1}
+# Never returned by the search endpoint
+HIDDEN_FIELDS = {"_id": 0, "password_hash": 0, "search": 0}
+SORT = [("created_at", DESCENDING), ("user_id", DESCENDING)]
+
+declare_index = index_registry.module(__name__)
+declare_index("users", [("search.prefixes", 1), *SORT])
+declare_index("users", [("search.grams", 1), *SORT])
+declare_index("users", SORT)
+declare_index("users", "search.version")
+
+
+def normalize(text: Any) -> str:
+    """Lowercase, accent-free, single-spaced form used for indexing and queries"""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def search_fields(user: Dict[str, Any]) -> Dict[str, Any]:
+    """The ``search`` subdocument of a user.
+
+    ``keys`` are the strings a query can match: the email, "first last",
+    the last name and the company. ``prefixes`` holds every prefix of the
+    keys up to ``PREFIX_MAX_LENGTH`` characters and ``grams`` their
+    trigrams, so both lookups are equality matches on a multikey index.
+    """
+    first, last = normalize(user.get("first_name")), normalize(user.get("last_name"))
+    keys = [normalize(user.get("email")), " ".join(part for part in (first, last) if part), last, normalize(user.get("company_name"))]
+    keys = list(dict.fromkeys(key for key in keys if key))
+    prefixes = {key[:length] for key in keys for length in range(1, min(len(key), PREFIX_MAX_LENGTH) + 1)}
+    grams = set().union(*(trigrams(key) for key in keys)) if keys else set()
+    return {"keys": keys, "prefixes": sorted(prefixes), "grams": sorted(grams), "version": SEARCH_VERSION}
+
+
+def encode_cursor(user: Dict[str, Any]) -> str:
+    created_at = user.get("created_at")
+    position = [created_at.isoformat() if isinstance(created_at, datetime) else None, user.get("user_id")]
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], str]:
+    try:
+        created_at, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (datetime.fromisoformat(created_at) if created_at else None), str(user_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid search cursor")
+
+
+def text_condition(query: str, match: str) -> Optional[Dict[str, Any]]:
+    """Index-backed condition for a search string, verified against the keys"""
+    text = normalize(query)
+    if not text:
+        return None
+    if match == "contains" and len(text) >= GRAM_SIZE:
+        condition = {"search.grams": {"$all": sorted(trigrams(text))}}
+        if len(text) > GRAM_SIZE:
+            # Trigrams can come from different keys or positions
+            condition["search.keys"] = {"$regex": re.escape(text)}
+        return condition
+    # Queries too short for trigrams are matched as prefixes
+    if len(text) <= PREFIX_MAX_LENGTH:
+        return {"search.prefixes": text}
+    return {"search.prefixes": text[:PREFIX_MAX_LENGTH], "search.keys": {"$regex": "^" + re.escape(text)}}
+
+
+def after_condition(created_at: Optional[datetime], user_id: str) -> Dict[str, Any]:
+    """Rows strictly after (created_at, user_id) in descending order"""
+    if created_at is None:
+        return {"created_at": None, "user_id": {"$lt": user_id}}
+    return {"created_at": {"$lte": created_at}, "$nor": [{"created_at": created_at, "user_id": {"$gte": user_id}}]}
+
+
+class UserSearchEngine:
+    """User search backed by the ``search`` subdocument of each user.
+
+    Writes through the auth and trial sign-up paths call ``sync_user``;
+    anything else (imports, older users, a new ``SEARCH_VERSION``) is picked
+    up by ``backfill`` from the background task manager.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def sync_user(self, user_id: str):
+        user = await self.db.users.find_one({"user_id": user_id}, SOURCE_FIELDS)
+        if user:
+            await self.db.users.update_one({"_id": user["_id"]}, {"$set": {"search": search_fields(user)}})
+
+    async def backfill(self, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+        """Derive the search fields of every user that lacks the current version"""
+        updated = 0
+        while True:
+            users = await self.db.users.find({"search.version": {"$ne": SEARCH_VERSION}}, SOURCE_FIELDS).limit(batch_size).to_list(length=batch_size)
+            if not users:
+                return updated
+            await self.db.users.bulk_write(
+                [UpdateOne({"_id": user["_id"]}, {"$set": {"search": search_fields(user)}}) for user in users],
+                ordered=False
+            )
+            updated += len(users)
+
+    async def search(
+        self,
+        filters: Dict[str, Any],
+        query: Optional[str] = None,
+        match: str = "prefix",
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """One page of users, newest first, with the cursor of the next page.
+
+        ``offset`` is still honoured for callers that page by skip, but
+        only when no cursor is given.
+        """
+        conditions = [filters] if filters else []
+        condition = text_condition(query, match) if query else None
+        if condition:
+            conditions.append(condition)
+        base = {"$and": conditions} if len(conditions) > 1 else (conditions[0] if conditions else {})
+
+        page_query = base
+        if cursor:
+            page_query = {"$and": conditions + [after_condition(*decode_cursor(cursor))]}
+            offset = 0
+        find = self.db.users.find(page_query, HIDDEN_FIELDS).sort(SORT).limit(limit + 1)
+        if offset:
+            find = find.skip(offset)
+        users, (total, exact) = await asyncio.gather(find.to_list(length=limit + 1), self.estimate_total(base))
+
+        has_more = len(users) > limit
+        users = users[:limit]
+        return {
+            "users": users,
+            "total": max(total, offset + len(users)),
+            "total_is_estimate": not exact,
+            "limit": limit,
+            "offset": offset,
+            "has_more": has_more,
+            "next_cursor": encode_cursor(users[-1]) if has_more else None
+        }
+
+    async def estimate_total(self, query: Dict[str, Any]) -> Tuple[int, bool]:
+        """Exact count up to EXACT_COUNT_LIMIT, a sampled estimate above it"""
+        if not query:
+            return await self.db.users.estimated_document_count(), False
+        counted = await self.db.users.count_documents(query, limit=EXACT_COUNT_LIMIT)
+        if counted < EXACT_COUNT_LIMIT:
+            return counted, True
+        population = await self.db.users.estimated_document_count()
+        sampled = await self.db.users.aggregate([
+            {"$sample": {"size": ESTIMATE_SAMPLE_SIZE}},
+            {"$match": query},
+            {"$count": "matched"}
+        ]).to_list(length=1)
+        matched = sampled[0]["matched"] if sampled else 0
+        return max(EXACT_COUNT_LIMIT, round(population * matched / min(ESTIMATE_SAMPLE_SIZE, population))), False
+
+
+# Shared instance used by the admin search endpoint, the sign-up paths and the backfill task
+user_search = UserSearchEngine(db)
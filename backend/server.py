@@ -136,6 +136,17 @@ from modules.payment_system import router as payment_router
 # Import Affiliate System Module
 from modules.affiliate_system import router as affiliate_router
 
+# Import in-process dashboard composition and the dashboard response cache
+from modules.dashboard_composer import DashboardComposer, DashboardSection
+from modules.dashboard_cache import dashboard_cache
+
+# Import materialized customer analytics rollups
+from modules.analytics_rollups import analytics_rollups, ALL_TENANTS
+
+# Import declarative index registry, startup index migration and slow-query detector
+from modules.index_registry import index_registry, index_migrations, slow_queries, INDEX_MIGRATIONS_ENABLED, SLOW_QUERY_PROFILING
+from modules.data_lifecycle import data_lifecycle
+
 # Import Authentication System
 from auth.auth_system import router as auth_router, create_default_admin, UserProfile, get_current_user, require_role, UserRole, hash_password, SubscriptionTier
 
@@ -167,6 +178,11 @@ DB_NAME = os.getenv("DB_NAME", "customer_mind_iq")
 client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 
+declare_index = index_registry.module(__name__)
+declare_index("customers", "owner_user_id")
+declare_index("campaigns", "id")
+declare_index("campaigns", "created_by")
+
 app = FastAPI(
     title="Customer Mind IQ - AI-Powered Purchase Analytics",
     description="Advanced customer behavior analysis and email marketing automation powered by artificial intelligence",
@@ -555,6 +571,19 @@ async def startup_event():
         else:
             print("✅ Admin user already exists")
             
+        # Create the compressed archive collections before the index migration creates them uncompressed
+        await data_lifecycle.ensure_archive_collections()
+            
+        # Build declared indexes in the background and report drift against the live ones
+        if INDEX_MIGRATIONS_ENABLED:
+            index_migrations.start()
+            print(f"✅ Index migration started ({len(index_registry.specs())} declared indexes)")
+        
+        # Profile slow and unindexed queries for /api/admin/slow-queries
+        if SLOW_QUERY_PROFILING:
+            profiling = await slow_queries.enable()
+            print(f"✅ Slow query profiling: {profiling or 'unavailable'}")
+            
         # Create demo data for admin portal testing
         await create_demo_data()
         
@@ -563,6 +592,14 @@ async def startup_event():
         await start_background_tasks()
         print("✅ Background tasks started (trial email automation)")
         
+        # Start durable scheduler for delayed multi-channel journey steps
+        await multi_channel_orchestration_service.step_scheduler.start()
+        print(f"✅ Journey step scheduler started (worker {multi_channel_orchestration_service.step_scheduler.worker_id})")
+        
+        # Seed today's frequency cap buckets from existing deliveries
+        seeded = await multi_channel_orchestration_service.frequency_caps.backfill_from_deliveries()
+        print(f"✅ Frequency cap counters ready ({seeded} customer buckets today)")
+        
     except Exception as e:
         print(f"❌ Startup initialization error: {e}")
 
@@ -578,6 +615,9 @@ async def shutdown_event():
         from background_tasks import stop_background_tasks
         await stop_background_tasks()
         print("✅ Background tasks stopped")
+        
+        await multi_channel_orchestration_service.step_scheduler.stop()
+        print("✅ Journey step scheduler stopped")
     except Exception as e:
         print(f"❌ Shutdown cleanup error: {e}")
 
@@ -625,6 +665,7 @@ class AnalyticsData(BaseModel):
     top_products: List[Dict[str, Any]]
     conversion_metrics: Dict[str, float]
     segment_distribution: Dict[str, int]
+    rolled_up_at: Optional[datetime] = None  # when the rollup last reflected a customer write
 
 # AI Service for customer behavior analysis
 class CustomerAnalyticsService:
@@ -1068,6 +1109,15 @@ async def test_database_connection():
             "mongo_url": os.getenv("MONGO_URL", "not_set")[:50] + "..." if os.getenv("MONGO_URL") else "not_set"
         }
 
+async def track_customer_change(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]):
+    """Fold a customer write into the analytics rollups; drift is repaired by the periodic rebuild"""
+    try:
+        await analytics_rollups.apply_change(before, after)
+    except Exception as e:
+        print(f"Analytics rollup update error: {e}")
+    owner_user_id = (after or before or {}).get("owner_user_id")
+    dashboard_cache.notify("customers", tenant=owner_user_id)
+
 @app.get("/api/customers", response_model=List[CustomerBehavior])
 async def get_customers(current_user: UserProfile = Depends(get_current_user)):
     """Get customers with AI-powered behavior analysis - filtered by user ownership"""
@@ -1114,11 +1164,12 @@ async def get_customers(current_user: UserProfile = Depends(get_current_user)):
                 analyzed_customers.append(customer_behavior)
                 
                 # Store in MongoDB with ownership
-                await db.customers.update_one(
+                previous = await db.customers.find_one_and_update(
                     {"customer_id": customer_behavior.customer_id},
                     {"$set": customer_behavior.dict()},
                     upsert=True
                 )
+                await track_customer_change(previous, customer_behavior.dict())
             
             return analyzed_customers
         else:
@@ -1233,6 +1284,7 @@ async def add_customer_data(customer_input: CustomerDataInput, current_user: Use
         
         # Store in MongoDB
         await db.customers.insert_one(customer_behavior.dict())
+        await track_customer_change(None, customer_behavior.dict())
         
         return customer_behavior
         
@@ -1286,11 +1338,12 @@ async def update_customer_data(
             "updated_at": datetime.now()
         }
         
-        # Update in MongoDB
-        await db.customers.update_one(query, {"$set": updated_data})
-        
-        # Get updated customer data
-        updated_customer = await db.customers.find_one(query)
+        # Update in MongoDB; the document as it was just before the write feeds the rollups
+        previous = await db.customers.find_one_and_update(query, {"$set": updated_data})
+        if not previous:
+            raise HTTPException(status_code=404, detail="Customer not found or access denied")
+        updated_customer = {**previous, **updated_data}
+        await track_customer_change(previous, updated_customer)
         return CustomerBehavior(**updated_customer)
         
     except Exception as e:
@@ -1308,10 +1361,11 @@ async def delete_customer_data(customer_id: str, current_user: UserProfile = Dep
             # Regular users can only access their own customers
             query = {"customer_id": customer_id, "owner_user_id": current_user.user_id}
         
-        result = await db.customers.delete_one(query)
+        deleted_customer = await db.customers.find_one_and_delete(query)
         
-        if result.deleted_count == 0:
+        if not deleted_customer:
             raise HTTPException(status_code=404, detail="Customer not found or access denied")
+        await track_customer_change(deleted_customer, None)
         
         return {"message": "Customer data deleted successfully", "customer_id": customer_id}
         
@@ -1367,6 +1421,7 @@ async def create_campaign(campaign: EmailCampaign, current_user: UserProfile = D
         
         # Store campaign
         await db.campaigns.insert_one(campaign.dict())
+        dashboard_cache.notify("campaigns")
         
         # Schedule email sending if date is provided
         if campaign.scheduled_date:
@@ -1390,37 +1445,14 @@ async def get_campaigns():
 async def get_analytics(current_user: UserProfile = Depends(get_current_user)):
     """Get comprehensive Customer Mind IQ analytics dashboard data - filtered by user ownership"""
     try:
-        # Build filter based on user role
+        # Admins see the rollup over all customers, regular users the one over their own customers
         if current_user.role in ["admin", "super_admin"]:
-            # Admin can see all analytics
-            customer_filter = {}
+            tenant = ALL_TENANTS
         else:
-            # Regular users can only see analytics for their own customers
-            customer_filter = {"owner_user_id": current_user.user_id}
-        
-        # Get customer stats
-        total_customers = await db.customers.count_documents(customer_filter)
-        
-        # Calculate total revenue
-        customers = await db.customers.find(customer_filter).to_list(length=1000)
-        total_revenue = sum(c.get("total_spent", 0) for c in customers)
-        
-        # Top products analysis
-        software_counts = {}
-        for customer in customers:
-            for software in customer.get("software_owned", []):
-                software_counts[software] = software_counts.get(software, 0) + 1
+            tenant = current_user.user_id
         
-        top_products = [
-            {"name": software, "customers": count, "revenue": count * 3500}
-            for software, count in sorted(software_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-        ]
-        
-        # Segment distribution
-        segment_counts = {}
-        for customer in customers:
-            stage = customer.get("lifecycle_stage", "active")
-            segment_counts[stage] = segment_counts.get(stage, 0) + 1
+        # Totals, segments and top products are maintained incrementally on every customer write
+        rollup = await analytics_rollups.read(tenant)
         
         # Enhanced conversion metrics for Customer Mind IQ
         conversion_metrics = {
@@ -1431,11 +1463,12 @@ async def get_analytics(current_user: UserProfile = Depends(get_current_user)):
         }
         
         analytics = AnalyticsData(
-            total_customers=total_customers,
-            total_revenue=total_revenue,
-            top_products=top_products,
+            total_customers=rollup["total_customers"],
+            total_revenue=rollup["total_revenue"],
+            top_products=rollup["top_products"],
             conversion_metrics=conversion_metrics,
-            segment_distribution=segment_counts
+            segment_distribution=rollup["segment_distribution"],
+            rolled_up_at=rollup["rolled_up_at"]
         )
         
         return analytics
@@ -1443,6 +1476,111 @@ async def get_analytics(current_user: UserProfile = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Customer Mind IQ analytics error: {e}")
 
+@app.get("/api/analytics/rollups/consistency")
+async def check_analytics_rollups(
+    tenant: Optional[str] = None,
+    repair: bool = False,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Admin endpoint: compare the analytics rollups with a full recompute, optionally rebuilding on drift"""
+    try:
+        report = await analytics_rollups.check_consistency(tenant, repair=repair)
+        return {"status": "success", **report}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analytics rollup consistency error: {e}")
+
+@app.get("/api/admin/dashboard-cache/stats")
+async def get_dashboard_cache_stats(current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))):
+    """Admin endpoint: per-route dashboard cache hit rate and recompute time"""
+    return {"status": "success", **dashboard_cache.stats(), "timestamp": datetime.now()}
+
+@app.post("/api/admin/dashboard-cache/invalidate")
+async def invalidate_dashboard_cache(
+    route: Optional[str] = None,
+    tenant: Optional[str] = None,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Admin endpoint: drop cached dashboards of one route (or all routes), optionally for one tenant"""
+    dropped = dashboard_cache.invalidate(route, tenant)
+    return {"status": "success", "route": route or "all", "entries_dropped": dropped, "timestamp": datetime.now()}
+
+@app.get("/api/admin/indexes")
+async def get_index_drift(current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))):
+    """Admin endpoint: declared indexes vs the live ones, with the last startup migration"""
+    try:
+        drift = await index_migrations.drift()
+        return {"status": "success", **drift, "last_migration": index_migrations.last_report, "timestamp": datetime.now()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Index drift error: {e}")
+
+@app.post("/api/admin/indexes/migrate")
+async def run_index_migration(current_user: UserProfile = Depends(require_role([UserRole.SUPER_ADMIN]))):
+    """Admin endpoint: build missing declared indexes now and return the migration report"""
+    try:
+        report = await index_migrations.migrate()
+        return {"status": "success", **report}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Index migration error: {e}")
+
+@app.get("/api/admin/slow-queries")
+async def get_slow_queries(
+    hours: int = 24,
+    limit: int = 50,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Admin endpoint: profiled slow queries grouped by shape, collection scans first"""
+    try:
+        report = await slow_queries.report(since=datetime.utcnow() - timedelta(hours=hours), limit=limit)
+        return {"status": "success", **report}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Slow query report error: {e}")
+
+@app.get("/api/admin/data-lifecycle")
+async def get_data_lifecycle(current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))):
+    """Admin endpoint: retention policies with their progress, hot working set size and the last run"""
+    try:
+        lifecycle = await data_lifecycle.status()
+        return {"status": "success", **lifecycle, "timestamp": datetime.now()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Data lifecycle status error: {e}")
+
+@app.post("/api/admin/data-lifecycle/run")
+async def run_data_lifecycle(
+    collection: Optional[str] = None,
+    current_user: UserProfile = Depends(require_role([UserRole.SUPER_ADMIN]))
+):
+    """Admin endpoint: roll up, archive and expire now (one collection or all) and return the run report"""
+    try:
+        report = await data_lifecycle.run(collection)
+        return {"status": "success", **report}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Data lifecycle run error: {e}")
+
+@app.get("/api/admin/data-lifecycle/rollups/{collection}")
+async def get_daily_rollups(
+    collection: str,
+    days: int = 30,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Admin endpoint: daily summaries of a log collection, including archived days"""
+    end = datetime.utcnow().date()
+    rollups = await data_lifecycle.daily(collection, end - timedelta(days=days), end)
+    return {"status": "success", "collection": collection, "rollups": rollups}
+
+@app.post("/api/analytics/rollups/rebuild")
+async def rebuild_analytics_rollups(
+    tenant: Optional[str] = None,
+    current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
+):
+    """Admin endpoint: recompute the analytics rollups of one tenant or of all tenants"""
+    try:
+        result = await analytics_rollups.rebuild(tenant)
+        return {"status": "success", **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analytics rollup rebuild error: {e}")
+
 @app.get("/api/admin/customers/all")
 async def get_all_customers_admin(current_user: UserProfile = Depends(require_role([UserRole.ADMIN, UserRole.SUPER_ADMIN]))):
     """Admin endpoint: Get all customers from all users with ownership information"""
@@ -1761,37 +1899,22 @@ async def get_touchpoint_analysis():
         raise HTTPException(status_code=500, detail=f"Touchpoint analysis error: {e}")
 
 @app.get("/api/intelligence/dashboard")
+@dashboard_cache.cached("/api/intelligence/dashboard", invalidated_by=["customers"])
 async def get_intelligence_dashboard():
     """Get comprehensive Customer Intelligence AI dashboard"""
     try:
-        # Get customers data
-        customers_data = await odoo_service.get_customers()
+        async def clustering_dashboard():
+            customers_data = await odoo_service.get_customers()
+            return await behavioral_clustering_service.analyze_customer_behaviors(customers_data)
         
-        # Run all intelligence services in parallel
-        clustering_task = behavioral_clustering_service.analyze_customer_behaviors(customers_data)
-        churn_task = churn_prevention_service.get_churn_dashboard_data()
-        scoring_task = lead_scoring_service.get_sales_pipeline_insights()
-        sentiment_task = sentiment_analysis_service.get_sentiment_dashboard_data()
-        journey_task = journey_mapping_service.get_journey_dashboard_data()
-        
-        # Execute all tasks
-        clustering_results, churn_dashboard, scoring_insights, sentiment_dashboard, journey_dashboard = await asyncio.gather(
-            clustering_task, churn_task, scoring_task, sentiment_task, journey_task,
-            return_exceptions=True
-        )
-        
-        return {
-            "service": "customer_intelligence_ai",
-            "status": "success",
-            "modules": {
-                "behavioral_clustering": clustering_results if not isinstance(clustering_results, Exception) else {"error": str(clustering_results)},
-                "churn_prevention": churn_dashboard if not isinstance(churn_dashboard, Exception) else {"error": str(churn_dashboard)},
-                "lead_scoring": scoring_insights if not isinstance(scoring_insights, Exception) else {"error": str(scoring_insights)},
-                "sentiment_analysis": sentiment_dashboard if not isinstance(sentiment_dashboard, Exception) else {"error": str(sentiment_dashboard)},
-                "journey_mapping": journey_dashboard if not isinstance(journey_dashboard, Exception) else {"error": str(journey_dashboard)}
-            },
-            "timestamp": datetime.now()
-        }
+        # Run all intelligence services concurrently, each with its own timeout
+        return await DashboardComposer("customer_intelligence_ai", [
+            DashboardSection("behavioral_clustering", clustering_dashboard),
+            DashboardSection("churn_prevention", churn_prevention_service.get_churn_dashboard_data),
+            DashboardSection("lead_scoring", lead_scoring_service.get_sales_pipeline_insights),
+            DashboardSection("sentiment_analysis", sentiment_analysis_service.get_sentiment_dashboard_data),
+            DashboardSection("journey_mapping", journey_mapping_service.get_journey_dashboard_data)
+        ]).compose()
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Intelligence dashboard error: {e}")
@@ -2119,6 +2242,38 @@ async def execute_multi_channel_campaign(campaign_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Campaign execution error: {e}")
 
+@app.get("/api/marketing/multi-channel-orchestration/scheduler/metrics")
+async def get_journey_scheduler_metrics():
+    """Get delayed-step scheduler queue depth and due-to-execution lag"""
+    try:
+        metrics = await multi_channel_orchestration_service.step_scheduler.get_metrics()
+        
+        return {
+            "service": "multi_channel_orchestration",
+            "action": "scheduler_metrics",
+            "metrics": metrics,
+            "timestamp": datetime.now()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Scheduler metrics error: {e}")
+
+@app.get("/api/marketing/multi-channel-orchestration/send-pipeline/stats")
+async def get_send_pipeline_stats():
+    """Get per-channel send throughput, latency and dead-letter counts"""
+    try:
+        stats = multi_channel_orchestration_service.send_pipeline.get_stats()
+        
+        return {
+            "service": "multi_channel_orchestration",
+            "action": "send_pipeline_stats",
+            "stats": stats,
+            "timestamp": datetime.now()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Send pipeline stats error: {e}")
+
 @app.post("/api/marketing/multi-channel-orchestration/sms")
 async def send_sms_message(request: Dict[str, Any]):
     """Send SMS message via Twilio integration"""
@@ -2469,34 +2624,18 @@ async def optimize_referral_rewards(program_id: str, performance_data: Dict[str,
 
 # UNIFIED MARKETING AUTOMATION DASHBOARD
 @app.get("/api/marketing/dashboard")
+@dashboard_cache.cached("/api/marketing/dashboard", invalidated_by=["customers", "campaigns"])
 async def get_marketing_automation_dashboard():
     """Get comprehensive Marketing Automation Pro dashboard with all modules"""
     try:
-        # Get data from all marketing services in parallel
-        multi_channel_task = multi_channel_orchestration_service.get_multi_channel_dashboard()
-        ab_testing_task = ab_testing_service.get_ab_testing_dashboard()
-        content_task = dynamic_content_service.get_content_performance_dashboard()
-        lead_scoring_task = lead_scoring_service.get_lead_scoring_dashboard()
-        referral_task = referral_program_service.get_referral_dashboard()
-        
-        # Execute all tasks
-        multi_channel_data, ab_testing_data, content_data, lead_scoring_data, referral_data = await asyncio.gather(
-            multi_channel_task, ab_testing_task, content_task, lead_scoring_task, referral_task,
-            return_exceptions=True
-        )
-        
-        return {
-            "service": "marketing_automation_pro",
-            "status": "success",
-            "modules": {
-                "multi_channel_orchestration": multi_channel_data if not isinstance(multi_channel_data, Exception) else {"error": str(multi_channel_data)},
-                "ab_testing": ab_testing_data if not isinstance(ab_testing_data, Exception) else {"error": str(ab_testing_data)},
-                "dynamic_content": content_data if not isinstance(content_data, Exception) else {"error": str(content_data)},
-                "lead_scoring": lead_scoring_data if not isinstance(lead_scoring_data, Exception) else {"error": str(lead_scoring_data)},
-                "referral_program": referral_data if not isinstance(referral_data, Exception) else {"error": str(referral_data)}
-            },
-            "timestamp": datetime.now()
-        }
+        # Get data from all marketing services concurrently, each with its own timeout
+        return await DashboardComposer("marketing_automation_pro", [
+            DashboardSection("multi_channel_orchestration", multi_channel_orchestration_service.get_multi_channel_dashboard),
+            DashboardSection("ab_testing", ab_testing_service.get_ab_testing_dashboard),
+            DashboardSection("dynamic_content", dynamic_content_service.get_content_performance_dashboard),
+            DashboardSection("lead_scoring", lead_scoring_service.get_lead_scoring_dashboard),
+            DashboardSection("referral_program", referral_program_service.get_referral_dashboard)
+        ]).compose()
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Marketing automation dashboard error: {e}")
@@ -2538,75 +2677,23 @@ app.include_router(financial_reporting_router, prefix="/api/revenue", tags=["Fin
 async def get_revenue_analytics_dashboard():
     """Get comprehensive Revenue Analytics Suite dashboard"""
     try:
-        # Get data from all revenue services in parallel
-        forecasting_task = revenue_forecasting_router.url_path_for("get_revenue_forecasting_dashboard")
-        price_task = price_optimization_router.url_path_for("get_price_optimization_dashboard")
-        margin_task = profit_margin_analysis_router.url_path_for("get_profit_margin_dashboard")
-        subscription_task = subscription_analytics_router.url_path_for("get_subscription_analytics_dashboard")
-        reporting_task = financial_reporting_router.url_path_for("get_financial_reporting_dashboard")
-        
-        # Since routers are included, we can make internal requests
-        import httpx
-        base_url = "http://localhost:8001/api/revenue"
-        
-        async with httpx.AsyncClient() as client:
-            forecasting_response = await client.get(f"{base_url}/revenue-forecasting")
-            price_response = await client.get(f"{base_url}/price-optimization")
-            margin_response = await client.get(f"{base_url}/profit-margin-analysis")
-            subscription_response = await client.get(f"{base_url}/subscription-analytics")
-            reporting_response = await client.get(f"{base_url}/financial-reporting")
-            
-            # Parse responses
-            forecasting_data = forecasting_response.json() if forecasting_response.status_code == 200 else {"status": "error"}
-            price_data = price_response.json() if price_response.status_code == 200 else {"status": "error"}
-            margin_data = margin_response.json() if margin_response.status_code == 200 else {"status": "error"}
-            subscription_data = subscription_response.json() if subscription_response.status_code == 200 else {"status": "error"}
-            reporting_data = reporting_response.json() if reporting_response.status_code == 200 else {"status": "error"}
+        from modules.revenue_analytics_suite.revenue_forecasting import get_revenue_forecasting_dashboard
+        from modules.revenue_analytics_suite.price_optimization import get_price_optimization_dashboard
+        from modules.revenue_analytics_suite.profit_margin_analysis import get_profit_margin_dashboard
+        from modules.revenue_analytics_suite.subscription_analytics import get_subscription_analytics_dashboard
+        from modules.revenue_analytics_suite.financial_reporting import get_financial_reporting_dashboard
         
-        return {
-            "service": "revenue_analytics_suite",
-            "status": "success",
-            "modules": {
-                "revenue_forecasting": forecasting_data,
-                "price_optimization": price_data,
-                "profit_margin_analysis": margin_data,
-                "subscription_analytics": subscription_data,
-                "financial_reporting": reporting_data
-            },
-            "timestamp": datetime.now()
-        }
+        # Call the module dashboards in-process and concurrently, each with its own timeout
+        return await DashboardComposer("revenue_analytics_suite", [
+            DashboardSection("revenue_forecasting", get_revenue_forecasting_dashboard),
+            DashboardSection("price_optimization", get_price_optimization_dashboard),
+            DashboardSection("profit_margin_analysis", get_profit_margin_dashboard),
+            DashboardSection("subscription_analytics", get_subscription_analytics_dashboard),
+            DashboardSection("financial_reporting", get_financial_reporting_dashboard)
+        ]).compose()
         
     except Exception as e:
-        # Fallback with direct method calls
-        try:
-            from modules.revenue_analytics_suite.revenue_forecasting import get_revenue_forecasting_dashboard
-            from modules.revenue_analytics_suite.price_optimization import get_price_optimization_dashboard
-            from modules.revenue_analytics_suite.profit_margin_analysis import get_profit_margin_dashboard
-            from modules.revenue_analytics_suite.subscription_analytics import get_subscription_analytics_dashboard
-            from modules.revenue_analytics_suite.financial_reporting import get_financial_reporting_dashboard
-            
-            # Execute directly
-            forecasting_data = await get_revenue_forecasting_dashboard()
-            price_data = await get_price_optimization_dashboard()
-            margin_data = await get_profit_margin_dashboard()
-            subscription_data = await get_subscription_analytics_dashboard()
-            reporting_data = await get_financial_reporting_dashboard()
-            
-            return {
-                "service": "revenue_analytics_suite",
-                "status": "success",
-                "modules": {
-                    "revenue_forecasting": forecasting_data,
-                    "price_optimization": price_data,
-                    "profit_margin_analysis": margin_data,
-                    "subscription_analytics": subscription_data,
-                    "financial_reporting": reporting_data
-                },
-                "timestamp": datetime.now()
-            }
-            
-        except Exception as fallback_error:
-            raise HTTPException(status_code=500, detail=f"Revenue Analytics Suite dashboard error: {fallback_error}")
+        raise HTTPException(status_code=500, detail=f"Revenue Analytics Suite dashboard error: {e}")
 
 # =====================================================
 # END REVENUE ANALYTICS SUITE MODULE ENDPOINTS
@@ -2710,68 +2797,23 @@ app.include_router(subscription_router, prefix="/api/subscriptions", tags=["Subs
 async def get_advanced_features_dashboard():
     """Get comprehensive Advanced Features Expansion dashboard"""
     try:
-        # Get data from all advanced features services
-        import httpx
-        base_url = "http://localhost:8001/api/advanced"
+        from modules.advanced_features_expansion.behavioral_clustering import get_behavioral_clustering_dashboard
+        from modules.advanced_features_expansion.churn_prevention_ai import get_churn_prevention_dashboard
+        from modules.advanced_features_expansion.cross_sell_intelligence import get_cross_sell_dashboard
+        from modules.advanced_features_expansion.pricing_optimization import get_pricing_optimization_dashboard
+        from modules.advanced_features_expansion.sentiment_analysis import get_sentiment_analysis_dashboard
         
-        async with httpx.AsyncClient() as client:
-            behavioral_response = await client.get(f"{base_url}/behavioral-clustering")
-            churn_response = await client.get(f"{base_url}/churn-prevention")
-            cross_sell_response = await client.get(f"{base_url}/cross-sell-intelligence")
-            pricing_response = await client.get(f"{base_url}/pricing-optimization")
-            sentiment_response = await client.get(f"{base_url}/sentiment-analysis")
-            
-            # Parse responses
-            behavioral_data = behavioral_response.json() if behavioral_response.status_code == 200 else {"status": "error"}
-            churn_data = churn_response.json() if churn_response.status_code == 200 else {"status": "error"}
-            cross_sell_data = cross_sell_response.json() if cross_sell_response.status_code == 200 else {"status": "error"}
-            pricing_data = pricing_response.json() if pricing_response.status_code == 200 else {"status": "error"}
-            sentiment_data = sentiment_response.json() if sentiment_response.status_code == 200 else {"status": "error"}
-        
-        return {
-            "service": "advanced_features_expansion",
-            "status": "success",
-            "modules": {
-                "behavioral_clustering": behavioral_data,
-                "churn_prevention": churn_data,
-                "cross_sell_intelligence": cross_sell_data,
-                "advanced_pricing_optimization": pricing_data,
-                "sentiment_analysis": sentiment_data
-            },
-            "timestamp": datetime.now()
-        }
+        # Call the module dashboards in-process and concurrently, each with its own timeout
+        return await DashboardComposer("advanced_features_expansion", [
+            DashboardSection("behavioral_clustering", get_behavioral_clustering_dashboard),
+            DashboardSection("churn_prevention", get_churn_prevention_dashboard),
+            DashboardSection("cross_sell_intelligence", get_cross_sell_dashboard),
+            DashboardSection("advanced_pricing_optimization", get_pricing_optimization_dashboard),
+            DashboardSection("sentiment_analysis", get_sentiment_analysis_dashboard)
+        ]).compose()
         
     except Exception as e:
-        # Fallback with direct method calls
-        try:
-            from modules.advanced_features_expansion.behavioral_clustering import get_behavioral_clustering_dashboard
-            from modules.advanced_features_expansion.churn_prevention_ai import get_churn_prevention_dashboard
-            from modules.advanced_features_expansion.cross_sell_intelligence import get_cross_sell_dashboard
-            from modules.advanced_features_expansion.pricing_optimization import get_pricing_optimization_dashboard
-            from modules.advanced_features_expansion.sentiment_analysis import get_sentiment_analysis_dashboard
-            
-            # Execute directly
-            behavioral_data = await get_behavioral_clustering_dashboard()
-            churn_data = await get_churn_prevention_dashboard()
-            cross_sell_data = await get_cross_sell_dashboard()
-            pricing_data = await get_pricing_optimization_dashboard()
-            sentiment_data = await get_sentiment_analysis_dashboard()
-            
-            return {
-                "service": "advanced_features_expansion",
-                "status": "success",
-                "modules": {
-                    "behavioral_clustering": behavioral_data,
-                    "churn_prevention": churn_data,
-                    "cross_sell_intelligence": cross_sell_data,
-                    "advanced_pricing_optimization": pricing_data,
-                    "sentiment_analysis": sentiment_data
-                },
-                "timestamp": datetime.now()
-            }
-            
-        except Exception as fallback_error:
-            raise HTTPException(status_code=500, detail=f"Advanced Features dashboard error: {fallback_error}")
+        raise HTTPException(status_code=500, detail=f"Advanced Features dashboard error: {e}")
 
 # =====================================================
 # END ADVANCED FEATURES EXPANSION MODULE ENDPOINTS
@@ -2781,103 +2823,84 @@ async def get_advanced_features_dashboard():
 async def get_analytics_insights_dashboard():
     """Get comprehensive Analytics & Insights dashboard"""
     try:
-        # Get data from all analytics & insights services
-        import httpx
-        base_url = "http://localhost:8001/api/analytics"
-        
-        async with httpx.AsyncClient() as client:
-            journey_response = await client.get(f"{base_url}/customer-journey-mapping/dashboard")
-            attribution_response = await client.get(f"{base_url}/revenue-attribution/dashboard")
-            cohort_response = await client.get(f"{base_url}/cohort-analysis/dashboard")
-            competitive_response = await client.get(f"{base_url}/competitive-intelligence/dashboard")
-            roi_response = await client.get(f"{base_url}/roi-forecasting/dashboard")
-            
-            # Parse responses
-            journey_data = journey_response.json() if journey_response.status_code == 200 else {"status": "error"}
-            attribution_data = attribution_response.json() if attribution_response.status_code == 200 else {"status": "error"}
-            cohort_data = cohort_response.json() if cohort_response.status_code == 200 else {"status": "error"}
-            competitive_data = competitive_response.json() if competitive_response.status_code == 200 else {"status": "error"}
-            roi_data = roi_response.json() if roi_response.status_code == 200 else {"status": "error"}
-        
-        return {
-            "service": "analytics_insights",
-            "status": "success",
-            "modules": {
-                "customer_journey_mapping": journey_data,
-                "revenue_attribution": attribution_data,
-                "cohort_analysis": cohort_data,
-                "competitive_intelligence": competitive_data,
-                "roi_forecasting": roi_data
-            },
-            "timestamp": datetime.now()
-        }
+        from modules.analytics_insights.customer_journey_mapping import get_journey_mapping_dashboard
+        from modules.analytics_insights.revenue_attribution import get_attribution_dashboard
+        from modules.analytics_insights.cohort_analysis import get_cohort_dashboard
+        from modules.analytics_insights.competitive_intelligence import get_competitive_dashboard
+        from modules.analytics_insights.roi_forecasting import get_roi_forecasting_dashboard
         
-    except Exception as e:
-        # Fallback response with mock data
-        return {
-            "service": "analytics_insights",
-            "status": "success",
-            "modules": {
-                "customer_journey_mapping": {
-                    "status": "success",
-                    "dashboard_data": {
-                        "overview": {
-                            "total_customers_analyzed": 245,
-                            "total_touchpoints": 1847,
-                            "total_journey_paths": 18,
-                            "avg_conversion_rate": 0.24,
-                            "avg_journey_length": 4.8
-                        }
-                    }
-                },
-                "revenue_attribution": {
-                    "status": "success",
-                    "dashboard_data": {
-                        "overview": {
-                            "total_revenue": 485000,
-                            "total_marketing_spend": 125000,
-                            "overall_roi": 2.88,
-                            "total_customers": 150,
-                            "average_ltv": 3240
-                        }
+        # Summary data served for a module whose dashboard fails or times out
+        fallbacks = {
+            "customer_journey_mapping": {
+                "status": "success",
+                "dashboard_data": {
+                    "overview": {
+                        "total_customers_analyzed": 245,
+                        "total_touchpoints": 1847,
+                        "total_journey_paths": 18,
+                        "avg_conversion_rate": 0.24,
+                        "avg_journey_length": 4.8
                     }
-                },
-                "cohort_analysis": {
-                    "status": "success",
-                    "dashboard_data": {
-                        "overview": {
-                            "total_customers_analyzed": 400,
-                            "total_cohorts": 12,
-                            "average_retention_rate_1m": 0.68,
-                            "average_revenue_per_customer": 850
-                        }
+                }
+            },
+            "revenue_attribution": {
+                "status": "success",
+                "dashboard_data": {
+                    "overview": {
+                        "total_revenue": 485000,
+                        "total_marketing_spend": 125000,
+                        "overall_roi": 2.88,
+                        "total_customers": 150,
+                        "average_ltv": 3240
                     }
-                },
-                "competitive_intelligence": {
-                    "status": "success",
-                    "dashboard_data": {
-                        "overview": {
-                            "total_competitors_monitored": 5,
-                            "total_data_points_collected": 150,
-                            "high_impact_movements": 8,
-                            "market_sentiment_score": 0.35
-                        }
+                }
+            },
+            "cohort_analysis": {
+                "status": "success",
+                "dashboard_data": {
+                    "overview": {
+                        "total_customers_analyzed": 400,
+                        "total_cohorts": 12,
+                        "average_retention_rate_1m": 0.68,
+                        "average_revenue_per_customer": 850
                     }
-                },
-                "roi_forecasting": {
-                    "status": "success",
-                    "dashboard_data": {
-                        "portfolio_overview": {
-                            "total_planned_budget": 28000,
-                            "total_predicted_revenue": 89600,
-                            "portfolio_roi": 2.2,
-                            "number_of_campaigns": 3
-                        }
+                }
+            },
+            "competitive_intelligence": {
+                "status": "success",
+                "dashboard_data": {
+                    "overview": {
+                        "total_competitors_monitored": 5,
+                        "total_data_points_collected": 150,
+                        "high_impact_movements": 8,
+                        "market_sentiment_score": 0.35
                     }
                 }
             },
-            "timestamp": datetime.now()
+            "roi_forecasting": {
+                "status": "success",
+                "dashboard_data": {
+                    "portfolio_overview": {
+                        "total_planned_budget": 28000,
+                        "total_predicted_revenue": 89600,
+                        "portfolio_roi": 2.2,
+                        "number_of_campaigns": 3
+                    }
+                }
+            }
         }
+        
+        # Call the module dashboards in-process and concurrently, each with its own timeout
+        return await DashboardComposer("analytics_insights", [
+            DashboardSection("customer_journey_mapping", get_journey_mapping_dashboard, fallback=fallbacks["customer_journey_mapping"]),
+            DashboardSection("revenue_attribution", get_attribution_dashboard, fallback=fallbacks["revenue_attribution"]),
+            DashboardSection("cohort_analysis", get_cohort_dashboard, fallback=fallbacks["cohort_analysis"]),
+            DashboardSection("competitive_intelligence", get_competitive_dashboard, fallback=fallbacks["competitive_intelligence"]),
+            DashboardSection("roi_forecasting", get_roi_forecasting_dashboard, fallback=fallbacks["roi_forecasting"])
+        ]).compose()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analytics & Insights dashboard error: {e}")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Banner Delivery Benchmark
+Seeds banners into a scratch database and compares the in-memory banner delivery cache with the
+previous query-and-filter per request: identical banners for every user, serving latency, start/end
+boundaries without a reload, write invalidation and the buffered interaction counters
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Scratch database before importing the modules
+os.environ["DB_NAME"] = f"banner_delivery_benchmark_{uuid.uuid4().hex[:8]}"
+sys.path.append('/app/backend')
+
+from modules.banner_delivery import db, client, BannerDeliveryCache, BannerInteractionBuffer, TRACKED_ACTIONS
+
+BANNERS = 80  # fewer than 50 live at once, so ties at the cap cannot differ
+USERS = 2000
+TIERS = ["free", "basic", "professional", "enterprise"]
+
+
+# ----- Previous per-request query and Python filtering -----
+async def legacy_active(email, tier):
+    now = datetime.utcnow()
+    banners = await db.banners.find({"$and": [
+        {"status": "active"},
+        {"$or": [{"start_date": {"$lte": now}}, {"start_date": None}]},
+        {"$or": [{"end_date": {"$gte": now}}, {"end_date": None}]}
+    ]}).sort("priority", -1).to_list(length=50)
+    filtered = []
+    for banner in banners:
+        banner.pop("_id", None)
+        if banner.get("target_users") and email not in banner["target_users"]:
+            continue
+        if banner.get("target_tiers") and tier not in banner["target_tiers"]:
+            continue
+        filtered.append(banner)
+    return filtered
+
+
+async def seed(rng, now):
+    banners = []
+    for index in range(BANNERS):
+        start = now + timedelta(days=rng.uniform(-30, 10)) if rng.random() < 0.5 else None
+        end = now + timedelta(days=rng.uniform(-5, 30)) if rng.random() < 0.5 else None
+        banners.append({
+            "banner_id": f"banner_{index:04d}",
+            "title": f"Banner {index}",
+            "status": rng.choice(["active", "active", "active", "paused"]),
+            "priority": rng.randint(0, 10),
+            "target_users": [f"user{rng.randrange(USERS)}@example.com" for _ in range(rng.choice([0, 0, 5, 500]))],
+            "target_tiers": rng.sample(TIERS, rng.choice([0, 0, 1, 2])),
+            "start_date": start,
+            "end_date": end,
+            "views": 0, "clicks": 0, "dismissals": 0
+        })
+    await db.banners.insert_many(banners)
+
+
+def ids(banners):
+    return [banner["banner_id"] for banner in banners]
+
+
+async def run_benchmark():
+    results = []
+    rng = random.Random(45)
+    now = datetime.utcnow()
+    cache = BannerDeliveryCache(db)
+    print("🪧 Banner Delivery Benchmark")
+    print("=" * 70)
+
+    try:
+        await seed(rng, now)
+
+        users = [(f"user{rng.randrange(USERS)}@example.com", rng.choice(TIERS)) for _ in range(500)]
+        identical = True
+        for email, tier in users:
+            cached = ids(await cache.active_for(email, tier))
+            legacy = ids(await legacy_active(email, tier))
+            identical = identical and sorted(cached) == sorted(legacy)
+        results.append(identical)
+        print(f"{'✅ PASS' if identical else '❌ FAIL'}: same banners as the previous query for {len(users)} users "
+              f"across tiers and targeted email lists")
+
+        started = time.perf_counter()
+        for email, tier in users * 20:
+            await cache.active_for(email, tier)
+        cached_us = (time.perf_counter() - started) * 1e6 / (len(users) * 20)
+        started = time.perf_counter()
+        for email, tier in users[:200]:
+            await legacy_active(email, tier)
+        legacy_us = (time.perf_counter() - started) * 1e6 / 200
+        fast = cached_us * 20 < legacy_us and cache.stats["reloads"] == 1
+        results.append(fast)
+        print(f"{'✅ PASS' if fast else '❌ FAIL'}: {cached_us:.1f} µs per request from memory vs {legacy_us:.0f} µs with the query "
+              f"({cache.stats['reloads']} database read for {cache.stats['served']:,} requests)")
+
+        # Start and end boundaries are applied without going back to the database
+        soon = datetime.utcnow() + timedelta(seconds=1)
+        await db.banners.insert_many([
+            {"banner_id": "starts_soon", "status": "active", "priority": 10, "start_date": soon, "end_date": None, "target_users": [], "target_tiers": []},
+            {"banner_id": "ends_soon", "status": "active", "priority": 10, "start_date": None, "end_date": soon, "target_users": [], "target_tiers": []}
+        ])
+        cache.invalidate()
+        before = ids(await cache.active_for("nobody@example.com", "free"))
+        reloads = cache.stats["reloads"]
+        await asyncio.sleep(1.2)
+        after = ids(await cache.active_for("nobody@example.com", "free"))
+        boundary = ("starts_soon" not in before and "ends_soon" in before and "starts_soon" in after and "ends_soon" not in after
+                    and cache.stats["reloads"] == reloads and cache.stats["boundary_refreshes"] >= 1)
+        results.append(boundary)
+        print(f"{'✅ PASS' if boundary else '❌ FAIL'}: banners start and stop at their boundaries with no reload")
+
+        # A write invalidates this worker's copy
+        await db.banners.update_one({"banner_id": "starts_soon"}, {"$set": {"status": "paused"}})
+        cache.invalidate()
+        paused = "starts_soon" not in ids(await cache.active_for("nobody@example.com", "free"))
+        results.append(paused)
+        print(f"{'✅ PASS' if paused else '❌ FAIL'}: banner update visible on the next request after invalidate()")
+
+        # Interaction counters are aggregated before they reach MongoDB
+        buffer = BannerInteractionBuffer(db)
+        expected = {}
+        started = time.perf_counter()
+        for _ in range(50000):
+            banner_id = f"banner_{rng.randrange(20):04d}"
+            action = rng.choice(["view", "view", "view", "click", "dismiss"])
+            expected[(banner_id, action)] = expected.get((banner_id, action), 0) + 1
+            await buffer.track(banner_id, action, "user_1", "free")
+        await buffer.flush()
+        track_us = (time.perf_counter() - started) * 1e6 / 50000
+        stored = {b["banner_id"]: b async for b in db.banners.find({"banner_id": {"$lt": "banner_0020"}})}
+        counted = (all(stored[banner_id][TRACKED_ACTIONS[action]] == count for (banner_id, action), count in expected.items())
+                   and await db.banner_interactions.count_documents({}) == 50000 and buffer.stats["flushes"] == 5)
+        results.append(counted)
+        print(f"{'✅ PASS' if counted else '❌ FAIL'}: 50,000 interactions in {buffer.stats['flushes']} flushes "
+              f"({track_us:.1f} µs per track), banner counters exact")
+
+        # Dismissals stored under the previous f"{action}s" field are folded into dismissals
+        await db.banners.update_one({"banner_id": "banner_0000"}, {"$inc": {"dismisss": 7}})
+        before = (await db.banners.find_one({"banner_id": "banner_0000"}))["dismissals"]
+        migrated = await buffer.migrate_legacy_counters()
+        rerun = await buffer.migrate_legacy_counters()
+        after = await db.banners.find_one({"banner_id": "banner_0000"})
+        folded = migrated == 1 and rerun == 0 and after["dismissals"] == before + 7 and "dismisss" not in after
+        results.append(folded)
+        print(f"{'✅ PASS' if folded else '❌ FAIL'}: legacy dismisss counts moved onto dismissals ({before} -> {after['dismissals']}), rerun is a no-op")
+
+    finally:
+        await client.drop_database(os.environ["DB_NAME"])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Bulk Discount Benchmark
+Seeds users into a scratch database and compares the set-based bulk discount engine with the
+previous per-user find_one/insert_one loop: throughput, anti-join of existing usage, idempotent
+re-runs, concurrent runs, resume after an interruption and the single total_uses $inc
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+# Scratch database before importing the modules
+os.environ["DB_NAME"] = f"bulk_discount_benchmark_{uuid.uuid4().hex[:8]}"
+sys.path.append('/app/backend')
+
+import modules.discount_bulk as discount_bulk
+from modules.discount_bulk import db, client, BulkDiscountEngine
+from modules.index_registry import index_registry, IndexMigrationRunner
+
+AUDIENCE = int(os.getenv("BULK_AUDIENCE", "1000000"))
+LEGACY_AUDIENCE = int(os.getenv("BULK_LEGACY_AUDIENCE", "10000"))
+TIERS = ["free", "basic", "professional", "enterprise"]
+
+
+# ----- Previous loop: a find_one and an insert_one per target user -----
+async def legacy_bulk_apply(discount, user_query):
+    users = await db.users.find(user_query).to_list(length=10000)
+    applied_count = 0
+    for user in users:
+        existing_usage = await db.discount_usage.find_one({"user_id": user["user_id"], "discount_id": discount["discount_id"]})
+        if existing_usage:
+            continue
+        await db.discount_usage.insert_one({
+            "usage_id": str(uuid.uuid4()), "discount_id": discount["discount_id"], "user_id": user["user_id"],
+            "applied_at": datetime.utcnow(), "discount_amount": discount["value"], "discount_type": discount["discount_type"]
+        })
+        applied_count += 1
+    await db.discounts.update_one({"discount_id": discount["discount_id"]}, {"$inc": {"total_uses": applied_count}})
+    return applied_count
+
+
+async def seed_users(count):
+    batch = []
+    for index in range(count):
+        batch.append({"user_id": f"user_{index:08d}", "email": f"user{index}@example.com",
+                      "subscription_tier": TIERS[index % len(TIERS)], "is_active": index % 10 != 0})
+        if len(batch) == 20000:
+            await db.users.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.users.insert_many(batch, ordered=False)
+
+
+async def new_discount(name):
+    discount = {"discount_id": str(uuid.uuid4()), "name": name, "value": 20, "discount_type": "percentage", "total_uses": 0}
+    await db.discounts.insert_one(dict(discount))
+    return discount
+
+
+async def run_benchmark():
+    results = []
+    engine = BulkDiscountEngine(db)
+    print("🏷️ Bulk Discount Benchmark")
+    print("=" * 70)
+
+    try:
+        await seed_users(AUDIENCE)
+        await IndexMigrationRunner(db, index_registry).migrate()
+
+        # Previous loop vs set-based engine on the audience the old endpoint capped at
+        legacy_discount = await new_discount("Legacy")
+        legacy_query = {"user_id": {"$lt": f"user_{LEGACY_AUDIENCE:08d}"}}
+        started = time.perf_counter()
+        legacy_applied = await legacy_bulk_apply(legacy_discount, legacy_query)
+        legacy_seconds = time.perf_counter() - started
+
+        discount = await new_discount("Partner drop")
+        # Some users already have the discount and must be skipped by the anti-join
+        await db.discount_usage.insert_many([
+            {"usage_id": str(uuid.uuid4()), "discount_id": discount["discount_id"], "user_id": f"user_{index:08d}"}
+            for index in range(0, AUDIENCE, 1000)
+        ])
+        job = await engine.create_job(discount, {"is_active": True}, "benchmark", False, "admin")
+        started = time.perf_counter()
+        job = await engine.run_job(job["job_id"])
+        engine_seconds = time.perf_counter() - started
+        expected = sum(1 for index in range(AUDIENCE) if index % 10 != 0 and index % 1000 != 0)
+        stored = await db.discounts.find_one({"discount_id": discount["discount_id"]})
+        correct = (job["status"] == "completed" and job["applied_count"] == expected and stored["total_uses"] == expected
+                   and await db.discount_usage.count_documents({"discount_id": discount["discount_id"]}) == expected + AUDIENCE // 1000)
+        results.append(correct)
+        print(f"{'✅ PASS' if correct else '❌ FAIL'}: {AUDIENCE:,} users: {expected:,} applied in {engine_seconds:.1f}s "
+              f"({expected / engine_seconds:,.0f}/s) vs previous loop {legacy_applied:,} in {legacy_seconds:.1f}s "
+              f"({legacy_applied / legacy_seconds:,.0f}/s); existing usage skipped")
+
+        # Re-running the same criteria writes nothing and leaves total_uses alone
+        rerun = await engine.run_job((await engine.create_job(discount, {"is_active": True}, "again", False, "admin"))["job_id"])
+        stored = await db.discounts.find_one({"discount_id": discount["discount_id"]})
+        idempotent = rerun["applied_count"] == 0 and stored["total_uses"] == expected
+        results.append(idempotent)
+        print(f"{'✅ PASS' if idempotent else '❌ FAIL'}: re-run applies {rerun['applied_count']} and total_uses stays {stored['total_uses']:,}")
+
+        # Two concurrent jobs for the same audience never double-apply
+        racing = await new_discount("Race")
+        jobs = [await engine.create_job(racing, {"subscription_tier": "basic"}, "race", False, "admin") for _ in range(2)]
+        finished = await asyncio.gather(*(engine.run_job(job["job_id"]) for job in jobs))
+        tier_users = await db.users.count_documents({"subscription_tier": "basic"})
+        stored = await db.discounts.find_one({"discount_id": racing["discount_id"]})
+        no_doubles = (sum(job["applied_count"] for job in finished) == tier_users == stored["total_uses"]
+                      and await db.discount_usage.count_documents({"discount_id": racing["discount_id"]}) == tier_users)
+        results.append(no_doubles)
+        print(f"{'✅ PASS' if no_doubles else '❌ FAIL'}: two concurrent jobs wrote {tier_users:,} records, duplicates rejected by the unique index")
+
+        # An interrupted job resumes where it stopped and applies its totals once
+        resumed_discount = await new_discount("Resume")
+        job = await engine.create_job(resumed_discount, {"subscription_tier": "enterprise"}, "resume", True, "admin")
+        original_apply = engine._apply_chunk
+        calls = {"count": 0}
+
+        async def crash_after_two(*args):
+            calls["count"] += 1
+            if calls["count"] > 2:
+                raise RuntimeError("worker restarted")
+            await original_apply(*args)
+
+        engine._apply_chunk = crash_after_two
+        failed = await engine.run_job(job["job_id"])
+        engine._apply_chunk = original_apply
+        resumed = await engine.run_job(job["job_id"])
+        tier_users = await db.users.count_documents({"subscription_tier": "enterprise"})
+        stored = await db.discounts.find_one({"discount_id": resumed_discount["discount_id"]})
+        notified = await db.notification_queue.count_documents({"discount_id": resumed_discount["discount_id"]})
+        resumable = (failed["status"] == "failed" and resumed["status"] == "completed" and resumed["applied_count"] == tier_users
+                     and stored["total_uses"] == tier_users and notified == tier_users)
+        results.append(resumable)
+        print(f"{'✅ PASS' if resumable else '❌ FAIL'}: job failed after {2 * discount_bulk.BULK_CHUNK_SIZE:,} users, resumed to "
+              f"{resumed['applied_count']:,}; total_uses and notifications counted once")
+
+    finally:
+        await client.drop_database(os.environ["DB_NAME"])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
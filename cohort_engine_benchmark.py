@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Cohort Engine Benchmark
+Seeds users, logins and payments into a scratch database, rolls them up day by day and checks
+the cohort matrices against a brute-force count, then times matrix reads and incremental refreshes
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+# Scratch database before importing the modules
+os.environ["DB_NAME"] = f"cohort_engine_benchmark_{uuid.uuid4().hex[:8]}"
+sys.path.append('/app/backend')
+
+from modules.analytics_insights.cohort_analysis import db, client
+from modules.analytics_insights.cohort_engine import CohortEngine, GRANULARITIES, period_key, period_ordinal
+
+USERS = int(os.getenv("COHORT_USERS", "20000"))
+DAYS = int(os.getenv("COHORT_DAYS", "120"))
+BATCH = 10000
+
+
+async def seed(start):
+    rng = random.Random(5)
+    users, logins, payments = [], [], []
+    expected = {g: {"sizes": defaultdict(int), "active": defaultdict(set), "revenue": defaultdict(float)} for g in GRANULARITIES}
+
+    async def flush():
+        if users:
+            await db.users.insert_many(users, ordered=False)
+        if logins:
+            await db.login_logs.insert_many(logins, ordered=False)
+        if payments:
+            await db.payments.insert_many(payments, ordered=False)
+        users.clear(), logins.clear(), payments.clear()
+
+    for i in range(USERS):
+        email = f"cohort{i}@example.com"
+        created = start + timedelta(days=rng.randrange(DAYS), seconds=rng.randrange(86400))
+        users.append({"user_id": f"cohort_{i:08d}", "email": email, "created_at": created})
+        for g in GRANULARITIES:
+            expected[g]["sizes"][period_key(g, created.date())] += 1
+
+        active_day = created
+        while True:
+            active_day += timedelta(days=rng.choice([0, 1, 3, 7, 14, 30]), seconds=rng.randrange(3600))
+            if active_day >= start + timedelta(days=DAYS) or rng.random() < 0.15:
+                break
+            logins.append({"email": email, "login_time": active_day, "success": True})
+            if rng.random() < 0.02:
+                logins.append({"email": email, "login_time": active_day, "success": False})
+            paid = rng.random() < 0.1
+            if paid:
+                amount = rng.choice([2900, 9900, 29900])
+                payments.append({"user_email": email, "payment_date": active_day, "status": "completed", "amount": amount})
+            for g in GRANULARITIES:
+                cell = (period_key(g, created.date()), period_key(g, active_day.date()))
+                expected[g]["active"][cell].add(email)
+                if paid:
+                    expected[g]["revenue"][cell] += amount / 100
+        if len(users) >= BATCH:
+            await flush()
+    await flush()
+    return expected
+
+
+def expected_cell(expected, granularity, cohort, offset):
+    for (cell_cohort, activity_period), emails in expected[granularity]["active"].items():
+        if cell_cohort == cohort and period_ordinal(granularity, activity_period) - period_ordinal(granularity, cohort) == offset:
+            return len(emails), expected[granularity]["revenue"][(cell_cohort, activity_period)]
+    return 0, 0.0
+
+
+async def run_benchmark():
+    results = []
+    engine = CohortEngine(db)
+    print("👥 Cohort Engine Benchmark")
+    print("=" * 70)
+
+    try:
+        start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=DAYS)
+        expected = await seed(start)
+        print(f"Seeded {USERS:,} users, {await db.login_logs.count_documents({}):,} logins, "
+              f"{await db.payments.count_documents({}):,} payments over {DAYS} days\n")
+
+        started = time.perf_counter()
+        refreshed = await engine.refresh(since=start.date())
+        backfill_seconds = time.perf_counter() - started
+        print(f"Backfill of {refreshed['days_processed']} days: {backfill_seconds:.2f}s")
+
+        # Exact distinct counts and revenue for every granularity
+        for granularity in GRANULARITIES:
+            matrix = await engine.matrix(granularity)
+            sizes_ok = dict(zip(matrix.cohorts, matrix.cohort_sizes)) == dict(expected[granularity]["sizes"])
+            cells_ok = True
+            for cohort, active_row, revenue_row in zip(matrix.cohorts, matrix.active_users, matrix.revenue):
+                for offset, (active, revenue) in enumerate(zip(active_row, revenue_row)):
+                    want_active, want_revenue = expected_cell(expected, granularity, cohort, offset)
+                    cells_ok = cells_ok and active == want_active and abs(revenue - want_revenue) < 0.01
+            exact = sizes_ok and cells_ok
+            results.append(exact)
+            print(f"{'✅ PASS' if exact else '❌ FAIL'}: {granularity:<9} matrix ({len(matrix.cohorts)} cohorts) matches a brute-force distinct count")
+
+        # Reprocessing days is idempotent
+        before = await engine.matrix("weekly")
+        await engine.refresh(since=start.date() + timedelta(days=DAYS // 2))
+        after = await engine.matrix("weekly")
+        idempotent = before.active_users == after.active_users and before.revenue == after.revenue
+        results.append(idempotent)
+        print(f"{'✅ PASS' if idempotent else '❌ FAIL'}: reprocessing the second half of the range leaves the matrix unchanged")
+
+        # Incremental refresh only touches the new day
+        started = time.perf_counter()
+        incremental = await engine.refresh()
+        incremental_seconds = time.perf_counter() - started
+        quick = incremental["days_processed"] <= 2 and incremental_seconds < backfill_seconds / 10
+        results.append(quick)
+        print(f"{'✅ PASS' if quick else '❌ FAIL'}: incremental refresh of {incremental['days_processed']} day(s) in {incremental_seconds * 1000:.0f} ms")
+
+        # Matrix reads never scan users or events
+        started = time.perf_counter()
+        for _ in range(20):
+            await engine.matrix("monthly")
+        read_ms = (time.perf_counter() - started) * 1000 / 20
+        started = time.perf_counter()
+        await db.users.find({}).to_list(length=None)
+        scan_ms = (time.perf_counter() - started) * 1000
+        fast = read_ms < scan_ms
+        results.append(fast)
+        print(f"{'✅ PASS' if fast else '❌ FAIL'}: monthly matrix read {read_ms:.1f} ms vs loading all users {scan_ms:.1f} ms")
+
+    finally:
+        await client.drop_database(os.environ["DB_NAME"])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
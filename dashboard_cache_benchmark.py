@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Dashboard Cache Benchmark
+Checks the dashboard response cache: single-flight under a burst of concurrent loads,
+stale-while-revalidate latency, invalidation hooks, per-tenant keys, error handling and
+the per-route statistics, including through a FastAPI endpoint with dependencies
+"""
+
+import asyncio
+import json
+import sys
+import time
+from urllib.parse import urlencode
+
+from fastapi import Depends, FastAPI, Query
+
+sys.path.append('/app/backend')
+
+from modules.dashboard_cache import DashboardCache
+
+CONCURRENT_LOADS = 1000
+RECOMPUTE_SECONDS = 0.3
+
+
+async def run_benchmark():
+    results = []
+    cache = DashboardCache(default_ttl=0.5, default_stale_ttl=5)
+    computations = {"count": 0}
+    print("🗃️ Dashboard Cache Benchmark")
+    print("=" * 70)
+
+    async def heavy_dashboard():
+        computations["count"] += 1
+        await asyncio.sleep(RECOMPUTE_SECONDS)
+        return {"status": "success", "version": computations["count"]}
+
+    cache.register("/api/marketing/dashboard", invalidated_by=["campaigns"])
+
+    # Many admins open the dashboard at once: one recompute
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(
+        cache.get_or_compute("/api/marketing/dashboard", heavy_dashboard) for _ in range(CONCURRENT_LOADS)
+    ))
+    burst_seconds = time.perf_counter() - started
+    single_flight = computations["count"] == 1 and all(response is responses[0] for response in responses)
+    results.append(single_flight)
+    print(f"{'✅ PASS' if single_flight else '❌ FAIL'}: {CONCURRENT_LOADS} concurrent loads -> {computations['count']} recompute "
+          f"in {burst_seconds * 1000:.0f} ms (uncached: {CONCURRENT_LOADS} recomputes)")
+
+    # Fresh hits are immediate
+    started = time.perf_counter()
+    for _ in range(10000):
+        await cache.get_or_compute("/api/marketing/dashboard", heavy_dashboard)
+    hit_us = (time.perf_counter() - started) * 1e6 / 10000
+    fast_hits = hit_us < 100 and computations["count"] == 1
+    results.append(fast_hits)
+    print(f"{'✅ PASS' if fast_hits else '❌ FAIL'}: fresh hit {hit_us:.1f} µs vs recompute {RECOMPUTE_SECONDS * 1000:.0f} ms")
+
+    # Expired entries are served stale while one background recompute runs
+    await asyncio.sleep(0.6)
+    started = time.perf_counter()
+    stale = await cache.get_or_compute("/api/marketing/dashboard", heavy_dashboard)
+    stale_ms = (time.perf_counter() - started) * 1000
+    await asyncio.gather(*(cache.get_or_compute("/api/marketing/dashboard", heavy_dashboard) for _ in range(100)))
+    await asyncio.sleep(RECOMPUTE_SECONDS + 0.1)
+    refreshed = await cache.get_or_compute("/api/marketing/dashboard", heavy_dashboard)
+    swr = stale["version"] == 1 and stale_ms < 5 and computations["count"] == 2 and refreshed["version"] == 2
+    results.append(swr)
+    print(f"{'✅ PASS' if swr else '❌ FAIL'}: stale response in {stale_ms:.2f} ms, one background refresh for 101 stale loads")
+
+    # A write invalidates the route; a recompute started before it is not stored
+    pending = asyncio.ensure_future(cache.get_or_compute("/api/marketing/dashboard", heavy_dashboard, params={"range": "7d"}))
+    await asyncio.sleep(0.05)
+    dropped = cache.notify("campaigns")
+    await pending
+    after_write = await cache.get_or_compute("/api/marketing/dashboard", heavy_dashboard)
+    not_stored = await cache.get_or_compute("/api/marketing/dashboard", heavy_dashboard, params={"range": "7d"})
+    invalidated = dropped == 1 and after_write["version"] == 4 and not_stored["version"] == 5
+    results.append(invalidated)
+    print(f"{'✅ PASS' if invalidated else '❌ FAIL'}: notify('campaigns') dropped {dropped} entry and discarded the in-flight result")
+
+    # Per-tenant keys and tenant-scoped invalidation
+    async def affiliate_dashboard(affiliate_id):
+        await asyncio.sleep(0.01)
+        return {"affiliate_id": affiliate_id, "at": time.perf_counter()}
+
+    cache.register("/api/affiliate/dashboard", ttl=60, invalidated_by=["affiliate_activity"])
+    first_a = await cache.get_or_compute("/api/affiliate/dashboard", lambda: affiliate_dashboard("a"), tenant="a")
+    first_b = await cache.get_or_compute("/api/affiliate/dashboard", lambda: affiliate_dashboard("b"), tenant="b")
+    cache.notify("affiliate_activity", tenant="a")
+    second_a = await cache.get_or_compute("/api/affiliate/dashboard", lambda: affiliate_dashboard("a"), tenant="a")
+    second_b = await cache.get_or_compute("/api/affiliate/dashboard", lambda: affiliate_dashboard("b"), tenant="b")
+    scoped = first_a["affiliate_id"] == "a" and first_b["affiliate_id"] == "b" and second_a is not first_a and second_b is first_b
+    results.append(scoped)
+    print(f"{'✅ PASS' if scoped else '❌ FAIL'}: entries keyed per tenant; invalidating one affiliate keeps the others")
+
+    # Errors reach every waiter and are not cached
+    failures = {"count": 0}
+
+    async def failing():
+        failures["count"] += 1
+        await asyncio.sleep(0.05)
+        raise RuntimeError("database unavailable")
+
+    outcomes = await asyncio.gather(*(cache.get_or_compute("/api/intelligence/dashboard", failing) for _ in range(50)), return_exceptions=True)
+    retry = await cache.get_or_compute("/api/intelligence/dashboard", heavy_dashboard)
+    errors = failures["count"] == 1 and all(isinstance(o, RuntimeError) for o in outcomes) and retry["status"] == "success"
+    results.append(errors)
+    print(f"{'✅ PASS' if errors else '❌ FAIL'}: one failing recompute shared by 50 waiters, next load recomputes")
+
+    stats = cache.stats()["routes"]["/api/marketing/dashboard"]
+    reported = stats["hits"] >= 10000 and stats["coalesced_misses"] >= CONCURRENT_LOADS - 1 and stats["mean_recompute_ms"] >= RECOMPUTE_SECONDS * 1000
+    results.append(reported)
+    print(f"{'✅ PASS' if reported else '❌ FAIL'}: marketing dashboard hit rate {stats['hit_rate']:.1%}, "
+          f"{stats['recomputes']} recomputes averaging {stats['mean_recompute_ms']:.0f} ms, {stats['invalidations']} invalidation(s)")
+
+    results.append(await check_fastapi_endpoint())
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+async def asgi_get(app, path, params=None):
+    """Minimal ASGI GET request, returning (status, json body)"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": urlencode(params or {}).encode(),
+        "headers": [], "client": ("127.0.0.1", 0), "server": ("testserver", 80), "root_path": ""
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    status = next(m["status"] for m in messages if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    return status, json.loads(body)
+
+
+async def check_fastapi_endpoint():
+    """The decorator keeps FastAPI's parameter and dependency handling"""
+    cache = DashboardCache(default_ttl=60)
+    app = FastAPI()
+    calls = {"auth": 0, "body": 0}
+
+    def current_user():
+        calls["auth"] += 1
+        return {"user_id": "admin"}
+
+    @app.get("/api/affiliate/dashboard")
+    @cache.cached("/api/affiliate/dashboard", tenant_param="affiliate_id", key_params=["period"])
+    async def affiliate_dashboard(affiliate_id: str = Query(...), period: str = "month", user=Depends(current_user)):
+        calls["body"] += 1
+        return {"affiliate_id": affiliate_id, "period": period}
+
+    responses = [await asgi_get(app, "/api/affiliate/dashboard", {"affiliate_id": "aff_1"}) for _ in range(3)]
+    responses.append(await asgi_get(app, "/api/affiliate/dashboard", {"affiliate_id": "aff_1", "period": "year"}))
+    responses.append(await asgi_get(app, "/api/affiliate/dashboard"))
+    ok = ([status for status, _ in responses] == [200, 200, 200, 200, 422] and calls == {"auth": 5, "body": 2}
+          and responses[3][1] == {"affiliate_id": "aff_1", "period": "year"})
+    print(f"{'✅ PASS' if ok else '❌ FAIL'}: FastAPI endpoint keeps validation and runs dependencies on every request; 5 requests, {calls['body']} endpoint bodies run")
+    return ok
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Dashboard Composition Benchmark
+Checks the in-process dashboard composer used by the revenue, advanced, analytics, marketing and
+intelligence dashboards: same module payloads as sequential calls, concurrency, per-module
+timeouts and partial results
+"""
+
+import asyncio
+import sys
+import time
+
+sys.path.append('/app/backend')
+
+from modules.dashboard_composer import DashboardComposer, DashboardSection
+from modules.revenue_analytics_suite.revenue_forecasting import get_revenue_forecasting_dashboard
+from modules.revenue_analytics_suite.price_optimization import get_price_optimization_dashboard
+from modules.revenue_analytics_suite.profit_margin_analysis import get_profit_margin_dashboard
+from modules.revenue_analytics_suite.subscription_analytics import get_subscription_analytics_dashboard
+from modules.revenue_analytics_suite.financial_reporting import get_financial_reporting_dashboard
+
+REVENUE_MODULES = {
+    "revenue_forecasting": get_revenue_forecasting_dashboard,
+    "price_optimization": get_price_optimization_dashboard,
+    "profit_margin_analysis": get_profit_margin_dashboard,
+    "subscription_analytics": get_subscription_analytics_dashboard,
+    "financial_reporting": get_financial_reporting_dashboard
+}
+MODULE_LATENCY = 0.2  # simulated I/O wait per module
+
+
+def delayed(fetch, seconds):
+    async def run():
+        await asyncio.sleep(seconds)
+        return await fetch()
+    return run
+
+
+def payload_keys(data):
+    return sorted(data) if isinstance(data, dict) else type(data).__name__
+
+
+async def run_benchmark():
+    results = []
+    print("🧩 Dashboard Composition Benchmark")
+    print("=" * 70)
+
+    # Every module is served in-process with the same payload shape as a direct call
+    composed = await DashboardComposer("revenue_analytics_suite", [
+        DashboardSection(name, fetch) for name, fetch in REVENUE_MODULES.items()
+    ]).compose()
+    direct = {name: await fetch() for name, fetch in REVENUE_MODULES.items()}
+    same = (not composed["partial"] and list(composed["modules"]) == list(REVENUE_MODULES)
+            and all(payload_keys(composed["modules"][name]) == payload_keys(direct[name]) for name in REVENUE_MODULES))
+    results.append(same)
+    print(f"{'✅ PASS' if same else '❌ FAIL'}: revenue dashboard composed in-process with all {len(REVENUE_MODULES)} modules "
+          f"({max(meta['elapsed_ms'] for meta in composed['sections'].values()):.1f} ms slowest)")
+
+    # Modules waiting on I/O overlap instead of adding up
+    sections = [DashboardSection(name, delayed(fetch, MODULE_LATENCY)) for name, fetch in REVENUE_MODULES.items()]
+    started = time.perf_counter()
+    for section in sections:
+        await section.fetch()
+    sequential = time.perf_counter() - started
+    started = time.perf_counter()
+    await DashboardComposer("revenue_analytics_suite", sections).compose()
+    concurrent = time.perf_counter() - started
+    overlapped = concurrent < sequential / 3
+    results.append(overlapped)
+    print(f"{'✅ PASS' if overlapped else '❌ FAIL'}: {len(sections)} modules with {MODULE_LATENCY * 1000:.0f} ms I/O each: "
+          f"sequential {sequential * 1000:.0f} ms vs composed {concurrent * 1000:.0f} ms")
+
+    # A hung module is cut off at its own timeout and the rest still render
+    async def hung():
+        await asyncio.sleep(60)
+
+    async def broken():
+        raise RuntimeError("upstream unavailable")
+
+    started = time.perf_counter()
+    partial = await DashboardComposer("revenue_analytics_suite", [
+        DashboardSection("revenue_forecasting", get_revenue_forecasting_dashboard),
+        DashboardSection("price_optimization", hung, timeout=0.5),
+        DashboardSection("profit_margin_analysis", broken),
+        DashboardSection("financial_reporting", broken, fallback={"status": "success", "dashboard": {}})
+    ], default_timeout=5).compose()
+    elapsed = time.perf_counter() - started
+    marked = (partial["partial"] and elapsed < 1.0
+              and partial["sections"]["price_optimization"]["status"] == "timeout"
+              and partial["modules"]["profit_margin_analysis"]["status"] == "error"
+              and partial["sections"]["financial_reporting"].get("fallback") is True
+              and partial["sections"]["revenue_forecasting"]["status"] == "ok"
+              and partial["failed_modules"] == ["price_optimization", "profit_margin_analysis", "financial_reporting"])
+    results.append(marked)
+    print(f"{'✅ PASS' if marked else '❌ FAIL'}: timeout, error and fallback markers per module; dashboard returned in {elapsed * 1000:.0f} ms")
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
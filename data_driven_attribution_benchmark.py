@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Data-Driven Attribution Benchmark
+Streams 1M synthetic journeys with planted channel lift through the Markov/Shapley engine,
+checking bounded memory, process-pool equivalence, the per-date-range cache and the Shapley error bound
+"""
+
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from itertools import combinations
+from math import factorial
+
+import numpy as np
+sys.path.append('/app/backend')
+
+from modules.analytics_insights.attribution_engine import TouchpointFrame
+from modules.analytics_insights.data_driven_attribution import DataDrivenAttributionEngine
+from modules.analytics_insights.revenue_attribution import TouchpointChannel
+
+JOURNEYS = int(os.getenv("DATA_DRIVEN_JOURNEYS", "1000000"))
+CHUNK_JOURNEYS = 100000
+CHANNELS = list(TouchpointChannel)
+# Conversion lift per channel; referral and email should earn the most credit
+LIFT = np.array([0.4, 0.2, 0.9, 0.1, 0.3, 1.2, 0.0, 0.15])
+
+
+def journey_chunks(total: int, seed: int = 3):
+    """Yield (channel_codes, lengths, converted) chunks generated on the fly"""
+    rng = np.random.default_rng(seed)
+    remaining = total
+    while remaining > 0:
+        size = min(CHUNK_JOURNEYS, remaining)
+        lengths = rng.integers(1, 9, size=size)
+        channels = rng.integers(0, len(CHANNELS), size=int(lengths.sum())).astype(np.int16)
+        starts = np.cumsum(lengths) - lengths
+        masks = np.bitwise_or.reduceat(np.left_shift(1, channels.astype(np.int64)), starts)
+        present = (masks[:, None] >> np.arange(len(CHANNELS))) & 1
+        probability = 1 / (1 + np.exp(-(-3.0 + present @ LIFT)))
+        converted = rng.random(size) < probability
+        yield channels, lengths, converted
+        remaining -= size
+
+
+def exact_shapley(summary):
+    """Exact Shapley values by enumerating every coalition (fine for 8 channels)"""
+    n = summary.n_channels
+    masks = np.array(list(summary.mask_conversions), dtype=np.int64)
+    conversions = np.array(list(summary.mask_conversions.values()))
+
+    def value(coalition):
+        return float(conversions[(masks & ~coalition) == 0].sum())
+
+    values = np.zeros(n)
+    for channel in range(n):
+        others = [c for c in range(n) if c != channel]
+        for size in range(n):
+            weight = factorial(size) * factorial(n - size - 1) / factorial(n)
+            for members in combinations(others, size):
+                coalition = sum(1 << c for c in members)
+                values[channel] += weight * (value(coalition | (1 << channel)) - value(coalition))
+    return values
+
+
+async def measure(engine, total, use_pool):
+    tracemalloc.start()
+    started = time.perf_counter()
+    summary = await engine.summarize_chunks(journey_chunks(total), CHANNELS, use_pool=use_pool)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return summary, elapsed, peak / (1024 * 1024)
+
+
+async def run_benchmark():
+    results = []
+    engine = DataDrivenAttributionEngine(max_workers=int(os.getenv("ATTRIBUTION_WORKERS", "4")), chunk_journeys=CHUNK_JOURNEYS)
+    print("🧮 Data-Driven Attribution Benchmark")
+    print("=" * 70)
+
+    try:
+        small, _, small_peak = await measure(engine, 2 * CHUNK_JOURNEYS, use_pool=False)
+        serial, serial_seconds, serial_peak = await measure(engine, JOURNEYS, use_pool=False)
+        pooled, pooled_seconds, pooled_peak = await measure(engine, JOURNEYS, use_pool=True)
+        print(f"Serial summary of {JOURNEYS:,} journeys: {serial_seconds:.2f}s, peak {serial_peak:.1f} MB")
+        print(f"Pool ({engine.max_workers} workers):             {pooled_seconds:.2f}s, peak {pooled_peak:.1f} MB")
+
+        same = np.array_equal(serial.transitions, pooled.transitions) and serial.mask_conversions == pooled.mask_conversions
+        results.append(same)
+        print(f"\n{'✅ PASS' if same else '❌ FAIL'}: process pool and serial summaries are identical ({pooled.journeys:,} journeys, {pooled.conversions:,.0f} conversions)")
+
+        bounded = serial_peak <= small_peak * 1.5 + 5
+        results.append(bounded)
+        print(f"{'✅ PASS' if bounded else '❌ FAIL'}: memory bounded by chunk size ({small_peak:.1f} MB at {2 * CHUNK_JOURNEYS:,} vs {serial_peak:.1f} MB at {JOURNEYS:,} journeys)")
+
+        # Markov removal effects should rank the planted lift
+        started = time.perf_counter()
+        effects = pooled.removal_effects()
+        markov_seconds = time.perf_counter() - started
+        ranking = [channel for channel, _ in sorted(effects.items(), key=lambda item: -item[1])]
+        expected = [CHANNELS[i] for i in np.argsort(-LIFT)]
+        ranked = ranking[:2] == expected[:2] and ranking[-1] == expected[-1]
+        results.append(ranked)
+        print(f"{'✅ PASS' if ranked else '❌ FAIL'}: Markov removal effects ({markov_seconds * 1000:.1f} ms) rank {', '.join(c.value for c in ranking[:3])} highest")
+
+        # Sampled Shapley within the error bound of the exact values
+        exact = exact_shapley(pooled)
+        error_bound = 0.005
+        started = time.perf_counter()
+        sampled = pooled.shapley(error_bound=error_bound, seed=42)
+        shapley_seconds = time.perf_counter() - started
+        sampled_values = np.array([sampled["values"][channel] for channel in CHANNELS])
+        worst = float(np.abs(sampled_values - exact).max() / pooled.conversions)
+        within = sampled["converged"] and worst <= error_bound
+        results.append(within)
+        print(f"{'✅ PASS' if within else '❌ FAIL'}: sampled Shapley ({sampled['permutations']:,} permutations, {shapley_seconds:.2f}s) "
+              f"within {error_bound:.1%} of exact (worst {worst:.3%}); efficiency {sampled_values.sum() / pooled.conversions:.4f}")
+
+        # Frame path: cached per date range, recomputed for a different range
+        rng = np.random.default_rng(5)
+        channels, lengths, converted = next(journey_chunks(CHUNK_JOURNEYS, seed=9))
+        journey = np.repeat(np.arange(len(lengths)), lengths)
+        timestamps = np.datetime64("2025-01-01", "us") + (journey * 60 + rng.integers(0, 60, len(journey))).astype("timedelta64[s]")
+        revenues = np.zeros(len(journey))
+        revenues[np.cumsum(lengths) - 1] = np.where(converted, 100.0, 0.0)
+        frame = TouchpointFrame(
+            customer_ids=journey, channels=np.array(CHANNELS, dtype=object)[channels], timestamps=timestamps,
+            costs=np.ones(len(journey)), revenues=revenues
+        )
+        midpoint = np.datetime64("2025-01-01", "us") + np.timedelta64(len(lengths) * 30, "s")
+        first = await engine.summarize(frame)
+        started = time.perf_counter()
+        second = await engine.summarize(frame)
+        cached_ms = (time.perf_counter() - started) * 1000
+        ranged = await engine.summarize(frame, end_date=midpoint.astype(object))
+        cache = engine.cache_stats()
+        cached = first is second and ranged is not first and 0 < ranged.journeys < first.journeys and cache["hits"] == 1
+        results.append(cached)
+        print(f"{'✅ PASS' if cached else '❌ FAIL'}: summaries cached per date range (hit in {cached_ms:.2f} ms, {ranged.journeys:,} journeys before midpoint, {cache})")
+
+    finally:
+        engine.shutdown()
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
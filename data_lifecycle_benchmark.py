@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Data Lifecycle Benchmark
+Seeds a year of login, click and email log events into a scratch database and applies the
+retention policies: daily rollups match the previous raw-collection aggregation, cold days leave
+the hot collections for the compressed archive collection and JSONL.gz files without loss, an
+interrupted run resumes without duplicates, TTL indexes spare the backlog until it is archived and
+then expire at the policy age, and the hot working set shrinks
+"""
+
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Scratch database before importing the modules
+os.environ["DB_NAME"] = f"data_lifecycle_benchmark_{uuid.uuid4().hex[:8]}"
+sys.path.append('/app/backend')
+
+from modules.data_lifecycle import (db, client, DataLifecycleEngine, RetentionPolicy, ROLLUP_COLLECTION,
+                                    archive_file_name, read_archive_file, write_archive_file)
+
+EVENTS = int(os.getenv("DATA_LIFECYCLE_EVENTS", "300000"))
+HISTORY_DAYS = 365
+POLICIES = [
+    RetentionPolicy("login_logs", "login_time", hot_days=90, dimensions=("success",), distinct="user_id"),
+    RetentionPolicy("click_tracking", "clicked_at", hot_days=180, dimensions=("affiliate_id",), distinct="session_id",
+                    totals={"conversions": {"$sum": {"$cond": ["$converted", 1, 0]}}}),
+    RetentionPolicy("email_logs", "sent_at", hot_days=90, archive="file", dimensions=("status",)),
+    RetentionPolicy("variant_selections", "timestamp", hot_days=30, archive=None, dimensions=("test_id",))
+]
+
+
+async def seed(rng, now):
+    async def insert(collection, documents):
+        for start in range(0, len(documents), 20000):
+            await collection.insert_many(documents[start:start + 20000], ordered=False)
+
+    def when():
+        return now - timedelta(seconds=rng.uniform(0, HISTORY_DAYS * 86400))
+
+    await insert(db.login_logs, [{"user_id": f"user_{rng.randrange(5000)}", "login_time": when(), "success": rng.random() < 0.95,
+                                  "ip_address": "10.0.0.1", "user_agent": "Mozilla/5.0 " + "x" * 80} for _ in range(EVENTS)])
+    await insert(db.click_tracking, [{"affiliate_id": f"aff_{rng.randrange(200)}", "session_id": uuid.uuid4().hex, "clicked_at": when(),
+                                      "converted": rng.random() < 0.05, "landing_page": "https://example.com/pricing"} for _ in range(EVENTS)])
+    await insert(db.email_logs, [{"to": f"user{rng.randrange(5000)}@example.com", "status": rng.choice(["sent", "failed"]),
+                                  "sent_at": when(), "html_content": "<p>Welcome</p>" * 20} for _ in range(EVENTS // 3)])
+    await insert(db.variant_selections, [{"test_id": f"test_{rng.randrange(10)}", "variant_id": "a", "timestamp": when()}
+                                         for _ in range(EVENTS // 3)])
+
+
+# ----- Previous dashboards: $group over the raw collection -----
+async def raw_daily_counts(collection, time_field, since, until):
+    rows = await db[collection].aggregate([
+        {"$match": {time_field: {"$gte": since, "$lt": until}}},
+        {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": f"${time_field}"}}, "count": {"$sum": 1}}}
+    ]).to_list(length=None)
+    return {row["_id"]: row["count"] for row in rows}
+
+
+async def rollup_daily_counts(collection):
+    counts = Counter()
+    async for row in db[ROLLUP_COLLECTION].find({"collection": collection}, {"day": 1, "count": 1}):
+        counts[row["day"]] += row["count"]
+    return counts
+
+
+async def hot_bytes(engine):
+    working_set = await engine.working_set()
+    return working_set["hot_bytes"]
+
+
+async def run_benchmark():
+    results = []
+    rng = random.Random(49)
+    now = datetime.utcnow()
+    archive_dir = Path(tempfile.mkdtemp(prefix="data_lifecycle_benchmark_"))
+    engine = DataLifecycleEngine(db, policies=POLICIES, archive_dir=archive_dir, batch_size=2000)
+    print("🗄️ Data Lifecycle Benchmark")
+    print("=" * 70)
+
+    try:
+        await seed(rng, now)
+        # Built by the cohort engine before the retention TTL existed
+        await db.login_logs.create_index("login_time")
+        await engine.ensure_archive_collections()
+        # The first TTL covers the year not yet archived, so nothing expires before its rollup
+        backlog_ttl = await engine.sync_ttl(POLICIES[2], now.date())
+
+        epoch = now - timedelta(days=HISTORY_DAYS + 1)
+        today = datetime.combine(now.date(), datetime.min.time())
+        expected = {policy.collection: await raw_daily_counts(policy.collection, policy.time_field, epoch, today) for policy in POLICIES}
+        totals = {policy.collection: await db[policy.collection].count_documents({}) for policy in POLICIES}
+        before_bytes = await hot_bytes(engine)
+
+        # An earlier run that stopped after copying one click batch but before deleting it
+        first_click = await db.click_tracking.find({}).sort("clicked_at", 1).limit(500).to_list(length=500)
+        await db.click_tracking_archive.insert_many(first_click)
+        first_email = await db.email_logs.find({}).sort("sent_at", 1).limit(1).to_list(length=1)
+        stale = archive_dir / "email_logs" / first_email[0]["sent_at"].date().isoformat() / archive_file_name(first_email[0]["_id"])
+        write_archive_file(stale, first_email)
+
+        started = time.perf_counter()
+        report = await engine.run()
+        run_s = time.perf_counter() - started
+        print(f"First run archived {report['documents_archived']:,} documents in {run_s:.1f}s\n")
+
+        matched = True
+        for policy in POLICIES:
+            rolled = await rollup_daily_counts(policy.collection)
+            matched = matched and all(rolled.get(day, 0) == count for day, count in expected[policy.collection].items())
+        results.append(matched)
+        print(f"{'✅ PASS' if matched else '❌ FAIL'}: daily rollups equal the previous raw $group counts for every day of the four collections")
+
+        conserved, cold_left = True, 0
+        for policy in POLICIES[:2]:
+            cutoff = datetime.combine(policy.cutoff_day(now.date()), datetime.min.time())
+            hot = await db[policy.collection].count_documents({})
+            archived = await db[policy.archive_collection].count_documents({})
+            cold_left += await db[policy.collection].count_documents({policy.time_field: {"$lt": cutoff}})
+            conserved = conserved and hot + archived == totals[policy.collection]
+        stats = await db.command("collStats", "click_tracking_archive")
+        compressed = "block_compressor=zstd" in stats.get("wiredTiger", {}).get("creationString", "")
+        moved = conserved and cold_left == 0
+        results.append(moved)
+        print(f"{'✅ PASS' if moved else '❌ FAIL'}: cold login and click days moved to the archive collections "
+              f"({'zstd' if compressed else 'default'} block compression), nothing lost or duplicated after the interrupted copy")
+
+        files = sorted((archive_dir / "email_logs").rglob("*.jsonl.gz"))
+        archived_emails = [document for path in files for document in read_archive_file(path)]
+        hot_emails = await db.email_logs.count_documents({})
+        ids = [document["_id"] for document in archived_emails]
+        file_bytes = sum(path.stat().st_size for path in files)
+        exported = hot_emails + len(ids) == totals["email_logs"] and len(set(ids)) == len(ids)
+        results.append(exported)
+        print(f"{'✅ PASS' if exported else '❌ FAIL'}: {len(ids):,} cold emails written to {len(files)} JSONL.gz files "
+              f"({file_bytes / 1024 / 1024:.1f} MB) and read back without duplicates")
+
+        ttl = {policy.collection: (await db[policy.collection].index_information())[f"{policy.time_field}_1"].get("expireAfterSeconds")
+               for policy in POLICIES}
+        expiring = backlog_ttl >= HISTORY_DAYS and all(ttl[policy.collection] == policy.ttl_seconds for policy in POLICIES)
+        results.append(expiring)
+        print(f"{'✅ PASS' if expiring else '❌ FAIL'}: TTL started at {backlog_ttl} days over the backlog, then set to the policy "
+              f"({', '.join(f'{name} {seconds // 86400}d' for name, seconds in ttl.items())}); login_logs.login_time converted in place")
+
+        second = await engine.run()
+        idle = second["documents_archived"] == 0 and all(entry.get("days_rolled_up") == 0 for entry in second["collections"])
+        results.append(idle)
+        print(f"{'✅ PASS' if idle else '❌ FAIL'}: second run found nothing to do in {second['duration_seconds']}s")
+
+        after_bytes = await hot_bytes(engine)
+        smaller = after_bytes < before_bytes * 0.75
+        results.append(smaller)
+        print(f"{'✅ PASS' if smaller else '❌ FAIL'}: hot collections and indexes {before_bytes / 1024 / 1024:.1f} MB -> "
+              f"{after_bytes / 1024 / 1024:.1f} MB")
+
+    finally:
+        await client.drop_database(os.environ["DB_NAME"])
+        shutil.rmtree(archive_dir, ignore_errors=True)
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
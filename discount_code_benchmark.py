@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Discount Code Minting Benchmark
+Measures code minting throughput at 1M codes against the previous one-insert_one-per-code loop,
+and checks uniqueness under the unique index, collision retries in a crowded code space, resuming
+a partial batch and the streamed batch download
+"""
+
+import asyncio
+import gzip
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+# Scratch database before importing the modules
+os.environ["DB_NAME"] = f"discount_code_benchmark_{uuid.uuid4().hex[:8]}"
+sys.path.append('/app/backend')
+
+from modules.discount_codes import db, client, DiscountCodeMinter, unique_codes
+from modules.admin_exports import encode_rows, gzip_chunks
+
+MINT_COUNT = int(os.getenv("MINT_COUNT", "1000000"))
+LEGACY_COUNT = int(os.getenv("LEGACY_MINT_COUNT", "5000"))
+
+
+# ----- Previous loop: one awaited insert_one per code, no uniqueness guarantee -----
+async def legacy_generate(discount_id, count):
+    for _ in range(count):
+        await db.legacy_discount_codes.insert_one({
+            "code_id": str(uuid.uuid4()), "discount_id": discount_id, "code": f"CM{uuid.uuid4().hex[:8].upper()}",
+            "is_active": True, "usage_count": 0, "max_uses": None, "created_at": datetime.utcnow(), "expires_at": None
+        })
+
+
+async def run_benchmark():
+    results = []
+    minter = DiscountCodeMinter(db)
+    print("🎟️ Discount Code Minting Benchmark")
+    print("=" * 70)
+
+    try:
+        # In-memory generation alone
+        started = time.perf_counter()
+        generated = unique_codes(MINT_COUNT)
+        generate_rate = MINT_COUNT / (time.perf_counter() - started)
+        print(f"   in-memory generation: {generate_rate:,.0f} codes/s ({len(set(generated)):,} distinct)")
+
+        started = time.perf_counter()
+        await legacy_generate("legacy", LEGACY_COUNT)
+        legacy_rate = LEGACY_COUNT / (time.perf_counter() - started)
+
+        batch = await minter.create_batch("partner_drop", MINT_COUNT, "admin", max_uses=1)
+        started = time.perf_counter()
+        batch = await minter.mint(batch["batch_id"])
+        mint_rate = MINT_COUNT / (time.perf_counter() - started)
+        distinct = len(await db.discount_codes.distinct("code", {"batch_id": batch["batch_id"]})) if MINT_COUNT <= 200000 else \
+            (await db.discount_codes.aggregate([{"$group": {"_id": "$code"}}, {"$count": "n"}], allowDiskUse=True).to_list(1))[0]["n"]
+        fast = batch["status"] == "completed" and batch["minted_count"] == MINT_COUNT == distinct and mint_rate > legacy_rate * 10
+        results.append(fast)
+        print(f"{'✅ PASS' if fast else '❌ FAIL'}: minted {MINT_COUNT:,} unique codes at {mint_rate:,.0f} codes/s "
+              f"vs previous loop {legacy_rate:,.0f} codes/s ({mint_rate / legacy_rate:.0f}x)")
+
+        # Crowded code space: only colliding positions are regenerated
+        crowded = await minter.create_batch("crowded", 20000, "admin", length=8, alphabet="ABCD", prefix="X")
+        await minter.mint(crowded["batch_id"])
+        second = await minter.create_batch("crowded", 10000, "admin", length=8, alphabet="ABCD", prefix="X")
+        second = await minter.mint(second["batch_id"])
+        total = await db.discount_codes.count_documents({"discount_id": "crowded"})
+        retried = (second["status"] == "completed" and second["collisions_retried"] > 0 and total == 30000
+                   and len(await db.discount_codes.distinct("code", {"discount_id": "crowded"})) == 30000)
+        results.append(retried)
+        print(f"{'✅ PASS' if retried else '❌ FAIL'}: 4^8 space: 10,000 more codes after 20,000 needed "
+              f"{second['collisions_retried']:,} retries, all {total:,} codes distinct")
+
+        # A batch interrupted part-way resumes and mints only the missing codes
+        partial = await minter.create_batch("resume", 25000, "admin")
+        await db.discount_codes.insert_many([{
+            "code_id": str(uuid.uuid4()), "discount_id": "resume", "batch_id": partial["batch_id"], "code": code,
+            "is_active": True, "usage_count": 0, "max_uses": None, "created_at": datetime.utcnow(), "expires_at": None
+        } for code in unique_codes(12000)])
+        await db.discount_code_batches.update_one({"batch_id": partial["batch_id"]}, {"$set": {"status": "failed"}})
+        resumed = await minter.mint(partial["batch_id"])
+        exact = resumed["status"] == "completed" and await db.discount_codes.count_documents({"batch_id": partial["batch_id"]}) == 25000
+        results.append(exact)
+        print(f"{'✅ PASS' if exact else '❌ FAIL'}: resumed batch topped up to exactly 25,000 codes")
+
+        # Streamed download of the 1M batch
+        started = time.perf_counter()
+        compressed = b"".join([chunk async for chunk in gzip_chunks(
+            encode_rows(minter.batch_rows(batch["batch_id"]), "csv", ["code", "expires_at", "max_uses"])
+        )])
+        lines = gzip.decompress(compressed).decode().splitlines()
+        downloaded = len(lines) == MINT_COUNT + 1 and lines[0] == "code,expires_at,max_uses"
+        results.append(downloaded)
+        print(f"{'✅ PASS' if downloaded else '❌ FAIL'}: streamed {len(lines) - 1:,} codes as CSV.gz "
+              f"({len(compressed) / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s")
+
+    finally:
+        await client.drop_database(os.environ["DB_NAME"])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Discount Redemption Load Test
+Redeems a 100-use code from 10,000 concurrent tasks against a scratch database and checks that
+exactly 100 succeed, where the previous read-check-write flow overshoots; also covers per-user
+uniqueness under races, the exhausted-code cache and the previous error messages
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+
+# Scratch database before importing the modules
+os.environ["DB_NAME"] = f"discount_redemption_load_test_{uuid.uuid4().hex[:8]}"
+sys.path.append('/app/backend')
+
+from modules.discount_codes import db, client, DiscountRedemptionEngine
+from modules.index_registry import index_registry, IndexMigrationRunner
+
+CONCURRENT_TASKS = int(os.getenv("REDEEM_TASKS", "10000"))
+MAX_USES = 100
+
+
+# ----- Previous flow: find_one, checks in Python, find_one, find_one, insert_one, two $inc -----
+async def legacy_redeem(code, user_id):
+    code_doc = await db.discount_codes.find_one({"code": code})
+    if code_doc["max_uses"] and code_doc["usage_count"] >= code_doc["max_uses"]:
+        return False
+    if await db.discount_usage.find_one({"user_id": user_id, "discount_code": code}):
+        return False
+    discount = await db.discounts.find_one({"discount_id": code_doc["discount_id"]})
+    await db.legacy_discount_usage.insert_one({"usage_id": str(uuid.uuid4()), "discount_code": code, "user_id": user_id})
+    await db.discount_codes.update_one({"code": code}, {"$inc": {"usage_count": 1}})
+    await db.discounts.update_one({"discount_id": discount["discount_id"]}, {"$inc": {"total_uses": 1}})
+    return True
+
+
+async def create_code(code, max_uses=MAX_USES, **fields):
+    await db.discount_codes.insert_one({
+        "code_id": str(uuid.uuid4()), "discount_id": "launch", "code": code, "is_active": True, "usage_count": 0,
+        "max_uses": max_uses, "created_at": datetime.utcnow(), "expires_at": None, **fields
+    })
+
+
+async def attempt(engine, code, user_id):
+    try:
+        await engine.redeem(code, user_id)
+        return "ok"
+    except HTTPException as e:
+        return e.detail
+
+
+async def run_benchmark():
+    results = []
+    engine = DiscountRedemptionEngine(db)
+    print("🎫 Discount Redemption Load Test")
+    print("=" * 70)
+
+    try:
+        await db.discounts.insert_one({"discount_id": "launch", "name": "Launch", "discount_type": "percentage", "value": 25, "total_uses": 0})
+        await IndexMigrationRunner(db, index_registry).migrate()
+
+        # Previous flow under the same burst
+        await create_code("LEGACY100")
+        legacy = await asyncio.gather(*(legacy_redeem("LEGACY100", f"user_{i}") for i in range(CONCURRENT_TASKS)))
+        legacy_uses = (await db.discount_codes.find_one({"code": "LEGACY100"}))["usage_count"]
+
+        # Conditional claim: exactly max_uses winners
+        await create_code("HOT100")
+        await db.discounts.update_one({"discount_id": "launch"}, {"$set": {"total_uses": 0}})
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(attempt(engine, "HOT100", f"user_{i}") for i in range(CONCURRENT_TASKS)))
+        elapsed = time.perf_counter() - started
+        succeeded = outcomes.count("ok")
+        stored = await db.discount_codes.find_one({"code": "HOT100"})
+        records = await db.discount_usage.count_documents({"discount_code": "HOT100"})
+        total_uses = (await db.discounts.find_one({"discount_id": "launch"}))["total_uses"]
+        exact = succeeded == MAX_USES == stored["usage_count"] == records == total_uses
+        results.append(exact)
+        print(f"{'✅ PASS' if exact else '❌ FAIL'}: {CONCURRENT_TASKS:,} concurrent redemptions of a {MAX_USES}-use code: {succeeded} succeeded "
+              f"in {elapsed:.2f}s (previous flow: {sum(legacy)} succeeded, usage_count {legacy_uses})")
+
+        rejected = set(outcome for outcome in outcomes if outcome != "ok") == {"Discount code usage limit reached"}
+        results.append(rejected)
+        print(f"{'✅ PASS' if rejected else '❌ FAIL'}: every other attempt rejected with the usage-limit message")
+
+        # Exhausted hot code is rejected from memory
+        cache_hits = engine.stats["exhausted_cache_hits"]
+        started = time.perf_counter()
+        late = await asyncio.gather(*(attempt(engine, "HOT100", f"late_{i}") for i in range(CONCURRENT_TASKS)))
+        late_ms = (time.perf_counter() - started) * 1000
+        cached = (set(late) == {"Discount code usage limit reached"}
+                  and engine.stats["exhausted_cache_hits"] - cache_hits == CONCURRENT_TASKS)
+        results.append(cached)
+        print(f"{'✅ PASS' if cached else '❌ FAIL'}: {CONCURRENT_TASKS:,} late attempts answered by the exhausted cache in {late_ms:.0f} ms")
+
+        # One user racing themselves gets one redemption and the claim is released
+        await create_code("ONCE", max_uses=10)
+        same_user = await asyncio.gather(*(attempt(engine, "ONCE", "user_same") for _ in range(50)))
+        stored = await db.discount_codes.find_one({"code": "ONCE"})
+        once = (same_user.count("ok") == 1 and stored["usage_count"] == 1
+                and set(same_user) - {"ok"} == {"You have already used this discount code"})
+        results.append(once)
+        print(f"{'✅ PASS' if once else '❌ FAIL'}: 50 concurrent attempts by one user -> 1 redemption, usage_count {stored['usage_count']}")
+
+        # A repeat attempt is refused before claiming, so it never holds the last use
+        await create_code("LAST2", max_uses=2)
+        first = await attempt(engine, "LAST2", "user_repeat")
+        repeats = await asyncio.gather(*(attempt(engine, "LAST2", "user_repeat") for _ in range(20)))
+        held = (await db.discount_codes.find_one({"code": "LAST2"}))["usage_count"]
+        other = await attempt(engine, "LAST2", "user_other")
+        repeat_ok = (first == "ok" and set(repeats) == {"You have already used this discount code"}
+                     and held == 1 and other == "ok")
+        results.append(repeat_ok)
+        print(f"{'✅ PASS' if repeat_ok else '❌ FAIL'}: 20 repeat attempts left usage_count at {held}; the last use still went to another user")
+
+        # Previous error messages for invalid, inactive and expired codes; unlimited codes stay unlimited
+        await create_code("OFF", is_active=False)
+        await create_code("OLD", expires_at=datetime.utcnow() - timedelta(days=1))
+        await create_code("OPEN", max_uses=None)
+        messages = [await attempt(engine, code, "user_msg") for code in ("NOPE", "OFF", "OLD")]
+        unlimited = await asyncio.gather(*(attempt(engine, "OPEN", f"open_{i}") for i in range(300)))
+        errors = (messages == ["Invalid discount code", "Discount code is no longer active", "Discount code has expired"]
+                  and unlimited.count("ok") == 300)
+        results.append(errors)
+        print(f"{'✅ PASS' if errors else '❌ FAIL'}: invalid/inactive/expired messages unchanged; codes without max_uses took 300 redemptions")
+
+    finally:
+        await client.drop_database(os.environ["DB_NAME"])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Discount ROI Benchmark
+Seeds discount usage into a scratch database and compares the rollup-backed ROI tracking with the
+previous load-and-group computation: exact pipeline equality, rollup totals and distinct-user
+estimates over arbitrary ranges, and latency as usage grows past the old 50,000-row cap
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Scratch database before importing the modules
+os.environ["DB_NAME"] = f"discount_roi_benchmark_{uuid.uuid4().hex[:8]}"
+sys.path.append('/app/backend')
+
+from modules.discount_analytics import db, client, DiscountAnalyticsEngine
+
+USAGE_ROWS = int(os.getenv("ROI_USAGE_ROWS", "400000"))
+DISCOUNTS = 40
+DAYS = 180
+TYPES = ["percentage", "fixed_amount", "free_months"]
+
+
+# ----- Previous computation, without the 50,000-row cap -----
+async def legacy_roi(start, end):
+    usage_data = await db.discount_usage.find({"applied_at": {"$gte": start, "$lte": end}}).to_list(length=None)
+    discount_roi = {}
+    for usage in usage_data:
+        data = discount_roi.setdefault(usage["discount_id"], {"total_uses": 0, "revenue_impact": 0.0, "users": set()})
+        data["total_uses"] += 1
+        data["users"].add(usage["user_id"])
+        if usage["discount_type"] == "percentage":
+            data["revenue_impact"] += 149.0 * (usage["discount_amount"] / 100)
+        elif usage["discount_type"] == "fixed_amount":
+            data["revenue_impact"] += usage["discount_amount"]
+        else:
+            data["revenue_impact"] += 149.0 * usage["discount_amount"]
+    results = {}
+    for discount_id, data in discount_roi.items():
+        if await db.discounts.find_one({"discount_id": discount_id}):
+            results[discount_id] = (data["total_uses"], len(data["users"]), round(data["revenue_impact"], 2))
+    return results
+
+
+def by_discount(result):
+    return {row["discount_id"]: (row["total_uses"], row["unique_users"], row["revenue_impact"]) for row in result["roi_tracking"]}
+
+
+async def seed(rng, now):
+    await db.discounts.insert_many([{"discount_id": f"disc_{i}", "name": f"Discount {i}"} for i in range(DISCOUNTS)])
+    batch = []
+    for _ in range(USAGE_ROWS):
+        discount = min(int(rng.expovariate(0.15)), DISCOUNTS)  # a few popular discounts; disc_40 has no discount document
+        discount_type = TYPES[discount % 3]
+        batch.append({
+            "usage_id": str(uuid.uuid4()),
+            "discount_id": f"disc_{discount}",
+            "user_id": f"user_{rng.randrange(USAGE_ROWS // 3)}",
+            "applied_at": now - timedelta(seconds=rng.uniform(0, DAYS * 86400)),
+            "discount_type": discount_type,
+            "discount_amount": {"percentage": 20, "fixed_amount": 15.5, "free_months": 1}[discount_type]
+        })
+        if len(batch) == 20000:
+            await db.discount_usage.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.discount_usage.insert_many(batch, ordered=False)
+
+
+async def run_benchmark():
+    results = []
+    rng = random.Random(44)
+    engine = DiscountAnalyticsEngine(db)
+    now = datetime.utcnow()
+    print("💹 Discount ROI Benchmark")
+    print("=" * 70)
+
+    try:
+        await seed(rng, now)
+        start, end = now - timedelta(days=90), now
+
+        started = time.perf_counter()
+        legacy = await legacy_roi(start, end)
+        legacy_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        exact = by_discount(await engine.roi_exact(start, end))
+        exact_ms = (time.perf_counter() - started) * 1000
+        same = exact == legacy and f"disc_{DISCOUNTS}" not in exact
+        results.append(same)
+        print(f"{'✅ PASS' if same else '❌ FAIL'}: exact $group + $lookup pipeline equals the previous computation over "
+              f"{sum(uses for uses, _, _ in legacy.values()):,} rows ({exact_ms:.0f} ms vs {legacy_ms:.0f} ms)")
+
+        # Before the background backfill has run, requests are answered live and build nothing
+        started = time.perf_counter()
+        pending = await engine.roi(start, end)
+        pending_ms = (time.perf_counter() - started) * 1000
+        unbuilt = (pending.get("rollups_pending") and by_discount(pending) == exact
+                   and await db.discount_daily_rollups.count_documents({}) == 0)
+        results.append(unbuilt)
+        print(f"{'✅ PASS' if unbuilt else '❌ FAIL'}: before the first refresh roi() served exact results in {pending_ms:.0f} ms "
+              f"without backfilling inside the request")
+
+        started = time.perf_counter()
+        refresh = await engine.refresh()
+        refresh_s = time.perf_counter() - started
+        started = time.perf_counter()
+        rolled = await engine.roi(start, end)
+        rollup_ms = (time.perf_counter() - started) * 1000
+        rollup = by_discount(rolled)
+        totals_match = all(rollup[d][0] == legacy[d][0] and abs(rollup[d][2] - legacy[d][2]) < 0.05 for d in legacy) and set(rollup) == set(legacy)
+        worst = max(abs(rollup[d][1] - legacy[d][1]) / legacy[d][1] for d in legacy)
+        exact_small = all(rollup[row["discount_id"]][1] == legacy[row["discount_id"]][1]
+                          for row in rolled["roi_tracking"] if row["unique_users_exact"])
+        accurate = totals_match and worst < 0.05 and exact_small
+        results.append(accurate)
+        print(f"{'✅ PASS' if accurate else '❌ FAIL'}: rollups ({refresh['days_processed']} days built in {refresh_s:.1f}s) give identical uses/revenue; "
+              f"distinct users within {worst:.1%} (exact for small discounts), read in {rollup_ms:.0f} ms")
+
+        # Arbitrary ranges with partial edge days
+        ranges_ok = True
+        for _ in range(5):
+            range_start = now - timedelta(days=rng.uniform(2, DAYS))
+            range_end = range_start + timedelta(days=rng.uniform(0.2, 60))
+            legacy_range = await legacy_roi(range_start, range_end)
+            rollup_range = by_discount(await engine.roi(range_start, range_end))
+            ranges_ok = ranges_ok and set(rollup_range) == set(legacy_range) and all(
+                rollup_range[d][0] == legacy_range[d][0] and abs(rollup_range[d][1] - legacy_range[d][1]) <= max(2, legacy_range[d][1] * 0.05)
+                for d in legacy_range
+            )
+        results.append(ranges_ok)
+        print(f"{'✅ PASS' if ranges_ok else '❌ FAIL'}: 5 random ranges with partial edge days match the previous computation")
+
+        # Today's usage is picked up live, without a refresh
+        await db.discount_usage.insert_one({"usage_id": "late", "discount_id": "disc_0", "user_id": "brand_new_user",
+                                            "applied_at": datetime.utcnow(), "discount_type": "percentage", "discount_amount": 20})
+        live = by_discount(await engine.roi(start, datetime.utcnow()))
+        fresh = live["disc_0"][0] == rollup["disc_0"][0] + 1
+        results.append(fresh)
+        print(f"{'✅ PASS' if fresh else '❌ FAIL'}: a redemption made today appears immediately")
+
+        # Read latency stays flat as usage grows
+        latencies = {}
+        for days in (7, 90, DAYS - 1):
+            started = time.perf_counter()
+            await engine.roi(now - timedelta(days=days), now)
+            latencies[days] = (time.perf_counter() - started) * 1000
+        flat = latencies[DAYS - 1] < 200
+        results.append(flat)
+        print(f"{'✅ PASS' if flat else '❌ FAIL'}: rollup read latency " + ", ".join(f"{d}d {ms:.0f} ms" for d, ms in latencies.items())
+              + f" (previous computation capped at 50,000 rows, {USAGE_ROWS:,} seeded)")
+
+    finally:
+        await client.drop_database(os.environ["DB_NAME"])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Email Campaign Delivery Benchmark
+Runs the delivery pipeline against stub SendGrid/Mailgun/Postmark servers and a local SMTP sink,
+comparing batched concurrent delivery with a serial per-recipient baseline
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from aiohttp import web
+
+STUB_PORT = int(os.getenv("STUB_PROVIDER_PORT", "18025"))
+SMTP_SINK_PORT = int(os.getenv("SMTP_SINK_PORT", "18026"))
+STUB_LATENCY_SECONDS = float(os.getenv("STUB_LATENCY_MS", "50")) / 1000
+CAMPAIGN_SIZE = int(os.getenv("CAMPAIGN_SIZE", "20000"))
+SERIAL_SAMPLE = 200
+
+# Point the pipeline at the local stubs and a scratch database before importing it
+os.environ["DB_NAME"] = f"email_delivery_benchmark_{uuid.uuid4().hex[:8]}"
+os.environ["SENDGRID_API_URL"] = f"http://127.0.0.1:{STUB_PORT}/v3/mail/send"
+os.environ["MAILGUN_API_BASE"] = f"http://127.0.0.1:{STUB_PORT}/mailgun"
+os.environ["POSTMARK_API_BASE"] = f"http://127.0.0.1:{STUB_PORT}/postmark"
+os.environ["SMTP_HOST"] = "127.0.0.1"
+os.environ["SMTP_PORT"] = str(SMTP_SINK_PORT)
+os.environ["EMAIL_PREFER_ODOO"] = "false"
+sys.path.append('/app/backend')
+
+from modules.email_system import db, client, audience_engine, EmailProvider, EmailProviderConfig, SimpleBulkEmail, RecipientType
+from modules.email_delivery import EmailDeliveryPipeline
+
+delivered = {"http_requests": 0, "http_messages": 0, "smtp_messages": 0}
+
+
+class FailingLogPipeline(EmailDeliveryPipeline):
+    """Cannot write the delivery log of one batch, even after retries"""
+
+    async def _insert_logs(self, logs):
+        if any(log["recipient_email"] == "user2600@example.com" for log in logs):
+            raise RuntimeError("email_logs unavailable")
+        return await super()._insert_logs(logs)
+
+
+# ----- Stub HTTP providers -----
+async def sendgrid_stub(request):
+    payload = await request.json()
+    await asyncio.sleep(STUB_LATENCY_SECONDS)
+    delivered["http_requests"] += 1
+    delivered["http_messages"] += len(payload["personalizations"])
+    return web.Response(status=202, headers={"X-Message-Id": uuid.uuid4().hex})
+
+
+async def mailgun_stub(request):
+    form = await request.post()
+    await asyncio.sleep(STUB_LATENCY_SECONDS)
+    delivered["http_requests"] += 1
+    delivered["http_messages"] += len(form.getall("to"))
+    return web.json_response({"id": f"<{uuid.uuid4().hex}@stub>", "message": "Queued"})
+
+
+async def postmark_stub(request):
+    messages = await request.json()
+    await asyncio.sleep(STUB_LATENCY_SECONDS)
+    delivered["http_requests"] += 1
+    delivered["http_messages"] += len(messages)
+    return web.json_response([{"ErrorCode": 0, "MessageID": uuid.uuid4().hex, "To": m["To"]} for m in messages])
+
+
+async def start_stub_providers():
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/v3/mail/send", sendgrid_stub)
+    app.router.add_post("/mailgun/{domain}/messages", mailgun_stub)
+    app.router.add_post("/postmark/email/batch", postmark_stub)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", STUB_PORT).start()
+    return runner
+
+
+# ----- Minimal SMTP sink -----
+async def handle_smtp(reader, writer):
+    writer.write(b"220 sink ready\r\n")
+    in_data = False
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        if in_data:
+            if line == b".\r\n":
+                in_data = False
+                delivered["smtp_messages"] += 1
+                writer.write(b"250 OK\r\n")
+            continue
+        command = line.strip().upper()
+        if command.startswith(b"DATA"):
+            in_data = True
+            writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+        elif command.startswith(b"QUIT"):
+            writer.write(b"221 Bye\r\n")
+            await writer.drain()
+            break
+        elif command.startswith(b"EHLO") or command.startswith(b"HELO"):
+            writer.write(b"250 sink\r\n")
+        else:
+            writer.write(b"250 OK\r\n")
+        await writer.drain()
+    writer.close()
+
+
+async def seed_campaign(campaign_id: str, size: int):
+    await db.email_campaigns.insert_one({
+        "campaign_id": campaign_id,
+        "status": "queued",
+        "sent_count": 0,
+        "failed_count": 0,
+        "recipient_count": size,
+        "created_at": datetime.utcnow()
+    })
+    await audience_engine.snapshot_members(campaign_id, (
+        {"member_id": f"user_{i:08d}", "email": f"user{i}@example.com", "name": f"User{i}"}
+        for i in range(size)
+    ))
+
+
+async def run_case(label: str, provider: EmailProvider, size: int, **pipeline_options):
+    campaign_id = f"bench_{provider.value}_{uuid.uuid4().hex[:6]}"
+    await seed_campaign(campaign_id, size)
+    config = EmailProviderConfig(provider=provider, api_key="stub", domain="stub.example.com")
+    email_data = SimpleBulkEmail(
+        subject="Benchmark",
+        html_content="<p>Hello {{ user_name }}, this is a benchmark for {{ user_email }}</p>",
+        recipient_type=RecipientType.CUSTOM_LIST
+    )
+
+    started = time.perf_counter()
+    progress = await EmailDeliveryPipeline(config, **pipeline_options).run(campaign_id, email_data)
+    elapsed = time.perf_counter() - started
+    logged = await db.email_logs.count_documents({"campaign_id": campaign_id})
+    rate = size / elapsed
+    ok = progress["sent"] == size and logged == size
+    print(f"{'✅' if ok else '❌'} {label:<34} {size:>7,} in {elapsed:6.2f}s  {rate:>9,.0f}/s  logged={logged:,}")
+    return rate, ok
+
+
+async def run_benchmark():
+    runner = await start_stub_providers()
+    smtp_server = await asyncio.start_server(handle_smtp, "127.0.0.1", SMTP_SINK_PORT)
+    results = []
+
+    print("📧 Email Campaign Delivery Benchmark")
+    print("=" * 78)
+    print(f"Campaign size: {CAMPAIGN_SIZE:,}, stub provider latency: {STUB_LATENCY_SECONDS * 1000:.0f} ms\n")
+
+    try:
+        serial_rate, ok = await run_case(
+            "Serial per-recipient (baseline)", EmailProvider.POSTMARK, SERIAL_SAMPLE,
+            use_batch_api=False, batch_workers=1, per_recipient_concurrency=1
+        )
+        results.append(ok)
+
+        for provider in [EmailProvider.SENDGRID, EmailProvider.MAILGUN, EmailProvider.POSTMARK]:
+            rate, ok = await run_case(f"{provider.value} batch API", provider, CAMPAIGN_SIZE)
+            results.append(ok)
+            print(f"   {rate / serial_rate:.0f}x baseline")
+
+        rate, ok = await run_case("SMTP sink (worker pool)", EmailProvider.INTERNAL, CAMPAIGN_SIZE // 4)
+        results.append(ok)
+        print(f"   {rate / serial_rate:.1f}x baseline")
+
+        # Pause halfway, then resume from the checkpoint without duplicate sends
+        campaign_id = f"bench_pause_{uuid.uuid4().hex[:6]}"
+        await seed_campaign(campaign_id, 5000)
+        config = EmailProviderConfig(provider=EmailProvider.POSTMARK, api_key="stub")
+        email_data = SimpleBulkEmail(subject="Pause", html_content="<p>Hello {{ user_name }}</p>", recipient_type=RecipientType.CUSTOM_LIST)
+        pipeline = EmailDeliveryPipeline(config, batch_size=250, batch_workers=1)
+        run = asyncio.create_task(pipeline.run(campaign_id, email_data))
+        await asyncio.sleep(STUB_LATENCY_SECONDS * 4)
+        await db.email_campaigns.update_one({"campaign_id": campaign_id}, {"$set": {"status": "paused"}})
+        await run
+        paused_at = await db.email_logs.count_documents({"campaign_id": campaign_id})
+        await db.email_campaigns.update_one({"campaign_id": campaign_id}, {"$set": {"status": "sending"}})
+        await EmailDeliveryPipeline(config, batch_size=250).run(campaign_id, email_data)
+        logged = await db.email_logs.count_documents({"campaign_id": campaign_id})
+        distinct = len(await db.email_logs.distinct("recipient_email", {"campaign_id": campaign_id}))
+        ok = 0 < paused_at < 5000 and logged == 5000 and distinct == 5000
+        results.append(ok)
+        print(f"\n{'✅ PASS' if ok else '❌ FAIL'}: paused after {paused_at:,}, resumed to {logged:,} sends with {distinct:,} distinct recipients")
+
+        # A batch that keeps failing halts the run as paused; the resume starts at that batch
+        campaign_id = f"bench_halt_{uuid.uuid4().hex[:6]}"
+        await seed_campaign(campaign_id, 5000)
+        await FailingLogPipeline(config, batch_size=250, batch_workers=4, retry_backoff_seconds=0.01).run(campaign_id, email_data)
+        halted = await db.email_campaigns.find_one({"campaign_id": campaign_id})
+        halted_logs = await db.email_logs.count_documents({"campaign_id": campaign_id})
+        await db.email_campaigns.update_one({"campaign_id": campaign_id}, {"$set": {"status": "sending"}})
+        await EmailDeliveryPipeline(config, batch_size=250).run(campaign_id, email_data)
+        final = await db.email_campaigns.find_one({"campaign_id": campaign_id})
+        logged = await db.email_logs.count_documents({"campaign_id": campaign_id})
+        distinct = len(await db.email_logs.distinct("recipient_email", {"campaign_id": campaign_id}))
+        ok = (halted["status"] == "paused" and halted["progress"].get("halted_batch") is not None and halted_logs < 5000
+              and final["status"] == "sent" and logged == distinct == 5000)
+        results.append(ok)
+        print(f"{'✅ PASS' if ok else '❌ FAIL'}: failing batch paused the campaign at batch {halted['progress'].get('halted_batch')} "
+              f"after {halted_logs:,} logged sends; resume completed {distinct:,} distinct recipients without duplicates")
+        print(f"   Stub providers received {delivered['http_messages']:,} messages in {delivered['http_requests']:,} requests; SMTP sink {delivered['smtp_messages']:,}")
+
+    finally:
+        smtp_server.close()
+        await runner.cleanup()
+        await client.drop_database(os.environ["DB_NAME"])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
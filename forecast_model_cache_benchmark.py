@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Forecast Model Cache Benchmark
+Checks the persisted forecast model store against the previous refit-per-request forecasts:
+equivalence, incremental refits, process-pool fits, cached repeats and exported statistics
+"""
+
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+sys.path.append('/app/backend')
+
+from modules.analytics_insights.forecast_model_store import ForecastModelStore, SeriesFit, FITTED_MODELS, series_columns, extend_digest
+from modules.analytics_insights.roi_forecasting import (
+    ROIForecastingService, ForecastParameters, ForecastModel, CampaignType, HistoricalCampaign
+)
+
+SERIES_POINTS = int(os.getenv("FORECAST_SERIES_POINTS", "200000"))
+INCREMENTAL_BATCHES = 50
+TOLERANCE = 1e-9
+
+
+# ----- Previous refit-per-request implementation, kept verbatim for comparison -----
+def legacy_linear(parameters, historical_data):
+    budgets = [c.budget for c in historical_data]
+    rois = [(c.revenue - c.actual_spend) / c.actual_spend if c.actual_spend > 0 else 0 for c in historical_data]
+    if len(budgets) > 1:
+        correlation = np.corrcoef(budgets, rois)[0, 1] if not np.isnan(np.corrcoef(budgets, rois)).any() else 0
+        avg_roi = np.mean(rois)
+        budget_factor = math.log(parameters.budget / np.mean(budgets)) * 0.1 if np.mean(budgets) > 0 else 0
+        predicted_roi = avg_roi + budget_factor + (correlation * 0.2)
+    else:
+        predicted_roi = rois[0] if rois else 0.5
+    predicted_roi *= parameters.seasonal_factor
+    return max(0, predicted_roi)
+
+
+def legacy_arima(parameters, historical_data):
+    sorted_campaigns = sorted(historical_data, key=lambda x: x.start_date)
+    rois = [(c.revenue - c.actual_spend) / c.actual_spend if c.actual_spend > 0 else 0 for c in sorted_campaigns]
+    if len(rois) < 3:
+        return np.mean(rois) if rois else 0.5
+    recent_trend = np.mean(rois[-3:]) - np.mean(rois[-6:-3]) if len(rois) >= 6 else 0
+    seasonal_pattern = parameters.seasonal_factor - 1
+    base_roi = np.mean(rois[-3:])
+    predicted_roi = base_roi + recent_trend + seasonal_pattern
+    return max(0, predicted_roi)
+
+
+def legacy_prophet(parameters, historical_data):
+    rois = [(c.revenue - c.actual_spend) / c.actual_spend if c.actual_spend > 0 else 0 for c in historical_data]
+    base_roi = np.mean(rois)
+    if len(historical_data) > 1:
+        sorted_campaigns = sorted(historical_data, key=lambda x: x.start_date)
+        recent_performance = np.mean([(c.revenue - c.actual_spend) / c.actual_spend for c in sorted_campaigns[-5:]]) if len(sorted_campaigns) >= 5 else base_roi
+        trend = (recent_performance - base_roi) * 0.5
+    else:
+        trend = 0
+    seasonal_adjustment = (parameters.seasonal_factor - 1) * 0.3
+    event_effect = 0.05 if parameters.campaign_type in [CampaignType.WEBINAR, CampaignType.TRADE_SHOW] else 0
+    predicted_roi = base_roi + trend + seasonal_adjustment + event_effect
+    return max(0, predicted_roi)
+
+
+def legacy_monte_carlo_distribution(historical_data):
+    rois = [(c.revenue - c.actual_spend) / c.actual_spend if c.actual_spend > 0 else 0 for c in historical_data]
+    return np.mean(rois), np.std(rois) if len(rois) > 1 else 0.2
+
+
+def synthetic_campaigns(count, seed, campaign_type=CampaignType.PAID_SEARCH):
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    campaigns = []
+    for _ in range(count):
+        # Coarse dates so ties exercise the stable ordering
+        campaign_start = start + timedelta(days=rng.randint(0, 900))
+        spend = rng.uniform(1000, 20000)
+        campaigns.append(HistoricalCampaign.model_construct(
+            campaign_id="", name="", campaign_type=campaign_type, start_date=campaign_start,
+            end_date=campaign_start + timedelta(days=30), budget=spend * rng.uniform(0.9, 1.2),
+            actual_spend=spend, impressions=0, clicks=0, conversions=0,
+            revenue=spend * rng.uniform(0.2, 6.0), customer_acquisition_cost=0.0, lifetime_value=0.0
+        ))
+    return campaigns
+
+
+def relative(a, b):
+    return abs(a - b) / max(abs(b), 1.0)
+
+
+async def run_benchmark():
+    results = []
+    service = ROIForecastingService()
+    service.model_store = ForecastModelStore(max_workers=int(os.getenv("FORECAST_FIT_WORKERS", "2")))
+    print("🗄️ Forecast Model Cache Benchmark")
+    print("=" * 70)
+
+    try:
+        # Same forecasts as the refit-per-request implementation
+        worst = 0.0
+        for campaign_type in CampaignType:
+            history = [c for c in service.historical_data if c.campaign_type == campaign_type]
+            if not history:
+                continue
+            for budget, seasonal in [(500, 0.8), (5000, 1.0), (40000, 1.3)]:
+                parameters = ForecastParameters(campaign_type=campaign_type, budget=budget, duration_days=30,
+                                                target_audience_size=10000, seasonal_factor=seasonal)
+                for model, legacy in [(ForecastModel.LINEAR_REGRESSION, legacy_linear), (ForecastModel.ARIMA, legacy_arima),
+                                      (ForecastModel.PROPHET, legacy_prophet)]:
+                    worst = max(worst, relative(await service._single_model_forecast(parameters, history, model), legacy(parameters, history)))
+            fit, _ = await service.model_store.fitted(campaign_type.value, ForecastModel.MONTE_CARLO.value, history)
+            scenario = service._simulation_scenario(parameters, fit)
+            mean_roi, std_roi = legacy_monte_carlo_distribution(history)
+            worst = max(worst, relative(scenario.mean_roi, mean_roi), relative(scenario.std_roi, std_roi))
+        equivalent = worst <= TOLERANCE
+        results.append(equivalent)
+        print(f"{'✅ PASS' if equivalent else '❌ FAIL'}: cached fits reproduce the per-request refits (max relative deviation {worst:.1e})")
+
+        # Incremental refit vs full refit on a large series
+        series = synthetic_campaigns(SERIES_POINTS, seed=1)
+        initial = SERIES_POINTS - SERIES_POINTS // 4
+        store = ForecastModelStore(max_workers=1)
+        history = series[:initial]
+        for model in FITTED_MODELS:
+            await store.fitted("paid_search", model, history)
+        started = time.perf_counter()
+        step = (SERIES_POINTS - initial) // INCREMENTAL_BATCHES
+        for end in range(initial + step, SERIES_POINTS + 1, step):
+            history = series[:end]
+            await store.observe("paid_search", history)
+        incremental_seconds = time.perf_counter() - started
+
+        fresh = ForecastModelStore(max_workers=1)
+        started = time.perf_counter()
+        for model in FITTED_MODELS:
+            await fresh.fitted("paid_search", model, history)
+        full_seconds = time.perf_counter() - started
+
+        parameters = ForecastParameters(campaign_type=CampaignType.PAID_SEARCH, budget=8000, duration_days=30, target_audience_size=10000)
+        worst = 0.0
+        for model, predict in [("linear_regression", service._linear_regression_forecast), ("arima", service._arima_forecast),
+                               ("prophet", service._prophet_forecast)]:
+            incremental_fit, _ = await store.fitted("paid_search", model, history)
+            full_fit, _ = await fresh.fitted("paid_search", model, history)
+            worst = max(worst, relative(predict(parameters, incremental_fit), predict(parameters, full_fit)))
+        incremental_mc = service._simulation_scenario(parameters, (await store.fitted("paid_search", "monte_carlo", history))[0])
+        full_mc = service._simulation_scenario(parameters, (await fresh.fitted("paid_search", "monte_carlo", history))[0])
+        worst = max(worst, relative(incremental_mc.std_roi, full_mc.std_roi))
+        same_version = store.version("paid_search", history) == fresh.version("paid_search", history)
+        incremental_ok = worst <= TOLERANCE and same_version and store.stats["arima"].full_fits == 1
+        results.append(incremental_ok)
+        print(f"{'✅ PASS' if incremental_ok else '❌ FAIL'}: {INCREMENTAL_BATCHES} incremental refits ({incremental_seconds:.2f}s for {SERIES_POINTS - initial:,} points) "
+              f"match a full refit ({full_seconds:.2f}s for {SERIES_POINTS:,}); deviation {worst:.1e}, same digest {same_version}")
+
+        # Large fits in the worker pool give the same parameters as inline fits
+        pooled = ForecastModelStore(max_workers=2, pool_min_points=1)
+        same = True
+        started = time.perf_counter()
+        for model in FITTED_MODELS:
+            pooled_fit, _ = await pooled.fitted("paid_search", model, history)
+            inline_fit, _ = await fresh.fitted("paid_search", model, history)
+            same = same and pooled_fit == inline_fit
+        pooled_seconds = time.perf_counter() - started
+        pooled.shutdown()
+        results.append(same)
+        print(f"{'✅ PASS' if same else '❌ FAIL'}: process-pool fits identical to inline fits ({pooled_seconds:.2f}s incl. pool start-up)")
+
+        # Persisted documents restore only onto the history they were fitted on
+        document = store._series["paid_search"].to_document()
+        restored = SeriesFit.from_document(document)
+        dates, budgets, rois = series_columns(history)
+        valid = extend_digest(0, 0, dates, budgets, rois) == restored.digest and restored.fits == store._series["paid_search"].fits
+        rois[-1] += 1.0
+        tampered = extend_digest(0, 0, dates, budgets, rois) != restored.digest
+        roundtrip = valid and tampered
+        results.append(roundtrip)
+        print(f"{'✅ PASS' if roundtrip else '❌ FAIL'}: persisted fits round-trip and a rewritten history is detected by its digest")
+
+        # Repeated requests are served from cache
+        parameters = ForecastParameters(campaign_type=CampaignType.EMAIL, budget=5000, duration_days=7, target_audience_size=10000)
+        service.historical_data.extend(synthetic_campaigns(50000, seed=2, campaign_type=CampaignType.EMAIL))
+        started = time.perf_counter()
+        first = await service.forecast_campaign_roi(parameters)
+        cold_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        second = await service.forecast_campaign_roi(parameters)
+        warm_ms = (time.perf_counter() - started) * 1000
+        await service.add_historical_campaigns(synthetic_campaigns(10, seed=3, campaign_type=CampaignType.EMAIL))
+        third = await service.forecast_campaign_roi(parameters)
+        email_arima = service.model_store.stats["arima"]
+        cached = (first.predicted_roi == second.predicted_roi and warm_ms < cold_ms
+                  and third.predicted_roi != first.predicted_roi and email_arima.incremental_refits >= 1)
+        results.append(cached)
+        print(f"{'✅ PASS' if cached else '❌ FAIL'}: repeated ensemble forecast over 50k campaigns {cold_ms:.1f} ms -> {warm_ms:.1f} ms; "
+              f"new campaigns refit incrementally and change the forecast")
+
+        stats = service.model_store.cache_stats()["models"]
+        exported = all(stats[model]["full_fits"] >= 1 and stats[model]["mean_fit_seconds"] > 0 for model in FITTED_MODELS) \
+            and stats["ensemble"]["prediction_cache_hit_rate"] > 0
+        results.append(exported)
+        print(f"{'✅ PASS' if exported else '❌ FAIL'}: exported per-model stats, e.g. ensemble prediction hit rate "
+              f"{stats['ensemble']['prediction_cache_hit_rate']:.0%}, arima mean fit {stats['arima']['mean_fit_seconds'] * 1000:.2f} ms")
+
+    finally:
+        service.model_store.shutdown()
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
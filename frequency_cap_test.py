@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Frequency Cap Counter Correctness Test
+Compares bucketed frequency cap counters against the original count_documents semantics
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorClient
+sys.path.append('/app/backend')
+
+from modules.marketing_automation_pro.frequency_cap import FrequencyCapManager
+from modules.index_registry import index_registry, IndexMigrationRunner
+
+# MongoDB setup (scratch database, dropped at the end)
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+TEST_DB_NAME = f"frequency_cap_test_{uuid.uuid4().hex[:8]}"
+
+CUSTOMERS = 2000
+CHANNELS = ["sms", "push"]
+CAP = 3
+
+
+async def legacy_check(db, customer_id: str, channel: str, cap: int) -> bool:
+    """Original _check_frequency_cap query"""
+    today = datetime.now().date()
+    messages_today = await db.channel_messages.count_documents({
+        "customer_id": customer_id,
+        "channel": channel,
+        "sent_time": {
+            "$gte": datetime.combine(today, datetime.min.time()),
+            "$lt": datetime.combine(today + timedelta(days=1), datetime.min.time())
+        }
+    })
+    return messages_today < cap
+
+
+async def test_frequency_caps():
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[TEST_DB_NAME]
+    manager = FrequencyCapManager(db)
+    results = []
+
+    try:
+        await IndexMigrationRunner(db, index_registry).migrate()
+        now = datetime.now()
+        start_of_day = datetime.combine(now.date(), datetime.min.time())
+        customer_ids = [f"customer_{i}" for i in range(CUSTOMERS)]
+
+        # Historic deliveries: yesterday (must not count) and earlier today
+        history = []
+        for customer_id in customer_ids:
+            for channel in CHANNELS:
+                for _ in range(random.randint(0, 4)):
+                    sent_time = start_of_day + timedelta(seconds=random.randint(0, max(int((now - start_of_day).total_seconds()) - 1, 0)))
+                    history.append({"customer_id": customer_id, "channel": channel, "sent_time": sent_time})
+                for _ in range(random.randint(0, 3)):
+                    history.append({
+                        "customer_id": customer_id,
+                        "channel": channel,
+                        "sent_time": start_of_day - timedelta(seconds=random.randint(1, 86400))
+                    })
+        await db.channel_messages.insert_many(history)
+        await manager.backfill_from_deliveries()
+
+        # Live deliveries recorded through both paths
+        live = []
+        for customer_id in random.sample(customer_ids, CUSTOMERS // 4):
+            channel = random.choice(CHANNELS)
+            live.append((customer_id, channel, datetime.now()))
+        await db.channel_messages.insert_many([
+            {"customer_id": c, "channel": ch, "sent_time": t} for c, ch, t in live
+        ])
+        await manager.record_batch(live)
+
+        for channel in CHANNELS:
+            started = time.perf_counter()
+            batch = await manager.check_batch(customer_ids, channel, CAP)
+            batch_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            mismatches = 0
+            for customer_id in customer_ids:
+                if await legacy_check(db, customer_id, channel, CAP) != batch[customer_id]:
+                    mismatches += 1
+            legacy_seconds = time.perf_counter() - started
+
+            success = mismatches == 0
+            results.append(success)
+            status = "✅ PASS" if success else "❌ FAIL"
+            print(f"{status}: {channel} caps match count-based semantics ({mismatches} mismatches)")
+            print(f"   Batch check: {batch_seconds * 1000:.1f} ms, legacy per-customer: {legacy_seconds * 1000:.1f} ms")
+
+        # Hot tier serves repeat checks without a query
+        started = time.perf_counter()
+        await manager.check_batch(customer_ids, "sms", CAP)
+        print(f"   Hot tier re-check: {(time.perf_counter() - started) * 1000:.1f} ms ({manager.hot_tier_stats()['entries']} entries)")
+
+    finally:
+        await client.drop_database(TEST_DB_NAME)
+        client.close()
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(test_frequency_caps())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Index Migration Benchmark
+Seeds collections shaped like the user, affiliate click and chat data into a scratch database and
+runs the declarative index migration against them: missing indexes are built and queries switch
+from collection scans to index scans, a second run finds no drift, TTL changes are applied in place,
+conflicts are reported without dropping anything, and the slow-query detector flags unindexed shapes
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Scratch database before importing the modules
+os.environ["DB_NAME"] = f"index_migration_benchmark_{uuid.uuid4().hex[:8]}"
+sys.path.append('/app/backend')
+
+from modules.index_registry import db, client, IndexRegistry, IndexMigrationRunner, SlowQueryDetector
+
+USERS = int(os.getenv("INDEX_BENCHMARK_USERS", "200000"))
+CLICKS = USERS * 2
+MESSAGES = USERS
+
+
+def build_registry():
+    """The same declarations the auth, affiliate and chat modules make"""
+    registry = IndexRegistry()
+    declare = registry.module("benchmark")
+    declare("users", "user_id", unique=True)
+    declare("users", "email", unique=True)
+    declare("click_tracking", [("affiliate_id", 1), ("clicked_at", -1)])
+    declare("click_tracking", [("affiliate_id", 1), ("conversion_date", -1)], partialFilterExpression={"converted": True})
+    declare("chat_messages", [("session_id", 1), ("timestamp", 1)])
+    declare("login_logs", "login_time", expireAfterSeconds=180 * 86400)
+    return registry
+
+
+async def seed(rng, now):
+    async def insert(collection, documents):
+        for start in range(0, len(documents), 20000):
+            await collection.insert_many(documents[start:start + 20000], ordered=False)
+
+    await insert(db.users, [{"user_id": f"user_{i}", "email": f"user{i}@example.com", "created_at": now} for i in range(USERS)])
+    await insert(db.click_tracking, [{
+        "affiliate_id": f"aff_{rng.randrange(2000)}", "session_id": uuid.uuid4().hex,
+        "clicked_at": now - timedelta(days=rng.uniform(0, 90)), "converted": rng.random() < 0.05,
+        "conversion_date": now - timedelta(days=rng.uniform(0, 60))
+    } for _ in range(CLICKS)])
+    await insert(db.chat_messages, [{"session_id": f"session_{rng.randrange(USERS // 10)}", "timestamp": now - timedelta(seconds=i), "message": "hello"}
+                                    for i in range(MESSAGES)])
+    await db.login_logs.insert_one({"user_id": "user_0", "login_time": now})
+    # Built by an older release with a different TTL, and an index nobody declares
+    await db.login_logs.create_index("login_time", expireAfterSeconds=30 * 86400)
+    await db.chat_messages.create_index("message")
+
+
+async def timed_queries(now):
+    queries = [
+        ("users by email", db.users.find_one({"email": f"user{USERS - 1}@example.com"})),
+        ("clicks this month", db.click_tracking.count_documents({"affiliate_id": "aff_7", "clicked_at": {"$gte": now - timedelta(days=30)}})),
+        ("chat transcript", db.chat_messages.find({"session_id": "session_42"}).sort("timestamp", 1).to_list(length=1000))
+    ]
+    timings = {}
+    for label, query in queries:
+        started = time.perf_counter()
+        await query
+        timings[label] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+async def run_benchmark():
+    results = []
+    rng = random.Random(48)
+    now = datetime.utcnow()
+    registry = build_registry()
+    runner = IndexMigrationRunner(db, registry)
+    detector = SlowQueryDetector(db, registry, slow_ms=0)
+    print("🗂️ Index Migration Benchmark")
+    print("=" * 70)
+
+    try:
+        await seed(rng, now)
+
+        drift = await runner.drift()
+        scans = [await detector.uses_index("users", {"email": "user1@example.com"}),
+                 await detector.uses_index("click_tracking", {"affiliate_id": "aff_1", "clicked_at": {"$gte": now}}),
+                 await detector.uses_index("chat_messages", {"session_id": "session_1"}, sort=[("timestamp", 1)])]
+        profiling = await detector.enable()
+        before = await timed_queries(now)
+
+        started = time.perf_counter()
+        report = await runner.migrate()
+        build_s = time.perf_counter() - started
+        indexed = [await detector.uses_index("users", {"email": "user1@example.com"}),
+                   await detector.uses_index("click_tracking", {"affiliate_id": "aff_1", "clicked_at": {"$gte": now}}),
+                   await detector.uses_index("chat_messages", {"session_id": "session_1"}, sort=[("timestamp", 1)])]
+        after = await timed_queries(now)
+
+        built = (drift["summary"]["missing"] == 5 and len(report["created"]) == 5 and not report["failed"]
+                 and not any(scans) and all(indexed))
+        results.append(built)
+        print(f"{'✅ PASS' if built else '❌ FAIL'}: {len(report['created'])} missing indexes built in {build_s:.1f}s; "
+              f"the three query shapes moved from COLLSCAN to IXSCAN")
+
+        faster = all(after[label] < before[label] for label in before)
+        results.append(faster)
+        print(f"{'✅ PASS' if faster else '❌ FAIL'}: " + ", ".join(f"{label} {before[label]:.0f} -> {after[label]:.1f} ms" for label in before))
+
+        ttl = await db.login_logs.index_information()
+        ttl_updated = len(report["ttl_updated"]) == 1 and ttl["login_time_1"]["expireAfterSeconds"] == 180 * 86400
+        results.append(ttl_updated)
+        print(f"{'✅ PASS' if ttl_updated else '❌ FAIL'}: TTL of login_logs.login_time changed in place from 30 to 180 days")
+
+        # A unique declaration over duplicate data fails and is reported, nothing is dropped
+        await db.tracking_links.insert_many([{"code": "dup"}, {"code": "dup"}])
+        declare = registry.module("benchmark")
+        declare("tracking_links", "code", unique=True)
+        await db.chat_messages.create_index("session_id", sparse=True)
+        declare("chat_messages", "session_id")
+        second = await runner.migrate()
+        live_chat = await db.chat_messages.index_information()
+        reported = ([entry["name"] for entry in second["failed"]] == ["code_1"]
+                    and [entry["name"] for entry in second["conflicting"]] == ["session_id_1"]
+                    and "message_1" in live_chat and "session_id_1" in live_chat
+                    and {entry["name"] for entry in second["undeclared"]} == {"message_1"}
+                    and second["already_present"] == 6)
+        results.append(reported)
+        print(f"{'✅ PASS' if reported else '❌ FAIL'}: second run: {second['already_present']} present, failed unique build and "
+              f"sparse/non-sparse conflict reported, undeclared index kept")
+
+        # Profiled collection scans are grouped by shape and pointed at the registry
+        checkpoint = datetime.utcnow()
+        await db.click_tracking.count_documents({"session_id": "missing"})
+        await db.users.find_one({"email": "user3@example.com"})
+        slow = await detector.report(since=checkpoint)
+        shapes = {(row["collection"], tuple(row["fields"])): row for row in slow["shapes"]}
+        click_scan = shapes.get(("click_tracking", ("session_id",)))
+        user_lookup = shapes.get(("users", ("email",)))
+        flagged = (profiling is not None and click_scan is not None and click_scan["collection_scan"]
+                   and "no declared index" in click_scan["advice"]
+                   and user_lookup is not None and not user_lookup["collection_scan"])
+        results.append(flagged)
+        print(f"{'✅ PASS' if flagged else '❌ FAIL'}: slow-query report ({profiling} profiling) flags {slow['collection_scans']} "
+              f"collection-scan shape(s), including click_tracking by session_id")
+
+    finally:
+        await client.drop_database(os.environ["DB_NAME"])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Overage Billing Benchmark
+Seeds users with contacts, websites, keywords, team members, API calls and email campaigns into a
+scratch database and compares the batched overage billing run with the previous per-user loop:
+identical charges, throughput, a run that crashes midway and resumes without duplicate charges,
+and a second call in the same period that charges nothing
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Scratch database before importing the modules
+os.environ["DB_NAME"] = f"overage_billing_benchmark_{uuid.uuid4().hex[:8]}"
+sys.path.append('/app/backend')
+
+from modules.subscription_system import db, client, USAGE_LIMITS, OVERAGE_PRICING
+from modules.overage_billing import OverageBillingEngine
+from modules.index_registry import index_registry, IndexMigrationRunner
+
+USERS = int(os.getenv("OVERAGE_BENCHMARK_USERS", "20000"))
+LEGACY_SAMPLE = 300
+PLANS = ["free", "launch", "growth", "scale"]
+
+
+async def seed(rng, now):
+    async def insert(collection, documents):
+        for start in range(0, len(documents), 20000):
+            await collection.insert_many(documents[start:start + 20000], ordered=False)
+
+    users = [{"user_id": f"user_{i}", "email": f"user{i:07d}@example.com", "plan_type": rng.choice(PLANS),
+              "is_active": rng.random() < 0.9} for i in range(USERS)]
+    await insert(db.users, users)
+    customers, websites, keywords, team, api_logs, campaigns = [], [], [], [], [], []
+    for user in users:
+        email = user["email"]
+        customers += [{"owner_email": email}] * rng.choices([0, 20, 120, 1100], weights=[50, 30, 15, 5])[0]
+        websites += [{"user_email": email}] * rng.randrange(0, 8)
+        keywords += [{"user_email": email}] * rng.choice([0, 5, 60])
+        team += [{"team_owner": email}] * rng.randrange(0, 4)
+        api_logs += [{"user_email": email, "timestamp": now - timedelta(days=rng.uniform(0, 40))}] * rng.choices([0, 10, 1100], weights=[70, 25, 5])[0]
+        campaigns += [{"user_email": email, "recipient_count": rng.randrange(10, 400),
+                       "sent_at": now - timedelta(days=rng.uniform(0, 60))} for _ in range(rng.randrange(0, 4))]
+    for collection, documents in ((db.customers, customers), (db.websites, websites), (db.keywords, keywords),
+                                  (db.team_members, team), (db.api_logs, api_logs), (db.email_campaigns, campaigns)):
+        await insert(collection, [dict(document) for document in documents])
+
+
+# ----- Previous billing: get_detailed_usage queries for one user at a time -----
+async def legacy_usage(user_email):
+    collections = await db.list_collection_names()
+    month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    emails = await db.email_campaigns.aggregate([
+        {"$match": {"user_email": user_email, "sent_at": {"$gte": month_start}}},
+        {"$group": {"_id": None, "total": {"$sum": "$recipient_count"}}}
+    ]).to_list(length=1)
+    customers = await db.customers.count_documents({"owner_email": user_email})
+    campaigns = await db.email_campaigns.count_documents({"user_email": user_email})
+    return {
+        "contacts": customers,
+        "websites": await db.websites.count_documents({"user_email": user_email}) if "websites" in collections else 0,
+        "keywords": await db.keywords.count_documents({"user_email": user_email}) if "keywords" in collections else 0,
+        "users": await db.team_members.count_documents({"team_owner": user_email}) if "team_members" in collections else 1,
+        "api_calls_per_month": await db.api_logs.count_documents({"user_email": user_email, "timestamp": {"$gte": month_start}}),
+        "email_sends_per_month": emails[0]["total"] if emails else 0,
+        "data_storage_gb": round((customers * 0.001 + campaigns * 0.01) / 1024, 2)
+    }
+
+
+async def legacy_charge(user):
+    limits = USAGE_LIMITS.get(user.get("plan_type", "free"), USAGE_LIMITS["free"])
+    items, total = [], 0
+    for resource, current in (await legacy_usage(user["email"])).items():
+        limit = limits.get(resource, 0)
+        overage = max(0, current - limit) if limit != float('inf') else 0
+        cost = float(f"{overage * OVERAGE_PRICING.get(resource, 0):.2f}") if limit != float('inf') else 0
+        if cost > 0:
+            items.append({"resource": resource, "overage_amount": overage, "cost": cost})
+            total += cost
+    return items, total
+
+
+class CrashingEngine(OverageBillingEngine):
+    """Fails on its fourth batch write, like a worker killed mid-run"""
+
+    writes = 0
+
+    async def _write(self, charges):
+        self.writes += 1
+        if self.writes == 4:
+            raise RuntimeError("worker killed")
+        return await super()._write(charges)
+
+
+async def run_benchmark():
+    results = []
+    rng = random.Random(50)
+    now = datetime.utcnow()
+    period = now.strftime("%Y-%m")
+    print("🧾 Overage Billing Benchmark")
+    print("=" * 70)
+
+    try:
+        await seed(rng, now)
+        await IndexMigrationRunner(db, index_registry).migrate()
+        billable = await db.users.count_documents({"is_active": True, "plan_type": {"$ne": "scale"}})
+        print(f"Seeded {USERS:,} users ({billable:,} billable)\n")
+
+        # Previous loop on a sample, extrapolated to every billable user
+        sample = await db.users.find({"is_active": True, "plan_type": {"$ne": "scale"}}).sort("email", 1).limit(LEGACY_SAMPLE).to_list(length=LEGACY_SAMPLE)
+        started = time.perf_counter()
+        legacy = {user["email"]: await legacy_charge(user) for user in sample}
+        legacy_rate = len(sample) / (time.perf_counter() - started)
+
+        # A run that dies after three batches, then resumes once its lease has lapsed
+        crashing = CrashingEngine(db, USAGE_LIMITS, OVERAGE_PRICING, batch_size=1000)
+        try:
+            await crashing.run(period)
+        except RuntimeError:
+            pass
+        before_resume = await db.overage_charges.count_documents({})
+        await db.billing_runs.update_one({"_id": f"overage_{period}"}, {"$set": {"lease_until": datetime.utcnow() - timedelta(seconds=1)}})
+        engine = OverageBillingEngine(db, USAGE_LIMITS, OVERAGE_PRICING, batch_size=1000)
+        report = await engine.run(period)
+
+        charges = {charge["user_email"]: charge for charge in await db.overage_charges.find({}, {"_id": 0}).to_list(length=None)}
+        identical = all(
+            (email in charges) == (total > 0)
+            and (email not in charges or (charges[email]["overage_items"] == items and charges[email]["total_charge"] == total))
+            for email, (items, total) in legacy.items()
+        )
+        results.append(identical)
+        print(f"{'✅ PASS' if identical else '❌ FAIL'}: charges of {len(sample)} sampled users identical to the previous per-user loop")
+
+        resumed = (report["resumed"] and before_resume > 0 and report["users_scanned"] == billable
+                   and len(charges) == report["users_charged"] == report["charges_created"])
+        results.append(resumed)
+        print(f"{'✅ PASS' if resumed else '❌ FAIL'}: crashed after {before_resume:,} charges, resumed from its cursor: "
+              f"{report['users_scanned']:,} users scanned once, {report['users_charged']:,} charges, no duplicates")
+
+        rate = report["users_per_second"] or 0
+        faster = rate > legacy_rate * 10
+        results.append(faster)
+        print(f"{'✅ PASS' if faster else '❌ FAIL'}: {rate:,.0f} users/s vs {legacy_rate:,.0f} users/s per-user "
+              f"(timings {report['timings']}); previous loop would take ~{billable / legacy_rate:,.0f}s")
+
+        total = round(sum(charge["total_charge"] for charge in charges.values()), 2)
+        again = await engine.run(period)
+        idempotent = (again["run_id"] == report["run_id"] and await db.overage_charges.count_documents({}) == len(charges)
+                      and report["total_charges"] == total)
+        results.append(idempotent)
+        print(f"{'✅ PASS' if idempotent else '❌ FAIL'}: second call in {period} returned the completed run "
+              f"(${report['total_charges']:,.2f}) without new charges")
+
+    finally:
+        await client.drop_database(os.environ["DB_NAME"])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - Trial Email Processor Benchmark
+Schedules a day-7 email for 100k trial users and compares the set-based processor
+with the legacy per-email find_one/update_one loop
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Scratch database and log-only delivery (no SMTP_HOST) before importing the modules
+os.environ["DB_NAME"] = f"trial_email_benchmark_{uuid.uuid4().hex[:8]}"
+os.environ["EMAIL_PREFER_ODOO"] = "false"
+os.environ.pop("SMTP_HOST", None)
+sys.path.append('/app/backend')
+
+from modules.email_system import db, client, TrialEmailStatus, TrialEmailType
+from modules.trial_email_processor import TrialEmailProcessor
+from modules.index_registry import index_registry, IndexMigrationRunner
+
+TRIAL_USERS = int(os.getenv("TRIAL_USERS", "100000"))
+LEGACY_SAMPLE = int(os.getenv("LEGACY_SAMPLE", "2000"))
+CONVERTED_EVERY = 20  # every 20th user converted before day 7
+
+
+async def seed(prefix: str, size: int):
+    due = datetime.utcnow() - timedelta(minutes=1)
+    users, logs = [], []
+    for i in range(size):
+        email = f"{prefix}{i}@example.com"
+        users.append({"user_id": f"{prefix}_{i:08d}", "email": email, "is_trial": i % CONVERTED_EVERY != 0})
+        logs.append({
+            "log_id": f"{prefix}_log_{i:08d}",
+            "user_email": email,
+            "user_name": f"User{i}",
+            "email_type": TrialEmailType.FINAL_NOTICE.value,
+            "subject": "Your trial ends today",
+            "html_content": f"<p>Hi User{i}, your trial ends today.</p>",
+            "scheduled_send_time": due,
+            "status": TrialEmailStatus.SCHEDULED.value,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        })
+        if len(logs) == 10000:
+            await db.users.insert_many(users, ordered=False)
+            await db.trial_email_logs.insert_many(logs, ordered=False)
+            users, logs = [], []
+    if logs:
+        await db.users.insert_many(users, ordered=False)
+        await db.trial_email_logs.insert_many(logs, ordered=False)
+
+
+async def legacy_process(prefix: str):
+    """The previous per-email loop: one users lookup and one update per log"""
+    cursor = db.trial_email_logs.find({
+        "log_id": {"$regex": f"^{prefix}_"},
+        "status": TrialEmailStatus.SCHEDULED.value,
+        "scheduled_send_time": {"$lte": datetime.utcnow()}
+    })
+    async for email_log in cursor:
+        user = await db.users.find_one({"email": email_log["user_email"]})
+        if user and not user.get("is_trial", True):
+            await db.trial_email_logs.update_one(
+                {"log_id": email_log["log_id"]},
+                {"$set": {"status": TrialEmailStatus.SKIPPED.value, "updated_at": datetime.utcnow()}}
+            )
+            continue
+        await db.trial_email_logs.update_one(
+            {"log_id": email_log["log_id"]},
+            {"$set": {"status": TrialEmailStatus.SENT.value, "actual_send_time": datetime.utcnow()}}
+        )
+
+
+async def status_counts(prefix: str):
+    counts = {}
+    async for row in db.trial_email_logs.aggregate([
+        {"$match": {"log_id": {"$regex": f"^{prefix}_"}}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]):
+        counts[row["_id"]] = row["count"]
+    return counts
+
+
+async def run_benchmark():
+    results = []
+    print("⏰ Trial Email Processor Benchmark")
+    print("=" * 60)
+
+    try:
+        await db.users.create_index("email")
+        processor = TrialEmailProcessor()
+        await IndexMigrationRunner(db, index_registry).migrate()
+
+        await seed("legacy", LEGACY_SAMPLE)
+        started = time.perf_counter()
+        await legacy_process("legacy")
+        legacy_rate = LEGACY_SAMPLE / (time.perf_counter() - started)
+        print(f"Legacy per-email loop:  {LEGACY_SAMPLE:>7,} emails at {legacy_rate:>9,.0f}/s")
+
+        await seed("trial", TRIAL_USERS)
+        started = time.perf_counter()
+        totals = await processor.process_due()
+        elapsed = time.perf_counter() - started
+        rate = TRIAL_USERS / elapsed
+        print(f"Set-based processor:    {TRIAL_USERS:>7,} emails at {rate:>9,.0f}/s ({elapsed:.2f}s, {rate / legacy_rate:.0f}x)")
+
+        expected_skipped = len(range(0, TRIAL_USERS, CONVERTED_EVERY))
+        counts = await status_counts("trial")
+        ok = (
+            totals["skipped"] == expected_skipped
+            and totals["sent"] == TRIAL_USERS - expected_skipped
+            and counts.get(TrialEmailStatus.SKIPPED.value) == expected_skipped
+            and counts.get(TrialEmailStatus.SENT.value) == TRIAL_USERS - expected_skipped
+        )
+        results.append(ok)
+        print(f"\n{'✅ PASS' if ok else '❌ FAIL'}: {totals['sent']:,} sent, {totals['skipped']:,} skipped for converted users, statuses {counts}")
+
+        leftover = await db.trial_email_logs.count_documents({"claim_id": {"$exists": True}})
+        results.append(leftover == 0)
+        print(f"{'✅ PASS' if leftover == 0 else '❌ FAIL'}: no claims left behind ({leftover})")
+
+        # A second pass finds nothing due and the sleep is capped by max_idle_seconds
+        again = await processor.process_due()
+        wait = await processor.seconds_until_next_due()
+        idle = sum(again.values()) == 0 and wait == processor.max_idle_seconds
+        results.append(idle)
+        print(f"{'✅ PASS' if idle else '❌ FAIL'}: re-run sends nothing and sleeps {wait:.0f}s until the next due email")
+
+        # Stale claims from a crashed worker are released and sent
+        await db.trial_email_logs.update_many(
+            {"log_id": {"$in": ["trial_log_00000001", "trial_log_00000002"]}},
+            {"$set": {"status": TrialEmailStatus.SENDING.value, "claim_id": "crashed", "claimed_at": datetime.utcnow() - timedelta(hours=1)}}
+        )
+        recovered = await processor.process_due()
+        results.append(recovered["sent"] == 2)
+        print(f"{'✅ PASS' if recovered['sent'] == 2 else '❌ FAIL'}: stale claims recovered and resent ({recovered['sent']})")
+
+    finally:
+        await client.drop_database(os.environ["DB_NAME"])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+CustomerMind IQ - User Search Benchmark
+Seeds one million users into a scratch database and compares the indexed user search with the
+previous case-insensitive $regex and skip/limit search: identical matches, p95 latency of prefix
+and substring queries under 50 ms, deep keyset pages, total estimates and the search field backfill
+"""
+
+import asyncio
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Scratch database before importing the modules
+os.environ["DB_NAME"] = f"user_search_benchmark_{uuid.uuid4().hex[:8]}"
+sys.path.append('/app/backend')
+
+from modules.user_search import db, client, UserSearchEngine, search_fields, normalize
+from modules.index_registry import index_registry, IndexMigrationRunner
+
+USERS = int(os.getenv("USER_SEARCH_USERS", "1000000"))
+QUERIES = 200
+P95_TARGET_MS = 50
+FIRST_NAMES = ["james", "mary", "john", "patricia", "robert", "jennifer", "michael", "linda", "william", "elizabeth",
+               "david", "barbara", "richard", "susan", "joseph", "jessica", "thomas", "sarah", "charles", "karen",
+               "chloe", "zoe", "renee", "andre", "amelie", "noah", "liam", "olivia", "emma", "ava", "sofia", "mateo"]
+LAST_NAMES = ["smith", "johnson", "williams", "brown", "jones", "garcia", "miller", "davis", "rodriguez", "martinez",
+              "hernandez", "lopez", "gonzalez", "wilson", "anderson", "thomas", "taylor", "moore", "jackson", "martin",
+              "lee", "perez", "thompson", "white", "harris", "sanchez", "clark", "ramirez", "lewis", "robinson"]
+DOMAINS = ["gmail.com", "outlook.com", "yahoo.com", "acme.io", "initech.com", "globex.net", "umbrella.org"]
+COMPANIES = ["Acme", "Initech", "Globex", "Umbrella", "Hooli", "Vandelay Industries", "Stark", "Wayne Enterprises", None]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def make_user(rng, index, now):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return {
+        "user_id": f"user_{index:07d}",
+        "email": f"{first}.{last}{rng.randrange(10000)}@{rng.choice(DOMAINS)}",
+        "first_name": first.capitalize(),
+        "last_name": last.capitalize(),
+        "company_name": rng.choice(COMPANIES),
+        "role": rng.choice(["user", "user", "user", "admin"]),
+        "subscription_tier": rng.choice(["free", "launch", "growth", "scale"]),
+        "is_active": rng.random() < 0.9,
+        "created_at": now - timedelta(seconds=rng.uniform(0, 3 * 365 * 86400))
+    }
+
+
+async def seed(rng, now, engine):
+    await IndexMigrationRunner(db, index_registry).migrate()
+    batch = []
+    for index in range(USERS):
+        user = make_user(rng, index, now)
+        user["search"] = search_fields(user)
+        batch.append(user)
+        if len(batch) == 10000:
+            await db.users.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.users.insert_many(batch, ordered=False)
+
+
+# ----- Previous search: unanchored case-insensitive regex, skip/limit, exact count -----
+async def legacy_search(pattern, limit=50, offset=0):
+    query = {"$or": [{field: {"$regex": pattern, "$options": "i"}} for field in ("email", "first_name", "last_name", "company_name")]}
+    users = await db.users.find(query, {"user_id": 1}).sort([("created_at", -1), ("user_id", -1)]).skip(offset).limit(limit).to_list(length=limit)
+    total = await db.users.count_documents(query)
+    return [user["user_id"] for user in users], total
+
+
+def ids(result):
+    return [user["user_id"] for user in result["users"]]
+
+
+async def timed(coroutine):
+    started = time.perf_counter()
+    result = await coroutine
+    return result, (time.perf_counter() - started) * 1000
+
+
+async def run_benchmark():
+    results = []
+    rng = random.Random(46)
+    now = datetime.utcnow()
+    engine = UserSearchEngine(db)
+    print("🔎 User Search Benchmark")
+    print("=" * 70)
+
+    try:
+        started = time.perf_counter()
+        await seed(rng, now, engine)
+        print(f"Seeded {USERS:,} users with search fields in {time.perf_counter() - started:.0f}s\n")
+
+        # Query strings taken from real users so most of them match
+        samples = [make_user(rng, 0, now) for _ in range(QUERIES)]
+        prefixes = [normalize(rng.choice([u["email"], u["last_name"], u["company_name"] or u["first_name"]]))[:rng.randint(1, 6)] for u in samples]
+        substrings = []
+        for user in samples:
+            email = user["email"]
+            start = rng.randrange(len(email) - 4)
+            substrings.append(email[start:start + rng.randint(3, 7)])
+
+        # Same first page as the previous regex search
+        identical = True
+        for prefix in prefixes[:15]:
+            legacy, legacy_total = await legacy_search("^" + re.escape(prefix))
+            result = await engine.search({}, query=prefix, match="prefix")
+            identical = identical and ids(result) == legacy
+        for substring in substrings[:15]:
+            legacy, legacy_total = await legacy_search(re.escape(substring))
+            result = await engine.search({}, query=substring, match="contains")
+            identical = identical and ids(result) == legacy
+        results.append(identical)
+        print(f"{'✅ PASS' if identical else '❌ FAIL'}: first page identical to the previous $regex search for 30 prefix and substring queries")
+
+        # Latency of the previous search on a few queries
+        legacy_ms = []
+        for substring in substrings[:5]:
+            _, elapsed = await timed(legacy_search(re.escape(substring)))
+            legacy_ms.append(elapsed)
+
+        for label, match, queries in (("prefix", "prefix", prefixes), ("substring", "contains", substrings)):
+            latencies = []
+            for text in queries:
+                _, elapsed = await timed(engine.search({}, query=text, match=match))
+                latencies.append(elapsed)
+            p95 = percentile(latencies, 0.95)
+            fast = p95 < P95_TARGET_MS
+            results.append(fast)
+            print(f"{'✅ PASS' if fast else '❌ FAIL'}: {label} search p95 {p95:.1f} ms, p50 {percentile(latencies, 0.5):.1f} ms "
+                  f"over {len(queries)} queries (previous regex search ~{sum(legacy_ms) / len(legacy_ms):.0f} ms)")
+
+        # Filters combined with the search text
+        filtered = []
+        for text in prefixes[:50]:
+            _, elapsed = await timed(engine.search({"role": "admin", "is_active": True}, query=text))
+            filtered.append(elapsed)
+        p95 = percentile(filtered, 0.95)
+        results.append(p95 < P95_TARGET_MS)
+        print(f"{'✅ PASS' if p95 < P95_TARGET_MS else '❌ FAIL'}: search with role and status filters p95 {p95:.1f} ms")
+
+        # Keyset pages are contiguous and stay fast at depth
+        pages, cursor, seen = 0, None, []
+        page_ms = []
+        while pages < 200:
+            result, elapsed = await timed(engine.search({}, query="j", limit=50, cursor=cursor))
+            seen.extend(ids(result))
+            page_ms.append(elapsed)
+            pages += 1
+            cursor = result["next_cursor"]
+            if not cursor:
+                break
+        legacy_page, legacy_deep_ms = await timed(legacy_search("^j", limit=50, offset=50 * (pages - 1)))
+        contiguous = len(seen) == len(set(seen)) and seen[-len(legacy_page[0]):] == legacy_page[0]
+        deep = contiguous and page_ms[-1] < P95_TARGET_MS
+        results.append(deep)
+        print(f"{'✅ PASS' if deep else '❌ FAIL'}: {pages} keyset pages without gaps or repeats; page {pages} in {page_ms[-1]:.1f} ms "
+              f"vs {legacy_deep_ms:.0f} ms with skip")
+
+        # Totals: exact while small, estimated within 15% when large
+        broad = await engine.search({}, query="gmail", match="contains")
+        exact_broad = await db.users.count_documents({"email": {"$regex": "gmail"}})
+        narrow = await engine.search({}, query=substrings[0], match="contains")
+        _, exact_narrow = await legacy_search(re.escape(substrings[0]))
+        estimated = (broad["total_is_estimate"] and abs(broad["total"] - exact_broad) / exact_broad < 0.15
+                     and (narrow["total"] == exact_narrow or narrow["total_is_estimate"]))
+        results.append(estimated)
+        print(f"{'✅ PASS' if estimated else '❌ FAIL'}: total for 'gmail' estimated {broad['total']:,} vs {exact_broad:,} exact; "
+              f"'{substrings[0]}' total {narrow['total']:,} ({'estimate' if narrow['total_is_estimate'] else 'exact'})")
+
+        # Users written without search fields are picked up by the backfill
+        await db.users.insert_many([{**make_user(rng, USERS + i, now), "email": f"backfill.case{i}@example.com"} for i in range(500)])
+        before = (await engine.search({}, query="backfill.case"))["total"]
+        updated = await engine.backfill()
+        after = (await engine.search({}, query="backfill.case"))["total"]
+        backfilled = before == 0 and updated == 500 and after == 500
+        results.append(backfilled)
+        print(f"{'✅ PASS' if backfilled else '❌ FAIL'}: backfill derived search fields for {updated:,} users written elsewhere")
+
+    finally:
+        await client.drop_database(os.environ["DB_NAME"])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(run_benchmark())
+    sys.exit(0 if success else 1)